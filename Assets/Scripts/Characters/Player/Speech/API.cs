@@ -58,6 +58,50 @@ namespace Characters.Player.Speech {
             }
         }
         
+        /// <summary>
+        /// Check if the API has finished loading and warming up the model. The API answers
+        /// TestConnection as soon as it starts, while the model may still be loading
+        /// </summary>
+        /// <param name="onComplete">A lambda function: Defines the behavior we want after checking</param>
+        public IEnumerator TestReady(Action<bool> onComplete) {
+            UnityWebRequest www = UnityWebRequest.Get(_url + "ready");
+
+            yield return www.SendWebRequest();
+            
+            onComplete?.Invoke(www.result == UnityWebRequest.Result.Success);
+        }
+        
+        public const string AudioContentType = "application/x-asr-audio";
+
+        /// <summary>
+        /// Pack a recording into the framed format the API accepts: a 16 byte header with the sample
+        /// rate and channel count followed by int16 PCM, half the size of the raw float32 samples.
+        /// The API resamples the audio itself if the sample rate doesn't match the model's
+        /// </summary>
+        /// <param name="samples">The interleaved samples collected from the microphone</param>
+        /// <param name="sampleRate">The sample rate of the recording</param>
+        /// <param name="channels">The number of channels of the recording</param>
+        /// <returns>The framed audio, sent with AudioContentType</returns>
+        public static byte[] FrameAudio(float[] samples, int sampleRate, int channels = 1) {
+            byte[] data = new byte[16 + samples.Length * sizeof(short)];
+
+            // Magic, sample rate, encoding (1 = int16), channels, reserved, frames per channel
+            data[0] = (byte)'A'; data[1] = (byte)'S'; data[2] = (byte)'R'; data[3] = (byte)'1';
+            BitConverter.GetBytes((uint)sampleRate).CopyTo(data, 4);
+            data[8] = 1;
+            data[9] = (byte)channels;
+            BitConverter.GetBytes((uint)(samples.Length / channels)).CopyTo(data, 12);
+
+            for (int i = 0; i < samples.Length; i++) {
+                short sample = (short)(Mathf.Clamp(samples[i], -1f, 1f) * short.MaxValue);
+
+                data[16 + i * 2] = (byte)sample;
+                data[17 + i * 2] = (byte)(sample >> 8);
+            }
+
+            return data;
+        }
+
         /// <summary>
         /// Send data to a specified endpoint to the API
         /// </summary>
@@ -65,11 +109,12 @@ namespace Characters.Player.Speech {
         /// <param name="data"></param>
         /// <param name="onSuccess">Lambda Function: defines the behavior for successfully posting the data</param>
         /// <param name="onError">Lambda function: defines the behavior for an unsuccessful post</param>
-        public IEnumerator SendWebRequest(string endpoint, byte[] data, Action<string> onSuccess, Action<string> onError) {
+        /// <param name="contentType">application/octet-stream for raw float32 audio, AudioContentType for FrameAudio</param>
+        public IEnumerator SendWebRequest(string endpoint, byte[] data, Action<string> onSuccess, Action<string> onError, string contentType = "application/octet-stream") {
             UnityWebRequest www = UnityWebRequest.PostWwwForm(this._url + endpoint, "");
             www.uploadHandler = new UploadHandlerRaw(data);
             www.downloadHandler = new DownloadHandlerBuffer();
-            www.SetRequestHeader("Content-Type", "application/octet-stream");
+            www.SetRequestHeader("Content-Type", contentType);
 
             yield return www.SendWebRequest();
 
@@ -283,8 +283,8 @@ namespace Characters.Player.Speech {
         private IEnumerator GetPrediction(float[] audioData) {
             string prediction = " ";
             
-            byte[] audioBytes = new byte[audioData.Length * sizeof(float)];
-            System.Buffer.BlockCopy(audioData, 0, audioBytes, 0, audioBytes.Length);
+            // int16 with a small header, half the bytes of the raw float32 samples
+            byte[] audioBytes = API.FrameAudio(audioData, SampleRate);
             
             // Timeout / running doesn't set if we start the scene outside of the main menu screen.
             if (APIWatchDog.Running && !APIWatchDog.Timeout) {
@@ -300,7 +300,8 @@ namespace Characters.Player.Speech {
                         Debug.Log("Failed to send audio: " + error);
     
                         prediction = "Ugh... my head feels fuzzy...";
-                    }
+                    },
+                    API.AudioContentType
                 );
             }
             
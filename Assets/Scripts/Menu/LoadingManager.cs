@@ -20,6 +20,7 @@ public class LoadingManager : MonoBehaviour {
     private float sceneProgress = 0f;
     private bool isProcessRunning;
     private bool isConnected;
+    private bool isReady;
     private int dotCounter = 0;
     private int frames = 30;
     
@@ -64,7 +65,7 @@ public class LoadingManager : MonoBehaviour {
                 yield return StartCoroutine(api.TestConnection((success) => {
                     isConnected = success;
                     APIWatchDog.Running = true;
-                    apiProgress = success ? 0.50f : apiProgress;
+                    apiProgress = success ? 0.25f : apiProgress;
                 }));
             }
             
@@ -73,6 +74,30 @@ public class LoadingManager : MonoBehaviour {
             yield return new WaitForEndOfFrame();
         }
 
+        // The API answers as soon as it starts, the model loads in the background after that
+        while (isConnected && !isReady) {
+            statusText.text = "API - Loading model" + new string('.', (dotCounter / frames) % 4);
+            dotCounter++;
+            
+            timer += Time.deltaTime;
+            
+            if (timer > timeout) {
+                statusText.text = "Connection Timeout!";
+                APIWatchDog.Timeout = true;
+                yield return new WaitForSeconds(1);
+                break;
+            }
+            
+            yield return StartCoroutine(api.TestReady((success) => {
+                isReady = success;
+                apiProgress = success ? 0.50f : apiProgress;
+            }));
+            
+            progressBar.fillAmount = processProgress + apiProgress + sceneProgress;
+            
+            yield return new WaitForEndOfFrame();
+        }
+
         if (APIWatchDog.Running) {
             statusText.text = "Connected Successfully!";
             yield return new WaitForSeconds(1);
@@ -2,53 +2,315 @@
 
 import os
 import sys
+import threading
+import functools
+import multiprocessing
 import numpy as np
 from flask import Flask, jsonify, request
-from multiprocessing import Process
 from io import BytesIO
 
-from Recognition import SpeechRec
+# Tensorflow, and everything that imports it, is only imported once the model is loaded so the
+# server is up as soon as possible
+from WorkerPool import WorkerPool
 from Grab_Ini import ini
+import AudioFormat
+from ResultCache import ResultCache
+from Metrics import metrics, Merge, Render
 
 app = Flask(__name__)
 close = False
+backend = None
+admission = None
+cache = None
+ready = threading.Event()
+stage = "starting"
+sampleRate = 16000
+
+def Admit(_route):
+    """
+    Reject requests that need the model with a 503 while the model is loading, or once
+    queue_depth of them are already waiting or running instead of letting them pile up. Routes
+    that don't use the model, like / and /close, aren't wrapped so they always answer right away.
+    """
+    @functools.wraps(_route)
+    def Wrapper(*args, **kwargs):
+        if not ready.is_set():
+            metrics.Reject()
+            return jsonify({"error": "The model is still loading", "stage": stage}), 503, {"Retry-After": "1"}
+
+        if admission is not None and not admission.acquire(blocking = False):
+            metrics.Reject()
+            return jsonify({"error": "The server is busy, try again"}), 503, {"Retry-After": "1"}
+
+        # Requests are counted by the rule they matched, so every streaming session shares a route
+        metrics.Begin(request.url_rule.rule)
+        status = 500
+
+        try:
+            response = _route(*args, **kwargs)
+            status = response[1] if isinstance(response, tuple) else 200
+
+            return response
+        finally:
+            metrics.End(status)
+
+            if admission is not None:
+                admission.release()
+
+    return Wrapper
+
+def ReadAudio():
+    """
+    Reads the audio of a request. Framed clips are decoded and resampled to the model's sample
+    rate, anything else is read as raw float32 PCM like the game always sent it.
+
+    Returns:
+        A np.float32 audio clip
+    """
+    with metrics.Time("parse"):
+        if request.mimetype == AudioFormat.CONTENT_TYPE:
+            audio = AudioFormat.Decode(request.get_data(cache = False), sampleRate)
+        else:
+            audio = np.frombuffer(request.data, dtype = np.float32)
+
+    metrics.Audio(len(audio) / sampleRate)
+
+    return audio
 
 @app.route('/')
 def index():
     return 'Hello, Welcome to the Automatic Speech Recognition API!'
 
+@app.route('/ready')
+def ready_service():
+    # / answers as soon as the server is up, this only answers 200 once the model is warmed up
+    if ready.is_set():
+        return jsonify({"ready": True, "stage": stage}), 200
+
+    return jsonify({"ready": False, "stage": stage}), 503
+
+@app.route('/cache')
+def cache_service():
+    if cache is None:
+        return jsonify({"enabled": False}), 200
+
+    return jsonify(dict(cache.Stats(), enabled = True)), 200
+
+@app.route('/metrics')
+def metrics_service():
+    snapshots = [metrics.Snapshot()]
+
+    # With worker processes the model runs in them, so their stages are kept there
+    if isinstance(backend, WorkerPool) and ready.is_set():
+        snapshots.append(backend.Metrics())
+
+    return Render(Merge(snapshots)), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
 @app.route('/ASR', methods = ['POST'])
+@Admit
 def api_service():    
     try:
         print("\nGenerating Prediction...")
-        audio_bytes = request.data
-
-        audio_data = np.frombuffer(audio_bytes, dtype = np.float32)
+        audio_data = ReadAudio()
 
-        prediction = speechRec.Predict(audio_data)
-        prediction = speechRec.PostProcess(prediction)
+        if cache is not None:
+            prediction = cache.Fetch(audio_data, backend.Predict)
+        else:
+            prediction = backend.Predict(audio_data)
         
         return jsonify({"prediction": prediction}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
+@app.route('/ASR/stream/<sessionId>', methods = ['POST'])
+@Admit
+def stream_service(sessionId):
+    try:
+        audio_data = ReadAudio()
+
+        prediction = backend.StreamPush(sessionId, audio_data)
+
+        return jsonify({"prediction": prediction, "final": False}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/ASR/stream/<sessionId>/end', methods = ['POST'])
+@Admit
+def stream_end_service(sessionId):
+    try:
+        audio_data = ReadAudio()
+
+        prediction = backend.StreamEnd(sessionId, audio_data)
+
+        return jsonify({"prediction": prediction, "final": True}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/ASR/phrases/<listName>', methods = ['POST'])
+@Admit
+def phrases_service(listName):
+    try:
+        phrases = request.get_json(force = True)["phrases"]
+
+        backend.RegisterPhrases(listName, phrases)
+
+        # The matches against the old phrases are stale now
+        if cache is not None:
+            cache.Clear(f"phrases/{listName}")
+
+        return jsonify({"phrases": len(phrases)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/ASR/phrases/<listName>/match', methods = ['POST'])
+@Admit
+def phrase_match_service(listName):
+    try:
+        audio_data = ReadAudio()
+
+        if cache is not None:
+            prediction, confidence = cache.Fetch(audio_data, lambda audio: backend.PredictPhrase(audio, listName), f"phrases/{listName}")
+        else:
+            prediction, confidence = backend.PredictPhrase(audio_data, listName)
+
+        return jsonify({"prediction": prediction, "confidence": confidence}), 200
+    except KeyError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/close')
 def close_api():
+    # The workers would exit on their own once they notice the API is gone, this is just quicker
+    if isinstance(backend, WorkerPool):
+        backend.Close(_timeout = 1.0)
+
     os._exit(0)
-    
+
+def Setup(_apiConfig, _modelPath = None):
+    """
+    Load the model, either in this process or once in every worker process, and get the
+    admission limit ready
+
+    Parameters:
+        - _apiConfig: The [API] section of the config
+        - _modelPath: The .keras file, .tflite file or SavedModel directory to serve, the packaged
+                      model when None
+    """
+    global backend, admission, cache, stage
+
+    workers = int(_apiConfig.get('workers', 0))
+
+    admission = threading.BoundedSemaphore(int(_apiConfig.get('queue_depth', 64)))
+
+    # The cache lives in the API process, so a hit doesn't even reach the worker processes
+    if eval(_apiConfig.get('cache', 'False')):
+        cache = ResultCache(
+            float(_apiConfig.get('cache_mb', 16)) * 1e6,
+            eval(_apiConfig.get('cache_near_duplicates', 'False')),
+            float(_apiConfig.get('cache_max_distance', 0.1)),
+            sampleRate
+        )
+    else:
+        cache = None
+
+    if workers > 0:
+        print(f"\nStarting {workers} model workers...")
+        stage = "starting workers"
+        backend = WorkerPool(_apiConfig, workers, _modelPath)
+        return
+
+    stage = "importing"
+    from Recognition import SpeechRec
+    from Backend import LocalBackend, ConfigureThreads
+
+    ConfigureThreads(_apiConfig)
+
+    print("\nLoading model...")
+    stage = "loading model"
+    if _modelPath is not None:
+        speechRec = SpeechRec(SpeechRec.LoadModel(_modelPath))
+    else:
+        speechRec = SpeechRec()
+
+    print("\nWarming up model...")
+    stage = "warming up"
+    speechRec.Warmup()
+
+    backend = LocalBackend(speechRec, _apiConfig)
+
+def Load(_apiConfig, _modelPath = None):
+    """
+    Runs Setup and marks the API as ready once it finished. With background_start this runs on
+    its own thread while the server already answers / and /ready.
+
+    Parameters:
+        - _apiConfig: The [API] section of the config
+        - _modelPath: The model file to serve, the packaged model when None
+    """
+    global stage
+
+    try:
+        Setup(_apiConfig, _modelPath)
+    except Exception as e:
+        stage = f"failed: {str(e)}"
+        print(f"Error loading the model: {str(e)}")
+        raise
+
+    stage = "ready"
+    ready.set()
+
+def Serve(_apiConfig, _host = '0.0.0.0'):
+    """
+    Serve the API until it is closed. Waitress accepts connections asynchronously and hands the
+    requests to a thread pool that has a few more threads than queue_depth, so a thread is always
+    free for / and /close even when the model is fully loaded.
+
+    Parameters:
+        - _apiConfig: The [API] section of the config
+        - _host: The address to listen on
+    """
+    port = int(_apiConfig['port'])
+
+    if _apiConfig.get('server', 'waitress') == 'waitress':
+        try:
+            from waitress import serve
+
+            serve(app, host = _host, port = port, threads = int(_apiConfig.get('queue_depth', 64)) + 4)
+            return
+        except ImportError:
+            print("waitress isn't installed, falling back to the flask server")
+
+    app.run(host = _host, port = port, threaded = True)
+
 def main():
-    global speechRec
+    global sampleRate
+
+    multiprocessing.freeze_support()
 
     try:
         print("Loading Config...")
-        apiConfig = ini().grabInfo(os.path.join(os.path.dirname(sys.executable), "config.ini"), "API")
-        port = int(apiConfig['port'])
+        configPath = os.path.join(os.path.dirname(sys.executable), "config.ini")
+        apiConfig = ini().grabInfo(configPath, "API")
+        sampleRate = int(ini().grabInfo(configPath, "Process.Spectrogram").get('sample_rate', 16000))
 
-        print("\nLoading model...")
-        speechRec = SpeechRec()
+        metrics.ConfigureFrom(apiConfig)
+
+        if eval(apiConfig.get('background_start', 'False')):
+            threading.Thread(target = Load, args = (apiConfig,), name = "Load", daemon = True).start()
+        else:
+            Load(apiConfig)
 
         print("\nStarting API...")
-        app.run(host = '0.0.0.0', port = port)
+        Serve(apiConfig)
     except Exception as e:
         print(f"Error starting the server: {str(e)}")
 
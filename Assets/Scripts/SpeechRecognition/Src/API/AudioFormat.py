@@ -0,0 +1,174 @@
+# Lucas Davis
+
+import math
+import zlib
+import struct
+import numpy as np
+
+# Requests with this content type carry a framed clip, anything else is raw float32 PCM at the
+# model's sample rate like before
+CONTENT_TYPE = "application/x-asr-audio"
+
+# The 16 byte little endian header of a framed clip:
+#   magic, sample rate, encoding, channels, reserved, frames (samples per channel)
+MAGIC  = b"ASR1"
+HEADER = struct.Struct("<4sIBBHI")
+
+# Encodings of the payload after the header
+FLOAT32 = 0     # Interleaved float32 PCM
+INT16   = 1     # Interleaved int16 PCM
+DEFLATE = 2     # Interleaved int16 PCM, delta coded per channel then raw deflate compressed
+
+def Encode(_audio, _sampleRate, _encoding = INT16):
+    """
+    Frames a clip the way the game sends it, used by the benchmarks and tests
+
+    Parameters:
+        - _audio: np.float32 audio in the shape of (samples,) or (samples, channels)
+        - _sampleRate: The sample rate of the clip
+        - _encoding: FLOAT32, INT16 or DEFLATE
+
+    Returns:
+        The framed clip as bytes
+    """
+    audio = np.asarray(_audio, dtype = np.float32)
+    audio = audio.reshape(audio.shape[0], -1)
+
+    if _encoding == FLOAT32:
+        payload = audio.tobytes()
+    else:
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+        if _encoding == DEFLATE:
+            # Neighbouring samples are close, so their differences compress far better
+            pcm = np.diff(pcm, axis = 0, prepend = np.zeros((1, pcm.shape[1]), dtype = np.int16))
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+            payload = compressor.compress(pcm.tobytes()) + compressor.flush()
+        else:
+            payload = pcm.tobytes()
+
+    return HEADER.pack(MAGIC, int(_sampleRate), _encoding, audio.shape[1], 0, audio.shape[0]) + payload
+
+def Decode(_body, _sampleRate):
+    """
+    Turns a framed clip into the mono float32 audio the model expects. Raw PCM payloads are
+    read in place, the only copies made are the int16 to float32 conversion, the channel mix and
+    the resampling, when they are needed.
+
+    Parameters:
+        - _body: The framed clip as bytes
+        - _sampleRate: The sample rate of the model
+
+    Returns:
+        A np.float32 audio clip at the models sample rate
+    """
+    if len(_body) < HEADER.size:
+        raise ValueError("The audio is shorter than its header")
+
+    magic, sampleRate, encoding, channels, _, frames = HEADER.unpack_from(_body)
+
+    if magic != MAGIC:
+        raise ValueError("The audio doesn't start with the ASR1 header")
+
+    if sampleRate == 0 or channels == 0:
+        raise ValueError("The audio needs a sample rate and at least one channel")
+
+    payload = memoryview(_body)[HEADER.size:]
+    samples = frames * channels
+
+    if encoding == FLOAT32:
+        audio = np.frombuffer(payload, dtype = np.float32, count = samples)
+    elif encoding in (INT16, DEFLATE):
+        if encoding == DEFLATE:
+            # Never inflates past the size the header claims, a few kilobytes of deflate can
+            # otherwise expand to gigabytes
+            decompressor = zlib.decompressobj(-15)
+
+            try:
+                payload = decompressor.decompress(payload, samples * 2)
+            except zlib.error as e:
+                raise ValueError(f"The audio isn't valid deflate data: {e}")
+
+            if decompressor.unconsumed_tail or decompressor.unused_data or len(payload) != samples * 2:
+                raise ValueError("The deflated audio doesn't hold the amount of samples in its header")
+
+        pcm = np.frombuffer(payload, dtype = np.int16, count = samples)
+
+        if encoding == DEFLATE:
+            # Undo the delta coding, int16 wraps around the same way it did when encoding
+            pcm = np.cumsum(pcm.reshape(frames, channels), axis = 0, dtype = np.int16).reshape(-1)
+
+        audio = pcm.astype(np.float32)
+        audio *= 1.0 / 32767.0
+    else:
+        raise ValueError(f"Unknown audio encoding {encoding}")
+
+    if channels > 1:
+        audio = audio.reshape(frames, channels).mean(axis = 1, dtype = np.float32)
+
+    if sampleRate != _sampleRate:
+        audio = Resample(audio, sampleRate, _sampleRate)
+
+    return audio
+
+def FastLength(_length, _step):
+    """
+    Parameters:
+        - _length: The length of a clip
+        - _step: The length has to be a multiple of this
+
+    Returns:
+        The first multiple of _step at or above _length where the multiplier has no prime factors
+        above 5, so the fft only has small factors to work through
+    """
+    multiple = -(-_length // _step)
+
+    while True:
+        remainder = multiple
+
+        for prime in (2, 3, 5):
+            while remainder % prime == 0:
+                remainder //= prime
+
+        if remainder == 1:
+            return multiple * _step
+
+        multiple += 1
+
+def Resample(_audio, _from, _to):
+    """
+    Resamples a clip by cutting or zero padding its spectrum, which also removes everything above
+    the new Nyquist frequency so downsampling doesn't alias. The clip is zero padded to a length
+    the fft is fast for first, a clip with a large prime length would take a hundred times longer.
+
+    Parameters:
+        - _audio: np.float32 audio clip
+        - _from: The sample rate of the clip
+        - _to: The sample rate to resample to
+
+    Returns:
+        The resampled np.float32 audio clip
+    """
+    length = int(round(_audio.shape[0] * _to / _from))
+
+    if length == 0:
+        return np.zeros(0, dtype = np.float32)
+
+    # Padding to a multiple of this keeps the resampled length a whole number of samples
+    step = _from // math.gcd(_from, _to)
+
+    padded = FastLength(_audio.shape[0], step)
+    resampled = padded * _to // _from
+
+    spectrum = np.fft.rfft(_audio, padded)
+    bins = resampled // 2 + 1
+
+    if bins <= spectrum.shape[0]:
+        spectrum = spectrum[:bins]
+    else:
+        spectrum = np.concatenate([spectrum, np.zeros(bins - spectrum.shape[0], dtype = spectrum.dtype)])
+
+    audio = np.fft.irfft(spectrum, resampled)[:length]
+    audio *= resampled / padded
+
+    return audio.astype(np.float32)
@@ -0,0 +1,124 @@
+# Lucas Davis
+
+from Scheduler import BatchScheduler
+from Streaming import StreamManager
+from Metrics import metrics
+
+def ConfigureThreads(_apiConfig):
+    """
+    Pin the amount of CPU threads tensorflow uses. This has to run before the first operation
+    executes, so before the model is loaded.
+
+    Parameters:
+        - _apiConfig: The [API] section of the config, 0 keeps tensorflow's default
+    """
+    import tensorflow as tf
+
+    intraOp = int(_apiConfig.get('intra_op_threads', 0))
+    interOp = int(_apiConfig.get('inter_op_threads', 0))
+
+    try:
+        if intraOp > 0:
+            tf.config.threading.set_intra_op_parallelism_threads(intraOp)
+
+        if interOp > 0:
+            tf.config.threading.set_inter_op_parallelism_threads(interOp)
+    except RuntimeError:
+        print("Tensorflow already started, the thread settings are ignored")
+
+class LocalBackend:
+    """
+    Serves every kind of request with a SpeechRec in the current process. The API uses it
+    directly when it runs without worker processes, and every worker process of a WorkerPool runs
+    one of its own.
+    """
+    def __init__(self, _speechRec, _apiConfig):
+        """
+        Parameters:
+            - _speechRec: The SpeechRec instance used to generate the predictions
+            - _apiConfig: The [API] section of the config
+        """
+        self.speechRec = _speechRec
+        self.scheduler = None
+
+        if eval(_apiConfig.get('batching', 'False')):
+            self.scheduler = BatchScheduler(
+                self.speechRec,
+                int(_apiConfig['max_batch_size']),
+                float(_apiConfig['max_wait_ms'])
+            )
+
+        self.streams = StreamManager(
+            self.speechRec,
+            float(_apiConfig['stream_timeout_s']),
+            int(_apiConfig['stream_max_sessions']),
+            float(_apiConfig.get('stream_max_seconds', 60))
+        )
+
+    def Predict(self, _audio):
+        """
+        Parameters:
+            - _audio: np.float32 audio clip
+
+        Returns:
+            The post processed prediction
+        """
+        if self.scheduler is not None:
+            prediction = self.scheduler.Predict(_audio)
+        else:
+            prediction = self.speechRec.Predict(_audio)
+
+        return self.speechRec.PostProcess(prediction)
+
+    def StreamPush(self, _sessionId, _audio):
+        """
+        Parameters:
+            - _sessionId: The id of the streaming session
+            - _audio: The next np.float32 chunk of the recording
+
+        Returns:
+            The partial prediction of the session
+        """
+        return self.streams.Push(_sessionId, _audio)
+
+    def StreamEnd(self, _sessionId, _audio):
+        """
+        Parameters:
+            - _sessionId: The id of the streaming session
+            - _audio: The last np.float32 chunk of the recording, may be empty
+
+        Returns:
+            The post processed final prediction of the session
+        """
+        return self.speechRec.PostProcess(self.streams.End(_sessionId, _audio))
+
+    def RegisterPhrases(self, _name, _phrases):
+        """
+        Parameters:
+            - _name: The name of the phrase list
+            - _phrases: A list of phrases
+        """
+        self.speechRec.RegisterPhrases(_name, _phrases)
+
+    def PredictPhrase(self, _audio, _name):
+        """
+        Parameters:
+            - _audio: np.float32 audio clip
+            - _name: The name of a registered phrase list
+
+        Returns:
+            The best matching phrase and its confidence, None when the clip is too short for
+            every phrase
+        """
+        return self.speechRec.PredictPhrase(_audio, _name)
+
+    def Metrics(self):
+        """
+        Returns:
+            A snapshot of the metrics of this process
+        """
+        return metrics.Snapshot()
+
+    def Close(self):
+        if self.scheduler is not None:
+            self.scheduler.Close()
@@ -0,0 +1,442 @@
+# Lucas Davis
+
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the real time factor histogram buckets, the seconds a request took per second of audio
+RTF_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class Histogram:
+    """
+    A histogram with fixed buckets. Observing a value is a binary search and an increment, so it
+    is cheap enough to run on every stage of every request.
+    """
+    def __init__(self, _buckets):
+        """
+        Parameters:
+            - _buckets: The sorted upper bounds of the buckets, values above the last one go into
+                        an overflow bucket
+        """
+        self.buckets = tuple(_buckets)
+        self.counts  = [0] * (len(self.buckets) + 1)
+        self.sum     = 0.0
+        self.count   = 0
+
+    def Observe(self, _value):
+        self.counts[bisect.bisect_left(self.buckets, _value)] += 1
+        self.sum += _value
+        self.count += 1
+
+    def Snapshot(self):
+        """
+        Returns:
+            A picklable copy of the histogram
+        """
+        return {"buckets": self.buckets, "counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+class Timer:
+    """
+    Times a block with the monotonic clock and records it in the stage's histogram, and in the
+    trace of the current request when there is one
+    """
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, _metrics, _stage):
+        self.metrics = _metrics
+        self.stage   = _stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, *_):
+        self.metrics.Observe(self.stage, time.perf_counter() - self.start)
+
+class NullTimer:
+    """
+    Stands in for a Timer when the metrics are turned off
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+NULL_TIMER = NullTimer()
+
+class Metrics:
+    """
+    Latency histograms of every stage of a request, and counters of the requests, errors and
+    audio the API has processed. Every process keeps its own, the API merges the ones of its
+    worker processes into its own when /metrics is read.
+
+    Requests can also be traced: the stages of a request, its route, status and audio length are
+    written as a line of json to a rotating file once it finishes.
+    """
+    def __init__(self, _enabled = True, _stages = False, _tracePath = None, _traceBytes = 10e6, _traceBackups = 3):
+        """
+        Parameters:
+            - _enabled: Record anything at all
+            - _stages: Run the model, the ctc decoder and the label conversion as separate graphs,
+                       so each of them is timed on its own instead of together
+            - _tracePath: The file the traces are written to, None doesn't trace
+            - _traceBytes: The size a trace file grows to before it is rotated
+            - _traceBackups: How many rotated trace files are kept
+        """
+        self.lock   = threading.Lock()
+        self.local  = threading.local()
+        self.tracer = None
+
+        self.Configure(_enabled, _stages, _tracePath, _traceBytes, _traceBackups)
+
+    def Configure(self, _enabled = True, _stages = False, _tracePath = None, _traceBytes = 10e6, _traceBackups = 3):
+        """
+        Resets every histogram and counter and applies new settings, see __init__ for the parameters
+        """
+        with self.lock:
+            self.enabled = _enabled
+            self.stages  = _enabled and _stages
+
+            self.stageSeconds    = {}
+            self.requestSeconds  = {}
+            self.requests        = {}
+            self.errors          = {}
+            self.rejected        = 0
+            self.audioSeconds    = 0.0
+            self.requestTotal    = 0.0
+            self.realTimeFactor  = Histogram(RTF_BUCKETS)
+
+            if self.tracer is not None:
+                for handler in self.tracer.handlers:
+                    handler.close()
+
+                self.tracer.handlers = []
+                self.tracer = None
+
+            if _enabled and _tracePath:
+                self.tracer = logging.getLogger(f"ASRTrace.{id(self)}")
+                self.tracer.propagate = False
+                self.tracer.setLevel(logging.INFO)
+                self.tracer.addHandler(RotatingFileHandler(_tracePath, maxBytes = int(_traceBytes), backupCount = int(_traceBackups)))
+
+    def ConfigureFrom(self, _apiConfig):
+        """
+        Parameters:
+            - _apiConfig: The [API] section of the config
+        """
+        self.Configure(
+            eval(_apiConfig.get('metrics', 'True')),
+            eval(_apiConfig.get('metrics_stages', 'False')),
+            _apiConfig.get('trace_path', '') or None,
+            float(_apiConfig.get('trace_max_mb', 10)) * 1e6,
+            int(_apiConfig.get('trace_backups', 3))
+        )
+
+    def Time(self, _stage):
+        """
+        Parameters:
+            - _stage: The name of the stage
+
+        Returns:
+            A context manager that times the block it wraps
+        """
+        if not self.enabled:
+            return NULL_TIMER
+
+        return Timer(self, _stage)
+
+    def Observe(self, _stage, _seconds, _trace = None):
+        """
+        Records how long a stage took
+
+        Parameters:
+            - _stage: The name of the stage
+            - _seconds: How long it took
+            - _trace: The trace to add it to, defaults to the trace of the current thread
+        """
+        if not self.enabled or getattr(self.local, "suspended", False):
+            return
+
+        with self.lock:
+            histogram = self.stageSeconds.get(_stage)
+
+            if histogram is None:
+                histogram = self.stageSeconds[_stage] = Histogram(LATENCY_BUCKETS)
+
+            histogram.Observe(_seconds)
+
+        trace = _trace if _trace is not None else getattr(self.local, "trace", None)
+
+        if trace is not None:
+            trace["stages"][_stage] = trace["stages"].get(_stage, 0.0) + _seconds
+
+    @contextmanager
+    def Suspend(self):
+        """
+        Nothing the current thread does inside this block is recorded, e.g. while warming up
+        """
+        self.local.suspended = True
+
+        try:
+            yield
+        finally:
+            self.local.suspended = False
+
+    def Begin(self, _route = None):
+        """
+        Starts the trace of a request on the current thread
+
+        Parameters:
+            - _route: The route of the request
+
+        Returns:
+            The trace, or None when the metrics are turned off
+        """
+        if not self.enabled:
+            return None
+
+        self.local.trace = {"route": _route, "start": time.perf_counter(), "audio": 0.0, "stages": {}}
+
+        return self.local.trace
+
+    def Current(self):
+        """
+        Returns:
+            The trace of the request the current thread is working on, or None
+        """
+        return getattr(self.local, "trace", None)
+
+    def Detach(self):
+        """
+        Stops tracing on the current thread without recording anything
+
+        Returns:
+            The trace that was detached, or None
+        """
+        trace = self.Current()
+        self.local.trace = None
+
+        return trace
+
+    def Audio(self, _seconds):
+        """
+        Adds to the length of the audio of the current request
+
+        Parameters:
+            - _seconds: The length of the audio in seconds
+        """
+        trace = self.Current()
+
+        if trace is not None:
+            trace["audio"] += _seconds
+
+    def Share(self, _batchTrace, _traces, _batchSize):
+        """
+        Adds the stages of a batch, which ran on another thread, to the traces of the requests
+        that were part of it
+
+        Parameters:
+            - _batchTrace: The trace the batch was recorded in
+            - _traces: The traces of the requests, None for requests that aren't traced
+            - _batchSize: The amount of requests in the batch
+        """
+        if _batchTrace is None:
+            return
+
+        for trace in _traces:
+            if trace is None:
+                continue
+
+            trace["batch"] = _batchSize
+
+            for stage, seconds in _batchTrace["stages"].items():
+                trace["stages"][stage] = trace["stages"].get(stage, 0.0) + seconds
+
+    def End(self, _status):
+        """
+        Finishes the trace of the request on the current thread and records it
+
+        Parameters:
+            - _status: The http status the request was answered with
+        """
+        trace = self.Current()
+
+        if trace is None:
+            return
+
+        self.local.trace = None
+
+        seconds = time.perf_counter() - trace["start"]
+        route   = trace["route"]
+
+        with self.lock:
+            histogram = self.requestSeconds.get(route)
+
+            if histogram is None:
+                histogram = self.requestSeconds[route] = Histogram(LATENCY_BUCKETS)
+
+            histogram.Observe(seconds)
+
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+            if _status >= 400:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+            if trace["audio"] > 0:
+                self.audioSeconds += trace["audio"]
+                self.requestTotal += seconds
+                self.realTimeFactor.Observe(seconds / trace["audio"])
+
+        if self.tracer is not None:
+            self.tracer.info(json.dumps({
+                "time":    time.time(),
+                "route":   route,
+                "status":  _status,
+                "seconds": seconds,
+                "audio":   trace["audio"],
+                "batch":   trace.get("batch", 1),
+                "stages":  trace["stages"]
+            }))
+
+    def Reject(self):
+        """
+        Counts a request that was turned away before it started
+        """
+        if self.enabled:
+            with self.lock:
+                self.rejected += 1
+
+    def Snapshot(self):
+        """
+        Returns:
+            A picklable copy of every histogram and counter
+        """
+        with self.lock:
+            return {
+                "stages":         {stage: histogram.Snapshot() for stage, histogram in self.stageSeconds.items()},
+                "requestSeconds": {route: histogram.Snapshot() for route, histogram in self.requestSeconds.items()},
+                "requests":       dict(self.requests),
+                "errors":         dict(self.errors),
+                "rejected":       self.rejected,
+                "audioSeconds":   self.audioSeconds,
+                "requestTotal":   self.requestTotal,
+                "realTimeFactor": self.realTimeFactor.Snapshot()
+            }
+
+def Merge(_snapshots):
+    """
+    Adds several snapshots together, e.g. the one of the API and the ones of its workers
+
+    Parameters:
+        - _snapshots: A list of snapshots taken by Metrics.Snapshot
+
+    Returns:
+        A single snapshot
+    """
+    def MergeHistogram(_a, _b):
+        if _a is None:
+            return {"buckets": _b["buckets"], "counts": list(_b["counts"]), "sum": _b["sum"], "count": _b["count"]}
+
+        _a["counts"] = [x + y for x, y in zip(_a["counts"], _b["counts"])]
+        _a["sum"] += _b["sum"]
+        _a["count"] += _b["count"]
+
+        return _a
+
+    merged = {
+        "stages": {}, "requestSeconds": {}, "requests": {}, "errors": {}, "rejected": 0,
+        "audioSeconds": 0.0, "requestTotal": 0.0, "realTimeFactor": None
+    }
+
+    for snapshot in _snapshots:
+        for key in ["stages", "requestSeconds"]:
+            for name, histogram in snapshot[key].items():
+                merged[key][name] = MergeHistogram(merged[key].get(name), histogram)
+
+        for key in ["requests", "errors"]:
+            for name, value in snapshot[key].items():
+                merged[key][name] = merged[key].get(name, 0) + value
+
+        for key in ["rejected", "audioSeconds", "requestTotal"]:
+            merged[key] += snapshot[key]
+
+        merged["realTimeFactor"] = MergeHistogram(merged["realTimeFactor"], snapshot["realTimeFactor"])
+
+    if merged["realTimeFactor"] is None:
+        merged["realTimeFactor"] = Histogram(RTF_BUCKETS).Snapshot()
+
+    return merged
+
+def Render(_snapshot):
+    """
+    Formats a snapshot in the prometheus text format
+
+    Parameters:
+        - _snapshot: A snapshot taken by Metrics.Snapshot, or merged by Merge
+
+    Returns:
+        The text of the /metrics endpoint
+    """
+    lines = []
+
+    def Labels(_labels):
+        if not _labels:
+            return ""
+
+        return "{" + ",".join(f'{key}="{value}"' for key, value in _labels.items()) + "}"
+
+    def AddHistogram(_name, _histogram, _labels):
+        cumulative = 0
+
+        for bound, count in zip(list(_histogram["buckets"]) + ["+Inf"], _histogram["counts"]):
+            cumulative += count
+            lines.append(f"{_name}_bucket{Labels(dict(_labels, le = bound))} {cumulative}")
+
+        lines.append(f"{_name}_sum{Labels(_labels)} {_histogram['sum']}")
+        lines.append(f"{_name}_count{Labels(_labels)} {_histogram['count']}")
+
+    def AddHeader(_name, _type, _help):
+        lines.append(f"# HELP {_name} {_help}")
+        lines.append(f"# TYPE {_name} {_type}")
+
+    AddHeader("asr_stage_seconds", "histogram", "Time spent in every stage of a prediction")
+    for stage, histogram in sorted(_snapshot["stages"].items()):
+        AddHistogram("asr_stage_seconds", histogram, {"stage": stage})
+
+    AddHeader("asr_request_seconds", "histogram", "Time from reading a request to answering it")
+    for route, histogram in sorted(_snapshot["requestSeconds"].items()):
+        AddHistogram("asr_request_seconds", histogram, {"route": route})
+
+    AddHeader("asr_requests_total", "counter", "Requests answered")
+    for route, count in sorted(_snapshot["requests"].items()):
+        lines.append(f"asr_requests_total{Labels({'route': route})} {count}")
+
+    AddHeader("asr_errors_total", "counter", "Requests answered with an error")
+    for route, count in sorted(_snapshot["errors"].items()):
+        lines.append(f"asr_errors_total{Labels({'route': route})} {count}")
+
+    AddHeader("asr_rejected_total", "counter", "Requests turned away while loading or busy")
+    lines.append(f"asr_rejected_total {_snapshot['rejected']}")
+
+    AddHeader("asr_audio_seconds_total", "counter", "Seconds of audio processed")
+    lines.append(f"asr_audio_seconds_total {_snapshot['audioSeconds']}")
+
+    AddHeader("asr_audio_request_seconds_total", "counter", "Seconds spent on the requests that carried audio")
+    lines.append(f"asr_audio_request_seconds_total {_snapshot['requestTotal']}")
+
+    AddHeader("asr_real_time_factor", "histogram", "Seconds a request took per second of its audio")
+    AddHistogram("asr_real_time_factor", _snapshot["realTimeFactor"], {})
+
+    return "\n".join(lines) + "\n"
+
+# The metrics of this process, every module records into the same ones
+metrics = Metrics()
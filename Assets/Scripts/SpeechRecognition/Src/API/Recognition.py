@@ -3,26 +3,130 @@
 import sys
 import os
 import numpy as np
+import tensorflow as tf
 from tensorflow.keras.models import load_model
 
 from Data.NLP import NLP
 from Data.Process import Process
+from Data.VAD import VAD
 from Model.ASRModel import ASRModel
+from Model.PhraseDecoder import PhraseDecoder
+from Model.BeamSearch import BeamSearch
+from Model.LiteModel import LiteModel
+from Model.GraphModel import GraphModel
 from ModelInterface import Interface
+from Metrics import metrics
+from Grab_Ini import ini
 
 class SpeechRec(Interface):
-    def __init__(self):
+    def __init__(self, _model = None, _strategy = None, _backend = None, _vad = None):
+        """
+        Parameters:
+            - _model: An already loaded keras model or LiteModel. When it isn't supplied the
+                      packaged model of the backend is loaded instead.
+            - _strategy: "greedy" or "beam", how the models output is decoded. Defaults to the
+                         strategy in the config
+            - _backend: "keras" for the packaged ASR.keras file, "savedmodel" for the quicker to
+                        load ASR_savedmodel export, or "float16" or "int8" for the quantized
+                        ASR_<backend>.tflite export. Defaults to the backend in the config
+            - _vad: Trim the silence off every clip, and skip silent clips, before they reach the
+                    model. Defaults to the [Inference.VAD] section of the config
+        """
         if getattr(sys, 'frozen', False):
-            scriptDir = sys._MEIPASS 
+            configPath = os.path.join(os.path.dirname(sys.executable), "config.ini")
         else:
-            scriptDir = os.path.dirname(os.path.abspath(__file__))
+            configPath = "config.ini"
+
+        if _strategy is None:
+            _strategy = ini().grabInfo(configPath, "Decoder").get('strategy', 'greedy')
+
+        if _vad is None:
+            _vad = eval(ini().grabInfo(configPath, "Inference.VAD").get('enabled', 'False'))
 
-        filePath = os.path.join(scriptDir, 'models', 'ASR.keras')
+        if _model is None:
+            if _backend is None:
+                _backend = ini().grabInfo(configPath, "Inference").get('backend', 'keras')
 
-        self.model = load_model(filePath, custom_objects = {'ctcloss': ASRModel.ctcloss}, safe_mode = False)
+            if getattr(sys, 'frozen', False):
+                scriptDir = sys._MEIPASS 
+            else:
+                scriptDir = os.path.dirname(os.path.abspath(__file__))
+
+            if _backend == 'keras':
+                fileName = 'ASR.keras'
+            elif _backend == 'savedmodel':
+                fileName = 'ASR_savedmodel'
+            else:
+                fileName = f'ASR_{_backend}.tflite'
+
+            _model = SpeechRec.LoadModel(os.path.join(scriptDir, 'models', fileName))
+
+        self.model = _model
         self.process = Process()
         self.NLP = NLP()
 
+        # The beam search runs in numpy on the logits, greedy decoding stays inside the graphs
+        self.beamSearch = BeamSearch(self.process) if _strategy == "beam" else None
+        self.vad = VAD(self.process) if _vad else None
+
+        bins = self.model.input_shape[-1]
+
+        # The graphs are sized by the model, the features by the feature_type of the config
+        if bins != self.process.Bins():
+            raise ValueError(
+                f"The model takes {bins} bins, but the feature_type {self.process.filterbank.type} in "
+                f"[Process.Spectrogram] has {self.process.Bins()}. Set the feature_type the model was trained with"
+            )
+
+        # How many spectrogram frames make up one time step of the logits, which depends on the
+        # architecture the model was built with
+        self.stride = ASRModel.TimeStride(self.model)
+
+        # Compiled serving graphs with fixed signatures, so keras' predict machinery is skipped and
+        # the graphs are only ever traced once regardless of the batch size or clip length.
+        self.inferBatch = tf.function(self.InferBatch, input_signature = [
+            tf.TensorSpec(shape = (None, None, bins), dtype = tf.float32),
+            tf.TensorSpec(shape = (None,), dtype = tf.int32)
+        ])
+        self.inferAudio = tf.function(self.InferAudio, input_signature = [
+            tf.TensorSpec(shape = (None,), dtype = tf.float32)
+        ])
+        self.inferLogits = tf.function(self.InferLogits, input_signature = [
+            tf.TensorSpec(shape = (None,), dtype = tf.float32)
+        ])
+        self.inferBatchLogits = tf.function(self.InferBatchLogits, input_signature = [
+            tf.TensorSpec(shape = (None, None, bins), dtype = tf.float32)
+        ])
+
+        # The decoder and the label conversion on their own, so the metrics can time every stage
+        self.inferDecode = tf.function(self.InferDecode, input_signature = [
+            tf.TensorSpec(shape = (None, None, self.model.output_shape[-1]), dtype = tf.float32),
+            tf.TensorSpec(shape = (None,), dtype = tf.int32)
+        ])
+        self.inferConvert = tf.function(self.InferConvert, input_signature = [
+            tf.TensorSpec(shape = (None, None), dtype = tf.int32)
+        ])
+
+        # Phrase lists registered by the game, by the name of the puzzle or scene they belong to
+        self.phraseLists = {}
+
+    @staticmethod
+    def LoadModel(_path):
+        """
+        Parameters:
+            - _path: The path to a .keras file, a .tflite export or a SavedModel export directory
+
+        Returns:
+            A keras model, a LiteModel for a .tflite file or a GraphModel for a SavedModel
+        """
+        if _path.endswith('.tflite'):
+            return LiteModel(_path)
+
+        if os.path.isdir(_path):
+            return GraphModel(_path)
+
+        return load_model(_path, custom_objects = {'ctcloss': ASRModel.ctcloss}, safe_mode = False)
+
     def Predict(self, _audio):
         """
         Generate a prediction from a given model
@@ -33,18 +137,317 @@ class SpeechRec(Interface):
         Returns:
         A string representing the prediction
         """
-        spectrogram = self.process.Spectrogram(_audio)
-        spectrogram = self.process.NormalizeSpec(spectrogram)
-        spectrogram = np.expand_dims(spectrogram, axis = 0)
+        audio = np.asarray(_audio, dtype = np.float32)
 
-        sentiment = self.model.predict(spectrogram)
-        softmax = ASRModel.ctcDecoder(sentiment)
-        prediction = self.process.ConvertLabel(softmax)
+        # A clip shorter than one stft frame has no spectrogram, the ctc decoder fails on it
+        if int(self.process.FrameCount(audio.shape[0])) == 0:
+            prediction = ""
+        # Timing every stage needs them run one after another, which the batch path does
+        elif self.vad is not None or metrics.stages:
+            prediction = self.PredictBatch([audio])[0]
+        elif self.beamSearch is not None:
+            with metrics.Time("inference"):
+                logits = self.inferLogits(audio).numpy()
+
+            with metrics.Time("decode"):
+                prediction = self.beamSearch.Decode(logits)
+        else:
+            with metrics.Time("inference"):
+                prediction = self.inferAudio(audio).numpy().decode("utf-8")
 
         print(prediction)
 
         return prediction
 
+    def PredictBatch(self, _audios):
+        """
+        Generate predictions for several audio clips with a single pass through the model. The
+        spectrograms are zero padded to the longest clip in the batch, and each clip is only
+        decoded over its own time steps so the padding doesn't leak into the transcript.
+
+        Clips shorter than one stft frame are predicted as an empty string. With the VAD, only the
+        speech of every clip is passed to the model. Silent clips are predicted as an empty string
+        without running the model as well, and when the VAD splits a clip at
+        its pauses all of its segments go into the same batch and their predictions are joined.
+
+        Parameters:
+            - _audios: A list of np.float32 audio clips
+
+        Returns:
+            A list of strings, one prediction per audio clip in the same order
+        """
+        spectrograms, owners = [], []
+
+        for i, audio in enumerate(_audios):
+            if self.vad is None:
+                spectrogram = self.Features(audio)
+
+                if spectrogram.shape[0] > 0:
+                    spectrograms.append(spectrogram)
+                    owners.append(i)
+
+                continue
+
+            # The VAD measures the loudness on the linear spectrogram, whatever the feature_type
+            with metrics.Time("spectrogram"):
+                spectrogram = np.asarray(self.process.Spectrogram(audio, _linear = True))
+
+            with metrics.Time("vad"):
+                segments = self.vad.Segments(spectrogram)
+
+            if segments:
+                with metrics.Time("spectrogram"):
+                    spectrogram = np.asarray(self.process.Features(spectrogram))
+
+            # The spectrogram is normalized frame by frame, so slicing it first changes nothing
+            for start, end in segments:
+                with metrics.Time("normalize"):
+                    spectrograms.append(np.asarray(self.process.NormalizeSpec(spectrogram[start:end])))
+
+                owners.append(i)
+
+        segments = [[] for _ in _audios]
+
+        if spectrograms:
+            for owner, prediction in zip(owners, self.PredictSpectrograms(spectrograms)):
+                segments[owner].append(prediction)
+
+        predictions = []
+
+        for parts in segments:
+            if len(parts) == 1:
+                predictions.append(parts[0])
+            else:
+                predictions.append(" ".join(part.strip() for part in parts if part.strip()))
+
+        return predictions
+
+    def PredictSpectrograms(self, _spectrograms):
+        """
+        Parameters:
+            - _spectrograms: A list of normalized spectrograms in the shape of (frames, bins)
+
+        Returns:
+            A list of strings, one prediction per spectrogram in the same order
+        """
+        frames = np.array([spec.shape[0] for spec in _spectrograms], dtype = np.int32)
+
+        batch = np.zeros((len(_spectrograms), frames.max(), _spectrograms[0].shape[1]), dtype = np.float32)
+
+        for i, spec in enumerate(_spectrograms):
+            batch[i, :frames[i]] = spec
+
+        if self.beamSearch is not None:
+            with metrics.Time("model"):
+                logits = self.inferBatchLogits(batch).numpy()
+
+            with metrics.Time("decode"):
+                return self.beamSearch.DecodeBatch(logits, ASRModel.OutputLength(frames, self.stride))
+
+        if metrics.stages:
+            with metrics.Time("model"):
+                logits = self.inferBatchLogits(batch)
+
+            with metrics.Time("decode"):
+                decoded = self.inferDecode(logits, frames)
+
+            with metrics.Time("convert"):
+                predictions = self.inferConvert(decoded).numpy()
+        else:
+            with metrics.Time("inference"):
+                predictions = self.inferBatch(batch, frames).numpy()
+
+        return [item.decode("utf-8") for item in predictions]
+
+    def PredictSpectrogram(self, _spectrogram):
+        """
+        Generate a prediction from an already normalized spectrogram, used by the streaming
+        sessions which compute their spectrogram chunk by chunk.
+
+        Parameters:
+            - _spectrogram: A normalized spectrogram in the shape of (frames, bins)
+
+        Returns:
+            A string representing the prediction
+        """
+        frames = _spectrogram.shape[0]
+
+        if frames == 0:
+            return ""
+
+        batch = np.expand_dims(np.asarray(_spectrogram, dtype = np.float32), axis = 0)
+
+        if self.beamSearch is not None:
+            with metrics.Time("model"):
+                logits = self.inferBatchLogits(batch).numpy()
+
+            with metrics.Time("decode"):
+                return self.beamSearch.DecodeBatch(logits)[0]
+
+        with metrics.Time("inference"):
+            return self.inferBatch(batch, np.array([frames], dtype = np.int32))[0].numpy().decode("utf-8")
+
+    def InferBatch(self, _spectrograms, _frames):
+        """
+        The model, the greedy ctc decoder and the label conversion as a single graph. This is
+        wrapped in a tf.function in the constructor, use self.inferBatch to call it.
+
+        Parameters:
+            - _spectrograms: A zero padded batch of normalized spectrograms
+            - _frames: The number of valid frames of each spectrogram in the batch
+
+        Returns:
+            A string tensor with one prediction per spectrogram
+        """
+        logits = self.model(_spectrograms, training = False)
+
+        return self.InferConvert(self.InferDecode(logits, _frames))
+
+    def InferDecode(self, _logits, _frames):
+        """
+        The greedy ctc decoder. This is wrapped in a tf.function in the constructor, use
+        self.inferDecode to call it on its own.
+
+        Parameters:
+            - _logits: The models output in the shape of (batch, time, classes)
+            - _frames: The number of valid spectrogram frames of each item in the batch
+
+        Returns:
+            The decoded labels in the shape of (batch, time), padded with -1
+        """
+        return ASRModel.ctcDecoder(_logits, ASRModel.OutputLength(_frames, self.stride))
+
+    def InferConvert(self, _decoded):
+        """
+        Converts decoded labels to text. This is wrapped in a tf.function in the constructor, use
+        self.inferConvert to call it on its own.
+
+        Parameters:
+            - _decoded: The decoded labels in the shape of (batch, time)
+
+        Returns:
+            A string tensor with one prediction per item in the batch
+        """
+        return tf.strings.reduce_join(self.process.numToChar(_decoded), axis = -1)
+
+    def InferBatchLogits(self, _spectrograms):
+        """
+        The model alone, for decoders that run outside the graph. This is wrapped in a
+        tf.function in the constructor, use self.inferBatchLogits to call it.
+
+        Parameters:
+            - _spectrograms: A zero padded batch of normalized spectrograms
+
+        Returns:
+            The logits in the shape of (batch, time, classes)
+        """
+        return self.model(_spectrograms, training = False)
+
+    def InferAudio(self, _audio):
+        """
+        The whole prediction of a single audio clip, from the spectrogram to the transcript, as a
+        single graph. This is wrapped in a tf.function in the constructor, use self.inferAudio
+        to call it.
+
+        Parameters:
+            - _audio: A float32 tensor of the audio clip
+
+        Returns:
+            A scalar string tensor of the prediction
+        """
+        spectrogram = self.process.Spectrogram(_audio)
+        spectrogram = self.process.NormalizeSpec(spectrogram)
+
+        frames = tf.shape(spectrogram)[:1]
+
+        return self.InferBatch(tf.expand_dims(spectrogram, axis = 0), frames)[0]
+
+    def InferLogits(self, _audio):
+        """
+        The model's output for a single audio clip without decoding it. This is wrapped in a
+        tf.function in the constructor, use self.inferLogits to call it.
+
+        Parameters:
+            - _audio: A float32 tensor of the audio clip
+
+        Returns:
+            The logits in the shape of (time, classes)
+        """
+        spectrogram = self.process.Spectrogram(_audio)
+        spectrogram = self.process.NormalizeSpec(spectrogram)
+
+        logits = self.model(tf.expand_dims(spectrogram, axis = 0), training = False)[0]
+
+        return logits[:ASRModel.OutputLength(tf.shape(spectrogram)[0], self.stride)]
+
+    def RegisterPhrases(self, _name, _phrases):
+        """
+        Register a list of phrases, e.g. the answers to a puzzle, that audio can later be matched
+        against with PredictPhrase. Registering a name again replaces its phrases.
+
+        Parameters:
+            - _name: The name of the phrase list
+            - _phrases: A list of phrases
+        """
+        self.phraseLists[_name] = PhraseDecoder(self.process, _phrases)
+
+    def PredictPhrase(self, _audio, _name):
+        """
+        Match an audio clip against a registered phrase list instead of transcribing it freely
+
+        Parameters:
+            - _audio: np.float32 audio clip
+            - _name: The name of a phrase list passed to RegisterPhrases
+
+        Returns:
+            The best matching phrase and its confidence between 0 and 1. The phrase is None with a
+            confidence of 0 when the clip is too short to spell out any of the phrases
+        """
+        if _name not in self.phraseLists:
+            raise KeyError(f"No phrase list named {_name}")
+
+        logits = self.inferLogits(np.asarray(_audio, dtype = np.float32)).numpy()
+
+        return self.phraseLists[_name].Decode(logits)
+
+    def Warmup(self, _seconds = 1.0, _sampleRate = 16000):
+        """
+        Trace the serving graphs ahead of time so the first real request doesn't pay for it
+
+        Parameters:
+            - _seconds: The length of the silent clip used to warm up
+            - _sampleRate: The sample rate of the clip
+        """
+        audio = np.zeros(int(_seconds * _sampleRate), dtype = np.float32)
+
+        # Tracing takes far longer than any real request, it would skew the latency histograms
+        with metrics.Suspend():
+            self.inferAudio(audio)
+            self.inferLogits(audio)
+
+            # The VAD would skip the silent clip, so the batch graph is traced on its features instead
+            self.PredictSpectrograms([self.Features(audio), self.Features(audio)])
+
+            if self.beamSearch is not None:
+                self.inferBatchLogits(np.zeros((1, 1, self.model.input_shape[-1]), dtype = np.float32))
+
+    def Features(self, _audio):
+        """
+        Compute the normalized spectrogram the model expects for a single audio clip
+
+        Parameters:
+            - _audio: np.float32 audio clip
+
+        Returns:
+            The normalized spectrogram as a numpy array in the shape of (frames, bins)
+        """
+        with metrics.Time("spectrogram"):
+            spectrogram = self.process.Spectrogram(_audio)
+
+        # The spectrogram was just made for this clip, so it can be normalized in place
+        with metrics.Time("normalize"):
+            return np.asarray(self.process.NormalizeSpec(spectrogram, _inPlace = True))
+
     def PostProcess(self, _prediction):
         """
         Preform post processing on the models prediction to clean up the models
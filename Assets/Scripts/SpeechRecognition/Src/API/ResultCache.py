@@ -0,0 +1,322 @@
+# Lucas Davis
+
+import sys
+import time
+import hashlib
+import itertools
+import threading
+import numpy as np
+from collections import OrderedDict
+
+class CacheEntry:
+    """
+    A cached result, with what it cost to compute and how much of the cache it takes up
+    """
+    def __init__(self, _result, _seconds, _fingerprint, _samples, _size):
+        self.result      = _result
+        self.seconds     = _seconds
+        self.fingerprint = _fingerprint
+        self.samples     = _samples
+        self.size        = _size
+
+class ResultCache:
+    """
+    Remembers the predictions of clips the API has already transcribed, so a clip that is sent
+    again is answered without computing its spectrogram or running the model.
+
+    Clips are keyed on a hash of their samples, which only matches the exact same recording.
+    With near duplicates enabled, a clip that misses is also compared against the fingerprints of
+    the cached clips: 16 bits for every ~100 ms of audio, each the sign of how the energy
+    difference between two neighbouring frequency bands changes from one step to the next.
+    Re-encoded, resampled, slightly louder or slightly cut copies of a clip keep almost every bit,
+    so the closest fingerprint within max_distance of the bits counts as a hit. The fingerprints
+    are indexed by namespace and length, so a lookup only compares clips within 10% of its length,
+    and at most MAX_CANDIDATES of the most recently cached ones.
+
+    The cache holds at most max_bytes of entries, evicting the least recently used ones first.
+    """
+    # Frames per time step and frequency bands of a fingerprint
+    STEP_FRAMES = 6
+    BANDS       = 17
+
+    # Python's own overhead of an entry, on top of its key, result and fingerprint
+    OVERHEAD = 256
+
+    # The lengths of the clips in a bucket of the index are within 5% of each other, and a near
+    # duplicate lookup compares at most this many fingerprints
+    LENGTH_BUCKET  = 0.05
+    MAX_CANDIDATES = 128
+
+    def __init__(self, _maxBytes, _nearDuplicates = False, _maxDistance = 0.1, _sampleRate = 16000):
+        """
+        Parameters:
+            - _maxBytes: The most memory the entries can take up
+            - _nearDuplicates: Also match clips on their fingerprint
+            - _maxDistance: The fraction of fingerprint bits that can differ for a near duplicate
+            - _sampleRate: The sample rate of the clips
+        """
+        self.maxBytes       = int(_maxBytes)
+        self.nearDuplicates = _nearDuplicates
+        self.maxDistance    = float(_maxDistance)
+
+        # 32 ms frames with half of them overlapping, the band edges are spaced evenly in pitch
+        self.frameLength = int(0.032 * _sampleRate)
+        self.window      = np.hanning(self.frameLength).astype(np.float32)
+
+        frequencies = np.fft.rfftfreq(self.frameLength, 1 / _sampleRate)
+        self.bandIndex = np.searchsorted(frequencies, np.geomspace(150, 4000, ResultCache.BANDS + 1))
+
+        # The entries, the fingerprint index and the size are only ever changed together under
+        # the lock
+        self.entries = OrderedDict()
+        self.index   = {}
+        self.lock    = threading.Lock()
+        self.size    = 0
+
+        self.hits         = 0
+        self.nearHits     = 0
+        self.misses       = 0
+        self.evictions    = 0
+        self.savedSeconds = 0.0
+
+    def Key(self, _audio, _namespace = ""):
+        """
+        Parameters:
+            - _audio: np.float32 audio clip
+            - _namespace: Keeps the results of different requests apart, e.g. a phrase list
+
+        Returns:
+            The hash of the clip's samples
+        """
+        digest = hashlib.blake2b(_namespace.encode("utf-8"), digest_size = 16)
+        digest.update(np.ascontiguousarray(_audio, dtype = np.float32).data)
+
+        return (_namespace, digest.digest())
+
+    def Fingerprint(self, _audio):
+        """
+        Parameters:
+            - _audio: np.float32 audio clip
+
+        Returns:
+            The fingerprint of the clip as a packed np.uint8 array in the shape of (steps, 2), one
+            row of 16 bits for every ~100 ms of audio
+        """
+        audio = np.asarray(_audio, dtype = np.float32)
+        step = self.frameLength // 2
+
+        # Enough samples for at least two steps, so there is a row of bits
+        minimum = self.frameLength + (2 * ResultCache.STEP_FRAMES - 1) * step
+
+        if audio.shape[0] < minimum:
+            audio = np.pad(audio, (0, minimum - audio.shape[0]))
+
+        frames = np.lib.stride_tricks.sliding_window_view(audio, self.frameLength)[::step] * self.window
+        power = np.square(np.abs(np.fft.rfft(frames, axis = 1)))
+
+        # The energy of every band, summed over every time step
+        bands = np.add.reduceat(power, self.bandIndex[:-1], axis = 1)[:, :ResultCache.BANDS]
+        steps = bands.shape[0] // ResultCache.STEP_FRAMES
+        bands = bands[:steps * ResultCache.STEP_FRAMES].reshape(steps, ResultCache.STEP_FRAMES, -1).sum(axis = 1)
+
+        difference = np.diff(np.log(bands + 1e-10), axis = 1)
+
+        return np.packbits(np.diff(difference, axis = 0) > 0, axis = 1)
+
+    def Bucket(self, _samples):
+        """
+        Parameters:
+            - _samples: The length of a clip
+
+        Returns:
+            The length bucket of the clip in the fingerprint index
+        """
+        return int(np.log(max(_samples, 1)) / np.log1p(ResultCache.LENGTH_BUCKET))
+
+    def Get(self, _audio, _namespace = ""):
+        """
+        Parameters:
+            - _audio: np.float32 audio clip
+            - _namespace: The namespace the clip was cached under
+
+        Returns:
+            The cached result, or None on a miss
+        """
+        key = self.Key(_audio, _namespace)
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                self.savedSeconds += entry.seconds
+
+                return entry.result
+
+        if self.nearDuplicates:
+            entry = self.Nearest(self.Fingerprint(_audio), len(_audio), _namespace)
+
+            if entry is not None:
+                with self.lock:
+                    self.hits += 1
+                    self.nearHits += 1
+                    self.savedSeconds += entry.seconds
+
+                return entry.result
+
+        with self.lock:
+            self.misses += 1
+
+        return None
+
+    def Nearest(self, _fingerprint, _samples, _namespace):
+        """
+        Parameters:
+            - _fingerprint: The fingerprint of the clip
+            - _samples: The length of the clip, clips more than 10% longer or shorter never match
+            - _namespace: The namespace to look in
+
+        Returns:
+            The entry of the closest fingerprint within max_distance, or None
+        """
+        own = self.Bucket(_samples)
+        buckets = sorted(range(self.Bucket(0.9 * _samples), self.Bucket(1.1 * _samples) + 1), key = lambda bucket: abs(bucket - own))
+
+        # The clips closest in length first, and within a bucket the most recently cached ones
+        with self.lock:
+            nearby = (
+                (key, entry) for bucket in buckets
+                for key, entry in reversed(self.index.get((_namespace, bucket), {}).items())
+                if abs(entry.samples - _samples) <= 0.1 * _samples
+            )
+            candidates = list(itertools.islice(nearby, ResultCache.MAX_CANDIDATES))
+
+        if not candidates:
+            return None
+
+        # A copy that was cut a little shorter or longer is compared over the steps both have
+        distances = []
+
+        for _, entry in candidates:
+            steps = min(entry.fingerprint.shape[0], _fingerprint.shape[0])
+            bits = np.unpackbits(entry.fingerprint[:steps] ^ _fingerprint[:steps]).sum()
+
+            distances.append(bits / (steps * _fingerprint.shape[1] * 8) if steps > 0 else 1.0)
+
+        best = int(np.argmin(distances))
+
+        if distances[best] > self.maxDistance:
+            return None
+
+        key, entry = candidates[best]
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+
+        return entry
+
+    def Put(self, _audio, _result, _seconds, _namespace = ""):
+        """
+        Parameters:
+            - _audio: np.float32 audio clip
+            - _result: The result of the clip
+            - _seconds: How long the result took to compute
+            - _namespace: The namespace to cache the clip under
+        """
+        key = self.Key(_audio, _namespace)
+        fingerprint = self.Fingerprint(_audio) if self.nearDuplicates else None
+
+        size = ResultCache.OVERHEAD + sys.getsizeof(key[1]) + sys.getsizeof(_namespace) + sys.getsizeof(str(_result))
+
+        if fingerprint is not None:
+            size += fingerprint.nbytes
+
+        entry = CacheEntry(_result, _seconds, fingerprint, len(_audio), size)
+
+        with self.lock:
+            if key in self.entries:
+                self.Remove(key)
+
+            self.entries[key] = entry
+            self.size += size
+
+            if fingerprint is not None:
+                self.index.setdefault((_namespace, self.Bucket(entry.samples)), {})[key] = entry
+
+            while self.size > self.maxBytes and self.entries:
+                self.Remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def Remove(self, _key):
+        """
+        Removes an entry from the cache and the fingerprint index, only call it with the lock held
+
+        Parameters:
+            - _key: The key of the entry
+        """
+        entry = self.entries.pop(_key)
+        self.size -= entry.size
+
+        if entry.fingerprint is not None:
+            bucket = (_key[0], self.Bucket(entry.samples))
+
+            del self.index[bucket][_key]
+
+            if not self.index[bucket]:
+                del self.index[bucket]
+
+    def Fetch(self, _audio, _compute, _namespace = ""):
+        """
+        Answer from the cache, or compute the result and cache it
+
+        Parameters:
+            - _audio: np.float32 audio clip
+            - _compute: Computes the result of the clip on a miss
+            - _namespace: The namespace of the clip
+
+        Returns:
+            The result of the clip
+        """
+        result = self.Get(_audio, _namespace)
+
+        if result is not None:
+            return result
+
+        start = time.monotonic()
+        result = _compute(_audio)
+
+        self.Put(_audio, result, time.monotonic() - start, _namespace)
+
+        return result
+
+    def Clear(self, _namespace = None):
+        """
+        Parameters:
+            - _namespace: Only remove the entries of this namespace, every entry when None
+        """
+        with self.lock:
+            for key in [key for key in self.entries if _namespace is None or key[0] == _namespace]:
+                self.Remove(key)
+
+    def Stats(self):
+        """
+        Returns:
+            A dictionary with the hit and miss counters, the size of the cache and the seconds of
+            computation the hits saved
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+
+            return {
+                "hits":          self.hits,
+                "near_hits":     self.nearHits,
+                "misses":        self.misses,
+                "hit_rate":      self.hits / lookups if lookups else 0.0,
+                "evictions":     self.evictions,
+                "entries":       len(self.entries),
+                "bytes":         self.size,
+                "max_bytes":     self.maxBytes,
+                "saved_seconds": self.savedSeconds
+            }
@@ -0,0 +1,137 @@
+# Lucas Davis
+
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+from Metrics import metrics
+
+class BatchScheduler:
+    """
+    Collects concurrent prediction requests and runs them through the model as a single batch.
+    A request waits at most max_wait_ms for other requests to join its batch, and a batch never
+    grows past max_batch_size.
+    """
+    def __init__(self, _speechRec, _maxBatchSize, _maxWait):
+        """
+        Parameters:
+            - _speechRec: The SpeechRec instance used to generate the predictions
+            - _maxBatchSize: The largest amount of requests that can share a batch
+            - _maxWait: How long, in milliseconds, the first request of a batch waits for others
+        """
+        self.speechRec    = _speechRec
+        self.maxBatchSize = max(1, int(_maxBatchSize))
+        self.maxWait      = max(0.0, float(_maxWait)) / 1000.0
+
+        self.requests = queue.Queue()
+        self.running  = True
+
+        self.worker = threading.Thread(target = self.Worker, name = "BatchScheduler", daemon = True)
+        self.worker.start()
+
+    def Submit(self, _audio):
+        """
+        Queue an audio clip to be predicted in the next batch
+
+        Parameters:
+            - _audio: np.float32 audio clip
+
+        Returns:
+            A Future that will hold the prediction
+        """
+        future = Future()
+
+        # The batch runs on the worker thread, its stages are added to the trace of the caller
+        self.requests.put((_audio, future, metrics.Current(), time.perf_counter()))
+
+        return future
+
+    def Predict(self, _audio):
+        """
+        Queue an audio clip and block until its prediction is ready
+
+        Parameters:
+            - _audio: np.float32 audio clip
+
+        Returns:
+            A string representing the prediction
+        """
+        return self.Submit(_audio).result()
+
+    def Close(self):
+        """
+        Stop the worker thread once the batch it is currently working on has finished
+        """
+        self.running = False
+        self.requests.put(None)
+        self.worker.join()
+
+    def Collect(self):
+        """
+        Block until a request arrives, then keep gathering requests until the batch is full or
+        the wait window of the first request has run out.
+
+        Returns:
+            A list of (audio, future, trace, submitted) tuples, or None when the scheduler is closing
+        """
+        item = self.requests.get()
+
+        if item is None:
+            return None
+
+        batch = [item]
+        deadline = time.monotonic() + self.maxWait
+
+        while len(batch) < self.maxBatchSize:
+            remaining = deadline - time.monotonic()
+
+            if remaining <= 0:
+                break
+
+            try:
+                item = self.requests.get(timeout = remaining)
+            except queue.Empty:
+                break
+
+            if item is None:
+                self.running = False
+                break
+
+            batch.append(item)
+
+        return batch
+
+    def Worker(self):
+        """
+        Runs on its own thread, forming batches and handing the predictions back to each caller
+        """
+        while self.running:
+            batch = self.Collect()
+
+            if batch is None:
+                break
+
+            audios  = [audio for audio, _, _, _ in batch]
+            futures = [future for _, future, _, _ in batch]
+            traces  = [trace for _, _, trace, _ in batch]
+
+            started = time.perf_counter()
+
+            for _, _, trace, submitted in batch:
+                metrics.Observe("queue", started - submitted, trace)
+
+            metrics.Begin()
+
+            try:
+                predictions = self.speechRec.PredictBatch(audios)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+
+                continue
+            finally:
+                metrics.Share(metrics.Detach(), traces, len(batch))
+
+            for future, prediction in zip(futures, predictions):
+                future.set_result(prediction)
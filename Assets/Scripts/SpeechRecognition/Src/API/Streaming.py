@@ -0,0 +1,225 @@
+# Lucas Davis
+
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+
+from Metrics import metrics
+
+class StreamSession:
+    """
+    The state of a single streaming recognition: the samples that haven't filled a complete
+    frame yet, the normalized spectrogram frames computed so far and, for the VAD, their linear
+    spectrogram.
+    """
+    def __init__(self, _bins, _linearBins):
+        self.pending    = np.zeros(0, dtype = np.float32)
+        self.samples    = 0
+        self.frames     = [np.zeros((0, _bins), dtype = np.float32)]
+        self.linear     = [np.zeros((0, _linearBins), dtype = np.float32)]
+        self.lastActive = time.monotonic()
+        self.lock       = threading.Lock()
+
+    @staticmethod
+    def Joined(_chunks):
+        """
+        Concatenates the chunks of frames in place, so they are only joined once per request
+
+        Parameters:
+            - _chunks: A list of arrays in the shape of (frames, bins)
+
+        Returns:
+            The frames of every chunk as one array
+        """
+        if len(_chunks) > 1:
+            _chunks[:] = [np.concatenate(_chunks)]
+
+        return _chunks[0]
+
+    def Spectrogram(self):
+        """
+        Returns:
+            The normalized spectrogram of all the audio received so far
+        """
+        return StreamSession.Joined(self.frames)
+
+    def Linear(self):
+        """
+        Returns:
+            The linear spectrogram of all the audio received so far, empty without the VAD
+        """
+        return StreamSession.Joined(self.linear)
+
+class StreamManager:
+    """
+    Keeps track of the streaming sessions of every client. Sessions are keyed on an id picked by
+    the client, and sessions that haven't received audio within the timeout, or that are the
+    least recently used once max_sessions is reached, are evicted.
+
+    Every chunk decodes the whole stream again, so a session is capped at max_seconds of audio
+    and chunks past it are refused. With the VAD, the final prediction only decodes the speech
+    of the stream, the same as Predict does for the whole recording.
+    """
+    def __init__(self, _speechRec, _timeout, _maxSessions, _maxSeconds = 60.0):
+        """
+        Parameters:
+            - _speechRec: The SpeechRec instance used to generate the predictions
+            - _timeout: How many seconds a session can stay idle before it is evicted
+            - _maxSessions: The maximum number of sessions kept at once
+            - _maxSeconds: The most audio a session can receive
+        """
+        self.speechRec   = _speechRec
+        self.process     = _speechRec.process
+        self.vad         = _speechRec.vad
+        self.timeout     = float(_timeout)
+        self.maxSessions = max(1, int(_maxSessions))
+        self.maxSeconds  = float(_maxSeconds)
+        self.maxSamples  = int(self.maxSeconds * int(self.process.spectrogramConfig.get('sample_rate', 16000)))
+        self.bins        = _speechRec.model.input_shape[-1]
+        self.linearBins  = int(self.process.spectrogramConfig['fft']) // 2 + 1
+
+        self.sessions = OrderedDict()
+        self.lock     = threading.Lock()
+
+    def Session(self, _sessionId, _create = True):
+        """
+        Look up a session, creating it if needed, and evict the abandoned ones
+
+        Parameters:
+            - _sessionId: The id of the session
+            - _create: Create the session when it doesn't exist
+
+        Returns:
+            The StreamSession, or None when it doesn't exist and _create is False
+        """
+        with self.lock:
+            self.Evict()
+
+            session = self.sessions.get(_sessionId)
+
+            if session is None and _create:
+                session = StreamSession(self.bins, self.linearBins)
+                self.sessions[_sessionId] = session
+
+                while len(self.sessions) > self.maxSessions:
+                    self.sessions.popitem(last = False)
+
+            if session is not None:
+                session.lastActive = time.monotonic()
+                self.sessions.move_to_end(_sessionId)
+
+        return session
+
+    def Evict(self):
+        """
+        Remove every session that has been idle for longer than the timeout. The caller should
+        hold self.lock.
+        """
+        now = time.monotonic()
+
+        expired = [key for key, session in self.sessions.items() if now - session.lastActive > self.timeout]
+
+        for key in expired:
+            del self.sessions[key]
+
+    def Append(self, _session, _audio):
+        """
+        Compute the spectrogram frames of a new chunk and add them to the session
+
+        Parameters:
+            - _session: The StreamSession
+            - _audio: np.float32 chunk of audio
+        """
+        if _session.samples + len(_audio) > self.maxSamples:
+            raise ValueError(f"A stream can be at most {self.maxSeconds:g} seconds long, end it and start a new one")
+
+        _session.samples += len(_audio)
+
+        with metrics.Time("spectrogram"):
+            spectrogram, _session.pending = self.process.StreamSpectrogram(_session.pending, _audio, self.vad is not None)
+
+        if spectrogram.shape[0] > 0:
+            # The VAD measures the loudness on the linear spectrogram, whatever the feature_type
+            if self.vad is not None:
+                _session.linear.append(spectrogram)
+
+                with metrics.Time("spectrogram"):
+                    spectrogram = np.asarray(self.process.Features(spectrogram))
+
+            with metrics.Time("normalize"):
+                spectrogram = np.asarray(self.process.NormalizeSpec(spectrogram))
+
+            _session.frames.append(spectrogram)
+
+    def Push(self, _sessionId, _audio):
+        """
+        Add a chunk of audio to a session and decode everything received so far
+
+        Parameters:
+            - _sessionId: The id of the session
+            - _audio: np.float32 chunk of audio
+
+        Returns:
+            The partial prediction
+        """
+        session = self.Session(_sessionId)
+
+        with session.lock:
+            self.Append(session, _audio)
+
+            return self.speechRec.PredictSpectrogram(session.Spectrogram())
+
+    def End(self, _sessionId, _audio = None):
+        """
+        Add the final chunk of audio to a session, decode the whole stream and close the session.
+        With the VAD, only the speech of the stream is decoded, and a silent stream is predicted
+        as an empty string without running the model.
+
+        Parameters:
+            - _sessionId: The id of the session
+            - _audio: An optional last chunk of audio
+
+        Returns:
+            The final prediction
+        """
+        session = self.Session(_sessionId)
+
+        with session.lock:
+            if _audio is not None and len(_audio) > 0:
+                self.Append(session, _audio)
+
+            prediction = self.Final(session)
+
+        with self.lock:
+            if self.sessions.get(_sessionId) is session:
+                del self.sessions[_sessionId]
+
+        return prediction
+
+    def Final(self, _session):
+        """
+        Parameters:
+            - _session: The StreamSession
+
+        Returns:
+            The prediction of the whole stream
+        """
+        spectrogram = _session.Spectrogram()
+
+        if self.vad is None:
+            return self.speechRec.PredictSpectrogram(spectrogram)
+
+        with metrics.Time("vad"):
+            segments = self.vad.Segments(_session.Linear())
+
+        if not segments:
+            return ""
+
+        # The spectrogram is normalized frame by frame, so slicing it afterwards changes nothing
+        parts = self.speechRec.PredictSpectrograms([spectrogram[start:end] for start, end in segments])
+
+        if len(parts) == 1:
+            return parts[0]
+
+        return " ".join(part.strip() for part in parts if part.strip())
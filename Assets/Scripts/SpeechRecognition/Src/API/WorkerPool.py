@@ -0,0 +1,375 @@
+# Lucas Davis
+
+import time
+import zlib
+import queue
+import pickle
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from Metrics import metrics, Merge
+
+# Requests that can share a batch run concurrently inside a worker, everything else runs in the
+# order it arrived so the chunks of a streaming session never overtake each other
+CONCURRENT = ("Predict", "PredictPhrase")
+
+def Worker(_index, _apiConfig, _modelPath, _requests, _results):
+    """
+    The main loop of a worker process. The model is loaded once, then requests are served until
+    the pool closes or the API process dies.
+
+    Parameters:
+        - _index: The index of the worker in the pool
+        - _apiConfig: The [API] section of the config
+        - _modelPath: The .keras or .tflite file to load, the packaged model when None
+        - _requests: The queue this worker receives (request id, method, arguments) on
+        - _results: The queue shared by all workers the (request id, worker, result, error) are
+                    sent back on
+    """
+    # Tensorflow is only imported here so the threading is set before its runtime starts
+    from Backend import LocalBackend, ConfigureThreads
+
+    ConfigureThreads(_apiConfig)
+
+    # Traces are only written by the API process, the workers just keep their histograms
+    metrics.ConfigureFrom(dict(_apiConfig, trace_path = ''))
+
+    from Recognition import SpeechRec
+
+    if _modelPath is not None:
+        speechRec = SpeechRec(SpeechRec.LoadModel(_modelPath))
+    else:
+        speechRec = SpeechRec()
+
+    speechRec.Warmup()
+
+    backend = LocalBackend(speechRec, _apiConfig)
+    executor = ThreadPoolExecutor(max_workers = max(1, int(_apiConfig.get('max_batch_size', 1))))
+
+    def Run(_requestId, _method, _args):
+        try:
+            _results.put((_requestId, _index, getattr(backend, _method)(*_args), None))
+        except Exception as e:
+            try:
+                pickle.dumps(e)
+            except Exception:
+                e = RuntimeError(str(e))
+
+            _results.put((_requestId, _index, None, e))
+
+    _results.put((None, _index, "ready", None))
+
+    parent = multiprocessing.parent_process()
+
+    while True:
+        try:
+            request = _requests.get(timeout = 1.0)
+        except queue.Empty:
+            if parent is not None and not parent.is_alive():
+                break
+
+            continue
+
+        if request is None:
+            break
+
+        if request[1] in CONCURRENT:
+            executor.submit(Run, *request)
+        else:
+            Run(*request)
+
+    executor.shutdown(wait = True)
+    backend.Close()
+
+class WorkerPool:
+    """
+    Serves requests with a pool of worker processes that each hold their own copy of the model,
+    so requests aren't limited to the one python interpreter the API runs in. It has the same
+    methods as LocalBackend.
+
+    Stateless requests go to the ready worker with the fewest requests in flight, the chunks of a
+    streaming session always go to the same worker and phrase lists are registered on every
+    worker. A worker that dies fails its requests in flight and is replaced. When a replacement
+    dies again before it finished loading, the next one waits twice as long as the one before,
+    and after max_restarts of those in a row the worker is given up on.
+    """
+    def __init__(self, _apiConfig, _workers = None, _modelPath = None, _startTimeout = 600.0):
+        """
+        Parameters:
+            - _apiConfig: The [API] section of the config
+            - _workers: The amount of worker processes. Defaults to the config
+            - _modelPath: The .keras or .tflite file every worker loads, the packaged model when None
+            - _startTimeout: How long, in seconds, to wait for the workers to load the model
+        """
+        self.apiConfig = dict(_apiConfig)
+        self.modelPath = _modelPath
+        self.count     = max(1, int(_workers if _workers is not None else self.apiConfig.get('workers', 1)))
+
+        self.maxRestarts    = int(self.apiConfig.get('max_restarts', 5))
+        self.restartBackoff = float(self.apiConfig.get('restart_backoff_s', 1.0))
+        self.metricsTimeout = float(self.apiConfig.get('metrics_timeout_s', 2.0))
+
+        # Spawned workers start from a fresh interpreter, a forked tensorflow runtime isn't safe
+        self.context = multiprocessing.get_context("spawn")
+        self.results = self.context.Queue()
+
+        self.lock      = threading.Lock()
+        self.ids       = itertools.count()
+        self.futures   = {}
+        self.inFlight  = [0] * self.count
+        self.ready     = [threading.Event() for _ in range(self.count)]
+        self.phrases   = {}
+        self.processes = [None] * self.count
+        self.requests  = [None] * self.count
+        self.running   = True
+
+        # Restarts in a row that died before they were ready, and when the worker restarts next
+        self.failures  = [0] * self.count
+        self.restartAt = [None] * self.count
+
+        # Whether a worker has to register phrase lists before it's ready
+        self.restoring = [False] * self.count
+
+        for i in range(self.count):
+            self.Start(i)
+
+        self.reader = threading.Thread(target = self.Reader, name = "WorkerPool", daemon = True)
+        self.reader.start()
+
+        for event in self.ready:
+            if not event.wait(_startTimeout):
+                self.Close()
+                raise RuntimeError("A worker didn't finish loading the model in time")
+
+    def Start(self, _index):
+        """
+        Start, or restart, a worker process
+
+        Parameters:
+            - _index: The index of the worker
+        """
+        self.ready[_index].clear()
+        self.requests[_index] = self.context.Queue()
+
+        # A replacement worker needs the phrase lists the one before it had. They are queued ahead
+        # of any other request, and the worker is only ready once it registered all of them
+        pending = [self.Call(_index, "RegisterPhrases", name, phrases) for name, phrases in list(self.phrases.items())]
+        self.restoring[_index] = len(pending) > 0
+
+        self.processes[_index] = self.context.Process(
+            target = Worker,
+            args = (_index, self.apiConfig, self.modelPath, self.requests[_index], self.results),
+            name = f"ASRWorker-{_index}",
+            daemon = True
+        )
+        self.processes[_index].start()
+
+        if pending:
+            threading.Thread(
+                target = self.Restore, args = (_index, self.processes[_index], pending),
+                name = f"WorkerPool-{_index}", daemon = True
+            ).start()
+
+    def Restore(self, _index, _process, _pending):
+        """
+        Marks a restarted worker ready once it registered the phrase lists it was started with. A
+        worker that fails to register one is stopped, so the Monitor replaces it
+
+        Parameters:
+            - _index: The index of the worker
+            - _process: The process of the worker, nothing is done once it has been replaced
+            - _pending: The futures of its RegisterPhrases requests
+        """
+        try:
+            for future in _pending:
+                future.result()
+        except Exception as e:
+            if self.processes[_index] is _process and _process.is_alive():
+                print(f"Worker {_index} couldn't register its phrase lists, restarting it: {e}")
+                _process.terminate()
+
+            return
+
+        if self.processes[_index] is _process:
+            self.ready[_index].set()
+
+    def Call(self, _index, _method, *_args):
+        """
+        Send a request to a worker
+
+        Parameters:
+            - _index: The index of the worker
+            - _method: The name of the LocalBackend method the worker calls
+            - _args: The arguments of the method
+
+        Returns:
+            A Future that will hold the result
+        """
+        future = Future()
+
+        with self.lock:
+            requestId = next(self.ids)
+            self.futures[requestId] = (_index, future)
+            self.inFlight[_index] += 1
+
+        self.requests[_index].put((requestId, _method, _args))
+
+        return future
+
+    def LeastBusy(self):
+        """
+        Returns:
+            The index of the ready worker with the fewest requests in flight. Workers that are
+            still loading or waiting to restart are only picked when none are ready
+        """
+        with self.lock:
+            workers = [i for i in range(self.count) if self.ready[i].is_set()] or range(self.count)
+
+            return min(workers, key = lambda i: self.inFlight[i])
+
+    def Sticky(self, _sessionId):
+        """
+        Parameters:
+            - _sessionId: The id of a streaming session
+
+        Returns:
+            The index of the worker that holds the session
+        """
+        return zlib.crc32(str(_sessionId).encode("utf-8")) % self.count
+
+    def Predict(self, _audio):
+        return self.Call(self.LeastBusy(), "Predict", _audio).result()
+
+    def StreamPush(self, _sessionId, _audio):
+        return self.Call(self.Sticky(_sessionId), "StreamPush", _sessionId, _audio).result()
+
+    def StreamEnd(self, _sessionId, _audio):
+        return self.Call(self.Sticky(_sessionId), "StreamEnd", _sessionId, _audio).result()
+
+    def RegisterPhrases(self, _name, _phrases):
+        self.phrases[_name] = list(_phrases)
+
+        for future in [self.Call(i, "RegisterPhrases", _name, self.phrases[_name]) for i in range(self.count)]:
+            future.result()
+
+    def PredictPhrase(self, _audio, _name):
+        return self.Call(self.LeastBusy(), "PredictPhrase", _audio, _name).result()
+
+    def Metrics(self):
+        """
+        Returns:
+            A snapshot of the metrics of every worker, merged into one. Workers that don't answer
+            within metrics_timeout_s, e.g. because they are still loading, are left out
+        """
+        futures = [self.Call(i, "Metrics") for i in range(self.count)]
+        deadline = time.monotonic() + self.metricsTimeout
+        snapshots = []
+
+        for future in futures:
+            try:
+                snapshots.append(future.result(timeout = max(0.0, deadline - time.monotonic())))
+            except Exception:
+                # Timed out, or the worker died before it answered
+                continue
+
+        return Merge(snapshots)
+
+    def Reader(self):
+        """
+        Hands the results of the workers back to the futures waiting on them, and replaces
+        workers that died
+        """
+        lastCheck = time.monotonic()
+
+        while self.running:
+            # The workers are checked at least once a second, even when results keep arriving
+            if time.monotonic() - lastCheck > 1.0:
+                self.Monitor()
+                lastCheck = time.monotonic()
+
+            try:
+                requestId, index, result, error = self.results.get(timeout = 1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            # The worker loaded the model, Restore marks it ready when it still has phrase lists to
+            # register
+            if requestId is None:
+                if not self.restoring[index]:
+                    self.ready[index].set()
+
+                continue
+
+            with self.lock:
+                entry = self.futures.pop(requestId, None)
+
+                if entry is not None:
+                    self.inFlight[entry[0]] -= 1
+
+            if entry is None:
+                continue
+
+            if error is not None:
+                entry[1].set_exception(error)
+            else:
+                entry[1].set_result(result)
+
+    def Monitor(self):
+        """
+        Fail the requests of any worker that died and start a new one in its place once its
+        backoff has passed
+        """
+        now = time.monotonic()
+
+        for i, process in enumerate(self.processes):
+            if not self.running or process.is_alive():
+                continue
+
+            with self.lock:
+                lost = [(requestId, future) for requestId, (index, future) in self.futures.items() if index == i]
+
+                for requestId, _ in lost:
+                    del self.futures[requestId]
+
+                self.inFlight[i] = 0
+
+            for _, future in lost:
+                future.set_exception(RuntimeError(f"Worker {i} stopped with exit code {process.exitcode}"))
+
+            if self.restartAt[i] is None:
+                # A worker that served requests before it died is replaced right away
+                self.failures[i] = 0 if self.ready[i].is_set() else self.failures[i] + 1
+                self.ready[i].clear()
+
+                if self.failures[i] > self.maxRestarts:
+                    print(f"Worker {i} stopped {self.failures[i]} times before it was ready, it isn't restarted again")
+                    self.restartAt[i] = float("inf")
+                    continue
+
+                delay = min(60.0, self.restartBackoff * 2 ** (self.failures[i] - 1)) if self.failures[i] > 0 else 0.0
+                self.restartAt[i] = now + delay
+
+                print(f"Worker {i} stopped, restarting it in {delay:.1f} s...")
+
+            if now >= self.restartAt[i]:
+                self.restartAt[i] = None
+                self.Start(i)
+
+    def Close(self, _timeout = 10.0):
+        """
+        Stop every worker once it finished the requests it already received
+        """
+        self.running = False
+
+        for requests in self.requests:
+            requests.put(None)
+
+        for process in self.processes:
+            process.join(_timeout)
+
+            if process.is_alive():
+                process.terminate()
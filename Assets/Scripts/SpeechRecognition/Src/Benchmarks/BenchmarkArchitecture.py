@@ -0,0 +1,85 @@
+# Lucas Davis
+
+import os
+import time
+import tempfile
+import argparse
+import numpy as np
+from jiwer import wer
+
+from Benchmarks.Common import SyntheticCSV, PrintTable, SAMPLE_RATE
+from Data.Process import Process
+from Data.Augment import Augment
+from Data.Validate import Validate
+from Model.ASRModel import ASRModel
+from Model.Setup import Setup
+from Recognition import SpeechRec
+
+# (name, [Model] section)
+VARIANTS = [
+    ("deepspeech2",            {"architecture": "deepspeech2"}),
+    ("gru 3x256 stride 4",     {"architecture": "streaming", "cell": "gru",  "layers": 3, "units": 256, "stride": 4}),
+    ("gru 3x256 stride 8",     {"architecture": "streaming", "cell": "gru",  "layers": 3, "units": 256, "stride": 8}),
+    ("lstm 3x256 stride 4",    {"architecture": "streaming", "cell": "lstm", "layers": 3, "units": 256, "stride": 4}),
+    ("gru 2x128 stride 4",     {"architecture": "streaming", "cell": "gru",  "layers": 2, "units": 128, "stride": 4}),
+    ("gru 5x512 stride 4",     {"architecture": "streaming", "cell": "gru",  "layers": 5, "units": 512, "stride": 4})
+]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Parameters, latency and WER of the model architectures")
+    parser.add_argument("--csv", default = None, help = "The csv file the WER is measured on, a synthetic corpus is used if omitted")
+    parser.add_argument("--train_csv", default = None, help = "A csv file every variant is trained on first, defaults to --csv")
+    parser.add_argument("--epochs", type = int, default = 0, help = "Epochs every variant is trained for, 0 leaves them untrained")
+    parser.add_argument("--samples", type = int, default = 8, help = "Size of the synthetic corpus")
+    parser.add_argument("--repeats", type = int, default = 3)
+    parser.add_argument("--variants", nargs = "+", default = None, help = "Only benchmark the variants with these names")
+    args = parser.parse_args()
+
+    csvPath = args.csv or SyntheticCSV(
+        os.path.join(tempfile.mkdtemp(prefix = "architecture_"), "corpus"), args.samples, np.random.default_rng(42), _maxSeconds = 6.0
+    )
+
+    process = Process()
+    setup = Setup(process, Augment(), Validate(process))
+    setup.cacheFeatures = False
+
+    audioPaths, transcripts = process.LoadCSV(csvPath)
+    transcripts = [str(transcript).lower() for transcript in transcripts]
+    clips = [process.LoadAudioFile(path).numpy() for path in audioPaths]
+    audioSeconds = sum(len(clip) for clip in clips) / SAMPLE_RATE * args.repeats
+
+    if args.epochs > 0:
+        trainDataset = setup.Batch(*setup.Features(args.train_csv or csvPath, setup.ProcessData, True), _training = True)
+
+    rows = []
+
+    for name, modelConfig in VARIANTS:
+        if args.variants is not None and name not in args.variants:
+            continue
+
+        model = ASRModel.Compile(ASRModel.Build(process.Bins(), process.charToNum.vocabulary_size(), modelConfig), 1e-4)
+
+        if args.epochs > 0:
+            model.fit(trainDataset, epochs = args.epochs, verbose = 0)
+
+        speechRec = SpeechRec(model, "greedy", _vad = False)
+        speechRec.Warmup()
+
+        predictions = []
+        start = time.monotonic()
+
+        for clip in clips:
+            for _ in range(args.repeats):
+                prediction = speechRec.Predict(clip)
+
+            predictions.append(prediction)
+
+        seconds = time.monotonic() - start
+
+        rows.append([
+            name, model.count_params() / 1e6, ASRModel.TimeStride(model), seconds / audioSeconds * 1000.0,
+            wer(transcripts, predictions)
+        ])
+        print(f"{name}: {seconds / audioSeconds * 1000.0:.1f} ms per second of audio", flush = True)
+
+    PrintTable(["variant", "params M", "stride", "ms per audio s", "WER"], rows)
@@ -0,0 +1,99 @@
+# Lucas Davis
+
+import time
+import tempfile
+import argparse
+import numpy as np
+
+import tensorflow as tf
+
+from Benchmarks.Common import SyntheticCSV, PrintTable
+from Data.Process import Process
+from Data.Augment import Augment
+from Data.Validate import Validate
+from Model.Setup import Setup
+
+def Epoch(_dataset):
+    """
+    Parameters:
+        - _dataset: A batched dataset
+
+    Returns:
+        The number of samples read and the time it took in seconds
+    """
+    samples = 0
+    start = time.monotonic()
+
+    for spectrogram, _ in _dataset:
+        samples += spectrogram.shape[0]
+
+    return samples, time.monotonic() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Samples/sec of per sample vs batched augmentation")
+    parser.add_argument("--csv", default = None, help = "A csv file to benchmark, a synthetic corpus is used if omitted")
+    parser.add_argument("--samples", type = int, default = 256, help = "Size of the synthetic corpus")
+    parser.add_argument("--epochs", type = int, default = 3)
+    args = parser.parse_args()
+
+    csvPath = args.csv or SyntheticCSV(tempfile.mkdtemp(prefix = "augment_"), args.samples, np.random.default_rng(42))
+
+    process = Process()
+    augment = Augment()
+    setup = Setup(process, augment, Validate(process))
+    setup.cacheFeatures = False
+
+    def PerSample(_file, _transcript):
+        # The original per sample augmentation; time streching was never enabled on this path
+        audio = process.LoadAudioFile(_file)
+        audio = augment.Noise(audio)
+        audio = augment.Volume(audio)
+
+        spec = process.Spectrogram(audio)
+        spec = process.NormalizeSpec(spec)
+
+        return spec, process.Transcript(_transcript)
+
+    audioPaths, transcripts = process.LoadCSV(csvPath)
+
+    perSample = (
+        tf.data.Dataset.from_tensor_slices((list(audioPaths), list(transcripts)))
+        .map(PerSample, num_parallel_calls = tf.data.AUTOTUNE)
+        .padded_batch(setup.batchSize)
+        .prefetch(tf.data.AUTOTUNE)
+    )
+
+    pipelines = [("per sample (noise, volume)", perSample)]
+
+    # The same augmentations as the per sample path, then everything the batched path supports
+    basic = Augment()
+    basic.augmentConfig = dict(augment.augmentConfig, time_stretch_ratio = "0", freq_masks = "0", time_masks = "0")
+
+    for name, batchAugment, bucketing in [
+        ("batched (noise, volume)", basic, False),
+        ("batched (noise, strech, volume, specaugment)", augment, False),
+        ("batched + buckets (noise, strech, volume, specaugment)", augment, True)
+    ]:
+        setup.augment = batchAugment
+        setup.bucketing = bucketing
+        setup.shuffle = bucketing
+
+        dataset = setup.Features(csvPath, setup.ProcessTrainingData, setup.shuffle, _cache = False)
+
+        # AugmentBatch is bound to the current augment instance when the dataset is traced
+        pipelines.append((name, setup.Batch(*dataset, _training = True, _map = setup.AugmentBatch)))
+
+    rows = []
+
+    for name, dataset in pipelines:
+        Epoch(dataset)
+
+        rates = []
+
+        for _ in range(args.epochs):
+            samples, seconds = Epoch(dataset)
+            rates.append(samples / seconds)
+
+        rows.append([name, float(np.mean(rates)), float(np.min(rates)), float(np.max(rates))])
+
+    PrintTable(["pipeline", "samples/s", "min", "max"], rows)
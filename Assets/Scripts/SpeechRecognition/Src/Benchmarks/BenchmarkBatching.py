@@ -0,0 +1,74 @@
+# Lucas Davis
+
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from Benchmarks.Common import LoadModel, SyntheticAudio, Percentiles, PrintTable, SAMPLE_RATE
+from Data.Process import Process
+from Recognition import SpeechRec
+from Scheduler import BatchScheduler
+
+def RunClients(_predict, _clips, _clients):
+    """
+    Simulates several game clients sending requests at the same time. Every client sends its
+    next request as soon as the previous one was answered.
+
+    Parameters:
+        - _predict: The function that turns an audio clip into a prediction
+        - _clips: The list of audio clips to send
+        - _clients: The number of concurrent clients
+
+    Returns:
+        The per request latencies and the total wall time in seconds
+    """
+    def Request(_clip):
+        start = time.monotonic()
+        _predict(_clip)
+
+        return time.monotonic() - start
+
+    start = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers = _clients) as pool:
+        latencies = list(pool.map(Request, _clips))
+
+    return latencies, time.monotonic() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Throughput and latency of batched vs unbatched inference")
+    parser.add_argument("--model", default = None, help = "Path to a .keras file, an untrained model is used if omitted")
+    parser.add_argument("--clients", type = int, nargs = "+", default = [1, 4, 8, 16])
+    parser.add_argument("--requests", type = int, default = 64)
+    parser.add_argument("--max_batch_size", type = int, default = 8)
+    parser.add_argument("--max_wait_ms", type = float, default = 10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    process = Process()
+
+    print("Loading model...")
+    speechRec = SpeechRec(LoadModel(args.model, process))
+
+    clips = [SyntheticAudio(rng.uniform(1.0, 5.0), rng) for _ in range(args.requests)]
+    audioSeconds = sum(len(clip) for clip in clips) / SAMPLE_RATE
+
+    # Trace the serving graphs so tracing isn't part of the measurements
+    speechRec.Warmup()
+
+    rows = []
+
+    for clients in args.clients:
+        latencies, wall = RunClients(speechRec.Predict, clips, clients)
+        stats = Percentiles(latencies)
+        rows.append(["unbatched", clients, args.requests / wall, audioSeconds / wall, stats["p50"], stats["p90"], stats["p99"]])
+
+        scheduler = BatchScheduler(speechRec, args.max_batch_size, args.max_wait_ms)
+        latencies, wall = RunClients(scheduler.Predict, clips, clients)
+        scheduler.Close()
+
+        stats = Percentiles(latencies)
+        rows.append(["batched", clients, args.requests / wall, audioSeconds / wall, stats["p50"], stats["p90"], stats["p99"]])
+
+    PrintTable(["mode", "clients", "utt/s", "audio s/s", "p50 ms", "p90 ms", "p99 ms"], rows)
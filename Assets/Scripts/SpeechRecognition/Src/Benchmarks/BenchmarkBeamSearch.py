@@ -0,0 +1,181 @@
+# Lucas Davis
+
+import os
+import time
+import tempfile
+import argparse
+import numpy as np
+from collections import Counter
+from jiwer import wer
+
+from Benchmarks.Common import LoadModel, PrintTable
+from Data.Process import Process
+from Model.BeamSearch import BeamSearch
+from Model.LanguageModel import LanguageModel
+from Recognition import SpeechRec
+
+WORDS = [
+    "the", "door", "opens", "light", "fire", "wolf", "forest", "brother", "veil", "whisper",
+    "open", "close", "gate", "torch", "north", "south", "old", "path", "through", "to"
+]
+
+def Sentences(_count, _rng):
+    """
+    Parameters:
+        - _count: The number of sentences
+        - _rng: A numpy Generator
+
+    Returns:
+        Sentences from a small grammar, so a language model has structure to learn
+    """
+    sentences = []
+
+    for _ in range(_count):
+        verb = _rng.choice(["open", "close", "light", "whisper to"])
+        noun = _rng.choice(["the door", "the gate", "the torch", "the fire", "the old path"])
+        place = _rng.choice(["", " through the forest", " to the north", " to the south"])
+
+        sentences.append(f"{verb} {noun}{place}")
+
+    return sentences
+
+def WriteARPA(_sentences, _path, _discount = 0.5):
+    """
+    Writes a word bigram ARPA file estimated from sentences with absolute discounting
+
+    Parameters:
+        - _sentences: A list of sentences
+        - _path: Where to write the ARPA file
+        - _discount: The count subtracted from every seen bigram
+    """
+    unigrams, bigrams = Counter(), Counter()
+
+    for sentence in _sentences:
+        words = ["<s>"] + sentence.split() + ["</s>"]
+
+        unigrams.update(words[1:])
+        bigrams.update(zip(words[:-1], words[1:]))
+
+    total = sum(unigrams.values())
+    unigramProb = {word: count / total for word, count in unigrams.items()}
+    contexts = Counter()
+
+    for (context, _), count in bigrams.items():
+        contexts[context] += count
+
+    backoff = {}
+
+    for context in list(unigrams) + ["<s>"]:
+        following = [word for (previous, word) in bigrams if previous == context]
+
+        if not following:
+            continue
+
+        left = _discount * len(following) / contexts[context]
+        backoff[context] = left / max(1e-12, 1.0 - sum(unigramProb[word] for word in following))
+
+    with open(_path, mode = 'w', encoding = 'utf-8') as arpa:
+        arpa.write(f"\\data\\\nngram 1={len(unigrams) + 1}\nngram 2={len(bigrams)}\n\n\\1-grams:\n")
+        arpa.write(f"-99\t<s>\t{np.log10(backoff['<s>']):.6f}\n")
+
+        for word, prob in unigramProb.items():
+            weight = f"\t{np.log10(backoff[word]):.6f}" if word in backoff else ""
+            arpa.write(f"{np.log10(prob):.6f}\t{word}{weight}\n")
+
+        arpa.write("\n\\2-grams:\n")
+
+        for (context, word), count in bigrams.items():
+            arpa.write(f"{np.log10((count - _discount) / contexts[context]):.6f}\t{context} {word}\n")
+
+        arpa.write("\n\\end\\\n")
+
+def Spell(_process, _sentence, _rng, _confusion, _frames = 4):
+    """
+    Parameters:
+        - _process: A Process instance
+        - _sentence: The sentence to spell
+        - _rng: A numpy Generator
+        - _confusion: The chance a character is acoustically confused with another one
+        - _frames: Frames per character
+
+    Returns:
+        Noisy logits that spell out a sentence, where some characters are ambiguous or wrong,
+        standing in for a trained model's output
+    """
+    label = _process.charToNum(list(_sentence)).numpy()
+    logits = _rng.normal(size = ((2 * len(label) + 1) * _frames, 29))
+
+    logits[:, -1] += 6.0
+
+    for i, char in enumerate(label):
+        block = slice((2 * i + 1) * _frames, (2 * i + 2) * _frames)
+
+        logits[block, -1] -= 6.0
+        logits[block, char] += 6.0
+
+        if _rng.random() < _confusion:
+            logits[block, _rng.integers(1, 28)] += 6.0 + _rng.normal()
+
+    return logits.astype(np.float32)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "WER and decode time of greedy vs beam search, with and without a language model")
+    parser.add_argument("--widths", default = "1,4,8,16,32,64", help = "Beam widths to measure")
+    parser.add_argument("--lm", default = None, help = "An ARPA file, a bigram model of the transcripts is used if omitted")
+    parser.add_argument("--lm_unit", default = "word", help = "word or char")
+    parser.add_argument("--utterances", type = int, default = 100, help = "Synthetic utterances")
+    parser.add_argument("--confusion", type = float, default = 0.15, help = "Chance of a confused character in the synthetic utterances")
+    parser.add_argument("--csv", default = None, help = "A held out csv file, decoded with --model instead of synthetic logits")
+    parser.add_argument("--model", default = None, help = "A trained .keras file")
+    args = parser.parse_args()
+
+    process = Process()
+    rng = np.random.default_rng(42)
+
+    if args.csv is not None:
+        speechRec = SpeechRec(LoadModel(args.model, process), "greedy")
+
+        audioPaths, transcripts = process.LoadCSV(args.csv)
+        logits = [speechRec.inferLogits(process.LoadAudioFile(path).numpy()).numpy() for path in audioPaths]
+    else:
+        transcripts = Sentences(args.utterances, rng)
+        logits = [Spell(process, sentence, rng, args.confusion) for sentence in transcripts]
+
+    lmPath = args.lm
+
+    if lmPath is None:
+        lmPath = os.path.join(tempfile.mkdtemp(prefix = "beam_search_"), "bigram.arpa")
+        WriteARPA(Sentences(2000, np.random.default_rng(7)) if args.csv is None else transcripts, lmPath)
+
+    languageModel = LanguageModel(lmPath, args.lm_unit)
+
+    decoders = [("greedy", 1, None)]
+
+    for width in [int(width) for width in args.widths.split(",")]:
+        decoders.append(("beam", width, None))
+        decoders.append(("beam + lm", width, languageModel))
+
+    rows = []
+
+    for name, width, lm in decoders:
+        if name == "greedy":
+            decoder = None
+        else:
+            decoder = BeamSearch(process, width, lm)
+
+        predictions = []
+        start = time.monotonic()
+
+        for item in logits:
+            if decoder is None:
+                best = np.argmax(item, axis = -1)
+                label = [c for i, c in enumerate(best) if c != 28 and (i == 0 or c != best[i - 1])]
+                predictions.append(process.ConvertLabel(label))
+            else:
+                predictions.append(decoder.Decode(item))
+
+        elapsed = time.monotonic() - start
+
+        rows.append([name, width, wer(list(transcripts), predictions) * 100.0, elapsed / len(logits) * 1000.0])
+
+    PrintTable(["decoder", "beam width", "WER %", "ms/utterance"], rows)
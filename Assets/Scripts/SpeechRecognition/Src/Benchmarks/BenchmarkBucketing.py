@@ -0,0 +1,90 @@
+# Lucas Davis
+
+import time
+import tempfile
+import argparse
+import numpy as np
+
+from tensorflow.keras.optimizers import Adam
+
+from Benchmarks.Common import SyntheticCSV, PrintTable
+from Data.Process import Process
+from Data.Augment import Augment
+from Data.Validate import Validate
+from Model.ASRModel import ASRModel, CTCLoss
+from Model.Setup import Setup
+
+def PaddingRatio(_dataset):
+    """
+    Measures how much of the batched spectrograms is padding. Padded frames are exactly zero in
+    every bin, which a normalized spectrogram frame never is.
+
+    Parameters:
+        - _dataset: A batched dataset of (spectrogram, label)
+
+    Returns:
+        The fraction of padded frames, the number of batches and the time it took to read them
+    """
+    padded, total, batches = 0, 0, 0
+    start = time.monotonic()
+
+    for spectrogram, _ in _dataset.as_numpy_iterator():
+        real = np.any(spectrogram != 0, axis = -1)
+
+        padded += real.size - real.sum()
+        total += real.size
+        batches += 1
+
+    return padded / total, batches, time.monotonic() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Padding and epoch time of csv order vs length bucketed batches")
+    parser.add_argument("--csv", default = None, help = "A csv file to benchmark, a synthetic corpus is used if omitted")
+    parser.add_argument("--samples", type = int, default = 256, help = "Size of the synthetic corpus")
+    parser.add_argument("--max_seconds", type = float, default = 15.0, help = "Longest clip of the synthetic corpus")
+    parser.add_argument("--batch_size", type = int, default = None, help = "Overrides batch_size from the config")
+    parser.add_argument("--epochs", type = int, default = 2, help = "Epochs trained per mode, the last one is timed")
+    parser.add_argument("--frame_budget", type = int, default = 0, help = "Frame budget used for the budget mode")
+    parser.add_argument("--no_train", action = "store_true", help = "Only measure the padding")
+    args = parser.parse_args()
+
+    csvPath = args.csv or SyntheticCSV(
+        tempfile.mkdtemp(prefix = "bucketing_"), args.samples, np.random.default_rng(42), _maxSeconds = args.max_seconds
+    )
+
+    process = Process()
+    setup = Setup(process, Augment(), Validate(process))
+    setup.cacheFeatures = False
+    setup.batchSize = args.batch_size or setup.batchSize
+
+    modes = [("csv order", False, 0), ("bucketed", True, 0)]
+
+    if args.frame_budget > 0:
+        modes.append(("frame budget", True, args.frame_budget))
+
+    rows = []
+
+    for name, bucketing, budget in modes:
+        setup.bucketing = bucketing
+        setup.shuffle = bucketing
+        setup.frameBudget = budget
+
+        dataset = setup.Batch(*setup.Features(csvPath, setup.ProcessData, setup.shuffle), _training = True)
+        ratio, batches, readTime = PaddingRatio(dataset)
+
+        epochTime = float("nan")
+
+        if not args.no_train:
+            model = ASRModel.BuildModel(process.Bins(), process.charToNum.vocabulary_size())
+            model.compile(optimizer = Adam(learning_rate = 1e-4), loss = CTCLoss())
+
+            if args.epochs > 1:
+                model.fit(dataset, epochs = args.epochs - 1, verbose = 0)
+
+            start = time.monotonic()
+            model.fit(dataset, epochs = 1, verbose = 0)
+            epochTime = time.monotonic() - start
+
+        rows.append([name, batches, ratio * 100.0, readTime, epochTime])
+
+    PrintTable(["mode", "batches", "padding %", "input pipeline s", "epoch s"], rows)
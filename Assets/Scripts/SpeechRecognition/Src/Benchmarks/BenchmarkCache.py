@@ -0,0 +1,122 @@
+# Lucas Davis
+
+import time
+import argparse
+import numpy as np
+
+from Benchmarks.Common import LoadModel, SyntheticAudio, Percentiles, PrintTable, SAMPLE_RATE
+from Data.Process import Process
+from Recognition import SpeechRec
+from ResultCache import ResultCache
+
+def RequestLog(_clips, _requests, _rng, _retakes = 0.3):
+    """
+    A replayed request log: players retry the same few phrases far more often than the rest, so
+    the clips are drawn with a zipf distribution. Some repeats are the exact same buffer, like a
+    replay or a test resending it, the rest are a retake: the same recording a little louder or
+    quieter, with some extra noise and cut slightly differently.
+
+    Parameters:
+        - _clips: The unique np.float32 audio clips
+        - _requests: The length of the log
+        - _rng: A numpy Generator
+        - _retakes: The fraction of repeats that are retakes instead of the exact same buffer
+
+    Returns:
+        A list of np.float32 audio clips and whether each one is a retake
+    """
+    weights = 1.0 / np.arange(1, len(_clips) + 1)
+    order = _rng.choice(len(_clips), size = _requests, p = weights / weights.sum())
+
+    log, seen = [], set()
+
+    for index in order:
+        clip = _clips[index]
+        retake = index in seen and _rng.uniform() < _retakes
+
+        if retake:
+            cut = _rng.integers(0, int(0.05 * clip.shape[0]))
+            clip = clip[:clip.shape[0] - cut] * _rng.uniform(0.7, 1.4)
+            clip = (clip + 0.002 * _rng.standard_normal(clip.shape[0])).astype(np.float32)
+
+        seen.add(index)
+        log.append((clip, retake))
+
+    return log
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Hit rate and compute saved by the result cache on a replayed request log")
+    parser.add_argument("--csv", default = None, help = "A csv file of recordings to draw the log from, synthetic clips are used if omitted")
+    parser.add_argument("--model", default = None, help = "Path to a .keras file, an untrained model is used if omitted")
+    parser.add_argument("--unique", type = int, default = 25, help = "Unique clips in the log")
+    parser.add_argument("--requests", type = int, default = 100, help = "Length of the log")
+    parser.add_argument("--cache_mb", type = float, default = 16.0)
+    args = parser.parse_args()
+
+    process = Process()
+    rng = np.random.default_rng(42)
+
+    if args.csv is not None:
+        audioPaths, _ = process.LoadCSV(args.csv)
+        clips = [process.LoadAudioFile(path).numpy() for path in audioPaths[:args.unique]]
+    else:
+        clips = [SyntheticAudio(rng.uniform(1.0, 2.5), rng) for _ in range(args.unique)]
+
+    log = RequestLog(clips, args.requests, rng)
+    audioSeconds = sum(len(clip) for clip, _ in log) / SAMPLE_RATE
+
+    speechRec = SpeechRec(LoadModel(args.model, process), "greedy")
+    speechRec.Warmup()
+
+    # Every clip predicted without the cache, to check the hits answer with the same prediction
+    reference = {}
+    rows = []
+
+    for name, cache in [
+        ("off", None),
+        ("exact", ResultCache(args.cache_mb * 1e6, False, _sampleRate = SAMPLE_RATE)),
+        ("near duplicates", ResultCache(args.cache_mb * 1e6, True, _sampleRate = SAMPLE_RATE))
+    ]:
+        latencies, lookups, same = [], [], []
+
+        start = time.monotonic()
+
+        for i, (clip, retake) in enumerate(log):
+            requestStart = time.monotonic()
+
+            if cache is None:
+                prediction = speechRec.Predict(clip)
+                reference[i] = prediction
+            else:
+                lookupStart = time.monotonic()
+                hit = cache.Get(clip)
+                lookups.append(time.monotonic() - lookupStart)
+
+                if hit is None:
+                    computeStart = time.monotonic()
+                    prediction = speechRec.Predict(clip)
+                    cache.Put(clip, prediction, time.monotonic() - computeStart)
+                else:
+                    prediction = hit
+
+            latencies.append(time.monotonic() - requestStart)
+            same.append(prediction == reference[i])
+
+        wall = time.monotonic() - start
+        stats = Percentiles(latencies)
+        cacheStats = cache.Stats() if cache is not None else {"hit_rate": 0.0, "near_hits": 0, "saved_seconds": 0.0, "bytes": 0}
+
+        rows.append([
+            name, 100.0 * cacheStats["hit_rate"], cacheStats["near_hits"], cacheStats["saved_seconds"],
+            wall, audioSeconds / wall, stats["p50"], stats["mean"],
+            Percentiles(lookups)["p50"] * 1000.0 if lookups else 0.0, cacheStats["bytes"] / 1e3,
+            100.0 * float(np.mean(same))
+        ])
+        print(f"{name}: {wall:.1f} s", flush = True)
+
+    print(f"{len(log)} requests of {len(clips)} unique clips, {sum(retake for _, retake in log)} retakes")
+
+    PrintTable(
+        ["cache", "hit %", "near hits", "model s saved", "wall s", "audio s/s", "p50 ms", "mean ms", "lookup p50 us", "cache KB", "same as off %"],
+        rows
+    )
@@ -0,0 +1,155 @@
+# Lucas Davis
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import subprocess
+import numpy as np
+
+from Benchmarks.Common import PrintTable
+
+def FreePorts(_count):
+    """
+    Parameters:
+        - _count: The amount of ports
+
+    Returns:
+        A list of ports nothing is listening on
+    """
+    sockets = [socket.socket() for _ in range(_count)]
+
+    for sock in sockets:
+        sock.bind(("localhost", 0))
+
+    ports = [sock.getsockname()[1] for sock in sockets]
+
+    for sock in sockets:
+        sock.close()
+
+    return ports
+
+def Worker(_batch, _seconds, _steps):
+    """
+    Trains the full model with MultiWorkerMirroredStrategy on synthetic batches, as one worker of
+    the cluster in TF_CONFIG. Every replica gets a batch of _batch clips, so the global batch grows
+    with the amount of workers. The first epoch traces and warms up, the second is timed. The chief
+    prints the mean step time as json.
+
+    Parameters:
+        - _batch: The batch size of every replica
+        - _seconds: The length of every clip in seconds
+        - _steps: The amount of steps per epoch
+    """
+    import tensorflow as tf
+    from tensorflow import keras
+    from Model.ASRModel import ASRModel
+    from Data.Features import Filterbank
+    from Grab_Ini import ini
+
+    # The strategy has to be created before tensorflow does anything else
+    strategy = ASRModel.Strategy("multi_worker")
+
+    specConfig = ini().grabInfo("config.ini", "Process.Spectrogram")
+    bins = Filterbank(specConfig).bins
+    frames = int(_seconds * int(specConfig['sample_rate']) / int(specConfig['frame_step']))
+
+    with strategy.scope():
+        model = ASRModel.Distribute(ASRModel.Compile(ASRModel.BuildModel(bins, 28), 1e-4), strategy)
+
+    def Dataset(_context):
+        rng = np.random.default_rng(42 + _context.input_pipeline_id)
+        spectrograms = rng.standard_normal((_batch, frames, bins)).astype(np.float32)
+        labels = rng.integers(1, 28, size = (_batch, int(_seconds * 12)))
+
+        return tf.data.Dataset.from_tensors((spectrograms, labels)).repeat()
+
+    dataset = strategy.distribute_datasets_from_function(Dataset)
+
+    class Timer(keras.callbacks.Callback):
+        def on_epoch_begin(self, epoch, logs = None):
+            self.start = time.monotonic()
+
+        def on_epoch_end(self, epoch, logs = None):
+            self.seconds = time.monotonic() - self.start
+
+    timer = Timer()
+
+    with strategy.scope():
+        model.fit(dataset, epochs = 2, steps_per_epoch = _steps, callbacks = [timer], verbose = 0)
+
+    if ASRModel.IsChief(strategy):
+        print(json.dumps({
+            "step_s":   timer.seconds / _steps,
+            "replicas": strategy.num_replicas_in_sync
+        }))
+
+def Cluster(_workers, _batch, _seconds, _steps):
+    """
+    Starts a cluster of local worker processes, one per port, and waits for them to finish
+
+    Parameters:
+        - _workers: The amount of workers
+        - _batch: The batch size of every replica
+        - _seconds: The length of every clip in seconds
+        - _steps: The amount of steps per epoch
+
+    Returns:
+        The json the chief printed
+    """
+    ports = FreePorts(_workers)
+    processes = []
+
+    for index in range(_workers):
+        environment = dict(os.environ)
+        environment["TF_CONFIG"] = json.dumps({
+            "cluster": {"worker": [f"localhost:{port}" for port in ports]},
+            "task":    {"type": "worker", "index": index}
+        })
+
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "Benchmarks.BenchmarkDistributed", "--child",
+             "--batch", str(_batch), "--seconds", str(_seconds), "--steps", str(_steps)],
+            env = environment, stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, text = True
+        ))
+
+    outputs = [process.communicate()[0] for process in processes]
+
+    for process in processes:
+        if process.returncode != 0:
+            raise RuntimeError(f"A worker of the {_workers} worker cluster failed")
+
+    return json.loads(outputs[0].strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Scaling of data parallel training over local worker processes")
+    parser.add_argument("--workers", type = int, nargs = "+", default = [1, 2, 4])
+    parser.add_argument("--batch", type = int, default = 2)
+    parser.add_argument("--seconds", type = float, default = 1.0)
+    parser.add_argument("--steps", type = int, default = 3)
+    parser.add_argument("--child", action = "store_true", help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        Worker(args.batch, args.seconds, args.steps)
+        sys.exit(0)
+
+    rows = []
+    baseline = None
+
+    for workers in args.workers:
+        result = Cluster(workers, args.batch, args.seconds, args.steps)
+        clipsPerSecond = result["replicas"] * args.batch / result["step_s"]
+
+        baseline = baseline or clipsPerSecond / workers
+
+        rows.append([
+            workers, result["replicas"] * args.batch, result["step_s"] * 1000.0, clipsPerSecond,
+            clipsPerSecond / baseline, clipsPerSecond / (baseline * workers)
+        ])
+        print(f"{workers} workers: {result['step_s'] * 1000.0:.0f} ms/step", flush = True)
+
+    print(f"{os.cpu_count()} cpus")
+    PrintTable(["workers", "global batch", "ms/step", "clips/s", "speedup", "efficiency"], rows)
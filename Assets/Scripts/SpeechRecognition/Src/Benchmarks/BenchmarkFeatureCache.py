@@ -0,0 +1,78 @@
+# Lucas Davis
+
+import time
+import tempfile
+import argparse
+import numpy as np
+
+import tensorflow as tf
+
+from Benchmarks.Common import SyntheticCSV, PrintTable
+from Data.Process import Process
+from Data.Augment import Augment
+from Data.Validate import Validate
+from Data.FeatureCache import FeatureCache
+from Model.Setup import Setup
+
+def Epoch(_dataset):
+    """
+    Parameters:
+        - _dataset: A batched dataset
+
+    Returns:
+        The number of samples read and the time it took in seconds
+    """
+    samples = 0
+    start = time.monotonic()
+
+    for spectrogram, _ in _dataset:
+        samples += spectrogram.shape[0]
+
+    return samples, time.monotonic() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Samples/sec of the cached vs uncached input pipelines")
+    parser.add_argument("--csv", default = None, help = "A csv file to benchmark, a synthetic corpus is used if omitted")
+    parser.add_argument("--samples", type = int, default = 256, help = "Size of the synthetic corpus")
+    parser.add_argument("--epochs", type = int, default = 3)
+    parser.add_argument("--batch_size", type = int, default = 32)
+    args = parser.parse_args()
+
+    workDir = tempfile.mkdtemp(prefix = "feature_cache_")
+    csvPath = args.csv or SyntheticCSV(workDir, args.samples, np.random.default_rng(42))
+
+    process = Process()
+    setup = Setup(process, Augment(), Validate(process))
+
+    cache = FeatureCache(process)
+    cache.path = workDir
+
+    audioPaths, transcripts = process.LoadCSV(csvPath)
+
+    uncached = (
+        tf.data.Dataset.from_tensor_slices((list(audioPaths), list(transcripts)))
+        .map(setup.ProcessData, num_parallel_calls = tf.data.AUTOTUNE)
+        .padded_batch(args.batch_size)
+        .prefetch(tf.data.AUTOTUNE)
+    )
+
+    start = time.monotonic()
+    cache.Build(csvPath, setup.ProcessData)
+    buildTime = time.monotonic() - start
+
+    cached = (
+        cache.Load(csvPath, setup.ProcessData)
+        .padded_batch(args.batch_size)
+        .prefetch(tf.data.AUTOTUNE)
+    )
+
+    rows = []
+
+    for epoch in range(1, args.epochs + 1):
+        samples, uncachedTime = Epoch(uncached)
+        _, cachedTime = Epoch(cached)
+
+        rows.append([epoch, samples, samples / uncachedTime, samples / cachedTime, uncachedTime / cachedTime])
+
+    print(f"Cache built in {buildTime:.2f} s ({len(audioPaths) / buildTime:.2f} samples/s) at {workDir}")
+    PrintTable(["epoch", "samples", "uncached samples/s", "cached samples/s", "speedup"], rows)
@@ -0,0 +1,80 @@
+# Lucas Davis
+
+import time
+import argparse
+import numpy as np
+import tensorflow as tf
+
+from Benchmarks.Common import SyntheticAudio, PrintTable, SAMPLE_RATE
+from Benchmarks.BenchmarkFeatures import Measure
+from Data.Process import Process
+from Data.Features import Filterbank, SpectrogramExtractor, FEATURE_TYPES
+from Model.ASRModel import ASRModel
+
+def StepTimes(_model, _features, _labels, _repeats):
+    """
+    Parameters:
+        - _model: A compiled model
+        - _features: A batch of features in the shape of (batch, frames, bins)
+        - _labels: A batch of labels in the shape of (batch, characters)
+        - _repeats: How many steps are timed
+
+    Returns:
+        The median seconds of a training step and of an inference
+    """
+    _model.train_on_batch(_features, _labels)
+    _model.predict_on_batch(_features)
+
+    train, inference = [], []
+
+    for _ in range(_repeats):
+        start = time.perf_counter()
+        _model.train_on_batch(_features, _labels)
+        train.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        _model.predict_on_batch(_features)
+        inference.append(time.perf_counter() - start)
+
+    return float(np.median(train)), float(np.median(inference))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Extraction cost, input width and model step time of every feature_type")
+    parser.add_argument("--seconds", type = float, default = 4.0, help = "Length of every clip")
+    parser.add_argument("--batch_size", type = int, default = 4)
+    parser.add_argument("--repeats", type = int, default = 5, help = "Timed model steps")
+    parser.add_argument("--extraction_repeats", type = int, default = 100)
+    parser.add_argument("--types", nargs = "+", default = list(FEATURE_TYPES), choices = FEATURE_TYPES)
+    args = parser.parse_args()
+
+    process = Process()
+    rng = np.random.default_rng(42)
+
+    clips = np.stack([SyntheticAudio(args.seconds, rng) for _ in range(args.batch_size)])
+    labels = rng.integers(1, process.charToNum.vocabulary_size(), size = (args.batch_size, int(args.seconds * 10)))
+
+    rows = []
+
+    for featureType in args.types:
+        config = dict(process.spectrogramConfig, feature_type = featureType)
+
+        process.spectrogramConfig = config
+        process.filterbank = Filterbank(config)
+        extractor = SpectrogramExtractor(config)
+
+        numpySeconds = Measure(extractor.Features, clips[0], args.extraction_repeats)
+        eagerSeconds = Measure(lambda clip: process.NormalizeSpec(process.Spectrogram(tf.constant(clip))).numpy(), clips[0], args.extraction_repeats)
+
+        features = extractor.Normalize(extractor.Spectrogram(clips))
+
+        model = ASRModel.Compile(ASRModel.Build(process.Bins(), process.charToNum.vocabulary_size()), 1e-4)
+        trainSeconds, inferenceSeconds = StepTimes(model, features, labels, args.repeats)
+
+        rows.append([
+            featureType, process.Bins(), numpySeconds * 1e6 / args.seconds, eagerSeconds * 1e6 / args.seconds,
+            model.count_params() / 1e6, trainSeconds * 1000.0, inferenceSeconds * 1000.0 / (args.seconds * args.batch_size)
+        ])
+        print(f"{featureType}: {process.Bins()} bins, {trainSeconds * 1000.0:.0f} ms per training step", flush = True)
+
+    print(f"\n{args.batch_size} clips of {args.seconds:.1f} s at {SAMPLE_RATE} Hz\n")
+    PrintTable(["feature_type", "bins", "numpy us per audio s", "tf eager us per audio s", "params M", "train step ms", "inference ms per audio s"], rows)
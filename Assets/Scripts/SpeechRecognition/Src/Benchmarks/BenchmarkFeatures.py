@@ -0,0 +1,76 @@
+# Lucas Davis
+
+import time
+import argparse
+import numpy as np
+import tensorflow as tf
+
+from Benchmarks.Common import SyntheticAudio, PrintTable, SAMPLE_RATE
+from Data.Process import Process
+from Data.Features import SpectrogramExtractor
+
+def Measure(_function, _clip, _repeats):
+    """
+    Parameters:
+        - _function: Computes the normalized spectrogram of a clip
+        - _clip: np.float32 audio clip
+        - _repeats: How many times the clip is run
+
+    Returns:
+        The median time per call in seconds
+    """
+    _function(_clip)
+
+    times = []
+
+    for _ in range(_repeats):
+        start = time.perf_counter()
+        _function(_clip)
+        times.append(time.perf_counter() - start)
+
+    return float(np.median(times))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Cost of the feature extraction of a request per backend")
+    parser.add_argument("--seconds", type = float, nargs = "+", default = [0.5, 2.0, 10.0], help = "Clip lengths")
+    parser.add_argument("--repeats", type = int, default = 200)
+    args = parser.parse_args()
+
+    process = Process()
+    extractor = SpectrogramExtractor(process.spectrogramConfig)
+
+    def Eager(_clip):
+        return np.asarray(process.NormalizeSpec(process.Spectrogram(tf.constant(_clip))))
+
+    graph = tf.function(lambda audio: process.NormalizeSpec(process.Spectrogram(audio)), input_signature = [
+        tf.TensorSpec(shape = (None,), dtype = tf.float32)
+    ])
+
+    def Graph(_clip):
+        return graph(_clip).numpy()
+
+    # name, function
+    backends = [
+        ("tensorflow eager", Eager),
+        ("tensorflow graph", Graph),
+        ("numpy",            extractor.Features)
+    ]
+
+    rng = np.random.default_rng(42)
+    rows = []
+
+    for seconds in args.seconds:
+        clip = SyntheticAudio(seconds, rng)
+        baseline = None
+
+        for name, function in backends:
+            median = Measure(function, clip, args.repeats)
+            baseline = baseline or median
+
+            rows.append([f"{seconds:.1f}", name, median * 1e6, median * 1e6 / (len(clip) / SAMPLE_RATE), baseline / median])
+
+        difference = np.abs(extractor.Features(clip) - Eager(clip)).max()
+        print(f"{seconds:.1f} s: largest difference to tensorflow {difference:.2e}")
+
+    print()
+    PrintTable(["clip s", "backend", "us per clip", "us per audio s", "speedup"], rows)
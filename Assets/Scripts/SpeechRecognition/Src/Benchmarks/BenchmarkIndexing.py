@@ -0,0 +1,126 @@
+# Lucas Davis
+
+import os
+import sys
+import csv
+import time
+import shutil
+import struct
+import argparse
+import tempfile
+import subprocess
+import contextlib
+
+from Benchmarks.Common import PrintTable
+
+def SyntheticCorpus(_directory, _speakers, _chapters, _utterances):
+    """
+    Writes a LibriSpeech style corpus of tiny wav files, so the benchmark measures walking the
+    directories, reading the headers and writing the manifest rather than the disk's bandwidth
+
+    Parameters:
+        - _directory: The directory to write the corpus to
+        - _speakers: The amount of speaker directories
+        - _chapters: The amount of chapter directories per speaker
+        - _utterances: The amount of wav files per chapter
+
+    Returns:
+        The amount of wav files written
+    """
+    fmt = struct.pack('<HHIIHH', 1, 1, 16000, 32000, 2, 16)
+
+    for speaker in range(_speakers):
+        for chapter in range(_chapters):
+            chapterDir = os.path.join(_directory, str(speaker), str(chapter))
+            os.makedirs(chapterDir)
+
+            lines = []
+
+            for utterance in range(_utterances):
+                name = f"{speaker}-{chapter}-{utterance:04d}"
+                data = bytes(2 * (1600 + 160 * utterance))
+                body = b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt + b'data' + struct.pack('<I', len(data)) + data
+
+                with open(os.path.join(chapterDir, name + ".wav"), 'wb') as wavFile:
+                    wavFile.write(b'RIFF' + struct.pack('<I', len(body)) + body)
+
+                lines.append(f"{name} THE QUICK BROWN FOX {utterance}")
+
+            with open(os.path.join(chapterDir, f"{speaker}-{chapter}.trans.txt"), 'w') as transFile:
+                transFile.write("\n".join(lines) + "\n")
+
+    return _speakers * _chapters * _utterances
+
+def Baseline(_rootDir, _csvPath, _extension = ".wav"):
+    """
+    The original CreateCSVFile: one os.walk, an exists and a getsize call for every utterance
+    and a print for every row
+    """
+    with open(_csvPath, 'w', newline = '', encoding = 'utf-8') as csvFile, open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        writer = csv.writer(csvFile)
+        writer.writerow(["filename", "filesize", "transcript"])
+
+        for subdir, _, files in os.walk(_rootDir):
+            for file in files:
+                if file.endswith(".trans.txt"):
+                    with open(os.path.join(subdir, file), 'r', encoding = 'utf-8') as transcriptFile:
+                        for line in transcriptFile:
+                            parts = line.strip().split(' ', 1)
+
+                            if len(parts) == 2:
+                                wavPath = os.path.join(subdir, parts[0] + _extension)
+
+                                if os.path.exists(wavPath):
+                                    writer.writerow([wavPath, os.path.getsize(wavPath), parts[1]])
+                                    print(f"File {wavPath} written")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Files per second of indexing a corpus with the old and the parallel indexer")
+    parser.add_argument("--root", default = None, help = "A LibriSpeech style corpus, a synthetic one is written if omitted")
+    parser.add_argument("--speakers", type = int, default = 40)
+    parser.add_argument("--chapters", type = int, default = 5)
+    parser.add_argument("--utterances", type = int, default = 50)
+    parser.add_argument("--workers", type = int, nargs = "+", default = [1, 4, 16])
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+
+    try:
+        root = args.root
+
+        if root is None:
+            root = os.path.join(directory, "corpus")
+            files = SyntheticCorpus(root, args.speakers, args.chapters, args.utterances)
+            print(f"Wrote {files} wav files")
+
+        csvPath = os.path.join(directory, "manifest.csv")
+        rows = []
+
+        start = time.monotonic()
+        Baseline(root, csvPath)
+        baseline = time.monotonic() - start
+
+        with open(csvPath, 'r', encoding = 'utf-8') as csvFile:
+            count = sum(1 for _ in csvFile) - 1
+
+        rows.append(["CreateCSVFile (old)", "1", count, baseline, count / baseline, 1.0])
+
+        # Run the way it is used, from the command line, so the worker processes don't import the
+        # tensorflow this benchmark's process already has
+        for workers in args.workers:
+            start = time.monotonic()
+            output = subprocess.run(
+                [sys.executable, "-m", "Scripts.IndexDataset", root, csvPath, "--workers", str(workers), "--restart"],
+                check = True, capture_output = True, text = True
+            ).stdout
+            seconds = time.monotonic() - start
+
+            indexed = int(output.split("Indexed ")[1].split()[0])
+
+            rows.append(["IndexDataset", str(workers), indexed, seconds, indexed / seconds, baseline / seconds])
+
+        print(f"{os.cpu_count()} cpu cores")
+
+        PrintTable(["indexer", "workers", "files", "seconds", "files/s", "speedup"], rows)
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,170 @@
+# Lucas Davis
+
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+
+from Benchmarks.Common import PrintTable
+
+WORDS = "the of and to a in that he was it his i with as had for you her not is at on but she be him by".split()
+
+def SyntheticManifest(_csvPath, _rows, _rng, _chunk = 500000):
+    """
+    Writes a LibriSpeech sized csv manifest of _rows rows, a chunk at a time so the benchmark's
+    own process stays small
+
+    Parameters:
+        - _csvPath: The csv file to write
+        - _rows: The amount of rows
+        - _rng: A numpy Generator
+        - _chunk: The amount of rows generated at once
+    """
+    # A pool of sentences, the csv parser still makes a new string for every row it reads
+    sentences = np.array([" ".join(_rng.choice(WORDS, size = _rng.integers(2, 60))) for _ in range(10000)], dtype = object)
+
+    for start in range(0, _rows, _chunk):
+        index = np.arange(start, min(_rows, start + _chunk))
+        speaker, chapter = pd.Series(index // 5000).astype(str), pd.Series(index // 100 % 50).astype(str)
+        name = speaker + "-" + chapter + "-" + pd.Series(index % 100).astype(str).str.zfill(4)
+        samples = _rng.integers(16000, 16000 * 25, size = index.shape[0])
+
+        pd.DataFrame({
+            'filename':    "/home/ldavis/Code/Data_Sets/LibriSpeech/train-960/" + speaker + "/" + chapter + "/" + name + ".wav",
+            'filesize':    44 + 2 * samples,
+            'transcript':  sentences[_rng.integers(0, sentences.shape[0], size = index.shape[0])],
+            'duration':    np.round(samples / 16000, 4),
+            'sample_rate': 16000,
+            'samples':     samples
+        }).to_csv(_csvPath, mode = 'w' if start == 0 else 'a', header = start == 0, index = False)
+
+def PeakRSS(_reset = False):
+    """
+    Parameters:
+        - _reset: Start measuring the peak from the current RSS instead, so the peak of importing
+                  tensorflow doesn't hide the peak of loading the manifest (Linux only)
+
+    Returns:
+        The peak RSS of this process in MB
+    """
+    try:
+        if _reset:
+            with open("/proc/self/clear_refs", 'w') as clearRefs:
+                clearRefs.write("5")
+
+        with open("/proc/self/status", 'r') as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def Load(_mode, _path, _maxDuration, _maxTranscript, _newPrefix):
+    """
+    Loads a manifest the way training does, into a tf.data dataset of (path, transcript, samples),
+    in this process. Prints the seconds it took and the peak RSS as json.
+
+    Parameters:
+        - _mode: "old" for the previous LoadCSV, or "new"
+        - _path: The manifest
+        - _maxDuration: The longest clip to keep in seconds
+        - _maxTranscript: The longest transcript to keep in characters
+        - _newPrefix: The directory the dataset was moved to
+    """
+    import tensorflow as tf
+    from Data.Process import Process
+
+    process = Process()
+    process.maxDuration, process.maxTranscriptLength = _maxDuration, _maxTranscript
+    process.pathPrefixFrom, process.pathPrefixTo = "/home/ldavis/Code/Data_Sets/", _newPrefix
+
+    before = PeakRSS(_reset = True)
+    start = time.monotonic()
+
+    if _mode == "old":
+        # The previous LoadCSV, followed by a loop like the old UpdateCSVPaths.py
+        data = pd.read_csv(_path)
+        data = data[(data['duration'] <= _maxDuration) & (data['transcript'].str.len() <= _maxTranscript)]
+
+        audioPaths, transcripts, samples = list(data['filename']), list(data['transcript']), list(data['samples'])
+        audioPaths = [_newPrefix + path[len(process.pathPrefixFrom):] for path in audioPaths]
+
+        dataset = tf.data.Dataset.from_tensor_slices((audioPaths, transcripts, samples))
+    else:
+        audioPaths, transcripts, samples = process.LoadCSV(_path, _withSamples = True, _asTensors = True)
+
+        dataset = tf.data.Dataset.from_tensor_slices((audioPaths, transcripts, samples))
+
+    seconds = time.monotonic() - start
+
+    print(json.dumps({
+        "seconds": seconds,
+        "rows":    int(dataset.cardinality()),
+        "peak_mb": PeakRSS(),
+        "base_mb": before
+    }))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Load time and peak memory of csv and columnar manifests")
+    parser.add_argument("--rows", type = int, default = 5000000)
+    parser.add_argument("--max_duration", type = float, default = 16.7)
+    parser.add_argument("--max_transcript", type = int, default = 250)
+    parser.add_argument("--child", nargs = 2, default = None, help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        Load(args.child[0], args.child[1], args.max_duration, args.max_transcript, "/mnt/speech/")
+        sys.exit(0)
+
+    from Scripts.UpdateCSVPaths import UpdatePaths
+
+    directory = tempfile.mkdtemp()
+
+    try:
+        csvPath = os.path.join(directory, "train.csv")
+
+        start = time.monotonic()
+        SyntheticManifest(csvPath, args.rows, np.random.default_rng(42))
+        print(f"Wrote {args.rows} rows in {time.monotonic() - start:.1f} s")
+
+        runs = [("csv, old LoadCSV", "old", csvPath), ("csv", "new", csvPath)]
+
+        for extension in [".npz", ".parquet"]:
+            try:
+                start = time.monotonic()
+                UpdatePaths(csvPath, os.path.join(directory, "train" + extension))
+                print(f"Converted to {extension} in {time.monotonic() - start:.1f} s")
+
+                runs.append((extension[1:], "new", os.path.join(directory, "train" + extension)))
+            except ImportError:
+                print(f"Skipping {extension}, pyarrow isn't installed")
+
+        rows = []
+
+        # Every run gets a fresh process, so the peak RSS of one doesn't hide the next
+        for name, mode, path in runs:
+            output = subprocess.run(
+                [sys.executable, "-m", "Benchmarks.BenchmarkManifest", "--child", mode, path,
+                 "--max_duration", str(args.max_duration), "--max_transcript", str(args.max_transcript)],
+                check = True, capture_output = True, text = True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+
+            rows.append([
+                name, os.path.getsize(path) / 1e6, result["rows"], result["seconds"],
+                result["peak_mb"], result["peak_mb"] - result["base_mb"]
+            ])
+            print(f"{name}: {result['seconds']:.1f} s", flush = True)
+
+        PrintTable(["manifest", "file MB", "rows kept", "load s", "peak RSS MB", "over imports MB"], rows)
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,99 @@
+# Lucas Davis
+
+import os
+import time
+import tempfile
+import argparse
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+from Benchmarks.Common import SyntheticCSV, PrintTable
+from Benchmarks.BenchmarkBucketing import PaddingRatio
+from Data.Process import Process
+from Data.Augment import Augment
+from Data.Validate import Validate
+from Model.ASRModel import ASRModel
+from Model.Setup import Setup
+from Model.ValidateModel import ValidateModel
+from Grab_Ini import ini
+
+class StepTimer(keras.callbacks.Callback):
+    """
+    Times every training step, which leaves the validation at the end of an epoch out
+    """
+    def __init__(self):
+        super().__init__()
+
+        self.times = []
+
+    def on_train_batch_begin(self, batch, logs = None):
+        self.start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs = None):
+        self.times.append(time.perf_counter() - self.start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Training step time and validation WER of a model with and without length masking")
+    parser.add_argument("--train_csv", default = None, help = "The csv file to train on, a synthetic corpus is used if omitted")
+    parser.add_argument("--csv", default = None, help = "The csv file the val_loss and WER are measured on, a synthetic corpus is used if omitted")
+    parser.add_argument("--samples", type = int, default = 64, help = "Size of the synthetic training corpus")
+    parser.add_argument("--min_seconds", type = float, default = 1.0, help = "Shortest clip of the synthetic corpora")
+    parser.add_argument("--max_seconds", type = float, default = 10.0, help = "Longest clip of the synthetic corpora")
+    parser.add_argument("--batch_size", type = int, default = None, help = "Overrides batch_size from the config")
+    parser.add_argument("--epochs", type = int, default = 3, help = "Epochs trained per mode, the first one isn't timed")
+    parser.add_argument("--architecture", default = None, help = "Overrides the architecture of the [Model] section")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    directory = tempfile.mkdtemp(prefix = "masking_")
+
+    trainPath = args.train_csv or SyntheticCSV(os.path.join(directory, "train"), args.samples, rng, args.min_seconds, args.max_seconds)
+    validationPath = args.csv or SyntheticCSV(os.path.join(directory, "validation"), max(8, args.samples // 4), rng, args.min_seconds, args.max_seconds)
+
+    process = Process()
+    setup = Setup(process, Augment(), Validate(process))
+    setup.cacheFeatures = False
+    setup.batchSize = args.batch_size or setup.batchSize
+
+    # Batches in csv order, so they hold clips of every length
+    setup.bucketing = False
+    setup.shuffle = False
+
+    trainDataset = setup.Batch(*setup.Features(trainPath, setup.ProcessData, False), _training = True).cache()
+    validationDataset = setup.Batch(*setup.Features(validationPath, setup.ProcessData, False)).cache()
+
+    padding, batches, _ = PaddingRatio(trainDataset)
+    print(f"{batches} batches of {setup.batchSize}, {padding * 100.0:.1f} % of their frames are padding\n")
+
+    modelConfig = dict(ini().grabInfo("config.ini", "Model"))
+
+    if args.architecture is not None:
+        modelConfig['architecture'] = args.architecture
+
+    rows = []
+
+    for masking in [False, True]:
+        tf.random.set_seed(setup.seed)
+
+        model = ASRModel.Build(process.Bins(), process.charToNum.vocabulary_size(), dict(modelConfig, masking = masking))
+        model = ASRModel.Compile(model, 1e-3)
+
+        timer = StepTimer()
+        model.fit(trainDataset, epochs = args.epochs, verbose = 0, callbacks = [timer])
+
+        # The steps of the first epoch trace the training function for every batch shape
+        stepTimes = timer.times[batches:] or timer.times
+
+        validate = ValidateModel(validationDataset, _everyEpochs = 1, _subsample = 0, _asynchronous = False)
+        validate.set_model(model)
+        validate.on_train_begin()
+
+        rows.append([
+            "masked" if masking else "unmasked", float(np.median(stepTimes)) * 1000.0,
+            model.evaluate(validationDataset, verbose = 0), validate.ErrorRate(model.get_weights())
+        ])
+        print(f"{rows[-1][0]}: {rows[-1][1]:.0f} ms per step", flush = True)
+
+    print()
+    PrintTable(["model", "train step ms", "val_loss", "WER"], rows)
@@ -0,0 +1,120 @@
+# Lucas Davis
+
+import os
+import time
+import tempfile
+import argparse
+import numpy as np
+
+from Benchmarks.Common import LoadModel, SyntheticAudio, PrintTable, SAMPLE_RATE
+from Data.Process import Process
+from Metrics import metrics
+from Recognition import SpeechRec
+
+def TimerCost(_iterations):
+    """
+    Parameters:
+        - _iterations: How many blocks are timed
+
+    Returns:
+        The cost of timing a single stage and of a whole request's bookkeeping, in microseconds
+    """
+    metrics.Configure()
+
+    start = time.perf_counter()
+
+    for _ in range(_iterations):
+        with metrics.Time("stage"):
+            pass
+
+    stage = (time.perf_counter() - start) / _iterations
+
+    start = time.perf_counter()
+
+    for _ in range(_iterations):
+        metrics.Begin("/ASR")
+        metrics.Audio(1.0)
+        metrics.End(200)
+
+    request = (time.perf_counter() - start) / _iterations
+
+    return stage * 1e6, request * 1e6
+
+def Request(_speechRec, _clip):
+    """
+    Runs a clip through the model the same way a request of the API does
+
+    Parameters:
+        - _speechRec: The SpeechRec instance
+        - _clip: np.float32 audio clip
+
+    Returns:
+        How long it took in seconds
+    """
+    start = time.perf_counter()
+
+    metrics.Begin("/ASR")
+    metrics.Audio(len(_clip) / SAMPLE_RATE)
+    _speechRec.Predict(_clip)
+    metrics.End(200)
+
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Overhead of the metrics on the request time")
+    parser.add_argument("--model", default = None, help = "Path to a .keras file, an untrained model is used if omitted")
+    parser.add_argument("--seconds", type = float, default = 2.0, help = "Length of every clip")
+    parser.add_argument("--requests", type = int, default = 100, help = "Requests per mode")
+    parser.add_argument("--vad", action = "store_true", help = "Run the VAD, which has more stages")
+    args = parser.parse_args()
+
+    process = Process()
+    speechRec = SpeechRec(LoadModel(args.model, process), "greedy", _vad = args.vad)
+
+    rng = np.random.default_rng(42)
+    clips = [SyntheticAudio(args.seconds, rng) for _ in range(8)]
+    tracePath = os.path.join(tempfile.mkdtemp(prefix = "metrics_"), "trace.jsonl")
+
+    # (name, enabled, stages, trace)
+    modes = [
+        ("off",            False, False, None),
+        ("on",             True,  False, None),
+        ("on + trace",     True,  False, tracePath),
+        ("stages",         True,  True,  None)
+    ]
+
+    # Every mode is warmed up once, stages traces its own graphs
+    for _, enabled, stages, trace in modes:
+        metrics.Configure(enabled, stages, trace)
+        speechRec.Warmup()
+
+    times = {name: [] for name, _, _, _ in modes}
+
+    # The modes take turns on every clip so a slow phase of the machine doesn't fall on one of them
+    for i in range(args.requests):
+        for name, enabled, stages, trace in modes:
+            metrics.Configure(enabled, stages, trace)
+
+            times[name].append(Request(speechRec, clips[i % len(clips)]))
+
+    stageCost, requestCost = TimerCost(100000)
+    metrics.Configure()
+
+    # The on mode times one stage without the VAD and four with it
+    timers = 4 if args.vad else 1
+    baseline = np.median(times["off"])
+    rows = []
+
+    for name, _, _, _ in modes:
+        median = np.median(times[name])
+
+        rows.append([
+            name, median * 1000.0, np.mean(times[name]) * 1000.0, (median / baseline - 1.0) * 100.0
+        ])
+
+    PrintTable(["mode", "median ms", "mean ms", "overhead %"], rows)
+
+    bookkeeping = (stageCost * timers + requestCost) / 1e6
+
+    print(f"\n{stageCost:.2f} us per timed stage, {requestCost:.2f} us per request")
+    print(f"Bookkeeping of the on mode: {bookkeeping * 1e6:.1f} us, {bookkeeping / baseline * 100.0:.3f} % of the median request")
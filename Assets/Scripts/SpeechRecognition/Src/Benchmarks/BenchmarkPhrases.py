@@ -0,0 +1,144 @@
+# Lucas Davis
+
+import time
+import difflib
+import argparse
+import numpy as np
+
+from Benchmarks.Common import LoadModel, Percentiles, PrintTable
+from Data.Process import Process
+from Model.PhraseDecoder import PhraseDecoder
+from Recognition import SpeechRec
+
+WORDS = [
+    "open", "close", "the", "door", "light", "torch", "gate", "red", "blue", "book", "lever", "pull",
+    "push", "left", "right", "wolf", "forest", "brother", "veil", "whisper", "fire", "north", "south"
+]
+
+def Phrases(_count, _rng):
+    """
+    Parameters:
+        - _count: The number of phrases
+        - _rng: A numpy Generator
+
+    Returns:
+        A list of unique phrases of two to five words
+    """
+    phrases = set()
+
+    while len(phrases) < _count:
+        phrases.add(" ".join(_rng.choice(WORDS, _rng.integers(2, 6))))
+
+    return sorted(phrases)
+
+def Spell(_decoder, _phrase, _rng, _steps = 250):
+    """
+    Parameters:
+        - _decoder: A PhraseDecoder, used to encode the phrase
+        - _phrase: The phrase to spell
+        - _rng: A numpy Generator
+        - _steps: The number of time steps, 250 is a 10 second clip
+
+    Returns:
+        Noisy logits that spell out the phrase, standing in for a trained model's output
+    """
+    label = _decoder.Encode(_phrase)
+    logits = _rng.normal(size = (_steps, 29))
+    width = _steps // (2 * len(label) + 1)
+
+    logits[:, -1] += 8.0
+
+    for i, char in enumerate(label):
+        logits[(2 * i + 1) * width:(2 * i + 2) * width, char] += 16.0
+
+    return logits.astype(np.float32)
+
+def Nearest(_prediction, _phrases):
+    """
+    The baseline, free transcription followed by the closest phrase
+
+    Parameters:
+        - _prediction: A free form transcript
+        - _phrases: The list of phrases
+
+    Returns:
+        The closest phrase, or an empty string
+    """
+    matches = difflib.get_close_matches(_prediction, _phrases, n = 1, cutoff = 0.0)
+
+    return matches[0] if matches else ""
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Latency of constrained phrase decoding and its accuracy on a held out csv")
+    parser.add_argument("--counts", default = "10,100,1000,10000", help = "Phrase list sizes to time")
+    parser.add_argument("--beam", type = float, default = None, help = "Overrides the beam from the config")
+    parser.add_argument("--utterances", type = int, default = 50, help = "Utterances timed per phrase list size")
+    parser.add_argument("--csv", default = None, help = "A held out csv file, the accuracy is only measured when given")
+    parser.add_argument("--model", default = None, help = "A trained .keras file used for the accuracy")
+    args = parser.parse_args()
+
+    process = Process()
+    rng = np.random.default_rng(42)
+
+    rows = []
+
+    for count in [int(count) for count in args.counts.split(",")]:
+        phrases = Phrases(count, rng)
+
+        start = time.monotonic()
+        decoder = PhraseDecoder(process, phrases, args.beam)
+        buildTime = time.monotonic() - start
+
+        latencies, correct = [], 0
+
+        for _ in range(args.utterances):
+            phrase = phrases[rng.integers(count)]
+            logits = Spell(decoder, phrase, rng)
+
+            start = time.monotonic()
+            prediction, _ = decoder.Decode(logits)
+            latencies.append(time.monotonic() - start)
+
+            correct += prediction == phrase
+
+        stats = Percentiles(latencies)
+
+        rows.append([count, buildTime * 1000.0, stats["mean"], stats["p50"], stats["p90"], correct / args.utterances * 100.0])
+
+    PrintTable(["phrases", "build ms", "mean ms", "p50 ms", "p90 ms", "accuracy %"], rows)
+
+    if args.csv is not None:
+        speechRec = SpeechRec(LoadModel(args.model, process))
+
+        audioPaths, transcripts = process.LoadCSV(args.csv)
+        phrases = sorted(set(transcripts))
+
+        decoder = PhraseDecoder(process, phrases, args.beam)
+
+        rows = [["greedy", 0, []], ["greedy + nearest phrase", 0, []], ["phrase decoder", 0, []]]
+
+        for path, transcript in zip(audioPaths, transcripts):
+            audio = process.LoadAudioFile(path).numpy()
+
+            start = time.monotonic()
+            prediction = speechRec.inferAudio(audio).numpy().decode("utf-8")
+            greedyTime = time.monotonic() - start
+
+            rows[0][1] += prediction == transcript
+            rows[0][2].append(greedyTime)
+
+            start = time.monotonic()
+            nearest = Nearest(prediction, phrases)
+            rows[1][1] += nearest == transcript
+            rows[1][2].append(greedyTime + time.monotonic() - start)
+
+            start = time.monotonic()
+            prediction, _ = decoder.Decode(speechRec.inferLogits(audio).numpy())
+            rows[2][1] += prediction == transcript
+            rows[2][2].append(time.monotonic() - start)
+
+        print(f"\n{len(transcripts)} utterances against {len(phrases)} phrases")
+        PrintTable(
+            ["decoding", "accuracy %", "mean ms"],
+            [[name, correct / len(transcripts) * 100.0, Percentiles(latencies)["mean"]] for name, correct, latencies in rows]
+        )
@@ -0,0 +1,115 @@
+# Lucas Davis
+
+import sys
+import json
+import time
+import argparse
+import subprocess
+import numpy as np
+
+from Benchmarks.Common import PrintTable
+
+# (name, policy, jit_compile)
+MODES = [
+    ("float32",              "float32",         False),
+    ("float32 + XLA",        "float32",         True),
+    ("mixed_bfloat16",       "mixed_bfloat16",  False),
+    ("mixed_bfloat16 + XLA", "mixed_bfloat16",  True),
+    ("mixed_float16",        "mixed_float16",   False),
+    ("mixed_float16 + XLA",  "mixed_float16",   True)
+]
+
+def Train(_policy, _jitCompile, _batch, _seconds, _steps):
+    """
+    Trains the full model on the same synthetic batch for a few steps, in this process. Prints
+    the time of the first step, which includes tracing and compiling, the mean time of the steps
+    after it and the first loss as json.
+
+    Parameters:
+        - _policy: The dtype policy
+        - _jitCompile: Compile the train step with XLA
+        - _batch: The batch size
+        - _seconds: The length of every clip in seconds
+        - _steps: The amount of timed steps
+    """
+    import tensorflow as tf
+    from Model.ASRModel import ASRModel
+    from Data.Features import Filterbank
+    from Grab_Ini import ini
+
+    specConfig = ini().grabInfo("config.ini", "Process.Spectrogram")
+    bins = Filterbank(specConfig).bins
+    frames = int(_seconds * int(specConfig['sample_rate']) / int(specConfig['frame_step']))
+
+    tf.random.set_seed(42)
+    rng = np.random.default_rng(42)
+
+    ASRModel.SetPrecision(_policy)
+    model = ASRModel.Compile(ASRModel.BuildModel(bins, 28), 1e-4, _jitCompile)
+
+    spectrograms = rng.standard_normal((_batch, frames, bins)).astype(np.float32)
+    labels = rng.integers(1, 28, size = (_batch, int(_seconds * 12)))
+
+    start = time.monotonic()
+    loss = float(model.train_on_batch(spectrograms, labels))
+    compileSeconds = time.monotonic() - start
+
+    start = time.monotonic()
+
+    for _ in range(_steps):
+        model.train_on_batch(spectrograms, labels)
+
+    print(json.dumps({
+        "compile_s": compileSeconds,
+        "step_s":    (time.monotonic() - start) / _steps,
+        "frames":    _batch * frames,
+        "loss":      loss
+    }))
+
+def HasGPU():
+    """
+    Returns:
+        True if tensorflow can see a GPU, checked in a subprocess so this one never imports it
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", "import tensorflow as tf; print(len(tf.config.list_physical_devices('GPU')))"],
+        capture_output = True, text = True
+    ).stdout
+
+    return output.strip().splitlines()[-1:] not in ([], ["0"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Training step time of the model with mixed precision and XLA")
+    parser.add_argument("--batch", type = int, default = 2)
+    parser.add_argument("--seconds", type = float, default = 1.0)
+    parser.add_argument("--steps", type = int, default = 3)
+    parser.add_argument("--child", nargs = 2, default = None, help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        Train(args.child[0], eval(args.child[1]), args.batch, args.seconds, args.steps)
+        sys.exit(0)
+
+    # float16 only pays off on a GPU, on a CPU it is emulated and very slow
+    modes = [mode for mode in MODES if mode[1] != "mixed_float16" or HasGPU()]
+    rows = []
+    baseline = None
+
+    # Every mode gets a fresh process, the dtype policy is global and XLA caches its kernels
+    for name, policy, jitCompile in modes:
+        output = subprocess.run(
+            [sys.executable, "-m", "Benchmarks.BenchmarkPrecision", "--child", policy, str(jitCompile),
+             "--batch", str(args.batch), "--seconds", str(args.seconds), "--steps", str(args.steps)],
+            check = True, capture_output = True, text = True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+
+        baseline = baseline or result["step_s"]
+
+        rows.append([
+            name, result["compile_s"], result["step_s"] * 1000.0, result["frames"] / result["step_s"],
+            baseline / result["step_s"], result["loss"]
+        ])
+        print(f"{name}: {result['step_s'] * 1000.0:.0f} ms/step", flush = True)
+
+    PrintTable(["mode", "first step s", "ms/step", "frames/s", "speedup", "first loss"], rows)
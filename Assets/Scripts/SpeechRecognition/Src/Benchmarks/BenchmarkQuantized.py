@@ -0,0 +1,128 @@
+# Lucas Davis
+
+import os
+import time
+import tempfile
+import argparse
+import multiprocessing
+import numpy as np
+from jiwer import wer
+
+from Benchmarks.Common import LoadModel, SyntheticCSV, Percentiles, PrintTable, SAMPLE_RATE
+from Data.Process import Process
+from Model.Quantize import Quantize, MODES
+from Recognition import SpeechRec
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def PeakMemory():
+    """
+    Returns:
+        The peak resident memory of this process in MB, or None where it can't be read
+    """
+    # ru_maxrss survives exec, so a spawned process would report the peak of its parent
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+
+    if resource is None:
+        return None
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def Measure(_path, _csvPath, _repeats):
+    """
+    Loads one backend and transcribes every clip of the csv file with it. This runs in a fresh
+    process for every backend so the memory of one doesn't count towards the next.
+
+    Parameters:
+        - _path: The .keras file or .tflite export to load
+        - _csvPath: The csv file to transcribe
+        - _repeats: How many times every clip is timed
+
+    Returns:
+        The load time in seconds, the latencies in seconds, the audio seconds, the predictions,
+        the peak memory in MB before loading and the peak memory in MB after transcribing
+    """
+    process = Process()
+    audioPaths, _ = process.LoadCSV(_csvPath)
+    clips = [process.LoadAudioFile(path).numpy() for path in audioPaths]
+
+    before = PeakMemory()
+
+    start = time.monotonic()
+    speechRec = SpeechRec(SpeechRec.LoadModel(_path), "greedy")
+    speechRec.Warmup()
+    loading = time.monotonic() - start
+
+    latencies, predictions = [], []
+
+    for clip in clips:
+        for _ in range(_repeats):
+            start = time.monotonic()
+            prediction = speechRec.Predict(clip)
+            latencies.append(time.monotonic() - start)
+
+        predictions.append(prediction)
+
+    return loading, latencies, sum(len(clip) for clip in clips) / SAMPLE_RATE * _repeats, predictions, before, PeakMemory()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Accuracy, latency and memory of the float32, float16 and int8 backends")
+    parser.add_argument("--csv", default = None, help = "A validation csv file, a synthetic corpus is used if omitted")
+    parser.add_argument("--train_csv", default = None, help = "The csv file the exports are checked on, defaults to --csv")
+    parser.add_argument("--samples", type = int, default = 16, help = "Size of the synthetic corpus")
+    parser.add_argument("--model", default = None, help = "Path to a .keras file, an untrained model is used if omitted")
+    parser.add_argument("--repeats", type = int, default = 3)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix = "quantized_")
+    csvPath = args.csv or SyntheticCSV(os.path.join(directory, "corpus"), args.samples, np.random.default_rng(42), _maxSeconds = 6.0)
+
+    process = Process()
+    quantize = Quantize(process)
+
+    model = LoadModel(args.model, process)
+    modelPath = args.model
+
+    if modelPath is None:
+        modelPath = os.path.join(directory, "ASR.keras")
+        model.save(modelPath)
+
+    print("Exporting...")
+    exports = quantize.Export(model, directory, MODES, quantize.RepresentativeDataset(args.train_csv or csvPath, 16))
+
+    _, transcripts = process.LoadCSV(csvPath)
+    transcripts = [str(transcript).lower() for transcript in transcripts]
+
+    backends = [("float32", modelPath, os.path.getsize(modelPath), None)]
+    backends += [(mode, path, size, error) for mode, (path, size, error, _) in exports.items()]
+
+    # Every backend is measured in a new process, with the same amount of tensorflow loaded
+    context = multiprocessing.get_context("spawn")
+    rows, reference = [], None
+
+    for name, path, size, error in backends:
+        with context.Pool(1) as pool:
+            loading, latencies, audioSeconds, predictions, before, after = pool.apply(Measure, (path, csvPath, args.repeats))
+
+        reference = reference or predictions
+        stats = Percentiles(latencies)
+        agree = np.mean([a == b for a, b in zip(predictions, reference)])
+
+        rows.append([
+            name, size / 1e6, loading, stats["p50"], stats["p99"], sum(latencies) / audioSeconds,
+            wer(transcripts, predictions), float(agree), "-" if error is None else f"{error:.4f}",
+            "-" if after is None else after - before, "-" if after is None else after
+        ])
+        print(f"{name}: {stats['p50']:.1f} ms p50", flush = True)
+
+    PrintTable(
+        ["backend", "file MB", "load s", "p50 ms", "p99 ms", "RTF", "WER", "same as float32", "max logit error", "model MB", "peak MB"],
+        rows
+    )
@@ -0,0 +1,93 @@
+# Lucas Davis
+
+import time
+import argparse
+import numpy as np
+
+from Benchmarks.Common import LoadModel, SyntheticAudio, Percentiles, PrintTable
+from Data.Process import Process
+from Model.ASRModel import ASRModel
+from Recognition import SpeechRec
+
+def KerasPredict(_speechRec, _audio):
+    """
+    The original prediction path: eager feature extraction, keras' model.predict and the
+    decoder running outside of any graph.
+
+    Parameters:
+        - _speechRec: The SpeechRec instance holding the model
+        - _audio: np.float32 audio clip
+
+    Returns:
+        A string representing the prediction
+    """
+    process = _speechRec.process
+
+    spectrogram = process.Spectrogram(_audio)
+    spectrogram = process.NormalizeSpec(spectrogram)
+    spectrogram = np.expand_dims(spectrogram, axis = 0)
+
+    sentiment = _speechRec.model.predict(spectrogram, verbose = 0)
+    softmax = ASRModel.ctcDecoder(sentiment)
+
+    return process.ConvertLabel(softmax)
+
+def Measure(_predict, _audio, _repeats):
+    """
+    Parameters:
+        - _predict: The function that turns an audio clip into a prediction
+        - _audio: The audio clip
+        - _repeats: How many times the prediction is timed
+
+    Returns:
+        The latencies in seconds and the last prediction
+    """
+    latencies = []
+
+    for _ in range(_repeats):
+        start = time.monotonic()
+        prediction = _predict(_audio)
+        latencies.append(time.monotonic() - start)
+
+    return latencies, prediction
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Per utterance latency of model.predict vs the compiled serving graph")
+    parser.add_argument("--model", default = None, help = "Path to a .keras file, an untrained model is used if omitted")
+    parser.add_argument("--seconds", type = int, nargs = "+", default = list(range(1, 11)))
+    parser.add_argument("--repeats", type = int, default = 10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    process = Process()
+
+    print("Loading model...")
+    speechRec = SpeechRec(LoadModel(args.model, process))
+
+    start = time.monotonic()
+    speechRec.Warmup()
+    print(f"Warm up took {(time.monotonic() - start) * 1000.0:.2f} ms")
+
+    KerasPredict(speechRec, SyntheticAudio(1.0, rng))
+
+    rows = []
+
+    for seconds in args.seconds:
+        audio = SyntheticAudio(seconds, rng)
+
+        kerasLatencies, kerasPrediction = Measure(lambda clip: KerasPredict(speechRec, clip), audio, args.repeats)
+        graphLatencies, graphPrediction = Measure(speechRec.Predict, audio, args.repeats)
+
+        kerasStats = Percentiles(kerasLatencies)
+        graphStats = Percentiles(graphLatencies)
+
+        rows.append([
+            seconds,
+            kerasStats["p50"],
+            graphStats["p50"],
+            kerasStats["p50"] - graphStats["p50"],
+            kerasStats["p50"] / graphStats["p50"],
+            kerasPrediction == graphPrediction
+        ])
+
+    PrintTable(["audio s", "predict p50 ms", "graph p50 ms", "saved ms", "speedup", "same output"], rows)
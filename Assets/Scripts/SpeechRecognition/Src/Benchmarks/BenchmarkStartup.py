@@ -0,0 +1,202 @@
+# Lucas Davis
+
+import time
+
+# Taken before anything else is imported, so the child process can report its import times
+START = time.time()
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+
+def Child(_modelPath, _background):
+    """
+    Starts the API the same way main does, then prints when every stage of the startup was first
+    seen as a json line on stdout. The process keeps serving until it is killed.
+
+    Parameters:
+        - _modelPath: The model file to serve
+        - _background: Load the model in the background once the server is up
+    """
+    sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "API"))
+
+    import ASR_API
+    from waitress import create_server
+
+    times = {"start": START, "imported": time.time()}
+
+    def Watch():
+        while "ready" not in times and not ASR_API.stage.startswith("failed"):
+            times.setdefault(ASR_API.stage, time.time())
+            time.sleep(0.005)
+
+    threading.Thread(target = Watch, daemon = True).start()
+
+    apiConfig = {'batching': 'False', 'stream_timeout_s': '30', 'stream_max_sessions': '4', 'queue_depth': '8'}
+
+    if _background:
+        threading.Thread(target = ASR_API.Load, args = (apiConfig, _modelPath), daemon = True).start()
+    else:
+        ASR_API.Load(apiConfig, _modelPath)
+
+    server = create_server(ASR_API.app, host = '127.0.0.1', port = 0, threads = 12)
+    print(json.dumps({"port": server.effective_port}), flush = True)
+
+    threading.Thread(target = server.run, daemon = True).start()
+
+    ASR_API.ready.wait()
+    times.setdefault("ready", time.time())
+    print(json.dumps(times), flush = True)
+
+    while True:
+        time.sleep(1)
+
+def WaitFor(_url, _timeout = 600.0):
+    """
+    Parameters:
+        - _url: The url to poll until it answers with a 200
+        - _timeout: How long to poll for, in seconds
+
+    Returns:
+        The time.time() it first answered
+    """
+    deadline = time.monotonic() + _timeout
+
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(_url) as response:
+                if response.status == 200:
+                    return time.time()
+        except (urllib.error.URLError, ConnectionError):
+            pass
+
+        time.sleep(0.01)
+
+    raise TimeoutError(f"{_url} didn't answer in time")
+
+def ReadJson(_stream):
+    """
+    Parameters:
+        - _stream: The stdout of the child process
+
+    Returns:
+        The next json line, the API's own prints are skipped
+    """
+    for line in _stream:
+        if line.startswith("{"):
+            return json.loads(line)
+
+    raise EOFError("The API process stopped")
+
+def Startup(_modelPath, _background, _audio):
+    """
+    Starts a fresh API process and measures how long it takes to become healthy and ready
+
+    Parameters:
+        - _modelPath: The model file to serve
+        - _background: Load the model in the background once the server is up
+        - _audio: The np.float32 clip sent as the first request
+
+    Returns:
+        A dictionary of the times of every stage in seconds since the process was launched, and
+        the latency of the first request in milliseconds
+    """
+    launched = time.time()
+
+    child = subprocess.Popen(
+        [sys.executable, "-m", "Benchmarks.BenchmarkStartup", "--child", _modelPath] + (["--background"] if _background else []),
+        stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, text = True
+    )
+
+    try:
+        port = ReadJson(child.stdout)["port"]
+        url = f"http://127.0.0.1:{port}/"
+
+        health = WaitFor(url)
+        ready = WaitFor(url + "ready")
+
+        start = time.monotonic()
+        request = urllib.request.Request(url + "ASR", data = _audio.tobytes(), method = 'POST', headers = {'Content-Type': 'application/octet-stream'})
+
+        with urllib.request.urlopen(request) as response:
+            response.read()
+
+        first = (time.monotonic() - start) * 1000.0
+
+        times = ReadJson(child.stdout)
+        times.update({"health": health, "ready": ready})
+    finally:
+        child.kill()
+        child.wait()
+
+    return {stage: at - launched for stage, at in times.items()}, first
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Cold start of the API, from launching the process to answering the first request")
+    parser.add_argument("--model", default = None, help = "Path to a .keras file, an untrained model is used if omitted")
+    parser.add_argument("--runs", type = int, default = 2, help = "Cold starts per backend, the fastest is reported")
+    parser.add_argument("--child", default = None, help = argparse.SUPPRESS)
+    parser.add_argument("--background", action = "store_true", help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        Child(args.child, args.background)
+
+    import numpy as np
+
+    from Benchmarks.Common import LoadModel, SyntheticAudio, PrintTable
+    from Data.Process import Process
+    from Model.GraphModel import GraphModel
+    from Model.Quantize import Quantize
+
+    directory = tempfile.mkdtemp(prefix = "startup_")
+    process = Process()
+    model = LoadModel(args.model, process)
+
+    modelPath = args.model or os.path.join(directory, "ASR.keras")
+
+    if args.model is None:
+        model.save(modelPath)
+
+    exportPath = os.path.join(directory, "ASR_savedmodel")
+    GraphModel.Export(model, exportPath)
+    exports = Quantize(process).Export(model, directory, ["int8"])
+
+    audio = SyntheticAudio(3.0, np.random.default_rng(42))
+
+    backends = [
+        ("keras", modelPath, False),
+        ("keras", modelPath, True),
+        ("savedmodel", exportPath, True),
+        ("int8", exports["int8"][0], True)
+    ]
+
+    rows = []
+
+    for name, path, background in backends:
+        runs = [Startup(path, background, audio) for _ in range(args.runs)]
+        times, first = min(runs, key = lambda run: run[0]["ready"])
+
+        rows.append([
+            name, "background" if background else "blocking",
+            times["start"], times["imported"] - times["start"],
+            times.get("loading model", times["ready"]) - times.get("importing", times["imported"]),
+            times.get("warming up", times["ready"]) - times.get("loading model", times["ready"]),
+            times["ready"] - times.get("warming up", times["ready"]),
+            times["health"], times["ready"], first
+        ])
+        print(f"{name}, {rows[-1][1]}: healthy after {times['health']:.2f} s, ready after {times['ready']:.2f} s", flush = True)
+
+    PrintTable(
+        ["backend", "start", "python s", "api import s", "tf import s", "model load s", "warm up s", "/ s", "/ready s", "first request ms"],
+        rows
+    )
+
+    shutil.rmtree(directory)
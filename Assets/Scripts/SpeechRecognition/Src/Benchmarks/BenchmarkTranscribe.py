@@ -0,0 +1,77 @@
+# Lucas Davis
+
+import os
+import time
+import shutil
+import tempfile
+import argparse
+import numpy as np
+
+from Benchmarks.Common import LoadModel, SyntheticCSV, PrintTable
+from Data.Process import Process
+from Recognition import SpeechRec
+from Scripts.Transcribe import Transcribe
+
+def Sequential(_speechRec, _csvPath):
+    """
+    Transcribes the clips one after the other, the same way Scripts/CheckKerasFile.py does
+
+    Parameters:
+        - _speechRec: The SpeechRec instance
+        - _csvPath: The csv file of the clips
+
+    Returns:
+        The seconds of audio and the seconds it took
+    """
+    audioPaths, _ = _speechRec.process.LoadCSV(_csvPath)
+    sampleRate = int(_speechRec.process.spectrogramConfig['sample_rate'])
+
+    start = time.monotonic()
+    samples = 0
+
+    for path in audioPaths:
+        audio = _speechRec.process.LoadAudioFile(path)
+        _speechRec.PredictSpectrogram(np.asarray(_speechRec.process.NormalizeSpec(_speechRec.process.Spectrogram(audio))))
+        samples += int(audio.shape[0])
+
+    return samples / sampleRate, time.monotonic() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Throughput of the transcription pipeline against one clip at a time")
+    parser.add_argument("--model", default = None, help = "Path to a .keras file, an untrained model is used if omitted")
+    parser.add_argument("--clips", type = int, default = 64, help = "Amount of synthetic clips")
+    parser.add_argument("--batch_size", type = int, default = 16)
+    parser.add_argument("--readers", type = int, nargs = "+", default = [1, 2, 4], help = "Feature workers to compare")
+    parser.add_argument("--decoders", type = int, default = 2)
+    parser.add_argument("--strategy", default = "greedy", choices = ["greedy", "beam"])
+    parser.add_argument("--processes", action = "store_true", help = "Use processes instead of threads")
+    args = parser.parse_args()
+
+    process = Process()
+    speechRec = SpeechRec(LoadModel(args.model, process), args.strategy, _vad = False)
+    speechRec.Warmup()
+
+    directory = tempfile.mkdtemp(prefix = "transcribe_")
+
+    try:
+        csvPath = SyntheticCSV(os.path.join(directory, "clips"), args.clips, np.random.default_rng(42), 1.0, 15.0)
+        outputPath = os.path.join(directory, "predictions.csv")
+
+        # The first run traces the batch shapes, which isn't part of the throughput
+        Transcribe(speechRec, csvPath, outputPath, args.batch_size, 1, 1, _verbose = False)
+
+        audioSeconds, seconds = Sequential(speechRec, csvPath)
+        baseline = audioSeconds / seconds
+        rows = [["sequential", "-", "-", seconds, baseline, 1.0]]
+
+        for readers in args.readers:
+            _, audioSeconds, seconds, _ = Transcribe(
+                speechRec, csvPath, outputPath, args.batch_size, readers, args.decoders, args.processes, _verbose = False
+            )
+
+            rows.append([f"pipeline x{args.batch_size}", readers, args.decoders, seconds, audioSeconds / seconds, audioSeconds / seconds / baseline])
+    finally:
+        shutil.rmtree(directory)
+
+    print(f"{args.clips} clips, {audioSeconds / 3600.0:.3f} hours of audio, {os.cpu_count()} cpu cores\n")
+    PrintTable(["mode", "readers", "decoders", "seconds", "audio h per h", "speedup"], rows)
@@ -0,0 +1,132 @@
+# Lucas Davis
+
+import time
+import argparse
+import threading
+import urllib.request
+import numpy as np
+
+from waitress import create_server
+
+from Benchmarks.Common import LoadModel, SyntheticAudio, Percentiles, PrintTable, SAMPLE_RATE
+from Data.Process import Process
+from Grab_Ini import ini
+from Recognition import SpeechRec
+from Backend import LocalBackend
+import ASR_API
+import AudioFormat
+
+# The formats the game can upload a clip in: a name, the sample rate it was recorded at and the
+# encoding of the framed clip, None is the raw float32 samples the API always accepted
+FORMATS = [
+    ("raw float32", SAMPLE_RATE, None),
+    ("framed float32", SAMPLE_RATE, AudioFormat.FLOAT32),
+    ("int16", SAMPLE_RATE, AudioFormat.INT16),
+    ("deflate", SAMPLE_RATE, AudioFormat.DEFLATE),
+    ("int16 48k", 48000, AudioFormat.INT16),
+    ("deflate 48k", 48000, AudioFormat.DEFLATE)
+]
+
+def Body(_clip, _sampleRate, _encoding):
+    """
+    Parameters:
+        - _clip: np.float32 audio clip at SAMPLE_RATE
+        - _sampleRate: The sample rate to send the clip at
+        - _encoding: The encoding of the framed clip, None for raw float32
+
+    Returns:
+        The request body and its content type
+    """
+    if _encoding is None:
+        return _clip.tobytes(), 'application/octet-stream'
+
+    if _sampleRate != SAMPLE_RATE:
+        _clip = AudioFormat.Resample(_clip, SAMPLE_RATE, _sampleRate)
+
+    return AudioFormat.Encode(_clip, _sampleRate, _encoding), AudioFormat.CONTENT_TYPE
+
+def Parse(_body, _encoding):
+    """
+    Parameters:
+        - _body: The request body
+        - _encoding: The encoding of the framed clip, None for raw float32
+
+    Returns:
+        The parse time in seconds, the way ReadAudio parses the body
+    """
+    start = time.perf_counter()
+
+    if _encoding is None:
+        np.frombuffer(_body, dtype = np.float32)
+    else:
+        AudioFormat.Decode(_body, SAMPLE_RATE)
+
+    return time.perf_counter() - start
+
+def Post(_url, _body, _contentType):
+    """
+    Parameters:
+        - _url: The url of the /ASR endpoint
+        - _body: The request body
+        - _contentType: The content type of the body
+
+    Returns:
+        The latency of the request in seconds
+    """
+    request = urllib.request.Request(_url, data = _body, method = 'POST', headers = {'Content-Type': _contentType})
+
+    start = time.monotonic()
+
+    with urllib.request.urlopen(request) as response:
+        response.read()
+
+    return time.monotonic() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Request size, parse time and latency of the audio upload formats")
+    parser.add_argument("--model", default = None, help = "Path to a .keras file, an untrained model is used if omitted")
+    parser.add_argument("--requests", type = int, default = 8)
+    parser.add_argument("--parses", type = int, default = 20, help = "How many times every body is parsed")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    clips = [SyntheticAudio(rng.uniform(2.0, 5.0), rng) for _ in range(args.requests)]
+    audioSeconds = sum(len(clip) for clip in clips) / SAMPLE_RATE
+
+    process = Process()
+    speechRec = SpeechRec(LoadModel(args.model, process), "greedy")
+    speechRec.Warmup()
+
+    apiConfig = dict(ini().grabInfo("config.ini", "API"))
+    apiConfig.update({'batching': 'False', 'workers': '0'})
+
+    ASR_API.backend = LocalBackend(speechRec, apiConfig)
+    ASR_API.admission = threading.BoundedSemaphore(8)
+    ASR_API.sampleRate = SAMPLE_RATE
+    ASR_API.ready.set()
+
+    server = create_server(ASR_API.app, host = '127.0.0.1', port = 0, threads = 4)
+    threading.Thread(target = server.run, daemon = True).start()
+
+    url = f"http://127.0.0.1:{server.effective_port}/ASR"
+    rows = []
+
+    for name, sampleRate, encoding in FORMATS:
+        bodies = [Body(clip, sampleRate, encoding) for clip in clips]
+        size = sum(len(body) for body, _ in bodies)
+
+        parses = [Parse(body, encoding) for body, _ in bodies for _ in range(args.parses)]
+        latencies = [Post(url, body, contentType) for body, contentType in bodies]
+
+        parse = Percentiles(parses)
+        stats = Percentiles(latencies)
+
+        rows.append([
+            name, size / 1e3, size / audioSeconds / 1e3, parse["p50"] * 1000.0,
+            parse["p50"] * 1000.0 / (audioSeconds / len(clips)), stats["p50"], stats["p99"]
+        ])
+        print(f"{name}: {size / 1e3:.1f} KB, {stats['p50']:.1f} ms p50", flush = True)
+
+    PrintTable(["format", "KB", "KB per audio s", "parse p50 us", "parse us per audio s", "p50 ms", "p99 ms"], rows)
+
+    ASR_API.backend.Close()
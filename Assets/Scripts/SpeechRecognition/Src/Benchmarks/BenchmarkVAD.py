@@ -0,0 +1,127 @@
+# Lucas Davis
+
+import time
+import argparse
+import numpy as np
+from jiwer import wer
+
+from Benchmarks.Common import LoadModel, SyntheticAudio, Percentiles, PrintTable, SAMPLE_RATE
+from Data.Process import Process
+from Data.VAD import VAD
+from Recognition import SpeechRec
+
+def Recordings(_count, _rng, _seconds = 5.0, _silent = 0.1):
+    """
+    Synthetic recordings the way the game records them: a fixed length window of quiet microphone
+    noise, with an utterance somewhere inside it
+
+    Parameters:
+        - _count: The number of recordings
+        - _rng: A numpy Generator
+        - _seconds: The length of the recording window
+        - _silent: The fraction of recordings where the player never speaks
+
+    Returns:
+        A list of np.float32 audio clips
+    """
+    clips = []
+
+    for _ in range(_count):
+        audio = (3e-4 * _rng.standard_normal(int(_seconds * SAMPLE_RATE))).astype(np.float32)
+
+        if _rng.uniform() >= _silent:
+            utterance = SyntheticAudio(_rng.uniform(0.8, 3.0), _rng)
+            start = _rng.integers(0, audio.shape[0] - utterance.shape[0])
+            audio[start:start + utterance.shape[0]] += utterance
+
+        clips.append(audio)
+
+    return clips
+
+def Measure(_speechRec, _clips, _repeats):
+    """
+    Parameters:
+        - _speechRec: The SpeechRec to time
+        - _clips: The list of audio clips to transcribe
+        - _repeats: How many times every clip is timed
+
+    Returns:
+        The latencies in seconds and the predictions
+    """
+    latencies, predictions = [], []
+
+    for clip in _clips:
+        for _ in range(_repeats):
+            start = time.monotonic()
+            prediction = _speechRec.Predict(clip)
+            latencies.append(time.monotonic() - start)
+
+        predictions.append(prediction)
+
+    return latencies, predictions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Frames and latency saved by trimming silence before the model")
+    parser.add_argument("--csv", default = None, help = "A csv file of recordings, synthetic recordings are used if omitted")
+    parser.add_argument("--samples", type = int, default = 20, help = "Amount of synthetic recordings")
+    parser.add_argument("--model", default = None, help = "Path to a .keras file, an untrained model is used if omitted")
+    parser.add_argument("--repeats", type = int, default = 2)
+    args = parser.parse_args()
+
+    process = Process()
+    rng = np.random.default_rng(42)
+    transcripts = None
+
+    if args.csv is not None:
+        audioPaths, transcripts = process.LoadCSV(args.csv)
+        clips = [process.LoadAudioFile(path).numpy() for path in audioPaths]
+        transcripts = [str(transcript).lower() for transcript in transcripts]
+    else:
+        clips = Recordings(args.samples, rng)
+
+    model = LoadModel(args.model, process)
+
+    # How many frames the VAD keeps of every clip
+    totalFrames, keptFrames, silent = 0, {False: 0, True: 0}, {False: 0, True: 0}
+
+    for clip in clips:
+        spectrogram = np.asarray(process.Spectrogram(clip, _linear = True))
+        totalFrames += spectrogram.shape[0]
+
+        for split in (False, True):
+            segments = VAD(process, split).Segments(spectrogram)
+            keptFrames[split] += sum(end - start for start, end in segments)
+            silent[split] += len(segments) == 0
+
+    print(f"{len(clips)} clips, {totalFrames / len(clips):.0f} frames on average")
+
+    audioSeconds = sum(len(clip) for clip in clips) / SAMPLE_RATE
+    rows, reference = [], None
+
+    for name, vad, split in [("off", False, False), ("trim", True, False), ("trim + split", True, True)]:
+        speechRec = SpeechRec(model, "greedy", _vad = vad)
+
+        if vad:
+            speechRec.vad = VAD(process, split)
+            kept = keptFrames[split]
+        else:
+            kept = totalFrames
+
+        speechRec.Warmup()
+
+        latencies, predictions = Measure(speechRec, clips, args.repeats)
+        reference = reference or latencies
+        stats = Percentiles(latencies)
+
+        rows.append([
+            name, kept / len(clips), (totalFrames - kept) / len(clips), 100.0 * (1 - kept / totalFrames),
+            silent[split] if vad else 0, stats["mean"], stats["p50"], stats["p99"],
+            100.0 * (1 - sum(latencies) / sum(reference)), sum(latencies) / args.repeats / audioSeconds,
+            "-" if transcripts is None else f"{wer(transcripts, predictions):.3f}"
+        ])
+        print(f"{name}: {stats['mean']:.1f} ms mean", flush = True)
+
+    PrintTable(
+        ["vad", "frames", "frames saved", "saved %", "silent clips", "mean ms", "p50 ms", "p99 ms", "latency saved %", "RTF", "WER"],
+        rows
+    )
@@ -0,0 +1,114 @@
+# Lucas Davis
+
+import time
+import tempfile
+import argparse
+import numpy as np
+
+from tensorflow import keras
+from tensorflow.keras.optimizers import Adam
+from jiwer import wer
+
+from Benchmarks.Common import SyntheticCSV, LoadModel, PrintTable
+from Data.Process import Process
+from Data.Augment import Augment
+from Data.Validate import Validate
+from Model.ASRModel import ASRModel, CTCLoss
+from Model.ValidateModel import ValidateModel
+from Model.Setup import Setup
+
+class PerItemValidateModel(keras.callbacks.Callback):
+    """
+    The original callback: predict batch by batch after val_loss, then convert every item on
+    its own
+    """
+    def __init__(self, _dataset, _process):
+        super().__init__()
+
+        self.dataset = _dataset
+        self.process = _process
+
+    def on_epoch_end(self, epoch, logs = None):
+        transcripts, predictions = [], []
+
+        for spectrogram, labels in self.dataset:
+            for item in ASRModel.ctcDecoder(self.model.predict(spectrogram, verbose = 0)):
+                predictions.append(self.process.ConvertLabel(item))
+
+            for item in labels:
+                transcripts.append(self.process.ConvertLabel(item))
+
+        logs['Error_Rate'] = wer(transcripts, predictions)
+
+class EpochTimer(keras.callbacks.Callback):
+    """
+    Times every epoch, and how long the callbacks before it held up the end of the epoch
+    """
+    def __init__(self):
+        super().__init__()
+
+        self.epochs, self.stalls = [], []
+
+    def on_epoch_begin(self, epoch, logs = None):
+        self.start = time.monotonic()
+
+    def on_test_end(self, logs = None):
+        self.validated = time.monotonic()
+
+    def on_epoch_end(self, epoch, logs = None):
+        now = time.monotonic()
+
+        self.epochs.append(now - self.start)
+        self.stalls.append(now - self.validated)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Epoch time and end of epoch stall of the error rate callbacks")
+    parser.add_argument("--csv", default = None, help = "A csv file used for every split, a synthetic corpus is used if omitted")
+    parser.add_argument("--samples", type = int, default = 32, help = "Size of the synthetic corpus")
+    parser.add_argument("--max_seconds", type = float, default = 4.0, help = "Longest clip of the synthetic corpus")
+    parser.add_argument("--batch_size", type = int, default = 8)
+    parser.add_argument("--epochs", type = int, default = 3, help = "Epochs per callback, the first one is not timed")
+    parser.add_argument("--model", default = None, help = "A .keras file to start from")
+    args = parser.parse_args()
+
+    csvPath = args.csv or SyntheticCSV(
+        tempfile.mkdtemp(prefix = "validation_"), args.samples, np.random.default_rng(42), _maxSeconds = args.max_seconds
+    )
+
+    process = Process()
+    setup = Setup(process, Augment(), Validate(process))
+    setup.cacheFeatures = False
+    setup.augmentData = False
+    setup.batchSize = args.batch_size
+
+    trainDataset, validationData, testDataset = setup.CreateDataset(csvPath, csvPath, csvPath)
+
+    callbacks = [
+        ("per item, after val_loss", lambda: PerItemValidateModel(testDataset, process)),
+        ("vectorized, after val_loss", lambda: ValidateModel(testDataset, _everyEpochs = 1, _subsample = 0, _asynchronous = False)),
+        ("vectorized, during val_loss", lambda: ValidateModel(testDataset, _everyEpochs = 1, _subsample = 0, _asynchronous = True)),
+        ("vectorized, every 2 epochs", lambda: ValidateModel(testDataset, _everyEpochs = 2, _subsample = 0, _asynchronous = True)),
+        ("none", lambda: None)
+    ]
+
+    rows = []
+
+    for name, Callback in callbacks:
+        model = LoadModel(args.model, process)
+        model.compile(optimizer = Adam(learning_rate = 1e-4), loss = CTCLoss())
+
+        timer = EpochTimer()
+        callback = Callback()
+
+        model.fit(
+            trainDataset,
+            validation_data = validationData,
+            epochs = args.epochs,
+            callbacks = [c for c in [callback, timer] if c is not None],
+            verbose = 0
+        )
+
+        rows.append([name, float(np.mean(timer.epochs[1:])), float(np.mean(timer.stalls[1:]))])
+        print(f"{name}: {rows[-1][1]:.2f} s per epoch, {rows[-1][2]:.2f} s stall", flush = True)
+
+    PrintTable(["error rate", "epoch s", "stall after val_loss s"], rows)
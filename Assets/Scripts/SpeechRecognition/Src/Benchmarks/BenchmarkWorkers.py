@@ -0,0 +1,151 @@
+# Lucas Davis
+
+import os
+import time
+import shutil
+import tempfile
+import argparse
+import threading
+import urllib.error
+import urllib.request
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from waitress import create_server
+
+from Benchmarks.Common import LoadModel, SyntheticAudio, Percentiles, PrintTable, SAMPLE_RATE
+from Data.Process import Process
+from Grab_Ini import ini
+import ASR_API
+
+def Post(_url, _audio):
+    """
+    Parameters:
+        - _url: The url of the /ASR endpoint
+        - _audio: np.float32 audio clip
+
+    Returns:
+        The status code of the response and the latency in seconds
+    """
+    # Without a content type urllib sends the clip as a form, which flask doesn't expose as request.data
+    request = urllib.request.Request(_url, data = _audio.tobytes(), method = 'POST', headers = {'Content-Type': 'application/octet-stream'})
+
+    start = time.monotonic()
+
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+
+    return status, time.monotonic() - start
+
+def Health(_url, _stop, _latencies):
+    """
+    Polls / while the load test runs, to show it stays responsive
+
+    Parameters:
+        - _url: The url of the / endpoint
+        - _stop: An Event that ends the polling
+        - _latencies: The list the latencies are appended to
+    """
+    while not _stop.is_set():
+        start = time.monotonic()
+
+        with urllib.request.urlopen(_url) as response:
+            response.read()
+
+        _latencies.append(time.monotonic() - start)
+        _stop.wait(0.1)
+
+def LoadTest(_url, _clips, _clients):
+    """
+    Sends every clip to the API from several clients at once. Every client sends its next
+    request as soon as the previous one was answered.
+
+    Parameters:
+        - _url: The url the API is served on
+        - _clips: The list of audio clips to send
+        - _clients: The number of concurrent clients
+
+    Returns:
+        The /ASR results, the wall time in seconds and the / latencies
+    """
+    stop = threading.Event()
+    health = []
+    poller = threading.Thread(target = Health, args = (_url + "/", stop, health), daemon = True)
+    poller.start()
+
+    start = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers = _clients) as pool:
+        results = list(pool.map(lambda clip: Post(_url + "/ASR", clip), _clips))
+
+    wall = time.monotonic() - start
+
+    stop.set()
+    poller.join()
+
+    return results, wall, health
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Throughput of the API over HTTP as the amount of model workers grows")
+    parser.add_argument("--model", default = None, help = "Path to a .keras file, an untrained model is used if omitted")
+    parser.add_argument("--workers", type = int, nargs = "+", default = [0, 1, 2, 4], help = "0 serves the model in the API process")
+    parser.add_argument("--clients", type = int, default = 16)
+    parser.add_argument("--requests", type = int, default = 64)
+    parser.add_argument("--queue_depth", type = int, default = 64, help = "Lower than --clients to see requests rejected")
+    parser.add_argument("--threads", type = int, default = 0, help = "intra_op_threads of every worker, 0 for tensorflow's default")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+
+    modelPath, directory = args.model, None
+
+    if modelPath is None:
+        directory = tempfile.mkdtemp(prefix = "workers_")
+        modelPath = os.path.join(directory, "ASR.keras")
+        LoadModel(None, Process()).save(modelPath)
+
+    clips = [SyntheticAudio(rng.uniform(1.0, 5.0), rng) for _ in range(args.requests)]
+    audioSeconds = sum(len(clip) for clip in clips) / SAMPLE_RATE
+
+    print(f"{os.cpu_count()} cpu cores")
+
+    # The server is started once, every amount of workers swaps the backend behind it
+    server = create_server(ASR_API.app, host = '127.0.0.1', port = 0, threads = args.queue_depth + 4)
+    threading.Thread(target = server.run, daemon = True).start()
+
+    url = f"http://127.0.0.1:{server.effective_port}"
+    rows = []
+
+    for workers in args.workers:
+        apiConfig = dict(ini().grabInfo("config.ini", "API"))
+        apiConfig.update({
+            'workers': str(workers),
+            'queue_depth': str(args.queue_depth),
+            'intra_op_threads': str(args.threads),
+            'inter_op_threads': '1' if args.threads > 0 else '0'
+        })
+
+        ASR_API.Setup(apiConfig, modelPath)
+
+        results, wall, health = LoadTest(url, clips, args.clients)
+
+        ASR_API.backend.Close()
+
+        served = [latency for status, latency in results if status == 200]
+        rejected = sum(1 for status, _ in results if status == 503)
+        stats = Percentiles(served) if served else {"p50": 0.0, "p99": 0.0}
+
+        rows.append([
+            workers, len(served) / wall, audioSeconds * len(served) / len(clips) / wall,
+            stats["p50"], stats["p99"], rejected, Percentiles(health)["p99"] if health else 0.0
+        ])
+        print(f"{workers} workers: {rows[-1][1]:.2f} utt/s", flush = True)
+
+    PrintTable(["workers", "utt/s", "audio s/s", "p50 ms", "p99 ms", "503s", "/ p99 ms"], rows)
+
+    if directory is not None:
+        shutil.rmtree(directory)
@@ -0,0 +1,130 @@
+# Lucas Davis
+
+import os
+import sys
+import csv
+import wave
+import numpy as np
+
+from tensorflow.keras.models import load_model
+
+# The API modules import each other by their bare names (this is how pyinstaller packages them),
+# so the API directory needs to be importable for the benchmarks to use SpeechRec.
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "API"))
+
+from Model.ASRModel import ASRModel
+
+SAMPLE_RATE = 16000
+
+def LoadModel(_path, _process):
+    """
+    Loads a trained model for benchmarking. When no path is given an untrained model with the
+    architecture, picked in the [Model] section of the config.ini, and the input width of the
+    feature_type is built instead, which has the exact same cost per inference.
+
+    Parameters:
+        - _path: The path to a .keras file, or None
+        - _process: A Process instance used to size the vocabulary
+
+    Returns:
+        A keras model
+    """
+    if _path is not None:
+        return load_model(_path, custom_objects = {'ctcloss': ASRModel.ctcloss}, safe_mode = False)
+
+    return ASRModel.Build(_process.Bins(), _process.charToNum.vocabulary_size())
+
+def SyntheticAudio(_seconds, _rng, _sampleRate = SAMPLE_RATE):
+    """
+    Creates a clip of synthetic audio: a few random tones with some background noise
+
+    Parameters:
+        - _seconds: The length of the clip
+        - _rng: A numpy Generator
+        - _sampleRate: The sample rate of the clip
+
+    Returns:
+        A np.float32 audio clip
+    """
+    t = np.arange(int(_seconds * _sampleRate)) / _sampleRate
+
+    audio = 0.01 * _rng.standard_normal(t.shape[0])
+
+    for freq in _rng.uniform(100, 3000, size = 3):
+        audio += 0.1 * np.sin(2 * np.pi * freq * t)
+
+    return audio.astype(np.float32)
+
+def SyntheticCSV(_directory, _count, _rng, _minSeconds = 1.0, _maxSeconds = 15.0):
+    """
+    Writes a small synthetic corpus: 16 bit wav files of random lengths and a csv file in the
+    same format CreateCSVFile produces.
+
+    Parameters:
+        - _directory: The directory to write the corpus to
+        - _count: The number of wav files
+        - _rng: A numpy Generator
+        - _minSeconds: The length of the shortest possible clip
+        - _maxSeconds: The length of the longest possible clip
+
+    Returns:
+        The path to the csv file
+    """
+    os.makedirs(_directory, exist_ok = True)
+
+    words = ["the", "door", "opens", "light", "fire", "wolf", "forest", "brother", "veil", "whisper"]
+    csvPath = os.path.join(_directory, "synthetic.csv")
+
+    with open(csvPath, mode = 'w', newline = '', encoding = 'utf-8') as csvFile:
+        writer = csv.writer(csvFile)
+        writer.writerow(["filename", "filesize", "transcript"])
+
+        for i in range(_count):
+            seconds = _rng.uniform(_minSeconds, _maxSeconds)
+            audio = SyntheticAudio(seconds, _rng)
+            path = os.path.join(_directory, f"{i:06d}.wav")
+
+            with wave.open(path, 'wb') as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(SAMPLE_RATE)
+                wav.writeframes((np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+
+            transcript = " ".join(_rng.choice(words, size = max(1, int(seconds * 2))))
+            writer.writerow([path, os.path.getsize(path), transcript])
+
+    return csvPath
+
+def Percentiles(_latencies):
+    """
+    Parameters:
+        - _latencies: A list of latencies in seconds
+
+    Returns:
+        The mean, p50, p90 and p99 latencies in milliseconds
+    """
+    values = np.asarray(_latencies) * 1000.0
+
+    return {
+        "mean": float(values.mean()),
+        "p50":  float(np.percentile(values, 50)),
+        "p90":  float(np.percentile(values, 90)),
+        "p99":  float(np.percentile(values, 99))
+    }
+
+def PrintTable(_header, _rows):
+    """
+    Prints the results of a benchmark as an aligned table
+
+    Parameters:
+        - _header: A list of column names
+        - _rows: A list of rows, each a list of values
+    """
+    rows = [[f"{value:.2f}" if isinstance(value, float) else str(value) for value in row] for row in _rows]
+    widths = [max([len(str(col))] + [len(row[i]) for row in rows]) for i, col in enumerate(_header)]
+
+    print("  ".join(str(col).rjust(width) for col, width in zip(_header, widths)))
+    print("  ".join("-" * width for width in widths))
+
+    for row in rows:
+        print("  ".join(value.rjust(width) for value, width in zip(row, widths)))
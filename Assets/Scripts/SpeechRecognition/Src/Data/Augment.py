@@ -83,4 +83,144 @@ class Augment:
         
         volume = tf.random.uniform(shape = [], minval = min, maxval = max)
 
-        return _audio * volume
\ No newline at end of file
+        return _audio * volume
+
+    # ------------------------------------------------------------------------
+    #   Batched augmentation
+    # ------------------------------------------------------------------------
+    def NoiseBatch(self, _audio, _samples):
+        """
+        The batched version of Noise. Every row of the batch gets its own noise level, and the
+        noise is only added to the samples of each row, so the padding stays zero.
+
+        Parameters:
+            - _audio: A zero padded float tensor of audio clips in the shape of (batch, samples)
+            - _samples: The number of valid samples of each clip
+
+        Returns:
+            The batch of audio clips with additive noise
+        """
+        min = -(int(self.augmentConfig['noise_min']))
+        max = -(int(self.augmentConfig['noise_max']))
+
+        if min == 0 or max == 0:
+            return _audio
+
+        mask = tf.sequence_mask(_samples, tf.shape(_audio)[1], dtype = _audio.dtype)
+
+        noiseLevel = tf.random.uniform(shape = [tf.shape(_audio)[0], 1], minval = min, maxval = max, seed = self.seed)
+        noise = tf.random.uniform(tf.shape(_audio)) * tf.math.pow(10.0, noiseLevel / 20.0)
+
+        return _audio + noise * mask
+
+    def TimeStrechBatch(self, _audio, _samples):
+        """
+        The batched version of TimeStrech. Every row is resampled by its own factor using linear
+        interpolation between neighbouring samples, which can be done for the whole batch with a
+        single gather.
+
+        Parameters:
+            - _audio: A zero padded float tensor of audio clips in the shape of (batch, samples)
+            - _samples: The number of valid samples of each clip
+
+        Returns:
+            The batch of streched audio clips, zero padded to the longest one, and their new number
+            of valid samples
+        """
+        strechRatio = int(self.augmentConfig['time_stretch_ratio'])
+
+        if strechRatio == 0:
+            return _audio, _samples
+
+        min = 1.0 - (strechRatio / 100.0)
+        max = 1.0 + (strechRatio / 100.0)
+
+        factor = tf.random.uniform(shape = [tf.shape(_audio)[0]], minval = min, maxval = max)
+
+        samples = tf.cast(_samples, tf.float32)
+        length = tf.cast(tf.round(samples / factor), tf.int32)
+
+        # The position in the original clip that each new sample is read from
+        positions = tf.cast(tf.range(tf.reduce_max(length)), tf.float32)[tf.newaxis, :] * factor[:, tf.newaxis]
+        positions = tf.minimum(positions, (samples - 1.0)[:, tf.newaxis])
+
+        lower = tf.cast(tf.floor(positions), tf.int32)
+        upper = tf.minimum(lower + 1, tf.cast(_samples, tf.int32)[:, tf.newaxis] - 1)
+        weight = positions - tf.cast(lower, tf.float32)
+
+        audio = (
+            tf.gather(_audio, lower, batch_dims = 1) * (1.0 - weight)
+            + tf.gather(_audio, upper, batch_dims = 1) * weight
+        )
+
+        return audio * tf.sequence_mask(length, tf.shape(audio)[1], dtype = audio.dtype), length
+
+    def VolumeBatch(self, _audio):
+        """
+        The batched version of Volume. Every row of the batch is scaled by its own factor, since
+        the padding is zero it stays zero.
+
+        Parameters:
+            - _audio: A zero padded float tensor of audio clips in the shape of (batch, samples)
+
+        Returns:
+            The batch of audio clips with their volume ajusted
+        """
+        volRatio = int(self.augmentConfig['volume_ratio'])
+
+        if volRatio == 0:
+            return _audio
+
+        min = 1 - (volRatio / 100)
+        max = 1 + (volRatio / 100)
+
+        volume = tf.random.uniform(shape = [tf.shape(_audio)[0], 1], minval = min, maxval = max)
+
+        return _audio * volume
+
+    def SpecAugment(self, _spectrogram, _frames):
+        """
+        SpecAugment style masking of a batch of spectrograms. Every row gets its own randomly
+        placed frequency and time masks, which are set to zero (the mean of a normalized
+        spectrogram). The time masks are kept within the valid frames of each row.
+
+        Parameters:
+            - _spectrogram: A zero padded batch of normalized spectrograms (batch, frames, bins)
+            - _frames: The number of valid frames of each spectrogram
+
+        Returns:
+            The masked batch of spectrograms
+        """
+        freqMasks = int(self.augmentConfig['freq_masks'])
+        freqWidth = int(self.augmentConfig['freq_mask_width'])
+        timeMasks = int(self.augmentConfig['time_masks'])
+        timeWidth = int(self.augmentConfig['time_mask_width'])
+
+        shape = tf.shape(_spectrogram)
+        bins = tf.range(shape[2])[tf.newaxis, tf.newaxis, :]
+        steps = tf.range(shape[1])[tf.newaxis, :, tf.newaxis]
+
+        def Mask(_positions, _size, _maxWidth):
+            width = tf.random.uniform(shape = [shape[0], 1, 1], minval = 0, maxval = _maxWidth + 1, dtype = tf.int32)
+            width = tf.minimum(width, _size)
+
+            start = tf.random.uniform(shape = [shape[0], 1, 1]) * tf.cast(_size - width, tf.float32)
+            start = tf.cast(start, tf.int32)
+
+            return (_positions >= start) & (_positions < start + width)
+
+        # The masks are built as (batch, 1, bins) and (batch, frames, 1) and only broadcast to the
+        # full size of the batch once, when they are applied
+        freqMask = tf.zeros_like(bins, dtype = tf.bool)
+        timeMask = tf.zeros_like(steps, dtype = tf.bool)
+        frames = tf.reshape(tf.cast(_frames, tf.int32), [-1, 1, 1])
+
+        for _ in range(freqMasks if freqWidth > 0 else 0):
+            freqMask = freqMask | Mask(bins, shape[2], freqWidth)
+
+        for _ in range(timeMasks if timeWidth > 0 else 0):
+            timeMask = timeMask | Mask(steps, frames, timeWidth)
+
+        keep = tf.cast(~freqMask, _spectrogram.dtype) * tf.cast(~timeMask, _spectrogram.dtype)
+
+        return _spectrogram * keep
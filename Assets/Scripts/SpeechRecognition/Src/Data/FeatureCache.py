@@ -0,0 +1,232 @@
+# Lucas Davis
+
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+
+import tensorflow as tf
+
+from Data.Process import Process
+
+from Grab_Ini import ini
+
+class FeatureCache:
+    """
+    Stores precomputed spectrograms and labels on disk so datasets that aren't augmented don't
+    have to decode every wav file and recompute its STFT each epoch.
+
+    A cache is made up of shards; each shard is a single (frames, bins) array holding the
+    spectrograms of consecutive samples back to back. An index records, for every sample, the
+    shard it lives in, its offset and its amount of frames, so a spectrogram is a slice of a
+    memory mapped shard. The labels are stored the same way in a single array.
+    """
+    def __init__(self, process: Process):
+        self.process = process
+
+        cacheConfig            = ini().grabInfo("config.ini", "Process.FeatureCache")
+        self.spectrogramConfig = ini().grabInfo("config.ini", "Process.Spectrogram")
+        self.labelConfig       = ini().grabInfo("config.ini", "Process.Label")
+
+        self.path        = str(cacheConfig['path_to_cache'])
+        self.dtype       = np.dtype(cacheConfig['dtype'])
+        self.shardFrames = int(cacheConfig['shard_frames'])
+
+    def Key(self, _csvPath):
+        """
+        Derives the key of a cache from everything that changes its contents: the spectrogram and
+        label configs, the storage dtype, the duration and transcript filters, the path prefix
+        rewrite, and the csv file itself.
+
+        Parameters:
+            - _csvPath: The path to the csv file
+
+        Returns:
+            A hex string identifying the cache
+        """
+        stat = os.stat(_csvPath)
+
+        description = json.dumps({
+            "spectrogram": self.spectrogramConfig,
+            "label":       self.labelConfig,
+            "dtype":       self.dtype.name,
+            "duration":    [self.process.minDuration, self.process.maxDuration],
+            "transcript":  self.process.maxTranscriptLength,
+            "paths":       [self.process.pathPrefixFrom, self.process.pathPrefixTo],
+            "csv":         [os.path.abspath(_csvPath), stat.st_size, stat.st_mtime_ns]
+        }, sort_keys = True)
+
+        return hashlib.sha1(description.encode("utf-8")).hexdigest()[:16]
+
+    def Directory(self, _csvPath):
+        """
+        Parameters:
+            - _csvPath: The path to the csv file
+
+        Returns:
+            The directory the cache of the csv file is stored in. It is named after the csv file
+            and a hash of its absolute path, so csv files with the same name in different folders
+            never share a directory, while a config change still replaces the cache it outdated
+        """
+        name = os.path.splitext(os.path.basename(_csvPath))[0]
+        pathHash = hashlib.sha1(os.path.abspath(_csvPath).encode("utf-8")).hexdigest()[:8]
+
+        return os.path.join(self.path, f"{name}_{pathHash}")
+
+    def IsValid(self, _csvPath):
+        """
+        Parameters:
+            - _csvPath: The path to the csv file
+
+        Returns:
+            True if a complete cache with a matching key exists; false otherwise
+        """
+        metaPath = os.path.join(self.Directory(_csvPath), "meta.json")
+
+        if not os.path.exists(metaPath):
+            return False
+
+        with open(metaPath, 'r', encoding = 'utf-8') as file:
+            meta = json.load(file)
+
+        return meta.get("key") == self.Key(_csvPath)
+
+    def Build(self, _csvPath, _processData):
+        """
+        Computes the features of every sample in a csv file and writes them to the cache. The
+        cache is written to a temporary directory first, so an interrupted build never leaves a
+        cache behind that looks valid.
+
+        Parameters:
+            - _csvPath: The path to the csv file
+            - _processData: The function that maps (file, transcript) to (spectrogram, label)
+        """
+        directory = self.Directory(_csvPath)
+        temp = directory + ".tmp"
+
+        shutil.rmtree(temp, ignore_errors = True)
+        os.makedirs(temp)
+
+        audioPaths, transcripts = self.process.LoadCSV(_csvPath, _asTensors = True)
+
+        dataset = tf.data.Dataset.from_tensor_slices((audioPaths, transcripts))
+        dataset = dataset.map(_processData, num_parallel_calls = tf.data.AUTOTUNE)
+
+        shardIds, offsets, frames = [], [], []
+        labels, labelLengths = [], []
+        shard, shardLength, shardCount = [], 0, 0
+        bins = self.process.Bins()
+
+        def WriteShard():
+            np.save(os.path.join(temp, f"shard_{shardCount:05d}.npy"), np.concatenate(shard).astype(self.dtype))
+
+        for spectrogram, label in dataset.as_numpy_iterator():
+            shardIds.append(shardCount)
+            offsets.append(shardLength)
+            frames.append(spectrogram.shape[0])
+
+            labels.append(label.astype(np.int16))
+            labelLengths.append(label.shape[0])
+
+            shard.append(spectrogram)
+            bins = spectrogram.shape[1]
+            shardLength += spectrogram.shape[0]
+
+            if shardLength >= self.shardFrames:
+                WriteShard()
+                shard, shardLength, shardCount = [], 0, shardCount + 1
+
+        if shard:
+            WriteShard()
+            shardCount += 1
+
+        np.savez(
+            os.path.join(temp, "index.npz"),
+            shard         = np.asarray(shardIds, dtype = np.int32),
+            offset        = np.asarray(offsets, dtype = np.int64),
+            frames        = np.asarray(frames, dtype = np.int32),
+            label_offset  = np.cumsum([0] + labelLengths)[:-1].astype(np.int64),
+            label_length  = np.asarray(labelLengths, dtype = np.int32)
+        )
+        np.save(os.path.join(temp, "labels.npy"), np.concatenate(labels) if labels else np.zeros(0, np.int16))
+
+        with open(os.path.join(temp, "meta.json"), 'w', encoding = 'utf-8') as file:
+            json.dump({
+                "key":     self.Key(_csvPath),
+                "samples": len(frames),
+                "shards":  shardCount,
+                "bins":    int(bins)
+            }, file)
+
+        shutil.rmtree(directory, ignore_errors = True)
+        os.rename(temp, directory)
+
+    def Index(self, _csvPath):
+        """
+        Parameters:
+            - _csvPath: The path to the csv file
+
+        Returns:
+            The index of the cache as a dictionary of numpy arrays
+        """
+        with np.load(os.path.join(self.Directory(_csvPath), "index.npz")) as index:
+            return {key: index[key] for key in index.files}
+
+    def Load(self, _csvPath, _processData, _shuffle = False, _shard = None):
+        """
+        Creates a dataset that reads the spectrograms and labels of a csv file from the cache,
+        building the cache first if it doesn't exist or is stale.
+
+        Parameters:
+            - _csvPath: The path to the csv file
+            - _processData: The function that maps (file, transcript) to (spectrogram, label)
+            - _shuffle: Read the samples in a different random order every epoch
+            - _shard: An optional (count, index), only every count-th sample starting at index is
+                      read. The samples are split before they are shuffled, so the shards of
+                      different workers never overlap
+
+        Returns:
+            An unbatched tensorflow dataset of (spectrogram, label)
+        """
+        if not self.IsValid(_csvPath):
+            print(f"Building feature cache for {_csvPath}")
+            self.Build(_csvPath, _processData)
+
+        directory = self.Directory(_csvPath)
+
+        with open(os.path.join(directory, "meta.json"), 'r', encoding = 'utf-8') as file:
+            meta = json.load(file)
+
+        index = self.Index(_csvPath)
+        bins = meta["bins"]
+
+        def Generator():
+            shards = [np.load(os.path.join(directory, f"shard_{i:05d}.npy"), mmap_mode = 'r') for i in range(meta["shards"])]
+            labels = np.load(os.path.join(directory, "labels.npy"), mmap_mode = 'r')
+
+            rows = np.arange(meta["samples"])
+
+            if _shard is not None:
+                rows = rows[_shard[1]::_shard[0]]
+
+            order = np.random.permutation(rows) if _shuffle else rows
+
+            for i in order:
+                start = index["offset"][i]
+                labelStart = index["label_offset"][i]
+
+                yield (
+                    shards[index["shard"][i]][start:start + index["frames"][i]],
+                    labels[labelStart:labelStart + index["label_length"][i]]
+                )
+
+        dataset = tf.data.Dataset.from_generator(Generator, output_signature = (
+            tf.TensorSpec(shape = (None, bins), dtype = tf.as_dtype(self.dtype)),
+            tf.TensorSpec(shape = (None,), dtype = tf.int16)
+        ))
+
+        return dataset.map(
+            lambda spectrogram, label: (tf.cast(spectrogram, tf.float32), tf.cast(label, tf.int64)),
+            num_parallel_calls = tf.data.AUTOTUNE
+        )
@@ -0,0 +1,268 @@
+# Lucas Davis
+
+import threading
+import functools
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# The features the model can be trained on, picked with feature_type in [Process.Spectrogram]
+FEATURE_TYPES = ("linear", "mel", "log-mel", "mfcc")
+
+# Added to the mel energies before the log, so silence doesn't end up at -inf
+LOG_OFFSET = 1e-6
+
+@functools.lru_cache(maxsize = None)
+def MelMatrix(_bins, _sampleRate, _melBins, _lowerHz, _upperHz):
+    """
+    The same HTK mel filterbank as tf.signal.linear_to_mel_weight_matrix: triangular filters that
+    are evenly spaced on the mel scale, and no weight on the DC bin. It is only computed once for
+    every config.
+
+    Parameters:
+        - _bins: The bins of the linear spectrogram, fft // 2 + 1
+        - _sampleRate: The sample rate of the audio
+        - _melBins: The amount of filters
+        - _lowerHz: The lower edge of the first filter
+        - _upperHz: The upper edge of the last filter
+
+    Returns:
+        A read only float32 array of (bins, mel bins)
+    """
+    toMel = lambda hertz: 1127.0 * np.log1p(np.asarray(hertz, dtype = np.float64) / 700.0)
+
+    frequencies = toMel(np.linspace(0.0, _sampleRate / 2.0, _bins)[1:])[:, np.newaxis]
+    edges = np.linspace(toMel(_lowerHz), toMel(_upperHz), _melBins + 2)
+
+    lower, center, upper = edges[:-2], edges[1:-1], edges[2:]
+
+    weights = np.maximum(0.0, np.minimum((frequencies - lower) / (center - lower), (upper - frequencies) / (upper - center)))
+    matrix = np.concatenate([np.zeros((1, _melBins)), weights]).astype(np.float32)
+
+    matrix.setflags(write = False)
+
+    return matrix
+
+@functools.lru_cache(maxsize = None)
+def DCTMatrix(_melBins, _coefficients):
+    """
+    The DCT-II of tf.signal.mfccs_from_log_mel_spectrograms as a matrix, only the first
+    coefficients of which are kept. It is only computed once for every config.
+
+    Parameters:
+        - _melBins: The bins of the log mel spectrogram
+        - _coefficients: The amount of MFCCs
+
+    Returns:
+        A read only float32 array of (mel bins, coefficients)
+    """
+    n = np.arange(_melBins)[:, np.newaxis]
+    k = np.arange(_coefficients)[np.newaxis, :]
+
+    matrix = (np.sqrt(2.0 / _melBins) * np.cos(np.pi * k * (2 * n + 1) / (2 * _melBins))).astype(np.float32)
+
+    matrix.setflags(write = False)
+
+    return matrix
+
+class Filterbank:
+    """
+    Turns the magnitudes of an STFT into the feature_type of the config:
+        - linear: the square root of the STFT magnitude, which is what Process.Spectrogram has
+                  always produced
+        - mel: the square root of the magnitude through a mel filterbank
+        - log-mel: the log of the power through a mel filterbank
+        - mfcc: the first MFCCs of the log-mel spectrogram
+    """
+    def __init__(self, _spectrogramConfig):
+        """
+        Parameters:
+            - _spectrogramConfig: The [Process.Spectrogram] section of the config
+        """
+        fft        = int(_spectrogramConfig['fft'])
+        sampleRate = int(_spectrogramConfig.get('sample_rate', 16000))
+
+        self.type = str(_spectrogramConfig.get('feature_type', 'linear'))
+
+        if self.type not in FEATURE_TYPES:
+            raise ValueError(f"feature_type has to be one of {', '.join(FEATURE_TYPES)}, not {self.type}")
+
+        self.mel = None
+        self.dct = None
+        self.bins = fft // 2 + 1
+
+        if self.type != "linear":
+            melBins = int(_spectrogramConfig.get('mel_bins', 80))
+            lowerHz = float(_spectrogramConfig.get('lower_hz', 20))
+            upperHz = float(_spectrogramConfig.get('upper_hz', sampleRate / 2))
+
+            self.mel = MelMatrix(self.bins, sampleRate, melBins, lowerHz, upperHz)
+            self.bins = melBins
+
+        if self.type == "mfcc":
+            self.dct = DCTMatrix(self.bins, int(_spectrogramConfig.get('mfcc', 40)))
+            self.bins = self.dct.shape[1]
+
+    def FromMagnitude(self, _magnitude):
+        """
+        Parameters:
+            - _magnitude: A float32 numpy array of STFT magnitudes in the shape of (..., frames,
+                          fft // 2 + 1), which is overwritten
+
+        Returns:
+            The features in the shape of (..., frames, bins)
+        """
+        if self.type == "linear":
+            return np.sqrt(_magnitude, out = _magnitude)
+
+        if self.type == "mel":
+            features = np.matmul(_magnitude, self.mel)
+            return np.sqrt(features, out = features)
+
+        features = np.matmul(np.square(_magnitude, out = _magnitude), self.mel)
+        features += LOG_OFFSET
+        np.log(features, out = features)
+
+        if self.type == "mfcc":
+            features = np.matmul(features, self.dct)
+
+        return features
+
+class SpectrogramExtractor:
+    """
+    Computes the same spectrogram as Process.Spectrogram in numpy instead of tensorflow. A request
+    only runs a small FFT over a few hundred frames, for which the dispatch of the eager
+    tensorflow ops costs more than the math.
+
+    The frames are strided views of the audio, so they aren't copied until they are windowed into
+    a buffer that is kept per thread and reused as long as the clips fit in it. Every row of the
+    buffer is already zero padded to the FFT length, which saves numpy's FFT a copy of its input.
+    The FFT is numpy's pocketfft, which computes in float64, so the output matches tf.signal.stft
+    to within its float32 rounding: an absolute difference below 1e-4 on the spectrogram of audio
+    in [-1, 1], which normalizing scales up to below 1e-3.
+    """
+    def __init__(self, _spectrogramConfig):
+        """
+        Parameters:
+            - _spectrogramConfig: The [Process.Spectrogram] section of the config
+        """
+        self.length = int(_spectrogramConfig['frame_length'])
+        self.step   = int(_spectrogramConfig['frame_step'])
+        self.fft    = int(_spectrogramConfig['fft'])
+
+        self.filterbank = Filterbank(_spectrogramConfig)
+        self.bins       = self.filterbank.bins
+
+        # The periodic Hann window, which is what tf.signal.stft uses by default
+        self.window = (0.5 - 0.5 * np.cos(2.0 * np.pi * np.arange(self.length) / self.length)).astype(np.float32)
+
+        self.buffers = threading.local()
+
+    def Frames(self, _samples):
+        """
+        Parameters:
+            - _samples: The amount of samples of a clip
+
+        Returns:
+            The amount of complete frames in it
+        """
+        return max(0, 1 + (_samples - self.length) // self.step)
+
+    def Buffer(self, _shape):
+        """
+        Parameters:
+            - _shape: The shape of the frames, without their last axis
+
+        Returns:
+            A float64 array of (..., fft), a view of the buffer of the calling thread. Only the
+            first frame_length samples of every row are ever written, the rest stays zero
+        """
+        rows = int(np.prod(_shape))
+        buffer = getattr(self.buffers, "frames", None)
+
+        if buffer is None or buffer.shape[0] < rows:
+            # Grow a little past the request so clips of a similar length don't keep reallocating
+            buffer = np.zeros((max(rows, int(rows * 1.25)), self.fft), dtype = np.float64)
+            self.buffers.frames = buffer
+
+        return buffer[:rows].reshape(tuple(_shape) + (self.fft,))
+
+    def Spectrogram(self, _audio, _linear = False):
+        """
+        Parameters:
+            - _audio: The audio as a numpy array, or a batch of clips of the same length along the
+                      first axes
+            - _linear: Return the linear spectrogram whatever the feature_type
+
+        Returns:
+            A float32 array in the shape of (..., frames, bins)
+        """
+        audio = np.asarray(_audio, dtype = np.float32)
+        frames = self.Frames(audio.shape[-1])
+        bins = self.fft // 2 + 1 if _linear else self.bins
+
+        if frames == 0:
+            return np.zeros(audio.shape[:-1] + (0, bins), dtype = np.float32)
+
+        views = sliding_window_view(audio, self.length, axis = -1)[..., :(frames - 1) * self.step + 1:self.step, :]
+
+        padded = self.Buffer(views.shape[:-1])
+        np.multiply(views, self.window, out = padded[..., :self.length])
+
+        spectrum = np.fft.rfft(padded, axis = -1)
+
+        magnitude = np.empty(spectrum.shape, dtype = np.float32)
+        np.abs(spectrum, out = magnitude)
+
+        if _linear:
+            return np.sqrt(magnitude, out = magnitude)
+
+        return self.filterbank.FromMagnitude(magnitude)
+
+    def FromLinear(self, _linear):
+        """
+        Parameters:
+            - _linear: A linear spectrogram from Spectrogram(_linear = True)
+
+        Returns:
+            The features of the feature_type
+        """
+        if self.filterbank.type == "linear":
+            return _linear
+
+        return self.filterbank.FromMagnitude(np.square(_linear))
+
+    def Normalize(self, _spectrogram, _inPlace = False):
+        """
+        Normalizes every frame across its frequency bins, the same as Process.NormalizeSpec
+
+        Parameters:
+            - _spectrogram: A float32 spectrogram in the shape of (..., frames, bins)
+            - _inPlace: Overwrite the spectrogram instead of writing to a new array. Only do this
+                        for a spectrogram nothing else holds a view of
+
+        Returns:
+            The normalized spectrogram
+        """
+        spectrogram = np.asarray(_spectrogram, dtype = np.float32)
+        means = spectrogram.mean(axis = -1, keepdims = True)
+
+        output = spectrogram if _inPlace else np.empty_like(spectrogram)
+        np.subtract(spectrogram, means, out = output)
+
+        # The std of the centered frames, without another temporary array for their squares
+        std = np.sqrt(np.einsum('...i,...i->...', output, output) / output.shape[-1])[..., np.newaxis]
+        std += 1e-10
+
+        np.divide(output, std, out = output)
+
+        return output
+
+    def Features(self, _audio):
+        """
+        Parameters:
+            - _audio: The audio as a numpy array
+
+        Returns:
+            The normalized features, computed without any copy in between
+        """
+        return self.Normalize(self.Spectrogram(_audio), _inPlace = True)
@@ -0,0 +1,375 @@
+# Lucas Davis
+
+import os
+import re
+import struct
+import zipfile
+import numpy as np
+import pandas as pd
+
+import tensorflow as tf
+
+# The formats a manifest can be stored in, by extension. Anything else is read as a csv file
+NUMPY   = (".npz",)
+PARQUET = (".parquet",)
+ARROW   = (".feather", ".arrow")
+
+class Manifest:
+    """
+    A manifest of a dataset, read one column at a time. Besides csv files, a manifest can be
+    stored in a columnar format: a .npz file of NumPy arrays, or a Parquet or Arrow file when
+    pyarrow is installed. Only the columns that are asked for are read, and the columns of a .npz
+    file are filtered while they are read, so the rows that are left out are never kept in memory.
+
+    A .npz manifest stores every string column the way Arrow does, as the utf-8 bytes of all of
+    its strings back to back (<column>_bytes) and where each string starts (<column>_offsets),
+    along with the amount of characters of each string (<column>_length).
+    """
+    def __init__(self, _path, _columns):
+        """
+        Parameters:
+            - _path: The path to the manifest
+            - _columns: The columns that may be used, columns the manifest doesn't have are skipped
+        """
+        self.path   = _path
+        self.npz    = None
+        self.data   = {}
+        extension   = os.path.splitext(_path)[1].lower()
+        wanted      = list(_columns) + [column + "_length" for column in _columns]
+
+        if extension in NUMPY:
+            self.npz = zipfile.ZipFile(_path)
+        elif extension in PARQUET:
+            import pyarrow.parquet
+
+            names = pyarrow.parquet.read_schema(_path).names
+            table = pyarrow.parquet.read_table(_path, columns = [name for name in wanted if name in names])
+
+            self.data = {name: table.column(name).to_numpy() for name in table.column_names}
+        elif extension in ARROW:
+            import pyarrow.ipc
+            import pyarrow.feather
+
+            names = pyarrow.ipc.open_file(_path).schema.names
+            table = pyarrow.feather.read_table(_path, columns = [name for name in wanted if name in names])
+
+            self.data = {name: table.column(name).to_numpy() for name in table.column_names}
+        else:
+            data = pd.read_csv(_path, usecols = lambda column: column in wanted)
+
+            self.data = {name: data[name].to_numpy() for name in data.columns if name in wanted}
+
+    def Stored(self, _name):
+        """
+        Parameters:
+            - _name: The name of an array in the .npz file
+
+        Returns:
+            True if the .npz file has the array
+        """
+        return _name + ".npy" in self.npz.NameToInfo
+
+    def IsText(self, _column):
+        """
+        Parameters:
+            - _column: The name of the column
+
+        Returns:
+            True if the column is a string column stored as bytes and offsets
+        """
+        return self.npz is not None and self.Stored(_column + "_offsets")
+
+    def Has(self, _column):
+        """
+        Parameters:
+            - _column: The name of the column
+
+        Returns:
+            True if the manifest has the column
+        """
+        if self.npz is not None:
+            return self.Stored(_column) or self.IsText(_column)
+
+        return _column in self.data
+
+    def Column(self, _column, _keep = None):
+        """
+        Parameters:
+            - _column: The name of the column
+            - _keep: A boolean array of the rows to return, every row when None
+
+        Returns:
+            The column as a numpy array, or None if the manifest doesn't have it. The string
+            columns of a .npz manifest are returned as fixed width byte strings
+        """
+        if not self.Has(_column):
+            return None
+
+        if self.IsText(_column):
+            return self.Strings(_column, _keep)
+
+        if self.npz is not None:
+            return self.Read(_column, _keep)
+
+        if _keep is None:
+            return self.data[_column]
+
+        return self.data[_column][_keep]
+
+    def Tensor(self, _column, _keep = None, _chunk = 1 << 18):
+        """
+        A string column as a tf.string tensor. The strings of a .npz manifest are cut straight out
+        of its bytes by tensorflow, a chunk of rows at a time, without a numpy or Python string
+        being made for every row.
+
+        Parameters:
+            - _column: The name of the column
+            - _keep: A boolean array of the rows to return, every row when None
+            - _chunk: The amount of rows cut out at once
+
+        Returns:
+            The column as a tf.string tensor, or None if the manifest doesn't have it
+        """
+        if not self.IsText(_column):
+            column = self.Column(_column, _keep)
+
+            return None if column is None else tf.constant(column, dtype = tf.string)
+
+        offsets = self.Read(_column + "_offsets")
+        parts = []
+
+        for start in range(0, offsets.shape[0] - 1, _chunk):
+            stop = min(start + _chunk, offsets.shape[0] - 1)
+            starts, ends = offsets[start:stop], offsets[start + 1:stop + 1]
+
+            if _keep is not None:
+                starts, ends = starts[_keep[start:stop]], ends[_keep[start:stop]]
+
+            if starts.shape[0] == 0:
+                continue
+
+            text = tf.constant(self.ReadBytes(_column + "_bytes", offsets[start], offsets[stop]))
+            parts.append(tf.strings.substr(text, starts - offsets[start], ends - starts))
+
+        if not parts:
+            return tf.constant([], dtype = tf.string)
+
+        return parts[0] if len(parts) == 1 else tf.concat(parts, axis = 0)
+
+    def Strings(self, _column, _keep = None, _chunk = 1 << 14):
+        """
+        Unpacks a string column of a .npz file into a fixed width byte string array, a chunk of
+        rows at a time
+
+        Parameters:
+            - _column: The name of the column
+            - _keep: A boolean array of the rows to return, every row when None
+            - _chunk: The amount of rows unpacked at once
+
+        Returns:
+            The column as an 'S' array
+        """
+        offsets = self.Read(_column + "_offsets")
+        starts, ends = offsets[:-1], offsets[1:]
+
+        if _keep is not None:
+            starts, ends = starts[_keep], ends[_keep]
+
+        lengths = ends - starts
+        width = max(1, int(lengths.max())) if lengths.shape[0] else 1
+        result = np.zeros((lengths.shape[0], width), dtype = np.uint8)
+        columns = np.arange(width)
+
+        for start in range(0, lengths.shape[0], _chunk):
+            stop = min(start + _chunk, lengths.shape[0])
+            first, last = starts[start], ends[stop - 1]
+            text = np.frombuffer(self.ReadBytes(_column + "_bytes", first, last), dtype = np.uint8)
+
+            # The byte of every (row, character), where characters past the end of a row are 0
+            index = (starts[start:stop, None] - first) + columns
+            inside = columns < lengths[start:stop, None]
+
+            result[start:stop] = np.where(inside, text[np.minimum(index, max(0, text.shape[0] - 1))], 0)
+
+        return result.view(f"S{width}").ravel()
+
+    def Locate(self, _name):
+        """
+        Parameters:
+            - _name: The name of an array in the .npz file
+
+        Returns:
+            Where the data of the array starts in the file, its shape and its dtype. np.savez
+            stores the arrays uncompressed, so every array can be read in place
+        """
+        info = self.npz.getinfo(_name + ".npy")
+
+        if info.compress_type != zipfile.ZIP_STORED:
+            raise ValueError(f"{self.path} is compressed, save it with np.savez instead of np.savez_compressed")
+
+        with open(self.path, 'rb') as npzFile:
+            # The array starts after the local file header, its name and its extra field
+            npzFile.seek(info.header_offset + 26)
+            nameLength, extraLength = struct.unpack('<HH', npzFile.read(4))
+            npzFile.seek(info.header_offset + 30 + nameLength + extraLength)
+
+            version = np.lib.format.read_magic(npzFile)
+
+            if version == (1, 0):
+                shape, _, dtype = np.lib.format.read_array_header_1_0(npzFile)
+            else:
+                shape, _, dtype = np.lib.format.read_array_header_2_0(npzFile)
+
+            return npzFile.tell(), shape, dtype
+
+    def Read(self, _name, _keep = None, _chunk = 1 << 18):
+        """
+        Reads an array of the .npz file, a chunk of rows at a time, only copying the rows that are
+        kept out of each chunk. The whole array is never in memory next to its filtered copy.
+
+        Parameters:
+            - _name: The name of the array
+            - _keep: A boolean array of the rows to return, every row when None
+            - _chunk: The amount of rows read at once
+
+        Returns:
+            The array
+        """
+        offset, shape, dtype = self.Locate(_name)
+
+        with open(self.path, 'rb') as npzFile:
+            npzFile.seek(offset)
+
+            if _keep is None:
+                return np.fromfile(npzFile, dtype = dtype, count = shape[0])
+
+            array = np.empty(int(np.count_nonzero(_keep)), dtype = dtype)
+            filled = 0
+
+            for start in range(0, shape[0], _chunk):
+                chunk = np.fromfile(npzFile, dtype = dtype, count = min(_chunk, shape[0] - start))[_keep[start:start + _chunk]]
+
+                array[filled:filled + chunk.shape[0]] = chunk
+                filled += chunk.shape[0]
+
+        return array
+
+    def ReadBytes(self, _name, _start, _stop):
+        """
+        Parameters:
+            - _name: The name of a np.uint8 array in the .npz file
+            - _start: The first byte to read
+            - _stop: The byte to stop at
+
+        Returns:
+            The bytes between _start and _stop
+        """
+        offset, _, _ = self.Locate(_name)
+
+        with open(self.path, 'rb') as npzFile:
+            npzFile.seek(offset + int(_start))
+
+            return npzFile.read(int(_stop) - int(_start))
+
+    def Lengths(self, _column):
+        """
+        Parameters:
+            - _column: The name of a string column
+
+        Returns:
+            The amount of characters of every string in the column, from its _length column when
+            the manifest has one. The length of a byte string without one is its amount of bytes
+        """
+        lengths = self.Column(_column + "_length")
+
+        if lengths is not None:
+            return lengths
+
+        if self.IsText(_column):
+            return np.diff(self.Read(_column + "_offsets"))
+
+        return pd.Series(self.Column(_column)).str.len().to_numpy()
+
+def RewritePrefix(_paths, _old, _new, _chunk = 1 << 20):
+    """
+    Replaces the directory the paths start with, e.g. after moving a dataset to another machine.
+    Paths that don't start with _old are left as they are. Byte string arrays are rewritten as a
+    matrix of bytes and tensors with a regex that tensorflow runs over all of them, without
+    making a Python string for every path.
+
+    Parameters:
+        - _paths: A numpy array or a tf.string tensor of paths
+        - _old: The prefix to replace
+        - _new: The prefix to put in its place
+        - _chunk: The amount of rows of a byte string array rewritten at once
+
+    Returns:
+        The rewritten paths
+    """
+    if not _old or len(_paths) == 0:
+        return _paths
+
+    if isinstance(_paths, tf.Tensor):
+        return tf.strings.regex_replace(_paths, "^" + re.escape(_old), _new.replace("\\", "\\\\"))
+
+    if _paths.dtype.kind != 'S':
+        paths = pd.Series(_paths)
+        match = paths.str.startswith(_old)
+        paths[match] = _new + paths[match].str.slice(len(_old))
+
+        return paths.to_numpy()
+
+    old = np.frombuffer(_old.encode("utf-8"), dtype = np.uint8)
+    new = np.frombuffer(_new.encode("utf-8"), dtype = np.uint8)
+
+    width = _paths.dtype.itemsize
+    matrix = np.ascontiguousarray(_paths).view(np.uint8).reshape(len(_paths), width)
+
+    if old.shape[0] > width:
+        return _paths
+
+    result = np.zeros((len(_paths), max(width, width - old.shape[0] + new.shape[0])), dtype = np.uint8)
+    rest = width - old.shape[0]
+
+    for start in range(0, len(_paths), _chunk):
+        rows = matrix[start:start + _chunk]
+        out = result[start:start + _chunk]
+        match = (rows[:, :old.shape[0]] == old).all(axis = 1)
+
+        out[~match, :width] = rows[~match]
+        out[match, :new.shape[0]] = new
+        out[match, new.shape[0]:new.shape[0] + rest] = rows[match, old.shape[0]:]
+
+    return result.view(f"S{result.shape[1]}").ravel()
+
+def Write(_path, _data):
+    """
+    Writes a manifest in the format of its extension
+
+    Parameters:
+        - _path: The path to write the manifest to
+        - _data: A pandas DataFrame with the columns of the manifest
+    """
+    extension = os.path.splitext(_path)[1].lower()
+
+    if extension in NUMPY:
+        columns = {}
+
+        for name in _data.columns:
+            if _data[name].dtype == object:
+                text = _data[name].astype(str)
+                encoded = text.str.encode("utf-8")
+
+                columns[name + "_bytes"] = np.frombuffer(b"".join(encoded), dtype = np.uint8)
+                columns[name + "_offsets"] = np.concatenate([[0], np.cumsum(encoded.str.len().to_numpy(dtype = np.int64))])
+                columns[name + "_length"] = text.str.len().to_numpy(dtype = np.int32)
+            else:
+                columns[name] = _data[name].to_numpy()
+
+        np.savez(_path, **columns)
+    elif extension in PARQUET:
+        _data.to_parquet(_path, index = False)
+    elif extension in ARROW:
+        _data.reset_index(drop = True).to_feather(_path)
+    else:
+        _data.to_csv(_path, index = False)
@@ -8,6 +8,8 @@ import pandas as pd
 import tensorflow as tf
 from tensorflow import keras
 
+from Data.Features import Filterbank, SpectrogramExtractor, LOG_OFFSET
+from Data.Manifest import Manifest, RewritePrefix
 from Grab_Ini import ini
 
 class Process:
@@ -26,8 +28,24 @@ class Process:
         labelConfig            = ini().grabInfo(path, "Process.Label")
 
         self.seed              = int(generalConfig['seed'])
+        self.minDuration       = float(self.processConfig.get('min_duration', 0))
+        self.maxDuration       = float(self.processConfig.get('max_duration', 0))
+        self.maxTranscriptLength = int(self.processConfig.get('max_transcript_length', 0))
+        self.pathPrefixFrom    = self.processConfig.get('path_prefix_from', "")
+        self.pathPrefixTo      = self.processConfig.get('path_prefix_to', "")
         vocab                  = labelConfig['vocabulary']
 
+        # The filterbank matrices of the feature_type are computed once and shared by both backends
+        self.filterbank = Filterbank(self.spectrogramConfig)
+
+        # numpy arrays, which is what the API passes around, are turned into spectrograms by numpy
+        # instead of eager tensorflow ops. Tensors, like those of the datasets and the serving
+        # graphs, always stay in tensorflow
+        if self.processConfig.get('feature_backend', 'tensorflow') == 'numpy':
+            self.extractor = SpectrogramExtractor(self.spectrogramConfig)
+        else:
+            self.extractor = None
+
         characters = [x for x in vocab]
         characters.append(' ')
 
@@ -49,22 +67,71 @@ class Process:
         """
         return tf.strings.reduce_join(self.numToChar(_label)).numpy().decode("utf-8")
 
-    def LoadCSV(self, _csvPath):
+    def LoadCSV(self, _csvPath, _withSizes = False, _withSamples = False, _asTensors = False):
         """
         Loads audio files paths and transcripts from a CSV file in the form of:
             wave_filename(path to the audio file), wave_filesize, transcript
+        
+        Manifests written by Scripts/IndexDataset.py also have a duration, sample_rate and samples
+        column. When the duration is known, clips shorter than min_duration or longer than
+        max_duration in the [Process] section of the config are left out, and so are transcripts
+        longer than max_transcript_length. Paths starting with path_prefix_from are moved to
+        path_prefix_to.
+
+        The manifest can also be a .npz, .parquet or .feather file (see Data/Manifest.py), of which
+        only the needed columns are read. The columns are returned as numpy arrays, which
+        tf.data.Dataset.from_tensor_slices takes as they are. The paths and transcripts of a .npz
+        manifest are byte strings.
 
         Parameters:
             - _csvPath: The path to the CSV file
+            - _withSizes: Also return the filesize column
+            - _withSamples: Also return the samples column
+            - _asTensors: Return the paths and transcripts as tf.string tensors, which a .npz
+                          manifest makes without unpacking its strings into numpy arrays first
 
         Returns:
-            Two lists: one for audio paths and one for transcripts
+            Two arrays: one for audio paths and one for transcripts. When _withSizes is set an
+            array with the file sizes is added, and when _withSamples is set an array with the
+            amount of samples of every clip is added, or None if the csv file doesn't have them
         """
-        try:
-            data = pd.read_csv(_csvPath)
+        columns = ['filename', 'transcript']
+
+        if _withSizes:
+            columns.append('filesize')
+
+        if _withSamples:
+            columns.append('samples')
 
-            audioPath = list(data['filename'])
-            transcripts = list(data['transcript'])
+        if self.minDuration > 0 or self.maxDuration > 0:
+            columns.append('duration')
+
+        try:
+            manifest = Manifest(_csvPath, columns)
+
+            # The filters only use the numeric columns, so the rows are dropped before the
+            # string columns of a .npz manifest are even read
+            keep = None
+
+            if manifest.Has('duration') and (self.minDuration > 0 or self.maxDuration > 0):
+                duration = manifest.Column('duration')
+                keep = duration >= self.minDuration
+
+                if self.maxDuration > 0:
+                    keep &= duration <= self.maxDuration
+
+            if self.maxTranscriptLength > 0:
+                short = manifest.Lengths('transcript') <= self.maxTranscriptLength
+                keep = short if keep is None else keep & short
+
+            if _asTensors:
+                audioPath = RewritePrefix(manifest.Tensor('filename', keep), self.pathPrefixFrom, self.pathPrefixTo)
+                transcripts = manifest.Tensor('transcript', keep)
+            else:
+                audioPath = RewritePrefix(manifest.Column('filename', keep), self.pathPrefixFrom, self.pathPrefixTo)
+                transcripts = manifest.Column('transcript', keep)
+            sizes = manifest.Column('filesize', keep) if _withSizes else None
+            samples = manifest.Column('samples', keep) if _withSamples else None
         except pd.errors.EmptyDataError:
             print("Error: Empty csv file or no columns to parse")
             exit(1)
@@ -72,7 +139,49 @@ class Process:
             print("The csv file doesn't exist")
             exit(1)
 
-        return audioPath, transcripts
+        result = (audioPath, transcripts)
+
+        if _withSizes:
+            result += (sizes,)
+
+        if _withSamples:
+            result += (samples,)
+
+        return result
+
+    def EstimateFrames(self, _fileSizes):
+        """
+        Estimates how many spectrogram frames each wav file will produce from its size on disk,
+        without having to open the file. Assumes 16 bit mono PCM wav files with a standard 44
+        byte header, which is what the datasets are converted to.
+
+        Parameters:
+            - _fileSizes: A list or array of file sizes in bytes
+
+        Returns:
+            A numpy array with the estimated number of frames of each file
+        """
+        length  = int(self.spectrogramConfig['frame_length'])
+        step    = int(self.spectrogramConfig['frame_step'])
+
+        samples = (np.asarray(_fileSizes, dtype = np.int64) - 44) // 2
+
+        return np.maximum(0, 1 + (samples - length) // step)
+
+    def FrameCount(self, _samples):
+        """
+        The number of spectrogram frames an audio clip with a given number of samples produces
+
+        Parameters:
+            - _samples: An int tensor of sample counts
+
+        Returns:
+            An int32 tensor with the number of frames
+        """
+        length  = int(self.spectrogramConfig['frame_length'])
+        step    = int(self.spectrogramConfig['frame_step'])
+
+        return tf.maximum(0, 1 + (tf.cast(_samples, tf.int32) - length) // step)
     
     def LoadAudioFile(self, _file):
         """
@@ -94,32 +203,51 @@ class Process:
     # ------------------------------------------------------------------------
     #   Audio processing
     # ------------------------------------------------------------------------    
-    def NormalizeSpec(self, _spectrogram):
+    def NormalizeSpec(self, _spectrogram, _inPlace = False):
         """
-        Normalize the features of the spectrogram
+        Normalize the features of the spectrogram. Each frame is normalized across its frequency
+        bins, so this works the same on a single spectrogram or a batch of them.
 
         Parameters:
             - _spectrogram: The spectrogram to normalize
+            - _inPlace: With the numpy feature_backend, overwrite a numpy spectrogram instead of
+                        returning a new array. Only for spectrograms nothing else has a view of
 
         Returns:
             The normalized spectrogram
         """
-        means = tf.math.reduce_mean(_spectrogram, 1, keepdims = True)
-        std = tf.math.reduce_std(_spectrogram, 1, keepdims = True)
+        if self.extractor is not None and isinstance(_spectrogram, np.ndarray):
+            return self.extractor.Normalize(_spectrogram, _inPlace)
+
+        means = tf.math.reduce_mean(_spectrogram, -1, keepdims = True)
+        std = tf.math.reduce_std(_spectrogram, -1, keepdims = True)
 
         return (_spectrogram - means) / (std + 1e-10)
     
-    def Spectrogram(self, _audio):
+    def Bins(self):
+        """
+        Returns:
+            The width of the features of the feature_type, which is the input width of the model
         """
-        This method will compute the Short-Time Fourier Transform (STFT) of a given audio sample.
-        This method will convert the results into log form and normalize the results.
+        return self.filterbank.bins
+
+    def Spectrogram(self, _audio, _linear = False):
+        """
+        This method will compute the Short-Time Fourier Transform (STFT) of a given audio sample,
+        and turn it into the feature_type of the [Process.Spectrogram] section of the config.
 
         Parameters:
-            - _audio: The float tensor of the wav file
+            - _audio: The float tensor of the wav file, or a numpy array
+            - _linear: Return the linear spectrogram whatever the feature_type, which is what the
+                       VAD measures the loudness of the frames on
 
         Returns:
-            The Spectrogram of a wav file
+            The Spectrogram of a wav file, as a numpy array when the numpy feature_backend is used
+            on a numpy array
         """
+        if self.extractor is not None and isinstance(_audio, np.ndarray):
+            return self.extractor.Spectrogram(_audio, _linear)
+
         length  = int(self.spectrogramConfig['frame_length'])
         step    = int(self.spectrogramConfig['frame_step'])
         fft     = int(self.spectrogramConfig['fft'])
@@ -128,9 +256,78 @@ class Process:
 
         spectrogram = tf.signal.stft(audio, frame_length = length, frame_step = step, fft_length = fft)
         spectrogram = tf.abs(spectrogram)
-        spectrogram = tf.math.pow(spectrogram, 0.5)
 
-        return spectrogram
+        if _linear or self.filterbank.type == "linear":
+            return tf.math.pow(spectrogram, 0.5)
+
+        return self.FromMagnitude(spectrogram)
+
+    def FromMagnitude(self, _magnitude):
+        """
+        Parameters:
+            - _magnitude: A tensor of STFT magnitudes
+
+        Returns:
+            The features of the feature_type
+        """
+        if self.filterbank.type == "mel":
+            return tf.math.sqrt(tf.tensordot(_magnitude, self.filterbank.mel, 1))
+
+        features = tf.math.log(tf.tensordot(tf.math.square(_magnitude), self.filterbank.mel, 1) + LOG_OFFSET)
+
+        if self.filterbank.type == "mfcc":
+            features = tf.tensordot(features, self.filterbank.dct, 1)
+
+        return features
+
+    def Features(self, _linear):
+        """
+        Turns a linear spectrogram into the features of the feature_type, for the VAD which needs
+        the linear spectrogram first
+
+        Parameters:
+            - _linear: A spectrogram from Spectrogram(_linear = True)
+
+        Returns:
+            The features of the feature_type
+        """
+        if self.filterbank.type == "linear":
+            return _linear
+
+        if self.extractor is not None and isinstance(_linear, np.ndarray):
+            return self.extractor.FromLinear(_linear)
+
+        return self.FromMagnitude(tf.math.square(_linear))
+
+    def StreamSpectrogram(self, _pending, _audio, _linear = False):
+        """
+        Computes the spectrogram frames of a chunk of audio that is part of a longer stream. Only
+        complete frames are computed; the samples that still belong to later frames (at least the
+        frame_length - frame_step overlap) are handed back so they can be prepended to the next
+        chunk. The concatenated frames of every chunk are identical to calling Spectrogram on the
+        whole stream at once.
+
+        Parameters:
+            - _pending: The samples left over from the previous chunk
+            - _audio: The new chunk of audio
+            - _linear: Return the linear spectrogram whatever the feature_type, for the VAD
+
+        Returns:
+            The spectrogram of the complete frames, and the samples left over for the next chunk
+        """
+        length  = int(self.spectrogramConfig['frame_length'])
+        step    = int(self.spectrogramConfig['frame_step'])
+
+        audio = np.concatenate([_pending, np.asarray(_audio, dtype = np.float32)])
+
+        if audio.shape[0] < length:
+            return np.zeros((0, self.Bins()), dtype = np.float32), audio
+
+        frames = 1 + (audio.shape[0] - length) // step
+
+        spectrogram = self.Spectrogram(audio[:(frames - 1) * step + length], _linear)
+
+        return np.asarray(spectrogram), audio[frames * step:]
 
     # ------------------------------------------------------------------------
     #   Transcript processing
@@ -0,0 +1,143 @@
+# Lucas Davis
+
+import os
+import sys
+import numpy as np
+
+from Data.Process import Process
+from Grab_Ini import ini
+
+class VAD:
+    """
+    Finds the frames of a spectrogram that hold speech, so the silence before and after the
+    player speaks, and optionally the pauses in between, never reach the model.
+
+    A frame counts as speech when it is loud enough and not too flat. Its loudness is the level
+    of its samples in dBFS, recovered from the spectrogram with Parseval's theorem, and it has to
+    be threshold_db above the noise floor of the clip (its quietest frames) as well as above
+    silence_db. The spectral flatness (the geometric over the arithmetic mean of the power
+    spectrum) is close to 1 for broadband noise and much lower for voiced speech.
+    """
+    def __init__(self, process: Process, _split = None):
+        """
+        Parameters:
+            - process: A Process instance, the spectrogram config is taken from it
+            - _split: Split the speech at long pauses into segments. Defaults to the config
+        """
+        if getattr(sys, 'frozen', False):
+            path = os.path.join(os.path.dirname(sys.executable), "config.ini")
+        else:
+            path = "config.ini"
+
+        vadConfig = ini().grabInfo(path, "Inference.VAD")
+
+        length     = int(process.spectrogramConfig['frame_length'])
+        step       = int(process.spectrogramConfig['frame_step'])
+        sampleRate = int(process.spectrogramConfig.get('sample_rate', 16000))
+
+        self.fft = int(process.spectrogramConfig['fft'])
+
+        self.silence   = float(vadConfig['silence_db'])
+        self.threshold = float(vadConfig['threshold_db'])
+        self.range     = float(vadConfig['range_db'])
+        self.flatness  = float(vadConfig['max_flatness'])
+        self.split     = eval(vadConfig['split']) if _split is None else _split
+
+        # The config is in milliseconds, a frame starts every step samples
+        toFrames = lambda milliseconds: int(round(milliseconds / 1000 * sampleRate / step))
+
+        self.padding   = toFrames(float(vadConfig['padding_ms']))
+        self.minSpeech = toFrames(float(vadConfig['min_speech_ms']))
+        self.minPause  = toFrames(float(vadConfig['min_pause_ms']))
+
+        # tf.signal.stft uses a periodic hann window
+        window = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(length) / length)
+        self.windowPower = float(np.sum(window ** 2))
+
+    def Features(self, _spectrogram):
+        """
+        Parameters:
+            - _spectrogram: A spectrogram from Process.Spectrogram(_linear = True), before it is
+                            normalized
+
+        Returns:
+            The level of every frame in dBFS and its spectral flatness between 0 and 1
+        """
+        # The spectrogram holds the square root of the magnitudes
+        power = np.square(np.square(np.asarray(_spectrogram, dtype = np.float64)))
+
+        # Parseval: the one sided bins other than DC and Nyquist stand for two bins each
+        total = 2 * power.sum(axis = 1) - power[:, 0] - power[:, -1]
+        meanSquare = total / (self.fft * self.windowPower)
+
+        level = 10 * np.log10(meanSquare + 1e-12)
+
+        bins = power[:, 1:] + 1e-12
+        flatness = np.exp(np.log(bins).mean(axis = 1)) / bins.mean(axis = 1)
+
+        return level, flatness
+
+    def Voiced(self, _spectrogram):
+        """
+        Parameters:
+            - _spectrogram: A spectrogram from Process.Spectrogram(_linear = True), before it is
+                            normalized
+
+        Returns:
+            A boolean array marking the frames that hold speech
+        """
+        level, flatness = self.Features(_spectrogram)
+
+        if level.shape[0] == 0:
+            return np.zeros(0, dtype = bool)
+
+        # A clip that is speech from start to end has no quiet frames to take the floor from, so
+        # the threshold is never more than range_db below the loudest frame
+        floor = np.percentile(level, 10)
+        threshold = max(self.silence, min(floor + self.threshold, level.max() - self.range))
+
+        return (level > threshold) & (flatness < self.flatness)
+
+    def Segments(self, _spectrogram):
+        """
+        Finds the speech in a spectrogram. Every segment is padded by padding_ms on both sides so
+        the start and end of words aren't cut off.
+
+        Parameters:
+            - _spectrogram: A spectrogram from Process.Spectrogram(_linear = True), before it is
+                            normalized
+
+        Returns:
+            A list of (start, end) frame ranges, or an empty list when the clip is silent
+        """
+        voiced = self.Voiced(_spectrogram)
+        frames = np.flatnonzero(voiced)
+
+        if frames.shape[0] < max(1, self.minSpeech):
+            return []
+
+        if self.split:
+            # A new segment starts after every pause of at least min_pause_ms
+            breaks = np.flatnonzero(np.diff(frames) > self.minPause)
+            starts = np.concatenate([frames[:1], frames[breaks + 1]])
+            ends = np.concatenate([frames[breaks], frames[-1:]]) + 1
+        else:
+            starts, ends = frames[:1], frames[-1:] + 1
+
+        segments = []
+
+        for start, end in zip(starts, ends):
+            # Short bursts, like a click or a knock, aren't speech
+            if self.split and voiced[start:end].sum() < self.minSpeech:
+                continue
+
+            start = max(0, start - self.padding)
+            end = min(voiced.shape[0], end + self.padding)
+
+            # The padding of neighbouring segments can overlap
+            if segments and start <= segments[-1][1]:
+                segments[-1] = (segments[-1][0], int(end))
+            else:
+                segments.append((int(start), int(end)))
+
+        return segments
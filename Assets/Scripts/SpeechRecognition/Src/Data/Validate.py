@@ -7,6 +7,14 @@ from Data.Process import Process
 
 from Grab_Ini import ini
 
+# What the rows of the spectrogram are for every feature_type
+AXIS_LABELS = {
+    "linear":  "Frequency Bins",
+    "mel":     "Mel Frequency Bins",
+    "log-mel": "Mel Frequency Bins",
+    "mfcc":    "MFCC"
+}
+
 class Validate:
     def __init__(self, process: Process):
         self.process = process
@@ -29,9 +37,9 @@ class Validate:
         plt.figure(figsize=(25, 10))
         plt.imshow(spectrogram, aspect = 'auto', origin = 'lower', cmap = 'jet')
         plt.colorbar(format='%+2.0f dB')
-        plt.title(f"Spectrogram")
+        plt.title(f"Spectrogram ({self.process.filterbank.type})")
         plt.xlabel('Frames')
-        plt.ylabel('Mel Frequency Bins')
+        plt.ylabel(AXIS_LABELS[self.process.filterbank.type])
 
         plt.show()
     
@@ -9,8 +9,16 @@ from tensorflow.keras.ops import ctc_decode
 from tensorflow.keras.regularizers import l2
 import numpy as np
 
+from Model.RowConv import RowConv
+from Model.Masking import LengthMask, MaskedLogits
+from Grab_Ini import ini
+
+ARCHITECTURES = ("deepspeech2", "streaming")
+CELLS = ("gru", "lstm")
+STRIDES = (1, 2, 4, 8)
+
 class ASRModel():
-    def BuildModel(_shape, _numClasses):
+    def BuildModel(_shape, _numClasses, _masking = True):
         """
         Disclaimer:
             This Model's architecture was derived from the deepspeech 2 documentation & its github page found at:
@@ -21,60 +29,350 @@ class ASRModel():
             bellow is the link to it as well:
                 https://github.com/NVIDIA/OpenSeq2Seq/blob/master/LICENSE
 
-        The described architecture was converted to a keras sequential model
+        The described architecture was converted to a keras model
 
         Parameters:
             - _shape: This is the shape of the MFCC features
             - _numClasses: This is the number of output classes that the predictions should have.
+            - _masking: Mask the time steps of the zero padding of a batch, so the recurrent layers
+                        skip them and the CTC loss only counts the time steps of every clip
 
         Returns:
-            A Keras sequential model following the deepspeech 2 model architecture
-        """
-        model = keras.Sequential()
-
-        model.add(layers.Input((None, _shape)))
-        model.add(layers.Reshape((-1, _shape, 1)))            
-
-        model.add(layers.Conv2D(
-            filters            = 32,
-            kernel_size        = [11, 41],
-            strides            = [2, 2],
-            padding            = 'same',
-            use_bias           = False,
-            kernel_regularizer = l2(0.0005)
-        ))
-        model.add(layers.BatchNormalization())
-        model.add(layers.ReLU())
-        
-        model.add(layers.Conv2D(
-            filters            = 32,
-            kernel_size        = [11, 41],
-            strides            = [2, 2],
-            padding            = 'same',
-            use_bias           = False,
-            kernel_regularizer = l2(0.0005)
-        ))
-        model.add(layers.BatchNormalization())
-        model.add(layers.ReLU())
-
-        model.add(layers.Reshape((-1, model.output_shape[-2] * model.output_shape[-1])))
+            A Keras model following the deepspeech 2 model architecture
+        """
+        inputs = layers.Input((None, _shape))
+        x = layers.Reshape((-1, _shape, 1))(inputs)
+
+        for _ in range(2):
+            x = layers.Conv2D(
+                filters            = 32,
+                kernel_size        = [11, 41],
+                strides            = [2, 2],
+                padding            = 'same',
+                use_bias           = False,
+                kernel_regularizer = l2(0.0005)
+            )(x)
+            x = layers.BatchNormalization()(x)
+            x = layers.ReLU()(x)
+
+        x = layers.Reshape((-1, x.shape[-2] * x.shape[-1]))(x)
+
+        if _masking:
+            x = LengthMask(4)([x, inputs])
 
         for i in range(1, 5 + 1):
-            model.add(layers.Bidirectional(layers.GRU(units = 512, return_sequences = True)))
+            x = layers.Bidirectional(layers.GRU(units = 512, return_sequences = True))(x)
+
+            if i < 5:
+                x = layers.Dropout(0.5)(x)
+
+        x = layers.Dense(units = 1024)(x)
+        x = layers.ReLU()(x)
+        x = layers.Dropout(0.5)(x)
+
+        # The logits stay float32 under mixed precision, the CTC loss and the decoders need them
+        # to be accurate
+        x = layers.Dense(units = _numClasses + 1, dtype = "float32")(x)
+
+        if _masking:
+            x = MaskedLogits(dtype = "float32")(x)
+
+        return keras.Model(inputs, x)
+
+    def BuildStreamingModel(_shape, _numClasses, _cell = "gru", _layers = 3, _units = 256, _lookahead = 2,
+                            _stride = 4, _filters = 32, _dropout = 0.3, _masking = True):
+        """
+        A smaller variant of BuildModel for low latency serving. The recurrent layers only run
+        forwards, so every output frame depends on the audio up to it and the lookahead frames of
+        a RowConv after them, instead of on the whole utterance. The two convolutions in front of
+        them cut the frame rate by _stride, so the recurrent stack has fewer steps to run.
+
+        Parameters:
+            - _shape: The amount of frequency bins of the spectrogram
+            - _numClasses: This is the number of output classes that the predictions should have.
+            - _cell: gru or lstm
+            - _layers: The amount of recurrent layers
+            - _units: The width of the recurrent layers and the dense layer after them
+            - _lookahead: How many future frames, after downsampling, the RowConv sees. 0 leaves
+                          it out
+            - _stride: How much the frame rate is cut before the recurrent stack, one of STRIDES
+            - _filters: The amount of filters of both convolutions
+            - _dropout: The dropout after every recurrent layer
+            - _masking: Mask the time steps of the zero padding of a batch, see BuildModel
 
-            if i < 5:                     
-                model.add(layers.Dropout(0.5))
+        Returns:
+            A Keras model
+        """
+        if _cell not in CELLS:
+            raise ValueError(f"Unknown cell {_cell}, expected one of {CELLS}")
+
+        if _stride not in STRIDES:
+            raise ValueError(f"Unsupported stride {_stride}, expected one of {STRIDES}")
+
+        # The stride is split over both convolutions, the first one never strides more than 2
+        timeStrides = [min(_stride, 2), _stride // min(_stride, 2)]
+
+        inputs = layers.Input((None, _shape))
+        x = layers.Reshape((-1, _shape, 1))(inputs)
+
+        for timeStride in timeStrides:
+            x = layers.Conv2D(
+                filters            = _filters,
+                kernel_size        = [5, 21],
+                strides            = [timeStride, 2],
+                padding            = 'same',
+                use_bias           = False,
+                kernel_regularizer = l2(0.0005)
+            )(x)
+            x = layers.BatchNormalization()(x)
+            x = layers.ReLU()(x)
+
+        x = layers.Reshape((-1, x.shape[-2] * x.shape[-1]))(x)
+
+        if _masking:
+            x = LengthMask(_stride)([x, inputs])
+
+        recurrent = layers.GRU if _cell == "gru" else layers.LSTM
+
+        for _ in range(_layers):
+            x = recurrent(units = _units, return_sequences = True)(x)
+            x = layers.Dropout(_dropout)(x)
+
+        if _lookahead > 0:
+            x = RowConv(_lookahead)(x)
+
+        x = layers.Dense(units = _units)(x)
+        x = layers.ReLU()(x)
+
+        x = layers.Dense(units = _numClasses + 1, dtype = "float32")(x)
+
+        if _masking:
+            x = MaskedLogits(dtype = "float32")(x)
+
+        return keras.Model(inputs, x)
+
+    def Build(_shape, _numClasses, _modelConfig = None):
+        """
+        Builds the architecture picked in the [Model] section of the config.ini
 
-        model.add(layers.Dense(units = 1024))
-        model.add(layers.ReLU())
-        model.add(layers.Dropout(0.5))
+        Parameters:
+            - _shape: The amount of frequency bins of the spectrogram
+            - _numClasses: This is the number of output classes that the predictions should have.
+            - _modelConfig: The [Model] section, read from the config.ini when omitted
+
+        Returns:
+            The model built by BuildModel or BuildStreamingModel
+        """
+        if _modelConfig is None:
+            _modelConfig = ini().grabInfo("config.ini", "Model")
+
+        architecture = str(_modelConfig.get('architecture', 'deepspeech2'))
+
+        if architecture not in ARCHITECTURES:
+            raise ValueError(f"Unknown architecture {architecture}, expected one of {ARCHITECTURES}")
+
+        masking = eval(str(_modelConfig.get('masking', True)))
+
+        if architecture == "deepspeech2":
+            return ASRModel.BuildModel(_shape, _numClasses, masking)
+
+        return ASRModel.BuildStreamingModel(
+            _shape,
+            _numClasses,
+            _cell      = str(_modelConfig.get('cell', 'gru')),
+            _layers    = int(_modelConfig.get('layers', 3)),
+            _units     = int(_modelConfig.get('units', 256)),
+            _lookahead = int(_modelConfig.get('lookahead', 2)),
+            _stride    = int(_modelConfig.get('stride', 4)),
+            _filters   = int(_modelConfig.get('filters', 32)),
+            _dropout   = float(_modelConfig.get('dropout', 0.3)),
+            _masking   = masking
+        )
+
+    def TimeStride(_model):
+        """
+        Parameters:
+            - _model: A keras model, or a LiteModel or GraphModel export
+
+        Returns:
+            How many spectrogram frames make up one time step of the models logits. For a keras
+            model it is read from the strides of its convolutions, an export is run once on a
+            short silent spectrogram instead
+        """
+        if hasattr(_model, "layers"):
+            stride = 1
+
+            for layer in _model.layers:
+                if isinstance(layer, (layers.Conv1D, layers.Conv2D)):
+                    stride *= layer.strides[0]
+
+            return stride
+
+        frames = 64
+        logits = _model(np.zeros((1, frames, _model.input_shape[-1]), dtype = np.float32), training = False)
+
+        return frames // int(logits.shape[1])
+
+    def SupportsBfloat16():
+        """
+        Returns:
+            True if the cpu has bfloat16 instructions (AVX512_BF16 or AMX), which is only known
+            on Linux
+        """
+        try:
+            with open("/proc/cpuinfo", 'r') as cpuInfo:
+                flags = cpuInfo.read()
+        except OSError:
+            return False
+
+        return "avx512_bf16" in flags or "amx_bf16" in flags
+
+    def SetPrecision(_policy):
+        """
+        Sets the dtype policy every layer built afterwards uses. It has to be set before the
+        model is built or loaded.
+
+        Parameters:
+            - _policy: float32, mixed_bfloat16, mixed_float16, or auto. Auto uses mixed_float16 on
+                       a GPU, mixed_bfloat16 on a cpu with bfloat16 instructions and float32
+                       otherwise
+
+        Returns:
+            The name of the policy that was set
+        """
+        if _policy == "auto":
+            if tf.config.list_physical_devices('GPU'):
+                _policy = "mixed_float16"
+            elif ASRModel.SupportsBfloat16():
+                _policy = "mixed_bfloat16"
+            else:
+                _policy = "float32"
 
-        model.add(layers.Dense(units = _numClasses + 1))
+        keras.mixed_precision.set_global_policy(_policy)
 
-        return model
+        return _policy
+
+    def Compile(_model, _learningRate, _jitCompile = False, _lossScale = True):
+        """
+        Compiles the model with Adam and the CTC loss. With a mixed precision policy the loss is
+        scaled, so the small gradients of the float16 or bfloat16 layers don't underflow to zero.
+
+        Parameters:
+            - _model: The model built by BuildModel
+            - _learningRate: The learning rate or a learning rate schedule
+            - _jitCompile: Compile the training step, the model and the CTC loss together, with XLA
+            - _lossScale: Scale the loss when the model uses mixed precision
+
+        Returns:
+            The model
+        """
+        optimizer = keras.optimizers.Adam(learning_rate = _learningRate)
+
+        if _lossScale and _model.dtype_policy.compute_dtype != "float32":
+            optimizer = keras.optimizers.LossScaleOptimizer(optimizer)
+
+        _model.compile(
+            optimizer   = optimizer,
+            loss        = CTCLoss(),
+            jit_compile = _jitCompile
+        )
+
+        return _model
+
+    def Strategy(_name, _cpuReplicas = 1):
+        """
+        Creates the tf.distribute strategy the model is trained with. It has to be created before
+        tensorflow runs anything else, since it configures the devices and the cluster.
+
+        Parameters:
+            - _name: none, mirrored or multi_worker. mirrored trains on every GPU of this machine,
+                     or on _cpuReplicas logical cpus when it has none. multi_worker trains on
+                     every worker process of the cluster described by the TF_CONFIG environment
+                     variable
+            - _cpuReplicas: The amount of replicas the cpu is split into for mirrored
+
+        Returns:
+            The strategy, or the default strategy for none
+        """
+        if _name == "multi_worker":
+            return tf.distribute.MultiWorkerMirroredStrategy()
+
+        if _name == "mirrored":
+            if not tf.config.list_physical_devices('GPU') and _cpuReplicas > 1:
+                cpu = tf.config.list_physical_devices('CPU')[0]
+                tf.config.set_logical_device_configuration(cpu, [tf.config.LogicalDeviceConfiguration()] * _cpuReplicas)
+
+                return tf.distribute.MirroredStrategy([f"/cpu:{i}" for i in range(_cpuReplicas)])
+
+            return tf.distribute.MirroredStrategy()
+
+        return tf.distribute.get_strategy()
+
+    def IsChief(_strategy):
+        """
+        Parameters:
+            - _strategy: The strategy the model is trained with
+
+        Returns:
+            True if this process is the one that saves checkpoints and figures, the chief of the
+            cluster or the first worker when there is no chief. Always True without a cluster
+        """
+        resolver = getattr(_strategy, "cluster_resolver", None)
+
+        if resolver is None or resolver.task_type is None:
+            return True
+
+        if resolver.task_type == "chief":
+            return True
+
+        return resolver.task_type == "worker" and resolver.task_id == 0 and "chief" not in resolver.cluster_spec().as_dict()
+
+    def Distribute(_model, _strategy):
+        """
+        Keras 3 can't fit with a MultiWorkerMirroredStrategy on its own. Before training it
+        reduces the first batch of data across the workers, which only works within a single
+        process, and after every step it reduces the logged loss along a batch axis the loss
+        doesn't have. The model is already built by then, so keras is made to take the strategy
+        from the scope fit is called in instead of reducing the first batch, and the logs of every
+        step get a batch axis of 1. The logs of every epoch are read from the metrics, which are
+        aggregated across the workers. Other strategies are left as they are.
+
+        Parameters:
+            - _model: The compiled model, built in the scope of the strategy
+            - _strategy: The strategy the model is trained with
+
+        Returns:
+            The model, which has to be fit in the scope of the strategy
+        """
+        if not isinstance(_strategy, tf.distribute.MultiWorkerMirroredStrategy):
+            return _model
+
+        trainStep, testStep = _model.train_step, _model.test_step
+
+        _model.train_step = lambda data: {name: tf.reshape(value, [1]) for name, value in trainStep(data).items()}
+        _model.test_step = lambda data: {name: tf.reshape(value, [1]) for name, value in testStep(data).items()}
+        _model._distribute_strategy = None
+
+        return _model
+
+    def LogitLengths(_logits):
+        """
+        Parameters:
+            - _logits: The models output in the shape of (batch, time, classes)
+
+        Returns:
+            The valid time steps of every row, read from the mask of a model built with masking,
+            or the full length of the logits when they have no mask
+        """
+        mask = getattr(_logits, "_keras_mask", None)
+
+        if mask is None:
+            return tf.fill(tf.shape(_logits)[:1], tf.shape(_logits)[1])
+
+        return tf.reduce_sum(tf.cast(mask, tf.int32), axis = -1)
 
     @register_keras_serializable(name = "ctcloss")
-    def ctcloss(_yTrue, _yPred):
+    def ctcloss(_yTrue, _yPred, _logitLengths = None):
         """
         CTC Loss using TensorFlow's `tf.nn.ctc_loss`.
 
@@ -85,14 +383,21 @@ class ASRModel():
         Parameters:
             - _yTrue: Ground truth labels (sparse representation).
             - _yPred: Model predictions (logits).
+            - _logitLengths: The valid time steps of every row of the logits, see LogitLengths.
+                             Defaults to the lengths of the mask of the logits
 
         Returns:
-            Returns the mean of the computed CTC loss across the batch
+            Returns the mean of the computed CTC loss across the batch. Under a distribution
+            strategy this is the mean across the global batch, scaled the way keras expects
         """
+        if _logitLengths is None:
+            _logitLengths = ASRModel.LogitLengths(_yPred)
+
+        _yPred = tf.cast(_yPred, tf.float32)
+
         batchSize = tf.shape(_yPred)[0]
-        timeSteps = tf.shape(_yPred)[1]
 
-        inputLength = tf.fill([batchSize], timeSteps)
+        inputLength = tf.cast(_logitLengths, tf.int32)
         labelLength = tf.reduce_sum(tf.cast(_yTrue != 0, tf.int32), axis = -1)
 
         _yTrue = tf.cast(_yTrue, tf.int32)
@@ -106,22 +411,74 @@ class ASRModel():
             blank_index       = -1
         )
 
-        return tf.reduce_mean(loss)
+        replica = tf.distribute.get_replica_context()
+
+        if replica is None or replica.num_replicas_in_sync == 1:
+            return tf.reduce_mean(loss)
+
+        # Keras divides the loss of every replica by the amount of replicas and sums their
+        # gradients, which is only the global mean when every replica got the same amount of
+        # samples. With bucketing and the last batch of an epoch they don't, so the sum of each
+        # replica is divided by the size of the global batch instead
+        globalBatch = replica.all_reduce(tf.distribute.ReduceOp.SUM, tf.cast(batchSize, tf.float32))
+
+        return tf.reduce_sum(loss) * replica.num_replicas_in_sync / tf.maximum(globalBatch, 1.0)
+
+    def OutputLength(_frames, _stride = 4):
+        """
+        Computes how many time steps the model outputs for a spectrogram with a given amount of
+        frames. The convolutions use 'same' padding, so each one divides the frame count by its
+        stride while rounding up.
+
+        Parameters:
+            - _frames: The number of spectrogram frames, either an int or an array of ints
+            - _stride: The time stride of the model, see TimeStride. BuildModel's is 4
+
+        Returns:
+            The number of time steps in the models logits
+        """
+        return (_frames + _stride - 1) // _stride
 
     @register_keras_serializable(name = "ctcDecoder")
-    def ctcDecoder(_logits):
+    def ctcDecoder(_logits, _lengths = None):
         """
+        Greedy CTC decoding of the models logits.
 
         Parameters:
-            - _logits:
+            - _logits: The models output in the shape of (batch, time, classes)
+            - _lengths: Optional valid time steps of each item in the batch. When the batch was
+                        padded this stops the decoder from reading into the padding. Defaults to
+                        the lengths of the mask of the logits, or their full length without one.
 
         Returns:
             A list of the decoded sequence
         """
+        if _lengths is None:
+            _lengths = ASRModel.LogitLengths(_logits)
+
         decoded = ctc_decode (
             _logits,
-            np.ones(_logits.shape[0]) * _logits.shape[1],
+            _lengths,
             strategy = 'greedy'
         )[0][0]
 
-        return decoded
\ No newline at end of file
+        return decoded
+
+@register_keras_serializable(name = "CTCLoss")
+class CTCLoss(keras.losses.Loss):
+    """
+    ASRModel.ctcloss as a keras Loss, which is what ASRModel.Compile trains with. Keras weights a
+    loss by the mask of the logits as if it had one value per time step, while the CTC loss has one
+    per clip. The mask is handed to ctcloss as the logit lengths instead.
+    """
+    def __init__(self, name = "ctcloss", **kwargs):
+        super().__init__(name = name, **kwargs)
+
+    def __call__(self, y_true, y_pred, sample_weight = None):
+        # A tuple has no mask for keras to apply
+        return super().__call__(y_true, (y_pred, ASRModel.LogitLengths(y_pred)), sample_weight)
+
+    def call(self, y_true, y_pred):
+        logits, lengths = y_pred
+
+        return ASRModel.ctcloss(y_true, logits, lengths)
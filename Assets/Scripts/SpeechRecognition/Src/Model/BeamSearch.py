@@ -0,0 +1,262 @@
+# Lucas Davis
+
+import os
+import sys
+import numpy as np
+
+from Data.Process import Process
+from Model.LanguageModel import LanguageModel
+from Grab_Ini import ini
+
+class BeamSearch:
+    """
+    CTC prefix beam search over the models output, optionally guided by an n-gram language model.
+
+    Every frame, each beam is extended by every character that is likely enough in that frame.
+    The extensions of all beams are scored together as one (beams, characters) array, and only
+    the best beam width prefixes are kept. With a language model, a prefix's score is its CTC
+    probability plus alpha times its language model probability plus beta for every word (or
+    character for a character model) in it.
+    """
+    def __init__(self, process: Process, _beamWidth = None, _languageModel = None):
+        """
+        Parameters:
+            - process: A Process instance, used to convert the labels into characters
+            - _beamWidth: The number of prefixes kept every frame. Defaults to the config
+            - _languageModel: A LanguageModel. Defaults to the one in the config, if any
+        """
+        if getattr(sys, 'frozen', False):
+            path = os.path.join(os.path.dirname(sys.executable), "config.ini")
+        else:
+            path = "config.ini"
+
+        decoderConfig = ini().grabInfo(path, "Decoder")
+
+        self.process = process
+        self.beamWidth = _beamWidth or int(decoderConfig['beam_width'])
+        self.prune = float(decoderConfig['char_prune'])
+        self.alpha = float(decoderConfig['lm_alpha'])
+        self.beta = float(decoderConfig['lm_beta'])
+
+        if _languageModel is None and decoderConfig.get('path_to_lm'):
+            _languageModel = LanguageModel(decoderConfig['path_to_lm'], decoderConfig['lm_unit'])
+
+        self.languageModel = _languageModel
+
+        self.vocabulary = self.process.charToNum.get_vocabulary()
+        self.space = self.vocabulary.index(" ")
+
+        if self.languageModel is not None and self.languageModel.unit == "char":
+            self.tokens = self.languageModel.Encode(self.vocabulary)
+
+        # Every start of a word the language model knows
+        self.lexicon = set()
+
+        if self.languageModel is not None and self.languageModel.unit == "word":
+            for word in self.languageModel.vocabulary:
+                self.lexicon.update(word[:i] for i in range(len(word) + 1))
+
+    def DecodeBatch(self, _logits, _lengths = None):
+        """
+        Parameters:
+            - _logits: The models output in the shape of (batch, time, classes)
+            - _lengths: Optional valid time steps of each item in the batch. Defaults to the full
+                        length of the logits
+
+        Returns:
+            A list of strings, one transcript per item in the batch
+        """
+        logits = np.asarray(_logits)
+
+        if _lengths is None:
+            _lengths = np.full(logits.shape[0], logits.shape[1])
+
+        return [self.Decode(item[:int(length)]) for item, length in zip(logits, _lengths)]
+
+    def Decode(self, _logits):
+        """
+        Parameters:
+            - _logits: The models output for a single utterance in the shape of (time, classes)
+
+        Returns:
+            The transcript of the best prefix
+        """
+        logits = np.asarray(_logits, dtype = np.float64)
+        logits = logits - logits.max(axis = -1, keepdims = True)
+        logProbs = logits - np.log(np.exp(logits).sum(axis = -1, keepdims = True))
+
+        classes = logProbs.shape[-1]
+        blank = classes - 1
+
+        # The beams, as parallel lists and arrays: the label of each prefix, its probability of
+        # ending in a blank and in a character, its language model score and state
+        prefixes = [()]
+        blankProb = np.zeros(1)
+        charProb = np.full(1, -np.inf)
+        lmScore = np.zeros(1)
+        lmState = np.array([self.languageModel.start if self.languageModel else 0], dtype = np.int64)
+
+        for frame in logProbs:
+            # The characters worth extending with this frame, never the blank or the oov label
+            candidates = np.flatnonzero(frame[:blank] >= frame.max() - self.prune)
+            candidates = candidates[candidates != 0]
+
+            position = np.full(classes, -1, dtype = np.int64)
+            position[candidates] = np.arange(len(candidates))
+
+            total = np.logaddexp(blankProb, charProb)
+            last = np.array([prefix[-1] if prefix else blank for prefix in prefixes], dtype = np.int64)
+
+            # Staying on the same prefix: a blank, or the last character repeated
+            newBlank = total + frame[blank]
+            newChar = np.where(last != blank, charProb + frame[last], -np.inf)
+
+            # Extending the prefix: a repeated character needs a blank in between
+            extend = np.where(last[:, np.newaxis] == candidates, blankProb[:, np.newaxis], total[:, np.newaxis])
+            extend = extend + frame[candidates]
+
+            bonus, states = self.LanguageScore(prefixes, lmState, candidates)
+
+            # An extension that is already one of the beams is merged into it
+            index = {prefix: i for i, prefix in enumerate(prefixes)}
+            parents = np.array([index.get(prefix[:-1], -1) if prefix else -1 for prefix in prefixes], dtype = np.int64)
+
+            merge = np.flatnonzero((parents >= 0) & (position[last] >= 0))
+
+            if len(merge):
+                rows, columns = parents[merge], position[last[merge]]
+
+                newChar[merge] = np.logaddexp(newChar[merge], extend[rows, columns])
+                extend[rows, columns] = -np.inf
+
+            # Keep the best beam width prefixes out of the stays and the extensions
+            scores = np.concatenate([np.logaddexp(newBlank, newChar) + lmScore, (extend + lmScore[:, np.newaxis] + bonus).ravel()])
+            keep = np.flatnonzero(np.isfinite(scores))
+
+            if len(keep) > self.beamWidth:
+                keep = keep[np.argpartition(-scores[keep], self.beamWidth - 1)[:self.beamWidth]]
+
+            beams = len(prefixes)
+            stays, extensions = keep[keep < beams], keep[keep >= beams] - beams
+            rows, columns = np.divmod(extensions, len(candidates)) if len(candidates) else (extensions, extensions)
+
+            prefixes = [prefixes[i] for i in stays] + [prefixes[r] + (int(candidates[c]),) for r, c in zip(rows, columns)]
+
+            blankProb = np.concatenate([newBlank[stays], np.full(len(extensions), -np.inf)])
+            charProb = np.concatenate([newChar[stays], extend[rows, columns]])
+            lmScore = np.concatenate([lmScore[stays], lmScore[rows] + bonus[rows, columns]])
+            lmState = np.concatenate([lmState[stays], states[rows, columns]])
+
+        scores = np.logaddexp(blankProb, charProb) + lmScore + self.FinalScore(prefixes, lmState)
+
+        return "".join(self.vocabulary[c] for c in prefixes[int(np.argmax(scores))])
+
+    def LanguageScore(self, _prefixes, _states, _candidates):
+        """
+        Scores every extension of every beam with the language model
+
+        Parameters:
+            - _prefixes: The label of each beam
+            - _states: The language model state of each beam
+            - _candidates: The characters the beams are extended with
+
+        Returns:
+            The weighted language model score of each extension and its new state, both in the
+            shape of (beams, candidates)
+        """
+        shape = (len(_prefixes), len(_candidates))
+
+        bonus = np.zeros(shape)
+        states = np.repeat(_states[:, np.newaxis], len(_candidates), axis = 1)
+
+        if self.languageModel is None:
+            return bonus, states
+
+        if self.languageModel.unit == "char":
+            scores, nextStates = self.languageModel.Score(states.ravel(), np.tile(self.tokens[_candidates], len(_prefixes)))
+
+            return self.alpha * scores.reshape(shape) + self.beta, nextStates.reshape(shape)
+
+        # A word model scores a word once a space finishes it. Until then a partial word that
+        # stops being the start of any known word pays the unknown word penalty straight away,
+        # otherwise beams could put off the penalty by never emitting a space.
+        partials = [self.PartialWord(prefix) for prefix in _prefixes]
+
+        for column, char in enumerate(_candidates):
+            if char == self.space:
+                finished = np.array([bool(partial) for partial in partials])
+
+                if finished.any():
+                    bonus[finished, column], states[finished, column] = self.WordScore(
+                        [partial for partial in partials if partial], _states[finished]
+                    )
+            else:
+                for row, partial in enumerate(partials):
+                    if partial in self.lexicon and partial + self.vocabulary[char] not in self.lexicon:
+                        bonus[row, column] = self.alpha * self.languageModel.unknownScore
+
+        return bonus, states
+
+    def WordScore(self, _words, _states):
+        """
+        Parameters:
+            - _words: A list of finished words
+            - _states: The language model state before each word
+
+        Returns:
+            The weighted language model score of each word and the state after it. Unknown words
+            only get beta, they already paid the penalty when they left the lexicon
+        """
+        scores, nextStates = self.languageModel.Score(_states, self.languageModel.Encode(_words))
+        known = np.array([word in self.languageModel.vocabulary for word in _words])
+
+        return np.where(known, self.alpha * scores, 0.0) + self.beta, nextStates
+
+    def FinalScore(self, _prefixes, _states):
+        """
+        Scores the end of every beam: the unfinished last word of a word model and the end of
+        the sentence
+
+        Parameters:
+            - _prefixes: The label of each beam
+            - _states: The language model state of each beam
+
+        Returns:
+            The weighted language model score of ending each beam
+        """
+        scores = np.zeros(len(_prefixes))
+
+        if self.languageModel is None:
+            return scores
+
+        states = _states.copy()
+
+        if self.languageModel.unit == "word":
+            partials = [self.PartialWord(prefix) for prefix in _prefixes]
+            finished = np.array([bool(partial) for partial in partials])
+
+            if finished.any():
+                scores[finished], states[finished] = self.WordScore(
+                    [partial for partial in partials if partial], _states[finished]
+                )
+
+        if self.languageModel.end >= 0:
+            endScores, _ = self.languageModel.Score(states, np.full(len(states), self.languageModel.end))
+            scores += self.alpha * endScores
+
+        return scores
+
+    def PartialWord(self, _prefix):
+        """
+        Parameters:
+            - _prefix: The label of a beam
+
+        Returns:
+            The characters after the last space of a prefix, the word it is in the middle of
+        """
+        start = len(_prefix)
+
+        while start > 0 and _prefix[start - 1] != self.space:
+            start -= 1
+
+        return "".join(self.vocabulary[c] for c in _prefix[start:])
@@ -0,0 +1,189 @@
+# Lucas Davis
+
+import numpy as np
+
+class LanguageModel:
+    """
+    A backoff n-gram language model read from an ARPA file. The n-grams are stored as a trie in
+    flat numpy arrays: every n-gram is a node, and the edges from a context to its next token are
+    a single sorted array of keys, so a whole batch of lookups is one np.searchsorted.
+
+    The model can either be over words, or over characters where every token is one character and
+    spaces are written as <space>.
+    """
+    # log10 probability of a token the model doesn't know, when it doesn't have an <unk>
+    UNKNOWN = -10.0
+
+    def __init__(self, _path, _unit = "word"):
+        """
+        Parameters:
+            - _path: The path to an ARPA file
+            - _unit: "word" or "char", what the tokens of the model are
+        """
+        self.unit = _unit
+
+        self.Load(_path)
+
+    def Load(self, _path):
+        """
+        Reads an ARPA file into the trie arrays
+
+        Parameters:
+            - _path: The path to an ARPA file
+        """
+        ngrams = []
+        order = 0
+
+        with open(_path, mode = 'r', encoding = 'utf-8') as arpa:
+            for line in arpa:
+                line = line.strip()
+
+                if not line or line == "\\data\\" or line.startswith("ngram "):
+                    continue
+
+                if line == "\\end\\":
+                    break
+
+                if line.startswith("\\") and line.endswith("-grams:"):
+                    order = int(line[1:-len("-grams:")])
+                    continue
+
+                fields = line.split()
+
+                logProb = float(fields[0])
+                tokens = tuple(fields[1:order + 1])
+                backoff = float(fields[order + 1]) if len(fields) > order + 1 else 0.0
+
+                ngrams.append((tokens, logProb, backoff))
+
+        self.vocabulary = {}
+
+        for tokens, _, _ in ngrams:
+            if len(tokens) == 1:
+                self.vocabulary.setdefault(tokens[0], len(self.vocabulary))
+
+        # Node 0 is the empty context, the n-grams follow shortest first
+        ngrams.sort(key = lambda ngram: len(ngram[0]))
+
+        nodes = {(): 0}
+
+        for tokens, _, _ in ngrams:
+            nodes.setdefault(tokens, len(nodes))
+
+        count = len(nodes)
+
+        self.order = max(len(tokens) for tokens, _, _ in ngrams)
+        self.size = len(self.vocabulary) + 1
+
+        self.logProb = np.zeros(count)
+        self.backoff = np.zeros(count)
+        self.depth = np.zeros(count, dtype = np.int64)
+        self.suffix = np.zeros(count, dtype = np.int64)
+
+        keys = np.zeros(count - 1, dtype = np.int64)
+        children = np.zeros(count - 1, dtype = np.int64)
+
+        for tokens, logProb, backoff in ngrams:
+            node = nodes[tokens]
+
+            self.logProb[node] = logProb * np.log(10.0)
+            self.backoff[node] = backoff * np.log(10.0)
+            self.depth[node] = len(tokens)
+
+            # The longest shorter context, where a lookup backs off to
+            suffix = tokens[1:]
+
+            while suffix not in nodes:
+                suffix = suffix[1:]
+
+            self.suffix[node] = nodes[suffix]
+
+            keys[node - 1] = nodes.get(tokens[:-1], 0) * self.size + self.vocabulary[tokens[-1]]
+            children[node - 1] = node
+
+        order = np.argsort(keys)
+
+        self.keys = keys[order]
+        self.children = children[order]
+
+        self.unknown = self.vocabulary.get("<unk>", -1)
+        self.unknownScore = self.logProb[nodes[("<unk>",)]] if self.unknown >= 0 else self.UNKNOWN * np.log(10.0)
+        self.start = nodes.get(("<s>",), 0)
+        self.end = self.vocabulary.get("</s>", -1)
+
+    def Encode(self, _tokens):
+        """
+        Parameters:
+            - _tokens: A list of words, or characters for a character model
+
+        Returns:
+            A numpy array with the id of every token. Unknown tokens get the id of <unk>, or one
+            past the vocabulary when there is no <unk>, which never matches a node
+        """
+        if self.unit == "char":
+            _tokens = ["<space>" if token == " " else token for token in _tokens]
+
+        missing = self.unknown if self.unknown >= 0 else self.size - 1
+
+        return np.array([self.vocabulary.get(token, missing) for token in _tokens], dtype = np.int64)
+
+    def Child(self, _nodes, _tokens):
+        """
+        Parameters:
+            - _nodes: A numpy array of context nodes
+            - _tokens: A numpy array of token ids, one per node
+
+        Returns:
+            The node of each context followed by its token, or -1 where the trie doesn't have it
+        """
+        query = _nodes * self.size + _tokens
+        index = np.minimum(np.searchsorted(self.keys, query), len(self.keys) - 1)
+
+        return np.where(self.keys[index] == query, self.children[index], -1)
+
+    def Score(self, _states, _tokens):
+        """
+        Scores a batch of tokens following their contexts, backing off to shorter contexts
+        where the n-gram is missing
+
+        Parameters:
+            - _states: A numpy array of context nodes, self.start for the start of a sentence
+            - _tokens: A numpy array of token ids, one per state
+
+        Returns:
+            The natural log probability of every token and the context node that follows it
+        """
+        states = np.array(_states, dtype = np.int64)
+        tokens = np.asarray(_tokens, dtype = np.int64)
+
+        scores = np.zeros(len(states))
+        found = np.zeros(len(states), dtype = np.int64)
+        done = np.zeros(len(states), dtype = bool)
+
+        for _ in range(self.order + 1):
+            child = self.Child(states, tokens)
+            hit = (child >= 0) & ~done
+
+            scores[hit] += self.logProb[child[hit]]
+            found[hit] = child[hit]
+            done |= hit
+
+            # Tokens the model doesn't know at all
+            unknown = ~done & (states == 0)
+
+            scores[unknown] += self.unknownScore
+            done |= unknown
+
+            if done.all():
+                break
+
+            backoff = ~done
+
+            scores[backoff] += self.backoff[states[backoff]]
+            states[backoff] = self.suffix[states[backoff]]
+
+        # A full length n-gram can't be extended, its context for the next token is its suffix
+        full = self.depth[found] >= self.order
+        found[full] = self.suffix[found[full]]
+
+        return scores, found
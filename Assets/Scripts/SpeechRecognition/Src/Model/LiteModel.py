@@ -0,0 +1,88 @@
+# Lucas Davis
+
+import threading
+import numpy as np
+import tensorflow as tf
+
+try:
+    # The standalone interpreter is a fraction of the size of tensorflow, use it when it's installed
+    from tflite_runtime.interpreter import Interpreter, OpResolverType
+except ImportError:
+    Interpreter = tf.lite.Interpreter
+    OpResolverType = tf.lite.experimental.OpResolverType
+
+class LiteModel:
+    """
+    Runs a quantized .tflite export of the model (see Scripts/ExportModel.py) behind the same call
+    signature as the keras model, so SpeechRec's serving graphs work with either.
+
+    The export takes a single spectrogram at a time, a batch is run one spectrogram after another.
+    """
+    def __init__(self, _path):
+        """
+        Parameters:
+            - _path: The path to the .tflite file
+        """
+        # XNNPACK, the default delegate, returns garbage for the dynamic range int8 GRU kernels
+        # after the input is resized, so only the builtin kernels are used
+        self.interpreter = Interpreter(
+            model_path = _path,
+            experimental_op_resolver_type = OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+        )
+
+        self.input  = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+
+        self.bins    = int(self.input['shape'][-1])
+        self.classes = int(self.output['shape'][-1])
+        self.frames  = None
+
+        # The interpreter isn't thread safe, and the API calls the model from several threads
+        self.lock = threading.Lock()
+
+        self.input_shape  = (None, None, self.bins)
+        self.output_shape = (None, None, self.classes)
+
+    def __call__(self, _spectrograms, training = False):
+        """
+        Parameters:
+            - _spectrograms: A batch of spectrograms in the shape of (batch, frames, bins)
+            - training: Ignored, an export only ever runs inference
+
+        Returns:
+            The logits in the shape of (batch, time, classes)
+        """
+        logits = tf.numpy_function(self.Invoke, [_spectrograms], tf.float32, stateful = True)
+        logits.set_shape((None, None, self.classes))
+
+        return logits
+
+    def Invoke(self, _spectrograms):
+        """
+        Runs the interpreter on a batch of spectrograms
+
+        Parameters:
+            - _spectrograms: A numpy array in the shape of (batch, frames, bins)
+
+        Returns:
+            The logits as a numpy array in the shape of (batch, time, classes)
+        """
+        spectrograms = np.asarray(_spectrograms, dtype = np.float32)
+        outputs = []
+
+        with self.lock:
+            # Tensors are only reallocated when the clip length changes
+            if self.frames != spectrograms.shape[1]:
+                self.interpreter.resize_tensor_input(self.input['index'], [1, spectrograms.shape[1], self.bins])
+                self.interpreter.allocate_tensors()
+                self.frames = spectrograms.shape[1]
+
+            for spectrogram in spectrograms:
+                self.interpreter.set_tensor(self.input['index'], spectrogram[np.newaxis])
+                self.interpreter.invoke()
+                outputs.append(self.interpreter.get_tensor(self.output['index'])[0])
+
+        if not outputs:
+            return np.zeros((0, 0, self.classes), dtype = np.float32)
+
+        return np.stack(outputs)
@@ -0,0 +1,105 @@
+# Lucas Davis
+
+import tensorflow as tf
+from tensorflow.keras import layers
+from keras import ops
+
+from keras.saving import register_keras_serializable
+
+# The logit of the blank on masked time steps, every other class gets 0. This leaves a
+# probability of about e^-10000 for anything but the blank
+BLANK_LOGIT = 1e4
+
+def Positions(_steps):
+    """
+    Parameters:
+        - _steps: A tensor in the shape of (batch, time)
+
+    Returns:
+        The int32 position of every time step, counted from 1
+    """
+    return ops.cumsum(ops.ones_like(_steps, dtype = "int32"), axis = 1)
+
+def FrameLengths(_spectrograms):
+    """
+    Parameters:
+        - _spectrograms: A zero padded batch of spectrograms in the shape of (batch, frames, bins)
+
+    Returns:
+        The int32 number of frames of every row, up to and including its last frame that isn't
+        all zeros. Normalized frames are only all zeros when their audio was a constant, so a
+        clip that ends in digital silence loses that silence, which holds nothing to transcribe
+    """
+    # keras ops, since the mask is also computed on the symbolic inputs while the model is built,
+    # when the amount of frames isn't known yet
+    nonZero = ops.any(ops.not_equal(_spectrograms, 0), axis = -1)
+
+    return ops.max(ops.where(nonZero, Positions(nonZero), 0), axis = 1)
+
+@register_keras_serializable(name = "LengthMask")
+class LengthMask(layers.Layer):
+    """
+    Masks the time steps of the downsampled features that only hold padding. It is called on the
+    features and the spectrograms of the model input: the frames of every row are read from the
+    zero padding of the spectrograms and divided by the time stride of the convolutions in front
+    of it, rounding up the same way ASRModel.OutputLength does. The features are passed through
+    unchanged, the recurrent layers after it skip the masked steps.
+    """
+    def __init__(self, stride = 4, **kwargs):
+        """
+        Parameters:
+            - stride: The time stride of the convolutions between the spectrograms and the features
+        """
+        super().__init__(**kwargs)
+
+        self.stride = int(stride)
+
+    def Lengths(self, _spectrograms):
+        """
+        Parameters:
+            - _spectrograms: The zero padded spectrograms of the model input
+
+        Returns:
+            The valid time steps of every row of the features
+        """
+        return (FrameLengths(_spectrograms) + self.stride - 1) // self.stride
+
+    def call(self, inputs):
+        return inputs[0]
+
+    def compute_mask(self, inputs, mask = None):
+        features, spectrograms = inputs
+
+        return ops.less_equal(Positions(features[:, :, 0]), self.Lengths(spectrograms)[:, None])
+
+    def compute_output_shape(self, input_shape):
+        return input_shape[0]
+
+    def get_config(self):
+        config = super().get_config()
+        config.update({"stride": self.stride})
+
+        return config
+
+@register_keras_serializable(name = "MaskedLogits")
+class MaskedLogits(layers.Layer):
+    """
+    Replaces the logits of the masked time steps with a certain blank, which every decoder skips,
+    and keeps the mask so the CTC loss can read the logit lengths from it. The exports of the
+    model lose the mask, this keeps them decoding the padding as nothing.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+        self.supports_masking = True
+
+    def call(self, inputs, mask = None):
+        if mask is None:
+            return inputs
+
+        blank = tf.one_hot(tf.shape(inputs)[-1] - 1, tf.shape(inputs)[-1], on_value = BLANK_LOGIT, dtype = inputs.dtype)
+
+        return tf.where(mask[..., tf.newaxis], inputs, blank)
+
+    def compute_output_shape(self, input_shape):
+        return input_shape
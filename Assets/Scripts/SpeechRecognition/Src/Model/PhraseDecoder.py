@@ -0,0 +1,270 @@
+# Lucas Davis
+
+import os
+import sys
+import numpy as np
+
+from Data.Process import Process
+from Grab_Ini import ini
+
+class PhraseDecoder:
+    """
+    Decodes the models output against a fixed list of phrases instead of any possible
+    transcript. Each phrase is scored by its CTC probability given the logits, i.e. the sum over
+    every alignment of the phrase, and the most probable phrase is returned.
+
+    The phrases are stored in a prefix trie, so phrases that start the same way share the work of
+    scoring that start. The trie is scored one depth at a time; every node at a depth is extended
+    from its parent over all time steps at once with cumulative log-sum-exps, so there is no
+    Python loop over the frames.
+    """
+    def __init__(self, process: Process, _phrases, _beam = None):
+        """
+        Parameters:
+            - process: A Process instance, used to convert the phrases into labels
+            - _phrases: A list of phrases to decode against
+            - _beam: How far, in log probability, a prefix can fall behind the best one before it
+                     is pruned. Defaults to the beam in the config
+        """
+        if _beam is None:
+            if getattr(sys, 'frozen', False):
+                path = os.path.join(os.path.dirname(sys.executable), "config.ini")
+            else:
+                path = "config.ini"
+
+            _beam = float(ini().grabInfo(path, "Decoder.Phrases")['beam'])
+
+        self.process = process
+        self.phrases = list(_phrases)
+        self.beam = _beam
+
+        self.Build()
+
+    def Encode(self, _phrase):
+        """
+        Parameters:
+            - _phrase: A phrase
+
+        Returns:
+            A tuple with the label of every character of the phrase that is in the vocabulary
+        """
+        return tuple(self.lookup[char] for char in str(_phrase).lower() if char in self.lookup)
+
+    def Build(self):
+        """
+        Builds the prefix trie of the phrases. The trie is stored as one set of arrays per depth:
+        the index of each nodes parent in the previous depth, its character, whether its
+        character repeats its parents, and which phrases end at it.
+        """
+        self.vocabulary = self.process.charToNum.get_vocabulary()
+        self.lookup = {char: i for i, char in enumerate(self.vocabulary) if char}
+        self.labels = {}
+
+        nodes = {(): 0}
+        self.levels = []
+        self.emptyPhrases = []
+
+        for phraseId, phrase in enumerate(self.phrases):
+            label = self.Encode(phrase)
+            self.labels.setdefault(label, phraseId)
+
+            if not label:
+                self.emptyPhrases.append(phraseId)
+
+            for depth in range(1, len(label) + 1):
+                prefix = label[:depth]
+
+                if prefix in nodes:
+                    continue
+
+                while len(self.levels) < depth:
+                    self.levels.append({"parent": [], "char": [], "repeat": [], "ends": []})
+
+                level = self.levels[depth - 1]
+                nodes[prefix] = len(level["char"])
+
+                level["parent"].append(nodes[prefix[:-1]])
+                level["char"].append(prefix[-1])
+                level["repeat"].append(depth > 1 and prefix[-1] == prefix[-2])
+                level["ends"].append([])
+
+            if label:
+                self.levels[len(label) - 1]["ends"][nodes[label]].append(phraseId)
+
+        for level in self.levels:
+            level["parent"] = np.asarray(level["parent"], dtype = np.int64)
+            level["char"] = np.asarray(level["char"], dtype = np.int64)
+            level["repeat"] = np.asarray(level["repeat"], dtype = bool)
+
+            ends = [(node, phraseId) for node, phraseIds in enumerate(level.pop("ends")) for phraseId in phraseIds]
+
+            level["endNode"] = np.asarray([node for node, _ in ends], dtype = np.int64)
+            level["endPhrase"] = np.asarray([phraseId for _, phraseId in ends], dtype = np.int64)
+
+    def LogProbs(self, _logits):
+        """
+        Parameters:
+            - _logits: The models output for a single utterance in the shape of (time, classes)
+
+        Returns:
+            The log softmax of the logits as float64
+        """
+        logits = np.asarray(_logits, dtype = np.float64)
+        logits = logits - logits.max(axis = -1, keepdims = True)
+
+        return logits - np.log(np.exp(logits).sum(axis = -1, keepdims = True))
+
+    def Score(self, _logits):
+        """
+        Computes the CTC log probability of every phrase. The blank is the last class, the same
+        as the one ASRModel.ctcloss trains with.
+
+        A prefix is pruned, along with every phrase that starts with it, once the probability of
+        any transcript starting with it falls more than the beam below the best prefix of the same
+        length or the best phrase found so far. Pruned phrases get a score of -inf.
+
+        Parameters:
+            - _logits: The models output for a single utterance in the shape of (time, classes)
+
+        Returns:
+            A numpy array with the log probability of each phrase
+        """
+        logProbs = self.LogProbs(_logits)
+        scores = np.full(len(self.phrases), -np.inf)
+
+        steps = logProbs.shape[0]
+
+        if steps == 0:
+            return scores
+
+        cumulative = np.cumsum(logProbs, axis = 0).T
+        blank = cumulative[-1]
+
+        # The empty prefix can only be blanks
+        blankPaths = blank[np.newaxis, :]
+        charPaths = np.full((1, steps), -np.inf)
+        position = np.zeros(1, dtype = np.int64)
+        isRoot = True
+
+        scores[self.emptyPhrases] = blank[-1]
+        best = blank[-1] if self.emptyPhrases else -np.inf
+
+        for level in self.levels:
+            # Only extend the nodes whose parent survived the beam
+            parents = position[level["parent"]]
+            alive = np.flatnonzero(parents >= 0)
+
+            if len(alive) == 0:
+                break
+
+            parents = parents[alive]
+            chars = level["char"][alive]
+
+            parentBlank = blankPaths[parents]
+            parentChar = charPaths[parents]
+
+            # A repeated character needs a blank between it and its parent's last character
+            previous = np.where(level["repeat"][alive, np.newaxis], parentBlank, np.logaddexp(parentBlank, parentChar))
+
+            # charPaths[t] = (charPaths[t - 1] + previous[t - 1]) * y_char[t], solved for every t
+            # with the cumulative sum of the log probabilities of the character
+            emit = cumulative[chars]
+
+            start = np.full((len(alive), 1), 0.0 if isRoot else -np.inf)
+            terms = np.concatenate([start, previous[:, :-1] - emit[:, :-1]], axis = 1)
+
+            charPaths = emit + np.logaddexp.accumulate(terms, axis = 1)
+
+            # The probability of any transcript starting with the prefix, an upper bound on the
+            # score of every phrase below it
+            prefix = np.logaddexp.reduce(terms + emit, axis = 1)
+
+            # blankPaths[t] = (blankPaths[t - 1] + charPaths[t - 1]) * y_blank[t]
+            terms = np.concatenate([np.full((len(alive), 1), -np.inf), charPaths[:, :-1] - blank[:-1]], axis = 1)
+
+            blankPaths = blank + np.logaddexp.accumulate(terms, axis = 1)
+            isRoot = False
+
+            final = np.logaddexp(blankPaths[:, -1], charPaths[:, -1])
+
+            ends = np.full(len(level["char"]), -1, dtype = np.int64)
+            ends[alive] = np.arange(len(alive))
+
+            ended = ends[level["endNode"]] >= 0
+            scores[level["endPhrase"][ended]] = final[ends[level["endNode"][ended]]]
+
+            if ended.any():
+                best = max(best, scores[level["endPhrase"][ended]].max())
+
+            # Prune the prefixes that fall outside the beam
+            keep = prefix >= max(prefix.max(), best) - self.beam
+
+            blankPaths, charPaths = blankPaths[keep], charPaths[keep]
+
+            position = np.full(len(level["char"]), -1, dtype = np.int64)
+            position[alive[keep]] = np.arange(int(keep.sum()))
+
+        return scores
+
+    def Decode(self, _logits):
+        """
+        Finds the phrase that best matches an utterance. The confidence is the probability of the
+        phrase relative to the other phrases and to the unconstrained greedy transcript, so an
+        utterance that isn't any of the phrases gets a low confidence.
+
+        Parameters:
+            - _logits: The models output for a single utterance in the shape of (time, classes)
+
+        Returns:
+            The best phrase and its confidence between 0 and 1. When no phrase can be spelled in
+            the time steps of the utterance, e.g. because it is shorter than every phrase, the
+            phrase is None with a confidence of 0
+        """
+        if not self.phrases:
+            return "", 0.0
+
+        scores = self.Score(_logits)
+        best = int(np.argmax(scores))
+
+        if not np.isfinite(scores[best]):
+            return None, 0.0
+
+        # Phrases that only differ by characters outside the vocabulary are counted once, and the
+        # greedy transcript is scored as one more candidate if it isn't already a phrase
+        greedy = self.Greedy(_logits)
+        competitors = scores[list(self.labels.values())]
+
+        if greedy and greedy not in self.labels:
+            competitors = np.append(competitors, self.ScoreLabel(_logits, greedy))
+
+        confidence = np.exp(scores[best] - np.logaddexp.reduce(competitors))
+
+        return self.phrases[best], float(confidence)
+
+    def Greedy(self, _logits):
+        """
+        Parameters:
+            - _logits: The models output for a single utterance in the shape of (time, classes)
+
+        Returns:
+            The label of the greedy transcript, without repeats and blanks
+        """
+        best = np.argmax(_logits, axis = -1)
+        blank = np.shape(_logits)[-1] - 1
+
+        label = [int(c) for i, c in enumerate(best) if c != blank and (i == 0 or c != best[i - 1])]
+
+        return tuple(c for c in label if c != 0)
+
+    def ScoreLabel(self, _logits, _label):
+        """
+        Parameters:
+            - _logits: The models output for a single utterance in the shape of (time, classes)
+            - _label: A tuple of labels
+
+        Returns:
+            The CTC log probability of a single label sequence
+        """
+        phrase = "".join(self.vocabulary[c] for c in _label)
+
+        return PhraseDecoder(self.process, [phrase], np.inf).Score(_logits)[0]
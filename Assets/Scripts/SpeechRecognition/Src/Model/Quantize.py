@@ -0,0 +1,150 @@
+# Lucas Davis
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+from Model.ASRModel import ASRModel
+from Model.LiteModel import LiteModel
+
+MODES = ("float16", "int8")
+
+class Quantize:
+    """
+    Converts the trained model to smaller .tflite exports for the players CPU:
+        - float16: The weights are stored as float16, the math stays float32
+        - int8: Dynamic range quantization, the weights are stored as int8 and the activations
+                are quantized on the fly
+    """
+    def __init__(self, _process):
+        """
+        Parameters:
+            - _process: A Process instance
+        """
+        self.process = _process
+
+    def Convert(self, _model, _mode):
+        """
+        Parameters:
+            - _model: The keras model
+            - _mode: One of MODES
+
+        Returns:
+            The .tflite file as bytes
+        """
+        if _mode not in MODES:
+            raise ValueError(f"Unknown quantization mode {_mode}, expected one of {MODES}")
+
+        directory = tempfile.mkdtemp(prefix = "quantize_")
+
+        try:
+            # A batch of one with any amount of frames. With a fixed batch size the GRU loops have
+            # static shapes, which the builtin tflite kernels need.
+            bins = _model.input_shape[-1]
+
+            archive = keras.export.ExportArchive()
+            archive.track(_model)
+            archive.add_endpoint(
+                "serve",
+                lambda spectrogram: _model(spectrogram, training = False),
+                input_signature = [tf.TensorSpec(shape = (1, None, bins), dtype = tf.float32)]
+            )
+            archive.write_out(directory, verbose = False)
+
+            converter = tf.lite.TFLiteConverter.from_saved_model(directory, signature_keys = ["serve"])
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+            if _mode == "float16":
+                converter.target_spec.supported_types = [tf.float16]
+
+            return converter.convert()
+        finally:
+            shutil.rmtree(directory, ignore_errors = True)
+
+    def RepresentativeDataset(self, _csvPath, _count):
+        """
+        Normalized spectrograms of a random sample of the clips in a csv file, used to check the
+        exports against the original model
+
+        Parameters:
+            - _csvPath: The path to a csv file in the format CreateCSVFile produces
+            - _count: The amount of clips
+
+        Returns:
+            A list of spectrograms in the shape of (frames, bins)
+        """
+        audioPaths, _ = self.process.LoadCSV(_csvPath)
+
+        rng = np.random.default_rng(self.process.seed)
+        chosen = rng.choice(len(audioPaths), size = min(_count, len(audioPaths)), replace = False)
+
+        spectrograms = []
+
+        for i in chosen:
+            spectrogram = self.process.Spectrogram(self.process.LoadAudioFile(audioPaths[i]))
+            spectrograms.append(np.asarray(self.process.NormalizeSpec(spectrogram)))
+
+        return spectrograms
+
+    def Check(self, _model, _liteModel, _spectrograms):
+        """
+        Compares an export with the original model
+
+        Parameters:
+            - _model: The keras model
+            - _liteModel: A LiteModel of the export
+            - _spectrograms: A list of spectrograms
+
+        Returns:
+            The largest absolute difference between their logits, and the fraction of clips
+            whose greedy transcripts are the same
+        """
+        error, agree = 0.0, 0
+
+        for spectrogram in _spectrograms:
+            batch = spectrogram[np.newaxis].astype(np.float32)
+
+            expected = _model(batch, training = False).numpy()
+            result = _liteModel.Invoke(batch)
+
+            error = max(error, float(np.abs(expected - result).max()))
+            agree += self.process.ConvertLabel(ASRModel.ctcDecoder(expected)) == self.process.ConvertLabel(ASRModel.ctcDecoder(result))
+
+        return error, agree / max(1, len(_spectrograms))
+
+    def Export(self, _model, _directory, _modes = MODES, _spectrograms = None):
+        """
+        Writes an ASR_<mode>.tflite file for every mode, and checks them against the original
+        model when spectrograms are given
+
+        Parameters:
+            - _model: The keras model
+            - _directory: The directory to write the exports to
+            - _modes: The modes to export
+            - _spectrograms: An optional list of spectrograms from RepresentativeDataset
+
+        Returns:
+            A dictionary of mode to (path, size in bytes, max logit error, transcript agreement),
+            the last two are None without spectrograms
+        """
+        os.makedirs(_directory, exist_ok = True)
+
+        results = {}
+
+        for mode in _modes:
+            path = os.path.join(_directory, f"ASR_{mode}.tflite")
+
+            with open(path, 'wb') as file:
+                file.write(self.Convert(_model, mode))
+
+            error, agree = None, None
+
+            if _spectrograms:
+                error, agree = self.Check(_model, LiteModel(path), _spectrograms)
+
+            results[mode] = (path, os.path.getsize(path), error, agree)
+
+        return results
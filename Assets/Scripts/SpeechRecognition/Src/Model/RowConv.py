@@ -0,0 +1,59 @@
+# Lucas Davis
+
+import tensorflow as tf
+from tensorflow.keras import layers
+
+from keras.saving import register_keras_serializable
+
+@register_keras_serializable(name = "RowConv")
+class RowConv(layers.Layer):
+    """
+    The lookahead convolution of Deep Speech 2, which gives a unidirectional recurrent stack a small
+    amount of future context. Every output frame is a learned, per feature, weighted sum of its
+    own frame and the next lookahead frames:
+
+        y[t, c] = sum(w[j, c] * x[t + j, c] for j in range(lookahead + 1))
+
+    Frames past the end of the input count as zeros, so the output has as many frames as the input.
+    Masked frames count as zeros as well, the recurrent layers in front of it repeat their last
+    output over them.
+    """
+    def __init__(self, lookahead = 2, **kwargs):
+        """
+        Parameters:
+            - lookahead: How many future frames every output frame sees
+        """
+        super().__init__(**kwargs)
+
+        self.lookahead = int(lookahead)
+        self.supports_masking = True
+
+    def build(self, input_shape):
+        self.kernel = self.add_weight(
+            name        = "kernel",
+            shape       = (self.lookahead + 1, input_shape[-1]),
+            initializer = "glorot_uniform"
+        )
+
+    def call(self, inputs, mask = None):
+        if mask is not None:
+            inputs = inputs * tf.cast(mask, inputs.dtype)[..., tf.newaxis]
+
+        frames = tf.shape(inputs)[1]
+        padded = tf.pad(inputs, [[0, 0], [0, self.lookahead], [0, 0]])
+
+        outputs = inputs * self.kernel[0]
+
+        for j in range(1, self.lookahead + 1):
+            outputs += padded[:, j:j + frames] * self.kernel[j]
+
+        return outputs
+
+    def compute_output_shape(self, input_shape):
+        return input_shape
+
+    def get_config(self):
+        config = super().get_config()
+        config.update({"lookahead": self.lookahead})
+
+        return config
@@ -5,6 +5,7 @@ import tensorflow as tf
 from Data.Process import Process
 from Data.Augment import Augment
 from Data.Validate import Validate
+from Data.FeatureCache import FeatureCache
 
 from Grab_Ini import ini
 
@@ -17,62 +18,226 @@ class Setup:
         generalConfig  = ini().grabInfo("config.ini", "General")
         trainingConfig = ini().grabInfo("config.ini", "Training")
         processConfig  = ini().grabInfo("config.ini", "Process")
+        cacheConfig    = ini().grabInfo("config.ini", "Process.FeatureCache")
+        bucketConfig   = ini().grabInfo("config.ini", "Training.Bucketing")
+        specConfig     = ini().grabInfo("config.ini", "Process.Spectrogram")
 
         self.augmentData = eval(processConfig['augment'])
+        self.cacheFeatures = eval(cacheConfig['enabled'])
+        self.featureCache  = FeatureCache(process) if self.cacheFeatures else None
         self.batchSize    = int(trainingConfig['batch_size'])
-        seed         = int(generalConfig['seed'])
+        self.seed         = int(generalConfig['seed'])
 
-        tf.random.set_seed(seed)
+        # Bucket boundaries are configured in seconds of audio and converted to frames
+        framesPerSecond = int(specConfig['sample_rate']) / int(specConfig['frame_step'])
 
-    def CreateDataset(self, _training, _validation, _test):
+        self.bucketing        = eval(bucketConfig['enabled'])
+        self.shuffle          = self.bucketing and eval(bucketConfig['shuffle'])
+        self.frameBudget      = int(bucketConfig['frame_budget'])
+        self.bucketBoundaries = [int(float(x) * framesPerSecond) for x in bucketConfig['bucket_boundaries'].split(',')]
+
+        tf.random.set_seed(self.seed)
+
+    def CreateDataset(self, _training, _validation, _test, _strategy = None):
         """
         Creates a dataset for both the training and validatation sets. It will map the audio paths and transcripts
         to the process.Data method to process them into spectrograms and labels.
 
+        When training with a distribution strategy that has more than one replica, the training and
+        validation sets are built once per input pipeline (one per worker). Every pipeline reads its
+        own shard of the csv file and makes batches of batch_size for a single replica, so the
+        global batch is batch_size times the amount of replicas. The test set stays a regular
+        dataset, the error rate is computed outside of the strategy.
+
         Parameters:
             - _training: The path to the training data csv file
             - _validation: The path to the validation data csv file
+            - _test: The path to the test data csv file
+            - _strategy: An optional tf.distribute strategy the model is trained with
 
         Returns:
-            Two tensorflow datasets containing the training and validation sets
-        """
-        trainAudioPaths, trainTranscripts = self.process.LoadCSV(_training)
-        validAudioPaths, validTranscripts = self.process.LoadCSV(_validation)
-        testAudioSamples, testTranscripts = self.process.LoadCSV(_test)
-
-        # The train dataset calls a different method that will augment the audio samples
-        trainDataset = tf.data.Dataset.from_tensor_slices(
-            (list(trainAudioPaths), list(trainTranscripts))
-        )
-        trainDataset = (
-            trainDataset.map(self.ProcessTrainingData, num_parallel_calls = tf.data.AUTOTUNE)
-            .padded_batch(self.batchSize)
-            .prefetch(buffer_size = tf.data.AUTOTUNE)
-        )
-
-        # The validation and testing datasets arent augmented. This is to keep them the same
-        # between different training sets so we can get an accurate val_loss and Error_Rate
-        # measurement
-        validationData = tf.data.Dataset.from_tensor_slices(
-            (list(validAudioPaths), list(validTranscripts))
-        )
-        validationData = (
-            validationData.map(self.ProcessData, num_parallel_calls = tf.data.AUTOTUNE)
-            .padded_batch(self.batchSize)
-            .prefetch(buffer_size = tf.data.AUTOTUNE)
-        )
-
-        testDataset = tf.data.Dataset.from_tensor_slices(
-            (list(testAudioSamples), list(testTranscripts))
-        )
-        testDataset = (
-            testDataset.map(self.ProcessData, num_parallel_calls = tf.data.AUTOTUNE)
-            .padded_batch(self.batchSize)
-            .prefetch(buffer_size = tf.data.AUTOTUNE)
-        )
+            Three tensorflow datasets containing the training, validation and test sets
+        """
+        if _strategy is not None and _strategy.num_replicas_in_sync > 1:
+            trainDataset = _strategy.distribute_datasets_from_function(
+                lambda context: self.TrainingDataset(_training, context)
+            )
+            validationData = _strategy.distribute_datasets_from_function(
+                lambda context: self.Batch(*self.Features(_validation, self.ProcessData, False, _context = context))
+            )
+        else:
+            trainDataset = self.TrainingDataset(_training)
+
+            # The validation and testing datasets arent augmented. This is to keep them the same
+            # between different training sets so we can get an accurate val_loss and Error_Rate
+            # measurement
+            validationData = self.Batch(*self.Features(_validation, self.ProcessData, False))
+
+        testDataset = self.Batch(*self.Features(_test, self.ProcessData, False))
 
         return trainDataset, validationData, testDataset
-    
+
+    def TrainingDataset(self, _training, _context = None):
+        """
+        Creates the batched training dataset.
+
+        Parameters:
+            - _training: The path to the training data csv file
+            - _context: An optional tf.distribute.InputContext of the input pipeline
+
+        Returns:
+            A batched dataset of (spectrogram, label)
+        """
+        # The train dataset loads the raw audio so it can be augmented a whole batch at a time.
+        # Augmented samples differ every epoch, so they can only come from the feature cache
+        # when augmentation is turned off
+        if self.augmentData:
+            trainDataset = self.Features(_training, self.ProcessTrainingData, self.shuffle, _cache = False, _context = _context)
+
+            return self.Batch(*trainDataset, _training = True, _map = self.AugmentBatch)
+
+        trainDataset = self.Features(_training, self.ProcessData, self.shuffle, _context = _context)
+
+        return self.Batch(*trainDataset, _training = True)
+
+    def Features(self, _csvPath, _processData, _shuffle, _cache = True, _context = None):
+        """
+        Creates an unbatched dataset of spectrograms, labels and lengths. The length is the number
+        of frames of the spectrogram, which is known from the samples column of an indexed
+        manifest, or estimated from the filesize column otherwise, before the audio is loaded so
+        the samples can be bucketed. Samples that aren't augmented are read from the
+        feature cache when it is enabled, in which case the exact lengths are known.
+
+        Parameters:
+            - _csvPath: The path to the csv file
+            - _processData: The function that maps (file, transcript) to (spectrogram, label)
+            - _shuffle: Shuffle the order of the samples every epoch
+            - _cache: Whether the samples are allowed to come from the feature cache
+            - _context: An optional tf.distribute.InputContext, only the shard of its input
+                        pipeline is read
+
+        Returns:
+            A tensorflow dataset of (spectrogram, label, length) and the longest length, or None
+            when the lengths aren't known ahead of time
+        """
+        # The csv is split between the input pipelines before anything is loaded, so every
+        # worker only decodes its own audio
+        shard = None
+
+        if _context is not None and _context.num_input_pipelines > 1:
+            shard = (_context.num_input_pipelines, _context.input_pipeline_id)
+
+        if self.cacheFeatures and _cache:
+            dataset = self.featureCache.Load(_csvPath, _processData, _shuffle, _shard = shard)
+            dataset = dataset.map(lambda spec, label: (spec, label, tf.shape(spec)[0]))
+
+            return dataset, int(self.featureCache.Index(_csvPath)["frames"].max())
+
+        audioPaths, transcripts, sizes, samples = self.process.LoadCSV(_csvPath, _withSizes = True, _withSamples = True, _asTensors = True)
+
+        lengths = None
+
+        if samples is not None:
+            lengths = self.process.FrameCount(samples).numpy()
+        elif sizes is not None:
+            lengths = self.process.EstimateFrames(sizes).astype("int32")
+
+        if lengths is not None:
+            maxLength = int(lengths.max())
+
+            dataset = tf.data.Dataset.from_tensor_slices((audioPaths, transcripts, lengths))
+        else:
+            maxLength = None
+
+            dataset = tf.data.Dataset.from_tensor_slices((audioPaths, transcripts))
+
+        if shard is not None:
+            dataset = dataset.shard(*shard)
+
+        # Shuffling the paths is cheap, so the whole csv fits in the shuffle buffer
+        if _shuffle:
+            dataset = dataset.shuffle(len(audioPaths), seed = self.seed, reshuffle_each_iteration = True)
+
+        if lengths is not None:
+            return dataset.map(
+                lambda file, transcript, length: (*_processData(file, transcript), length),
+                num_parallel_calls = tf.data.AUTOTUNE
+            ), maxLength
+
+        return dataset.map(
+            lambda file, transcript: self.AddLength(*_processData(file, transcript)),
+            num_parallel_calls = tf.data.AUTOTUNE
+        ), maxLength
+
+    def AddLength(self, _spec, _label):
+        """
+        Pairs a sample with the exact number of frames of its spectrogram. Raw training audio
+        comes paired with its number of samples, which is converted to frames instead.
+        """
+        if isinstance(_spec, tuple):
+            return _spec, _label, self.process.FrameCount(_spec[1])
+
+        return _spec, _label, tf.shape(_spec)[0]
+
+    def BucketBatchSizes(self, _maxLength):
+        """
+        The batch size of every bucket. With a frame budget each batch holds as many samples as
+        fit in the budget once padded to the upper boundary of their bucket, so buckets of short
+        clips get large batches and buckets of long clips get small ones. Without a budget every
+        bucket uses batch_size.
+
+        Parameters:
+            - _maxLength: The longest length in the dataset, or None if it isn't known
+
+        Returns:
+            A list with one batch size per bucket
+        """
+        if self.frameBudget <= 0:
+            return [self.batchSize] * (len(self.bucketBoundaries) + 1)
+
+        if _maxLength is None or _maxLength < self.bucketBoundaries[-1]:
+            _maxLength = 2 * self.bucketBoundaries[-1]
+
+        uppers = self.bucketBoundaries + [_maxLength]
+
+        return [max(1, self.frameBudget // upper) for upper in uppers]
+
+    def Batch(self, _dataset, _maxLength, _training = False, _map = None):
+        """
+        Batches a dataset of (spectrogram, label, length). With bucketing enabled, samples of a
+        similar length are grouped together so batches carry as little padding as possible, and
+        the batches of the training set are shuffled. Otherwise the samples are batched in csv
+        order. The spectrograms are padded with zeros, which is where a model built with masking
+        reads the length of every clip from.
+
+        Parameters:
+            - _dataset: A tensorflow dataset of (spectrogram, label, length)
+            - _maxLength: The longest length in the dataset, or None if it isn't known
+            - _training: Shuffle the order of the batches
+            - _map: An optional function applied to every (features, label) batch
+
+        Returns:
+            A batched dataset of (spectrogram, label)
+        """
+        if not self.bucketing:
+            dataset = _dataset.padded_batch(self.batchSize)
+        else:
+            dataset = _dataset.bucket_by_sequence_length(
+                element_length_func = lambda spec, label, length: length,
+                bucket_boundaries   = self.bucketBoundaries,
+                bucket_batch_sizes  = self.BucketBatchSizes(_maxLength)
+            )
+
+            if _training and self.shuffle:
+                dataset = dataset.shuffle(64, seed = self.seed, reshuffle_each_iteration = True)
+
+        dataset = dataset.map(lambda spec, label, length: (spec, label))
+
+        if _map is not None:
+            dataset = dataset.map(_map, num_parallel_calls = tf.data.AUTOTUNE)
+
+        return dataset.prefetch(buffer_size = tf.data.AUTOTUNE)
+
     def Debug(self, _train, _valid, _test):
         """
         This function will display the labels and spcetrograms using process' ValidateData method.
@@ -84,14 +249,14 @@ class Setup:
             - _valid: The validation dataset
             - _test: The testing dataset
         """
-        for spectrogram, label in _train.take(1):
-            self.validate.Spectrogram(spectrogram[0], label[0])
-
-        for spectrogram, label in _valid.take(1):
-            self.validate.Spectrogram(spectrogram[0], label[0])
+        for dataset in [_train, _valid, _test]:
+            # The datasets of a distribution strategy are split between the replicas and can't be
+            # read this way
+            if not isinstance(dataset, tf.data.Dataset):
+                continue
 
-        for spectrogram, label in _test.take(1):
-            self.validate.Spectrogram(spectrogram[0], label[0])
+            for spectrogram, label in dataset.take(1):
+                self.validate.Spectrogram(spectrogram[0], label[0])
 
     def ProcessData(self, _file, _transcript):
         """
@@ -107,16 +272,43 @@ class Setup:
         return spec, label    
 
     def ProcessTrainingData(self, _file, _transcript):
+        """
+        Load an audio file of the training set. The audio is kept raw, along with its number of
+        samples, so it can be augmented after it has been batched by AugmentBatch.
+        """
         audio = self.process.LoadAudioFile(_file)
 
-        if (self.augmentData):
-            audio = self.augment.Noise(audio)
-            # audio = self.augment.TimeStrech(audio)
-            audio = self.augment.Volume(audio)
+        label = self.process.Transcript(_transcript)
+
+        return (audio, tf.shape(audio)[0]), label
+
+    def AugmentBatch(self, _audio, _label):
+        """
+        Augment a zero padded batch of raw training audio and turn it into spectrograms. Every
+        augmentation draws its random parameters per row and masks out the padding, so the
+        padding of the batch stays zero throughout.
+
+        Parameters:
+            - _audio: A tuple of the padded audio batch and the number of samples of each row
+            - _label: The padded batch of labels
+
+        Returns:
+            The batch of augmented spectrograms and the labels
+        """
+        audio, samples = _audio
+
+        audio = self.augment.NoiseBatch(audio, samples)
+        audio, samples = self.augment.TimeStrechBatch(audio, samples)
+        audio = self.augment.VolumeBatch(audio)
+
+        frames = self.process.FrameCount(samples)
 
         spec = self.process.Spectrogram(audio)
         spec = self.process.NormalizeSpec(spec)
 
-        label = self.process.Transcript(_transcript)
+        # Frames that overlap the end of a clip would contain part of the padding, the
+        # spectrogram of the clip on its own doesn't have them
+        spec = spec * tf.sequence_mask(frames, tf.shape(spec)[1], dtype = spec.dtype)[..., tf.newaxis]
+        spec = self.augment.SpecAugment(spec, frames)
 
-        return spec, label
\ No newline at end of file
+        return spec, _label
\ No newline at end of file
@@ -1,51 +1,181 @@
 # Lucas Davis
 
+from concurrent.futures import ThreadPoolExecutor
+
+import tensorflow as tf
 from tensorflow import keras
 from jiwer import wer
 
 from Model.ASRModel import ASRModel
+from Model.Masking import FrameLengths
 from Data.Process import Process
+from Grab_Ini import ini
 
 class ValidateModel(keras.callbacks.Callback):
-    def __init__(self, _dataset):
+    def __init__(self, _dataset, _decoder = None, _everyEpochs = None, _subsample = None, _asynchronous = None):
+        """
+        Parameters:
+            - _dataset: The dataset the error rate is computed on
+            - _decoder: An optional BeamSearch to decode with instead of greedy decoding
+            - _everyEpochs: Only compute the error rate every this many epochs. Defaults to the config
+            - _subsample: Only use this many batches of the dataset, 0 for all of them. Defaults to
+                          the config
+            - _asynchronous: Start computing the error rate while keras computes val_loss instead of
+                             after it. Defaults to the config
+        """
         super().__init__()
 
-        self.dataset = _dataset
+        validationConfig = ini().grabInfo("config.ini", "Training.Validation")
+
+        self.everyEpochs  = _everyEpochs if _everyEpochs is not None else int(validationConfig.get('every_n_epochs', 1))
+        self.subsample    = _subsample if _subsample is not None else int(validationConfig.get('subsample_batches', 0))
+        self.asynchronous = _asynchronous if _asynchronous is not None else eval(validationConfig.get('asynchronous', 'True'))
+
+        # The subsample is always the same first batches, so error rates stay comparable
+        self.dataset = _dataset.take(self.subsample) if self.subsample > 0 else _dataset
+        self.decoder = _decoder
         self.process = Process()
 
+        # A single background worker computes the error rate on a copy of the weights
+        self.executor = ThreadPoolExecutor(max_workers = 1)
+        self.pending = None
+        self.epoch = None
+        self.snapshot = None
+        self.snapshotOf = None
+        self.transcripts = None
+        self.lastErrorRate = None
+
         self.errorRate = []
 
+    def on_train_begin(self, logs = None):
+        # A model fit in the scope of a MultiWorkerMirroredStrategy needs the snapshot built before
+        # fit, only the chief computes the error rate and would wait on the other workers to
+        # create its variables
+        if self.snapshot is not None and self.snapshotOf is self.model:
+            return
+
+        # A second model with the same architecture the weight snapshots are loaded into
+        self.snapshot = keras.models.clone_model(self.model)
+        self.snapshotOf = self.model
+        self.stride = ASRModel.TimeStride(self.model)
+
+        self.inferBatch = tf.function(self.InferBatch, input_signature = [
+            tf.TensorSpec(shape = (None, None, self.model.input_shape[-1]), dtype = tf.float32)
+        ])
+
+    def on_epoch_begin(self, epoch, logs = None):
+        self.epoch = epoch
+
+    def on_test_begin(self, logs = None):
+        """
+        During fit, keras computes val_loss right before on_epoch_end with the weights the epoch
+        ended with. The error rate is started on a snapshot of those weights here so both run at
+        the same time.
+        """
+        if self.asynchronous and self.epoch is not None:
+            self.Submit(self.epoch)
+
     def on_epoch_end(self, epoch, logs = None):
         """
         This function will compute the word error rate at the end of each epoch. The error rate
         will be added to a custom metric for the models logs; 'Error_Rate'.
 
+        The first epoch is always evaluated, so every epoch has an error rate. Epochs that aren't
+        evaluated after it report the last error rate, which ModelCheckpoint never counts as an
+        improvement.
+
         Parameters:
             - epoch: The epoch that just completed
-            - logs: 
+            - logs:
         """
-        transcripts = []
-        predictions = []
+        self.Submit(epoch)
 
-        model = self.model
+        if self.pending is not None:
+            pendingEpoch, future = self.pending
+            self.pending = None
 
-        for batch in self.dataset:
-            spectrogram, labels = batch
+            self.lastErrorRate = future.result()
+            self.errorRate.append((pendingEpoch, self.lastErrorRate))
 
-            output = model.predict(spectrogram)
+        # This will add a custom metric to the models logs for the error rate
+        if self.lastErrorRate is not None and logs is not None:
+            logs['Error_Rate'] = self.lastErrorRate
 
-            output = ASRModel.ctcDecoder(output)
+    def on_train_end(self, logs = None):
+        self.epoch = None
 
-            for item in output:
-                decoded = self.process.ConvertLabel(item)
+    def Submit(self, _epoch):
+        """
+        Starts computing the error rate of the current weights in the background, unless it
+        already was started this epoch or this epoch isn't evaluated. The first epoch and every
+        every_n_epochs epoch are evaluated
 
-                predictions.append(decoded)
+        Parameters:
+            - _epoch: The current epoch
+        """
+        if self.pending is not None or (_epoch > 0 and (_epoch + 1) % self.everyEpochs != 0):
+            return
 
-            for item in labels:
-                item = self.process.ConvertLabel(item)
-                transcripts.append(item)
+        if self.snapshot is None:
+            self.on_train_begin()
 
-        errorRate = wer(transcripts, predictions)
+        self.pending = (_epoch, self.executor.submit(self.ErrorRate, self.model.get_weights()))
 
-        # This will add a custom metric to the models logs for the error rate
-        logs['Error_Rate'] = errorRate
\ No newline at end of file
+    def InferBatch(self, _spectrograms):
+        """
+        The snapshot model, the greedy ctc decoder and the label conversion of a whole batch as
+        a single graph. This is wrapped in a tf.function, use self.inferBatch to call it.
+
+        Parameters:
+            - _spectrograms: A batch of spectrograms
+
+        Returns:
+            A string tensor with one prediction per spectrogram
+        """
+        logits = self.snapshot(_spectrograms, training = False)
+
+        return tf.strings.reduce_join(self.process.numToChar(ASRModel.ctcDecoder(logits, self.Lengths(_spectrograms))), axis = -1)
+
+    def Lengths(self, _spectrograms):
+        """
+        Parameters:
+            - _spectrograms: A zero padded batch of spectrograms
+
+        Returns:
+            The time steps of the logits of every spectrogram without its padding, so a model
+            built without masking isn't decoded over the padding either
+        """
+        return ASRModel.OutputLength(FrameLengths(_spectrograms), self.stride)
+
+    def ErrorRate(self, _weights):
+        """
+        Computes the word error rate of a set of weights over the dataset. This runs on the
+        background worker.
+
+        Parameters:
+            - _weights: The weights to evaluate, as returned by model.get_weights()
+
+        Returns:
+            The word error rate
+        """
+        self.snapshot.set_weights(_weights)
+
+        predictions = []
+        transcripts = []
+
+        for spectrogram, labels in self.dataset:
+            if self.decoder is not None:
+                logits = self.snapshot(spectrogram, training = False).numpy()
+                predictions.extend(self.decoder.DecodeBatch(logits, self.Lengths(spectrogram).numpy()))
+            else:
+                predictions.extend(item.decode("utf-8") for item in self.inferBatch(spectrogram).numpy())
+
+            # The dataset is never shuffled, so the transcripts are only converted once
+            if self.transcripts is None:
+                joined = tf.strings.reduce_join(self.process.numToChar(labels), axis = -1)
+                transcripts.extend(item.decode("utf-8") for item in joined.numpy())
+
+        if self.transcripts is None:
+            self.transcripts = transcripts
+
+        return wer(self.transcripts, predictions)
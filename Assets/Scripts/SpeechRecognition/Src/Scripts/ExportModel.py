@@ -0,0 +1,37 @@
+# Lucas Davis
+
+import os
+import sys
+
+from tensorflow.keras.models import load_model
+
+from Model.ASRModel import ASRModel
+from Model.Quantize import Quantize, MODES
+from Model.GraphModel import GraphModel
+from Data.Process import Process
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python -m Scripts.ExportModel /path/to/model.keras /path/to/train.csv [/path/to/output/directory]")
+        exit(1)
+
+    directory = sys.argv[3] if len(sys.argv) == 4 else "models"
+
+    process = Process()
+    quantize = Quantize(process)
+
+    print("Loading model")
+    model = load_model(sys.argv[1], custom_objects = {'ctcloss': ASRModel.ctcloss}, safe_mode = False)
+
+    print("Loading representative dataset")
+    spectrograms = quantize.RepresentativeDataset(sys.argv[2], 32)
+
+    print("Exporting")
+    GraphModel.Export(model, os.path.join(directory, "ASR_savedmodel"))
+    results = quantize.Export(model, directory, MODES, spectrograms)
+
+    print(f"\nfloat32: {os.path.getsize(sys.argv[1]) / 1e6:.1f} MB")
+    print(f"savedmodel: {os.path.join(directory, 'ASR_savedmodel')}")
+
+    for mode, (path, size, error, agree) in results.items():
+        print(f"{mode}: {path}, {size / 1e6:.1f} MB, max logit error {error:.4f}, {agree:.0%} of the transcripts unchanged")
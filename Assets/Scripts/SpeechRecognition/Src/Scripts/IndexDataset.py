@@ -0,0 +1,313 @@
+# Lucas Davis
+
+import os
+import csv
+import time
+import wave
+import struct
+import argparse
+import subprocess
+import multiprocessing
+import numpy as np
+
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+COLUMNS = ["filename", "filesize", "transcript", "duration", "sample_rate", "samples"]
+
+def ReadWavHeader(_path):
+    """
+    Reads the format of a wav file from its header, without reading any of the audio
+
+    Parameters:
+        - _path: The path to the wav file
+
+    Returns:
+        The sample rate, the amount of channels and the amount of samples per channel
+    """
+    with open(_path, 'rb') as wavFile:
+        riff, _, form = struct.unpack('<4sI4s', wavFile.read(12))
+
+        if riff != b'RIFF' or form != b'WAVE':
+            raise ValueError(f"{_path} isn't a wav file")
+
+        sampleRate, channels, blockAlign = None, None, None
+
+        while True:
+            header = wavFile.read(8)
+
+            if len(header) < 8:
+                raise ValueError(f"{_path} has no data chunk")
+
+            chunk, size = struct.unpack('<4sI', header)
+
+            if chunk == b'fmt ':
+                _, channels, sampleRate, _, blockAlign = struct.unpack('<HHIIH', wavFile.read(14))
+                wavFile.seek(size - 14 + (size & 1), 1)
+            elif chunk == b'data':
+                if sampleRate is None:
+                    raise ValueError(f"{_path} has its data before its format")
+
+                return sampleRate, channels, size // blockAlign
+            else:
+                # Chunks are padded to an even size
+                wavFile.seek(size + (size & 1), 1)
+
+def ConvertFlac(_flacPath, _wavPath):
+    """
+    Decodes a flac file into a 16 bit wav file, with soundfile when it is installed and the flac
+    command line tool otherwise
+
+    Parameters:
+        - _flacPath: The flac file
+        - _wavPath: The wav file to write
+    """
+    # Written next to the wav file first, so an interrupted run never leaves half a wav file behind
+    partialPath = _wavPath + ".partial"
+
+    if soundfile is not None:
+        audio, sampleRate = soundfile.read(_flacPath, dtype = 'int16', always_2d = True)
+
+        with wave.open(partialPath, 'wb') as wavFile:
+            wavFile.setnchannels(audio.shape[1])
+            wavFile.setsampwidth(2)
+            wavFile.setframerate(sampleRate)
+            wavFile.writeframes(np.ascontiguousarray(audio).tobytes())
+    else:
+        subprocess.run(["flac", "--decode", "--silent", "--force", "-o", partialPath, _flacPath], check = True)
+
+    os.replace(partialPath, _wavPath)
+
+def FindTranscripts(_directory):
+    """
+    Parameters:
+        - _directory: The directory to search
+
+    Returns:
+        The paths of every .trans.txt file in the directory and all of its sub directories
+    """
+    found, pending = [], [_directory]
+
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks = False):
+                    pending.append(entry.path)
+                elif entry.name.endswith(".trans.txt"):
+                    found.append(entry.path)
+
+    return found
+
+def IndexTranscript(_args):
+    """
+    Indexes the utterances of a single .trans.txt file. Every line of it holds the name of an
+    audio file in the same directory and its transcript. The directory is listed once, instead of
+    checking whether every file exists one at a time.
+
+    Parameters:
+        - _args: The path to the .trans.txt file, the audio extension and whether flac files are
+                 converted to wav files and then deleted
+
+    Returns:
+        The path of the .trans.txt file and the manifest rows of its utterances
+    """
+    transPath, extension, convert = _args
+    directory = os.path.dirname(transPath)
+
+    with os.scandir(directory) as entries:
+        files = {entry.name: entry for entry in entries}
+
+    rows = []
+
+    with open(transPath, 'r', encoding = 'utf-8') as transcriptFile:
+        for line in transcriptFile:
+            parts = line.strip().split(' ', 1)
+
+            if len(parts) != 2:
+                continue
+
+            name, transcript = parts
+            audioName = name + extension
+
+            if audioName not in files and convert and extension == ".wav" and name + ".flac" in files:
+                ConvertFlac(os.path.join(directory, name + ".flac"), os.path.join(directory, audioName))
+                os.remove(os.path.join(directory, name + ".flac"))
+
+                audioPath = os.path.join(directory, audioName)
+                size = os.path.getsize(audioPath)
+            elif audioName in files:
+                audioPath = files[audioName].path
+                size = files[audioName].stat().st_size
+            else:
+                continue
+
+            if extension == ".wav":
+                sampleRate, _, samples = ReadWavHeader(audioPath)
+                duration = round(samples / sampleRate, 4)
+            else:
+                sampleRate, samples, duration = "", "", ""
+
+            rows.append([audioPath, size, transcript, duration, sampleRate, samples])
+
+    return transPath, rows
+
+class Manifest:
+    """
+    A csv manifest that is written to as the dataset is indexed. After the rows of every
+    .trans.txt file are written and flushed, the file and the size of the manifest at that point
+    are appended to a progress file next to it. A run that was interrupted cuts the manifest back
+    to the last complete .trans.txt file and skips every file it already indexed.
+    """
+    def __init__(self, _csvPath, _resume = True):
+        """
+        Parameters:
+            - _csvPath: The path to the manifest
+            - _resume: Continue an interrupted run instead of starting over
+        """
+        self.csvPath      = _csvPath
+        self.progressPath = _csvPath + ".progress"
+        self.done         = set()
+
+        offset = 0
+
+        if _resume and os.path.exists(self.progressPath) and os.path.exists(_csvPath):
+            with open(self.progressPath, 'r', encoding = 'utf-8') as progressFile:
+                for line in progressFile:
+                    parts = line.rstrip("\n").rsplit("\t", 1)
+
+                    # The last line may be cut off by the interruption
+                    if line.endswith("\n") and len(parts) == 2 and parts[1].isdigit():
+                        offset = int(parts[1])
+
+                        if parts[0]:
+                            self.done.add(parts[0])
+
+        if offset > 0:
+            self.csvFile = open(_csvPath, 'r+', newline = '', encoding = 'utf-8')
+            self.csvFile.truncate(offset)
+            self.csvFile.seek(offset)
+            self.progressFile = open(self.progressPath, 'a', encoding = 'utf-8')
+        else:
+            self.done = set()
+            self.csvFile = open(_csvPath, 'w', newline = '', encoding = 'utf-8')
+            self.progressFile = open(self.progressPath, 'w', encoding = 'utf-8')
+
+        self.writer = csv.writer(self.csvFile)
+
+        if offset == 0:
+            self.writer.writerow(COLUMNS)
+            self.Commit(None)
+
+    def Write(self, _transPath, _rows):
+        """
+        Parameters:
+            - _transPath: The .trans.txt file the rows came from
+            - _rows: The manifest rows
+        """
+        self.writer.writerows(_rows)
+        self.Commit(_transPath)
+
+    def Commit(self, _transPath):
+        """
+        Parameters:
+            - _transPath: The .trans.txt file that is now fully written, or None for the header
+        """
+        self.csvFile.flush()
+        os.fsync(self.csvFile.fileno())
+
+        if _transPath is not None:
+            self.done.add(_transPath)
+
+        self.progressFile.write(f"{_transPath or ''}\t{self.csvFile.tell()}\n")
+        self.progressFile.flush()
+
+    def Close(self, _complete = True):
+        """
+        Parameters:
+            - _complete: Every file is indexed, so the progress file isn't needed anymore
+        """
+        self.csvFile.close()
+        self.progressFile.close()
+
+        if _complete:
+            os.remove(self.progressPath)
+
+def Index(_rootDir, _csvPath, _extension = ".wav", _workers = None, _convert = False, _resume = True, _verbose = True):
+    """
+    Indexes a LibriSpeech style dataset into a manifest. The directories are searched for
+    .trans.txt files, and every .trans.txt file is indexed, by a pool of processes.
+
+    Parameters:
+        - _rootDir: The root directory of the dataset
+        - _csvPath: The manifest to write
+        - _extension: The extension of the audio files
+        - _workers: The amount of processes, the amount of cpu cores when None
+        - _convert: Convert flac files to wav files, deleting the flac files
+        - _resume: Continue an interrupted run
+        - _verbose: Print the progress every few seconds
+
+    Returns:
+        The amount of utterances indexed by this run
+    """
+    workers = _workers or os.cpu_count()
+    manifest = Manifest(_csvPath, _resume)
+
+    with os.scandir(_rootDir) as entries:
+        top = [entry.path for entry in entries if entry.is_dir(follow_symlinks = False)]
+
+    # The root directory itself can hold transcripts too
+    with os.scandir(_rootDir) as entries:
+        transPaths = [entry.path for entry in entries if entry.name.endswith(".trans.txt")]
+
+    pool = multiprocessing.get_context("spawn").Pool(workers) if workers > 1 else None
+
+    try:
+        for found in (pool.imap_unordered(FindTranscripts, top) if pool is not None else map(FindTranscripts, top)):
+            transPaths.extend(found)
+
+        pending = [(path, _extension, _convert) for path in sorted(transPaths) if path not in manifest.done]
+
+        if _verbose and manifest.done:
+            print(f"Resuming, {len(manifest.done)} of {len(transPaths)} transcript files are already indexed")
+
+        count, lastPrint = 0, time.monotonic()
+
+        if pool is not None:
+            results = pool.imap_unordered(IndexTranscript, pending, chunksize = 4)
+        else:
+            results = map(IndexTranscript, pending)
+
+        for transPath, rows in results:
+            manifest.Write(transPath, rows)
+            count += len(rows)
+
+            if _verbose and time.monotonic() - lastPrint > 5:
+                print(f"{len(manifest.done)} of {len(transPaths)} transcript files, {count} utterances")
+                lastPrint = time.monotonic()
+    except BaseException:
+        manifest.Close(_complete = False)
+        raise
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    manifest.Close()
+
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Index a LibriSpeech style dataset into a csv manifest")
+    parser.add_argument("root", help = "The root directory of the dataset")
+    parser.add_argument("csv", help = "The manifest to write")
+    parser.add_argument("--extension", default = "wav", help = "The extension of the audio files")
+    parser.add_argument("--workers", type = int, default = None, help = "Defaults to the amount of cpu cores")
+    parser.add_argument("--convert", action = "store_true", help = "Convert flac files to wav files, deleting the flac files")
+    parser.add_argument("--restart", action = "store_true", help = "Start over instead of resuming an interrupted run")
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    count = Index(args.root, args.csv, "." + args.extension, args.workers, args.convert, not args.restart)
+
+    print(f"Indexed {count} utterances in {time.monotonic() - start:.1f} s")
@@ -0,0 +1,356 @@
+# Lucas Davis
+
+import os
+import sys
+import csv
+import time
+import queue
+import argparse
+import threading
+import multiprocessing
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# The API modules import each other by their bare names, so the API directory needs to be
+# importable for SpeechRec
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "API"))
+
+# Set in every worker that computes features or beam searches, see InitFeatures and InitBeamSearch
+process = None
+beamSearch = None
+
+def InitFeatures():
+    """
+    Creates the Process instance the features of a worker process are computed with
+    """
+    global process
+
+    from Data.Process import Process
+
+    process = Process()
+
+def ComputeFeatures(_path):
+    """
+    Reads a wav file and computes the normalized spectrogram the model expects
+
+    Parameters:
+        - _path: The path to the wav file
+
+    Returns:
+        The spectrogram as a np.float32 array of (frames, bins) and the amount of samples
+    """
+    audio = process.LoadAudioFile(_path).numpy()
+    spectrogram = process.NormalizeSpec(process.Spectrogram(audio), _inPlace = True)
+
+    return np.asarray(spectrogram, dtype = np.float32), int(audio.shape[0])
+
+def InitBeamSearch():
+    """
+    Creates the BeamSearch of a worker process, with the language model from the config
+    """
+    global beamSearch
+
+    from Data.Process import Process
+    from Model.BeamSearch import BeamSearch
+
+    beamSearch = BeamSearch(Process())
+
+def DecodeBeams(_logits, _lengths):
+    """
+    Parameters:
+        - _logits: The logits of a batch in the shape of (batch, time, classes)
+        - _lengths: The valid time steps of every item in the batch
+
+    Returns:
+        A list of predictions
+    """
+    return beamSearch.DecodeBatch(_logits, _lengths)
+
+class Transcriber:
+    """
+    Transcribes a whole manifest in a pipeline of three stages that run at the same time:
+        - A pool reads the wav files and computes their spectrograms
+        - The model runs on batches of spectrograms of a similar length, padded to the longest one
+        - A second pool decodes the logits of the batches the model already finished
+
+    The clips are sorted by length first, so batches carry as little padding as possible, and the
+    transcripts are written as soon as their batch is decoded. Only a few batches are in flight
+    at any time, so the memory doesn't grow with the size of the manifest.
+    """
+    def __init__(self, _speechRec, _batchSize = 16, _readers = None, _decoders = None, _processes = False, _prefetch = 4):
+        """
+        Parameters:
+            - _speechRec: The SpeechRec instance whose model and decoder are used
+            - _batchSize: The amount of clips in a batch
+            - _readers: The amount of workers computing features. Defaults to the amount of cpus
+            - _decoders: The amount of workers decoding. Defaults to half the amount of cpus
+            - _processes: Compute the features, and beam search, in processes instead of threads.
+                          Tensorflow releases the GIL in its ops, but the python around them
+                          doesn't, so processes scale further at the cost of loading tensorflow
+                          in every one of them
+            - _prefetch: How many batches of features are computed ahead of the model
+        """
+        global process
+
+        self.speechRec = _speechRec
+        self.batchSize = max(1, int(_batchSize))
+        self.readers   = _readers or os.cpu_count()
+        self.decoders  = _decoders or max(1, os.cpu_count() // 2)
+        self.processes = _processes
+        self.prefetch  = max(1, int(_prefetch))
+
+        # The threads share the Process of the SpeechRec
+        process = _speechRec.process
+
+    def Pools(self):
+        """
+        Returns:
+            The feature pool and the decode pool
+        """
+        if not self.processes:
+            return ThreadPoolExecutor(self.readers), ThreadPoolExecutor(self.decoders)
+
+        # Spawned workers start from a fresh interpreter, a forked tensorflow runtime isn't safe
+        context = multiprocessing.get_context("spawn")
+        features = ProcessPoolExecutor(self.readers, mp_context = context, initializer = InitFeatures)
+
+        # Greedy decoding is a tensorflow graph that releases the GIL, only the beam search is
+        # python that needs its own processes
+        if self.speechRec.beamSearch is None:
+            return features, ThreadPoolExecutor(self.decoders)
+
+        return features, ProcessPoolExecutor(self.decoders, mp_context = context, initializer = InitBeamSearch)
+
+    def Decode(self, _logits, _frames):
+        """
+        Greedy decoding of a batch, run on the decode pool
+
+        Parameters:
+            - _logits: The logits of the batch
+            - _frames: The amount of spectrogram frames of every item in the batch
+
+        Returns:
+            A list of predictions
+        """
+        predictions = self.speechRec.inferConvert(self.speechRec.inferDecode(_logits, _frames)).numpy()
+
+        return [item.decode("utf-8") for item in predictions]
+
+    def Order(self, _audioPaths, _lengths):
+        """
+        Parameters:
+            - _audioPaths: The paths of the clips
+            - _lengths: The samples or file sizes of the clips, or None
+
+        Returns:
+            The indices of the clips from the shortest to the longest
+        """
+        if _lengths is None:
+            return np.arange(len(_audioPaths))
+
+        return np.argsort(np.asarray(_lengths), kind = "stable")
+
+    def Run(self, _audioPaths, _order, _output):
+        """
+        Runs the pipeline
+
+        Parameters:
+            - _audioPaths: The paths of the clips
+            - _order: The order the clips are batched in
+            - _output: Called from the writer thread with (indices, predictions, samples) of
+                       every batch, in the order of the batches
+
+        Returns:
+            The amount of samples that were transcribed
+        """
+        featurePool, decodePool = self.Pools()
+        decoded = queue.Queue(maxsize = self.prefetch)
+        errors = []
+
+        # The writer keeps emptying the queue after an error, so the model loop never blocks on it
+        def Writer():
+            while True:
+                item = decoded.get()
+
+                if item is None:
+                    return
+
+                if errors:
+                    continue
+
+                indices, future, samples = item
+
+                try:
+                    _output(indices, future.result(), samples)
+                except Exception as error:
+                    errors.append(error)
+
+        writer = threading.Thread(target = Writer, name = "TranscribeWriter", daemon = True)
+        writer.start()
+
+        totalSamples = 0
+
+        try:
+            features = deque()
+            position = 0
+            ahead = self.batchSize * self.prefetch
+
+            while (position < len(_order) or features) and not errors:
+                while position < len(_order) and len(features) < ahead:
+                    features.append(featurePool.submit(ComputeFeatures, _audioPaths[_order[position]]))
+                    position += 1
+
+                count = min(self.batchSize, len(features))
+                indices = _order[position - len(features):position - len(features) + count]
+                results = [features.popleft().result() for _ in range(count)]
+
+                spectrograms = [spectrogram for spectrogram, _ in results]
+                samples = [length for _, length in results]
+                frames = np.array([spectrogram.shape[0] for spectrogram in spectrograms], dtype = np.int32)
+
+                batch = np.zeros((count, max(1, frames.max()), spectrograms[0].shape[1]), dtype = np.float32)
+
+                for i, spectrogram in enumerate(spectrograms):
+                    batch[i, :frames[i]] = spectrogram
+
+                logits = self.speechRec.inferBatchLogits(batch).numpy()
+
+                if self.speechRec.beamSearch is None:
+                    future = decodePool.submit(self.Decode, logits, frames)
+                elif self.processes:
+                    future = decodePool.submit(DecodeBeams, logits, (frames + self.speechRec.stride - 1) // self.speechRec.stride)
+                else:
+                    future = decodePool.submit(self.speechRec.beamSearch.DecodeBatch, logits, (frames + self.speechRec.stride - 1) // self.speechRec.stride)
+
+                decoded.put((indices, future, samples))
+                totalSamples += sum(samples)
+        finally:
+            decoded.put(None)
+            writer.join()
+
+            featurePool.shutdown(wait = True, cancel_futures = True)
+            decodePool.shutdown(wait = True)
+
+        if errors:
+            raise errors[0]
+
+        return totalSamples
+
+class ErrorRate:
+    """
+    Keeps a running word error rate over the batches that have a reference transcript
+    """
+    def __init__(self):
+        self.errors = 0
+        self.words  = 0
+
+    def Add(self, _references, _predictions):
+        """
+        Parameters:
+            - _references: The reference transcripts, empty ones are skipped
+            - _predictions: The predictions in the same order
+        """
+        from jiwer import process_words
+
+        pairs = [(reference, prediction) for reference, prediction in zip(_references, _predictions) if reference.strip()]
+
+        if not pairs:
+            return
+
+        output = process_words([reference for reference, _ in pairs], [prediction for _, prediction in pairs])
+
+        self.errors += output.substitutions + output.deletions + output.insertions
+        self.words  += output.substitutions + output.deletions + output.hits
+
+    def Value(self):
+        """
+        Returns:
+            The word error rate so far, or None without any reference
+        """
+        return self.errors / self.words if self.words > 0 else None
+
+def Transcribe(_speechRec, _manifestPath, _outputPath, _batchSize = 16, _readers = None, _decoders = None, _processes = False,
+               _verbose = True):
+    """
+    Transcribes every clip of a manifest and writes a csv file of filename, transcript and
+    prediction, batch by batch as they finish. The rows are in the order the clips were batched,
+    from the shortest to the longest.
+
+    Parameters:
+        - _speechRec: The SpeechRec instance used to transcribe
+        - _manifestPath: A manifest Process.LoadCSV can read
+        - _outputPath: The csv file to write
+        - _batchSize, _readers, _decoders, _processes: See Transcriber
+
+    Returns:
+        The amount of clips, the seconds of audio, the seconds it took and the word error rate,
+        which is None when the manifest has no transcripts
+    """
+    audioPaths, transcripts, samples = _speechRec.process.LoadCSV(_manifestPath, _withSamples = True)
+
+    # Older csv files don't know the samples, their file size is just as good to sort by
+    if samples is None:
+        _, _, samples = _speechRec.process.LoadCSV(_manifestPath, _withSizes = True)
+
+    audioPaths = [path.decode("utf-8") if isinstance(path, bytes) else str(path) for path in audioPaths]
+    transcripts = [text.decode("utf-8") if isinstance(text, bytes) else ("" if text != text else str(text)) for text in transcripts]
+
+    transcriber = Transcriber(_speechRec, _batchSize, _readers, _decoders, _processes)
+    errorRate = ErrorRate()
+    sampleRate = int(_speechRec.process.spectrogramConfig['sample_rate'])
+
+    start = time.monotonic()
+    done = [0, 0]
+
+    with open(_outputPath, mode = 'w', newline = '', encoding = 'utf-8') as outputFile:
+        writer = csv.writer(outputFile)
+        writer.writerow(["filename", "transcript", "prediction"])
+
+        def Output(_indices, _predictions, _samples):
+            references = [transcripts[i].lower() for i in _indices]
+
+            writer.writerows([audioPaths[i], reference, prediction] for i, reference, prediction in zip(_indices, references, _predictions))
+            outputFile.flush()
+
+            errorRate.Add(references, _predictions)
+
+            done[0] += len(_indices)
+            done[1] += sum(_samples)
+
+            if _verbose:
+                seconds = time.monotonic() - start
+                print(f"{done[0]} of {len(audioPaths)} clips, {done[1] / sampleRate / seconds:.1f} audio seconds per second", end = "\r")
+
+        totalSamples = transcriber.Run(audioPaths, transcriber.Order(audioPaths, samples), Output)
+
+    if _verbose:
+        print()
+
+    return len(audioPaths), totalSamples / sampleRate, time.monotonic() - start, errorRate.Value()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Transcribe every clip of a manifest")
+    parser.add_argument("model", help = "A .keras file, a .tflite export or a SavedModel directory")
+    parser.add_argument("manifest", help = "A csv, npz, parquet or feather manifest")
+    parser.add_argument("output", help = "The csv file the transcripts are written to")
+    parser.add_argument("--batch_size", type = int, default = 16)
+    parser.add_argument("--readers", type = int, default = None, help = "Feature workers, defaults to the amount of cpu cores")
+    parser.add_argument("--decoders", type = int, default = None, help = "Decode workers, defaults to half the amount of cpu cores")
+    parser.add_argument("--processes", action = "store_true", help = "Use processes instead of threads for the features and beam search")
+    parser.add_argument("--strategy", default = None, choices = ["greedy", "beam"], help = "Defaults to the config")
+    args = parser.parse_args()
+
+    from Recognition import SpeechRec
+
+    speechRec = SpeechRec(SpeechRec.LoadModel(args.model), args.strategy, _vad = False)
+
+    clips, audioSeconds, seconds, errorRate = Transcribe(
+        speechRec, args.manifest, args.output, args.batch_size, args.readers, args.decoders, args.processes
+    )
+
+    print(f"Transcribed {clips} clips, {audioSeconds / 3600.0:.2f} hours of audio in {seconds:.1f} s")
+    print(f"Throughput: {audioSeconds / seconds:.1f} audio hours per hour")
+
+    if errorRate is not None:
+        print(f"WER: {errorRate:.4f}")
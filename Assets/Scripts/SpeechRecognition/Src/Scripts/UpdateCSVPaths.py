@@ -1,32 +1,54 @@
 # Lucas Davis
 
+import argparse
 import pandas as pd
-import re
-import sys
 
-CSVPATH = "/home/ldavis/Code/Data_Sets/SpeechRec/Data/CSVs/lj.csv"
+from Data.Manifest import RewritePrefix, Write
 
-path = "/home/ldavis/Code/Data_Sets/SpeechRec/LJSpeech-1.1/wavs/"
-extention = ".wav"
+def UpdatePaths(_inputPath, _outputPath, _old = "", _new = "", _extension = "", _clean = False):
+    """
+    Rewrites the paths of a manifest and saves it in the format of the output's extension (.csv,
+    .npz, .parquet or .feather). Every operation works on whole columns at once.
 
-data = pd.read_csv(CSVPATH)
+    Parameters:
+        - _inputPath: The manifest to read
+        - _outputPath: The manifest to write, can be the same file
+        - _old: The prefix of the paths to replace
+        - _new: The prefix to put in its place
+        - _extension: An extension to add to every path, e.g. for the LJSpeech csv file which only
+                      has the names of the wav files
+        - _clean: Remove everything from the transcripts that isn't a letter or a space
 
-audioPath = data['filename'].tolist()
-transcripts = data['transcript'].tolist()
+    Returns:
+        The amount of rows written
+    """
+    data = pd.read_csv(_inputPath)
 
-updatedAudioPaths = []
-updatedTranscripts = []
+    if _old:
+        data['filename'] = RewritePrefix(data['filename'].to_numpy(), _old, _new)
+    elif _new:
+        data['filename'] = _new + data['filename']
 
-for item in audioPath:
-    updatedAudioPaths.append(path + item + extention)
+    if _extension:
+        data['filename'] = data['filename'] + _extension
 
-for item in transcripts:
-    item = str(re.sub(r'[^a-zA-Z\s]', '', item))
-    updatedTranscripts.append(item)
+    if _clean:
+        data['transcript'] = data['transcript'].str.replace(r'[^a-zA-Z\s]', '', regex = True)
 
-data = pd.DataFrame({
-    'filename': updatedAudioPaths,
-    'transcript': transcripts
-})
+    Write(_outputPath, data)
 
-data.to_csv(CSVPATH)
\ No newline at end of file
+    return len(data)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Rewrite the paths of a csv manifest, or convert it to a columnar manifest")
+    parser.add_argument("input", help = "The csv file to read")
+    parser.add_argument("output", help = "The manifest to write: .csv, .npz, .parquet or .feather")
+    parser.add_argument("--old", default = "", help = "The prefix of the paths to replace, every path is prefixed with --new if omitted")
+    parser.add_argument("--new", default = "", help = "The prefix to put in its place")
+    parser.add_argument("--extension", default = "", help = "An extension to add to every path, e.g. .wav")
+    parser.add_argument("--clean", action = "store_true", help = "Remove everything from the transcripts that isn't a letter or a space")
+    args = parser.parse_args()
+
+    count = UpdatePaths(args.input, args.output, args.old, args.new, args.extension, args.clean)
+
+    print(f"Wrote {count} rows to {args.output}")
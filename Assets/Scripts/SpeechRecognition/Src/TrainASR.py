@@ -7,7 +7,6 @@ import matplotlib.pyplot as plt
 
 import tensorflow as tf
 from tensorflow.keras.models import load_model
-from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.callbacks import ModelCheckpoint, EarlyStopping
 from tensorflow.keras.optimizers.schedules import ExponentialDecay
 
@@ -17,21 +16,23 @@ from Data.Process import Process
 from Data.Augment import Augment
 from Data.Validate import Validate
 from Model.ValidateModel import ValidateModel
+from Model.BeamSearch import BeamSearch
 from Model.Setup import Setup
 
-def PlotErrorRate(_history, _path):
+def PlotErrorRate(_rate, _path):
     """
     This function plots the error rate of the model that was recorded from the
     callback class ValidateModel.
 
     Parameters:
-        - _rate: A list of error rates
-        - _history: 
+        - _rate: A list of (epoch, error rate), for the epochs the error rate was computed
+        - _path: The directory to save the figure to
     """
-    metrics = _history.history
+    epochs = [epoch for epoch, _ in _rate]
+    rates = [rate for _, rate in _rate]
 
     plt.figure(figsize = (16, 6))
-    plt.plot(_history.epoch, metrics['Error_Rate'])
+    plt.plot(epochs, rates)
     plt.legend('Error Rate')
     plt.ylim([0, max(plt.ylim())])
     plt.xlabel('Epoch')
@@ -62,6 +63,16 @@ if __name__ == "__main__":
         print("usage: python TrainASRModel.py /Path/to/TrainingData.csv /Path/to/ValidationData.csv /Path/to/TestData.csv")
         exit(1)
 
+    # The strategy sets up the devices and the cluster, which has to happen before tensorflow
+    # runs anything else
+    distributedConfig = ini().grabInfo("config.ini", "Training.Distributed")
+
+    strategy = ASRModel.Strategy(
+        str(distributedConfig.get('strategy', 'none')),
+        int(distributedConfig.get('cpu_replicas', 1))
+    )
+    isChief = ASRModel.IsChief(strategy)
+
     process = Process()
     augment = Augment()
     validate = Validate(process)
@@ -74,8 +85,9 @@ if __name__ == "__main__":
     learningConfig   = ini().grabInfo("config.ini", "Training.LearningRate")
     stopConfig       = ini().grabInfo("config.ini", "Training.EarlyStopping")
     processConfig    = ini().grabInfo("config.ini", "Process")
-    spectrogramConfig= ini().grabInfo("config.ini", "Process.Spectrogram")
-
+    decoderConfig    = ini().grabInfo("config.ini", "Decoder")
+    precisionConfig  = ini().grabInfo("config.ini", "Training.Precision")
+    modelConfig      = ini().grabInfo("config.ini", "Model")
 
     seed             = int(generalConfig['seed'])
     numEpochs        = int(trainingConfig['epochs'])
@@ -87,7 +99,10 @@ if __name__ == "__main__":
     decayRate        = float(learningConfig['decay_rate'])
     stoppingPatients = int(stopConfig['patience'])
     debug            = eval(processConfig['display_spectrograms'])
-    fft              = int(spectrogramConfig['fft'])
+    decoding         = str(decoderConfig['strategy'])
+    policy           = str(precisionConfig.get('policy', 'float32'))
+    jitCompile       = eval(precisionConfig.get('jit_compile', 'False'))
+    lossScale        = eval(precisionConfig.get('loss_scale', 'True'))
     
     tf.random.set_seed(seed)
     np.random.seed(seed)
@@ -99,32 +114,46 @@ if __name__ == "__main__":
         staircase   = True
     )
 
-    if os.path.exists(pathToModel):
-        print(f"\nLoaded existing model")
-
-        model = load_model(
-            pathToModel, 
-            custom_objects = {'ctcloss': ASRModel.ctcloss}, 
-            safe_mode = False
-        )
-    else:
-        print(f"\nBuilding a new model")
-
-        model = ASRModel.BuildModel (
-            fft // 2 + 1,                           # Input size
-            process.charToNum.vocabulary_size()     # Num of Classes
-        )
-
-        model.compile(
-            optimizer   = Adam(learning_rate = expDecayLR), 
-            loss = ASRModel.ctcloss
-        )
+    # The policy has to be set before the model is built. A loaded model keeps the policy it
+    # was trained with
+    print(f"Precision: {ASRModel.SetPrecision(policy)}, XLA: {jitCompile}, Replicas: {strategy.num_replicas_in_sync}")
+
+    # The variables of the model and the optimizer are mirrored on every replica
+    with strategy.scope():
+        if os.path.exists(pathToModel):
+            print(f"\nLoaded existing model")
+
+            model = load_model(
+                pathToModel, 
+                custom_objects = {'ctcloss': ASRModel.ctcloss}, 
+                safe_mode = False
+            )
+            model.jit_compile = jitCompile
+
+            # A model only takes the features it was trained on
+            if model.input_shape[-1] != process.Bins():
+                raise ValueError(
+                    f"{pathToModel} takes {model.input_shape[-1]} bins, but the feature_type {process.filterbank.type} "
+                    f"in [Process.Spectrogram] has {process.Bins()}"
+                )
+        else:
+            print(f"\nBuilding a new model")
+
+            model = ASRModel.Build (
+                process.Bins(),                         # Input size, depends on the feature_type
+                process.charToNum.vocabulary_size(),    # Num of Classes
+                modelConfig
+            )
+
+            ASRModel.Compile(model, expDecayLR, jitCompile, lossScale)
+
+        ASRModel.Distribute(model, strategy)
 
     model.summary()
 
-    trainDataset, validationData, testDataset = setup.CreateDataset(sys.argv[1], sys.argv[2], sys.argv[3])
+    trainDataset, validationData, testDataset = setup.CreateDataset(sys.argv[1], sys.argv[2], sys.argv[3], strategy)
 
-    validate = ValidateModel(testDataset)
+    validate = ValidateModel(testDataset, BeamSearch(process) if decoding == "beam" else None)
 
     checkpoint = ModelCheckpoint (
         pathToCheckpoint + "BestWeights.keras",
@@ -140,18 +169,28 @@ if __name__ == "__main__":
         restore_best_weights = True
     )
 
-    if debug:
+    # Every worker computes the same val_loss, so they all stop at the same epoch. The error rate,
+    # the checkpoints, the figures and the model are only computed and saved by the chief
+    callbacks = [validate, checkpoint, earlyStop] if isChief else [earlyStop]
+
+    if debug and isChief:
         setup.Debug(trainDataset, validationData, testDataset)
 
-    history = model.fit (
-        trainDataset,
-        validation_data = validationData,
-        epochs          = numEpochs,
-        callbacks       = [validate, checkpoint, earlyStop]
-    )
+    if isChief:
+        validate.set_model(model)
+        validate.on_train_begin()
+
+    with strategy.scope():
+        history = model.fit (
+            trainDataset,
+            validation_data = validationData,
+            epochs          = numEpochs,
+            callbacks       = callbacks
+        )
 
-    PlotLoss(history, pathToFigures)
-    PlotErrorRate(history, pathToFigures)
+    if isChief:
+        PlotLoss(history, pathToFigures)
+        PlotErrorRate(validate.errorRate, pathToFigures)
 
-    model.save(pathToModel)
-    model.summary()
\ No newline at end of file
+        model.save(pathToModel)
+        model.summary()
\ No newline at end of file
@@ -1,8 +1,15 @@
 @echo off
+setlocal EnableDelayedExpansion
 if "%~1"=="" (
     echo Building API
 
-    pyinstaller --onefile --add-data "models/ASR.keras;models" --add-data "Data/Process.py;Data" --add-data "Data/NLP.py;Data" --add-data "Model/ASRModel.py;Model" --add-data "Grab_Ini.py;." --hidden-import language_tool_python API/ASR_API.py
+    rem Package the exports from Scripts/ExportModel.py when they exist
+    set exports=
+    if exist models\ASR_savedmodel\ set exports=!exports! --add-data "models/ASR_savedmodel;models/ASR_savedmodel"
+    if exist models\ASR_float16.tflite set exports=!exports! --add-data "models/ASR_float16.tflite;models"
+    if exist models\ASR_int8.tflite set exports=!exports! --add-data "models/ASR_int8.tflite;models"
+
+    pyinstaller --onefile !exports! --add-data "models/ASR.keras;models" --add-data "Data/Process.py;Data" --add-data "Data/Features.py;Data" --add-data "Data/NLP.py;Data" --add-data "Data/VAD.py;Data" --add-data "Data/Manifest.py;Data" --add-data "Model/ASRModel.py;Model" --add-data "Model/PhraseDecoder.py;Model" --add-data "Model/BeamSearch.py;Model" --add-data "Model/LanguageModel.py;Model" --add-data "Model/LiteModel.py;Model" --add-data "Model/GraphModel.py;Model" --add-data "Model/RowConv.py;Model" --add-data "Model/Masking.py;Model" --add-data "Grab_Ini.py;." --hidden-import language_tool_python API/ASR_API.py
 
     copy config.ini dist\config.ini
 ) else if "%~1"=="clean" (
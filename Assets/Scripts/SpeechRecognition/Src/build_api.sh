@@ -2,7 +2,17 @@
 if [ -z "$1" ]; then
     echo "Building API"
 
-    pyinstaller --onefile --add-data "models/ASR.keras:models" --add-data "Data/Process.py:Data" --add-data "Data/NLP.py:Data" --add-data "Model/ASRModel.py:Model" --add-data "Grab_Ini.py:." --hidden-import language_tool_python API/ASR_API.py
+    # Package the exports from Scripts/ExportModel.py when they exist
+    exports=""
+    for export in models/ASR_savedmodel models/ASR_float16.tflite models/ASR_int8.tflite; do
+        if [ -d "$export" ]; then
+            exports="$exports --add-data $export:$export"
+        elif [ -f "$export" ]; then
+            exports="$exports --add-data $export:models"
+        fi
+    done
+
+    pyinstaller --onefile $exports --add-data "models/ASR.keras:models" --add-data "Data/Process.py:Data" --add-data "Data/Features.py:Data" --add-data "Data/NLP.py:Data" --add-data "Data/VAD.py:Data" --add-data "Data/Manifest.py:Data" --add-data "Model/ASRModel.py:Model" --add-data "Model/PhraseDecoder.py:Model" --add-data "Model/BeamSearch.py:Model" --add-data "Model/LanguageModel.py:Model" --add-data "Model/LiteModel.py:Model" --add-data "Model/GraphModel.py:Model" --add-data "Model/RowConv.py:Model" --add-data "Model/Masking.py:Model" --add-data "Grab_Ini.py:." --hidden-import language_tool_python API/ASR_API.py
 
     cp config.ini dist/config.ini
 elif [ "$1" == "clean" ]; then
@@ -0,0 +1,112 @@
+# Lucas Davis
+
+import os
+import sys
+import zlib
+import struct
+import threading
+import numpy as np
+from unittest.mock import Mock
+
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "API"))
+
+import ASR_API
+import AudioFormat
+
+class TestAudioFormat(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(42)
+        cls.audio = rng.normal(scale = 0.1, size = 16000).astype(np.float32)
+
+    def test_encodings_round_trip(self):
+        for encoding, tolerance in [(AudioFormat.FLOAT32, 0.0), (AudioFormat.INT16, 1 / 32767), (AudioFormat.DEFLATE, 1 / 32767)]:
+            decoded = AudioFormat.Decode(AudioFormat.Encode(self.audio, 16000, encoding), 16000)
+
+            self.assertEqual(decoded.dtype, np.float32)
+            np.testing.assert_allclose(decoded, self.audio, atol = tolerance)
+
+    def test_deflate_is_lossless_and_smaller(self):
+        int16 = AudioFormat.Encode(self.audio, 16000, AudioFormat.INT16)
+        deflate = AudioFormat.Encode(self.audio, 16000, AudioFormat.DEFLATE)
+
+        self.assertLess(len(deflate), len(int16))
+        np.testing.assert_array_equal(AudioFormat.Decode(deflate, 16000), AudioFormat.Decode(int16, 16000))
+
+    def test_stereo_is_mixed_down(self):
+        stereo = np.stack([self.audio, -self.audio * 0.5], axis = 1)
+
+        decoded = AudioFormat.Decode(AudioFormat.Encode(stereo, 16000, AudioFormat.DEFLATE), 16000)
+
+        np.testing.assert_allclose(decoded, self.audio * 0.25, atol = 1 / 32767)
+
+    def test_resampled_to_model_rate(self):
+        t = np.arange(48000) / 48000
+        tone = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+        decoded = AudioFormat.Decode(AudioFormat.Encode(tone, 48000), 16000)
+        expected = 0.5 * np.sin(2 * np.pi * 440 * np.arange(16000) / 16000)
+
+        self.assertEqual(decoded.shape, (16000,))
+        np.testing.assert_allclose(decoded, expected, atol = 1e-3)
+
+    def test_malformed_audio_raises(self):
+        framed = AudioFormat.Encode(self.audio, 16000)
+
+        for body in [framed[:10], b"RIFF" + framed[4:], framed[:8] + b"\x07" + framed[9:], framed[:-2]]:
+            with self.assertRaises(ValueError):
+                AudioFormat.Decode(body, 16000)
+
+    def test_oversized_deflate_raises(self):
+        # A header claiming one second over a stream that inflates to a hundred megabytes
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+        bomb = compressor.compress(bytes(100 * 1024 * 1024)) + compressor.flush()
+        framed = AudioFormat.HEADER.pack(AudioFormat.MAGIC, 16000, AudioFormat.DEFLATE, 1, 0, 16000) + bomb
+
+        with self.assertRaises(ValueError):
+            AudioFormat.Decode(framed, 16000)
+
+        # Too few samples and trailing bytes after the stream are rejected as well
+        deflate = AudioFormat.Encode(self.audio, 16000, AudioFormat.DEFLATE)
+        header = bytearray(deflate[:AudioFormat.HEADER.size])
+        struct.pack_into("<I", header, 12, 16001)
+
+        for body in [bytes(header) + deflate[AudioFormat.HEADER.size:], deflate + b"\x00", deflate[:-4]]:
+            with self.assertRaises(ValueError):
+                AudioFormat.Decode(body, 16000)
+
+        client = ASR_API.app.test_client()
+        ASR_API.backend = Mock()
+        ASR_API.admission = threading.BoundedSemaphore(4)
+        ASR_API.ready.set()
+
+        response = client.post('/ASR', data = framed, content_type = AudioFormat.CONTENT_TYPE)
+
+        self.assertEqual(response.status_code, 400)
+        ASR_API.backend.Predict.assert_not_called()
+
+    def test_api_accepts_framed_audio(self):
+        backend = Mock()
+        backend.Predict.side_effect = lambda audio: f"{audio.shape[0]}"
+
+        ASR_API.backend = backend
+        ASR_API.admission = threading.BoundedSemaphore(4)
+        ASR_API.ready.set()
+
+        client = ASR_API.app.test_client()
+
+        raw = client.post('/ASR', data = self.audio.tobytes(), content_type = 'application/octet-stream')
+        framed = client.post('/ASR', data = AudioFormat.Encode(self.audio, 8000), content_type = AudioFormat.CONTENT_TYPE)
+        broken = client.post('/ASR', data = b"ASR1", content_type = AudioFormat.CONTENT_TYPE)
+
+        self.assertEqual(raw.get_json()["prediction"], "16000")
+        self.assertEqual(framed.get_json()["prediction"], "32000")
+        self.assertEqual(broken.status_code, 400)
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
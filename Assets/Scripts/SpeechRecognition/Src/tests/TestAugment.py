@@ -3,7 +3,7 @@
 import tensorflow as tf
 
 import unittest
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 from Data.Augment import Augment
 
@@ -14,7 +14,9 @@ class TestAugment(unittest.TestCase):
         mock_uniform = Mock()
         mock_uniform.side_effect = [tf.constant(-1.5), tf.constant([0.1, 0.2, 0.3])]
 
-        tf.random.uniform = mock_uniform
+        patcher = patch.object(tf.random, 'uniform', mock_uniform)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
         _audio = tf.constant([0.5, 0.5, 0.5], dtype=tf.float32)
 
@@ -29,7 +31,9 @@ class TestAugment(unittest.TestCase):
         augment = Augment()
 
         mock_uniform = Mock(return_value=tf.constant(1.05))
-        tf.random.uniform = mock_uniform
+        patcher = patch.object(tf.random, 'uniform', mock_uniform)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
         _audio = tf.constant([0.5, 0.5, 0.5], dtype=tf.float32)
 
@@ -43,6 +47,72 @@ class TestAugment(unittest.TestCase):
         self.assertTrue(tf.reduce_all(tf.equal(result, expected_result)))
         mock_uniform.assert_called_once_with(shape=[], minval=0.95, maxval=1.05)
 
+    def test_noise_batch(self):
+        augment = Augment()
+
+        mock_uniform = Mock(side_effect = [
+            tf.constant([[-1.5], [-2.0]]),
+            tf.constant([[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]])
+        ])
+
+        _audio = tf.constant([[0.5, 0.5, 0.5], [0.5, 0.5, 0.0]], dtype=tf.float32)
+
+        with patch.object(tf.random, 'uniform', mock_uniform):
+            result = augment.NoiseBatch(_audio, tf.constant([3, 2]))
+
+        expected_result = tf.constant([
+            [0.5 + 0.1 * 10 ** (-1.5 / 20), 0.5 + 0.2 * 10 ** (-1.5 / 20), 0.5 + 0.3 * 10 ** (-1.5 / 20)],
+            [0.5 + 0.4 * 10 ** (-2.0 / 20), 0.5 + 0.5 * 10 ** (-2.0 / 20), 0.0]
+        ])
+
+        self.assertTrue(tf.reduce_all(tf.abs(result - expected_result) < 1e-6))
+
+    def test_volume_batch(self):
+        augment = Augment()
+
+        mock_uniform = Mock(return_value=tf.constant([[1.05], [0.95]]))
+
+        _audio = tf.constant([[0.5, 0.5, 0.5], [0.5, 0.5, 0.0]], dtype=tf.float32)
+
+        with patch.object(tf.random, 'uniform', mock_uniform):
+            result = augment.VolumeBatch(_audio)
+
+        expected_result = tf.constant([[0.5, 0.5, 0.5], [0.5, 0.5, 0.0]]) * tf.constant([[1.05], [0.95]])
+
+        self.assertTrue(tf.reduce_all(tf.equal(result, expected_result)))
+        self.assertEqual(mock_uniform.call_args.kwargs['minval'], 0.95)
+        self.assertEqual(mock_uniform.call_args.kwargs['maxval'], 1.05)
+
+    def test_time_strech_batch_padding(self):
+        augment = Augment()
+        tf.random.set_seed(42)
+
+        samples = tf.constant([1600, 1000])
+        _audio = tf.random.stateless_uniform([2, 1600], seed = [1, 2], minval = 0.1, maxval = 1.0)
+        _audio = _audio * tf.sequence_mask(samples, 1600, dtype = tf.float32)
+
+        result, length = augment.TimeStrechBatch(_audio, samples)
+
+        for row in range(2):
+            ratio = samples[row].numpy() / length[row].numpy()
+
+            self.assertTrue(0.95 - 1e-3 <= ratio <= 1.05 + 1e-3)
+            self.assertTrue(tf.reduce_all(result[row, :length[row]] > 0))
+            self.assertTrue(tf.reduce_all(result[row, length[row]:] == 0))
+
+    def test_spec_augment_padding(self):
+        augment = Augment()
+        tf.random.set_seed(42)
+
+        frames = tf.constant([50, 30])
+        _spec = tf.ones([2, 50, 193]) * tf.sequence_mask(frames, 50, dtype = tf.float32)[..., tf.newaxis]
+
+        result = augment.SpecAugment(_spec, frames)
+
+        self.assertTrue(tf.reduce_all(result[1, 30:] == 0))
+        self.assertTrue(tf.reduce_all((result == 0) | (result == _spec)))
+        self.assertTrue(tf.reduce_any(result != _spec))
+
 def main():
     unittest.main(verbosity = 2)
 
@@ -0,0 +1,115 @@
+# Lucas Davis
+
+import os
+import shutil
+import tempfile
+import numpy as np
+
+import unittest
+
+from Data.Process import Process
+from Model.BeamSearch import BeamSearch
+from Model.LanguageModel import LanguageModel
+
+ARPA = """
+\\data\\
+ngram 1=5
+ngram 2=3
+
+\\1-grams:
+-99\t<s>\t-0.5
+-1.0\t</s>
+-0.5\tlight\t-0.3
+-0.7\tthe
+-0.9\tfire\t-0.2
+
+\\2-grams:
+-0.1\t<s> light
+-0.2\tlight the
+-0.3\tthe fire
+
+\\end\\
+"""
+
+class TestBeamSearch(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.arpaPath = os.path.join(cls.directory, "test.arpa")
+
+        with open(cls.arpaPath, mode = 'w', encoding = 'utf-8') as arpa:
+            arpa.write(ARPA)
+
+        cls.process = Process()
+        cls.languageModel = LanguageModel(cls.arpaPath)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def Spell(self, _text, _rng, _confusions = {}):
+        """
+        Logits that spell out a text, where the characters at the positions in _confusions are
+        slightly more likely to be another character
+        """
+        label = self.process.charToNum(list(_text)).numpy()
+        logits = _rng.normal(scale = 0.1, size = ((2 * len(label) + 1) * 3, 29))
+
+        logits[:, -1] += 8.0
+
+        for i, char in enumerate(label):
+            block = slice((2 * i + 1) * 3, (2 * i + 2) * 3)
+
+            logits[block, -1] -= 8.0
+            logits[block, char] += 8.0
+
+            if i in _confusions:
+                logits[block, self.process.charToNum(_confusions[i]).numpy()] += 9.0
+
+        return logits.astype(np.float32)
+
+    def test_language_model_scores(self):
+        model = self.languageModel
+        ln10 = np.log(10.0)
+
+        states = np.array([model.start, model.start, model.start])
+        scores, nextStates = model.Score(states, model.Encode(["light", "the", "wolf"]))
+
+        # A bigram, a backoff from <s> to the unigram, and an unknown word
+        np.testing.assert_allclose(scores[:2], [-0.1 * ln10, (-0.5 - 0.7) * ln10])
+        self.assertAlmostEqual(scores[2], -0.5 * ln10 + model.unknownScore)
+
+        # The bigram "light the" from the state after "light"
+        scores, _ = model.Score(nextStates[:1], model.Encode(["the"]))
+        np.testing.assert_allclose(scores, [-0.2 * ln10])
+
+    def test_matches_greedy_without_language_model(self):
+        rng = np.random.default_rng(42)
+        decoder = BeamSearch(self.process, 8, None)
+
+        for text in ["light the fire", "a door", "hello"]:
+            self.assertEqual(decoder.Decode(self.Spell(text, rng)), text)
+
+    def test_language_model_fixes_confusion(self):
+        rng = np.random.default_rng(42)
+        logits = self.Spell("light the fire", rng, {13: "a"})
+
+        self.assertEqual(BeamSearch(self.process, 8, None).Decode(logits), "light the fira")
+        self.assertEqual(BeamSearch(self.process, 8, self.languageModel).Decode(logits), "light the fire")
+
+    def test_decode_batch_uses_lengths(self):
+        rng = np.random.default_rng(42)
+        decoder = BeamSearch(self.process, 8, None)
+
+        short, long = self.Spell("the", rng), self.Spell("the fire", rng)
+
+        batch = np.zeros((2, long.shape[0], 29), dtype = np.float32)
+        batch[0, :short.shape[0]], batch[1] = short, long
+
+        self.assertEqual(decoder.DecodeBatch(batch, [short.shape[0], long.shape[0]]), ["the", "the fire"])
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# Lucas Davis
+
+import numpy as np
+import tensorflow as tf
+
+import unittest
+
+from Model.ASRModel import ASRModel
+
+class TestDistributed(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Two logical cpus, so a mirrored strategy has two replicas without a GPU. The cpu can
+        # only be split before tensorflow runs anything, which an earlier test in the same
+        # process may already have done
+        try:
+            cls.strategy = ASRModel.Strategy("mirrored", 2)
+        except RuntimeError:
+            raise unittest.SkipTest("The cpu can't be split after tensorflow is initialized, run this test on its own")
+
+    def test_strategy_has_two_replicas(self):
+        self.assertEqual(self.strategy.num_replicas_in_sync, 2)
+        self.assertTrue(ASRModel.IsChief(self.strategy))
+
+    def test_only_first_worker_is_chief(self):
+        cluster = tf.train.ClusterSpec({"worker": ["localhost:1", "localhost:2"]})
+
+        class Worker:
+            def __init__(self, _index):
+                self.cluster_resolver = tf.distribute.cluster_resolver.SimpleClusterResolver(
+                    cluster, task_type = "worker", task_id = _index
+                )
+
+        self.assertTrue(ASRModel.IsChief(Worker(0)))
+        self.assertFalse(ASRModel.IsChief(Worker(1)))
+
+    def test_loss_is_scaled_by_global_batch(self):
+        rng = np.random.default_rng(42)
+        logits = rng.standard_normal((4, 20, 29)).astype(np.float32)
+        labels = rng.integers(1, 28, size = (4, 5))
+
+        expected = float(ASRModel.ctcloss(labels, logits))
+
+        # The replicas get an uneven split of the global batch, 3 samples and 1
+        splits = [(labels[:3], logits[:3]), (labels[3:], logits[3:])]
+        values = self.strategy.experimental_distribute_values_from_function(
+            lambda context: splits[context.replica_id_in_sync_group]
+        )
+
+        # Keras divides the loss of every replica by the amount of replicas and sums the gradients
+        perReplica = self.strategy.run(
+            lambda value: ASRModel.ctcloss(*value) / self.strategy.num_replicas_in_sync,
+            args = (values,)
+        )
+        loss = self.strategy.reduce(tf.distribute.ReduceOp.SUM, perReplica, axis = None)
+
+        self.assertAlmostEqual(float(loss), expected, places = 3)
+
+    def test_mirrored_training_step(self):
+        with self.strategy.scope():
+            model = ASRModel.Compile(ASRModel.BuildModel(193, 28), 1e-4)
+
+        rng = np.random.default_rng(42)
+        spectrograms = rng.standard_normal((4, 32, 193)).astype(np.float32)
+        labels = rng.integers(1, 28, size = (4, 4))
+
+        dataset = self.strategy.distribute_datasets_from_function(
+            lambda context: tf.data.Dataset.from_tensor_slices((spectrograms, labels)).shard(
+                context.num_input_pipelines, context.input_pipeline_id
+            ).batch(context.get_per_replica_batch_size(4))
+        )
+
+        history = model.fit(dataset, epochs = 1, verbose = 0)
+
+        self.assertTrue(np.isfinite(history.history['loss'][0]))
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
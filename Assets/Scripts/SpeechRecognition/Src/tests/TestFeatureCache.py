@@ -0,0 +1,101 @@
+# Lucas Davis
+
+import os
+import csv
+import wave
+import shutil
+import tempfile
+import numpy as np
+import tensorflow as tf
+
+import unittest
+
+from Data.Process import Process
+from Data.FeatureCache import FeatureCache
+
+class TestFeatureCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.csvPath = os.path.join(self.directory, "test.csv")
+
+        rng = np.random.default_rng(42)
+
+        with open(self.csvPath, mode = 'w', newline = '', encoding = 'utf-8') as csvFile:
+            writer = csv.writer(csvFile)
+            writer.writerow(["filename", "filesize", "transcript"])
+
+            for i, samples in enumerate([4000, 9000, 16000]):
+                path = os.path.join(self.directory, f"{i}.wav")
+
+                with wave.open(path, 'wb') as wav:
+                    wav.setnchannels(1)
+                    wav.setsampwidth(2)
+                    wav.setframerate(16000)
+                    wav.writeframes(rng.integers(-3000, 3000, samples).astype(np.int16).tobytes())
+
+                writer.writerow([path, os.path.getsize(path), f"clip number {i}"])
+
+        self.process = Process()
+        self.cache = FeatureCache(self.process)
+        self.cache.path = os.path.join(self.directory, "cache")
+        self.cache.dtype = np.dtype("float32")
+        self.cache.shardFrames = 100
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def ProcessData(self, _file, _transcript):
+        audio = self.process.LoadAudioFile(_file)
+
+        spec = self.process.Spectrogram(audio)
+        spec = self.process.NormalizeSpec(spec)
+
+        return spec, self.process.Transcript(_transcript)
+
+    def test_cached_features_match(self):
+        audioPaths, transcripts = self.process.LoadCSV(self.csvPath)
+
+        cached = list(self.cache.Load(self.csvPath, self.ProcessData).as_numpy_iterator())
+
+        self.assertEqual(len(cached), 3)
+
+        for (spectrogram, label), path, transcript in zip(cached, audioPaths, transcripts):
+            expected, expectedLabel = self.ProcessData(tf.constant(path), tf.constant(transcript))
+
+            np.testing.assert_allclose(spectrogram, expected.numpy(), rtol = 1e-5, atol = 1e-5)
+            np.testing.assert_array_equal(label, expectedLabel.numpy())
+
+    def test_config_change_invalidates_cache(self):
+        self.cache.Build(self.csvPath, self.ProcessData)
+        self.assertTrue(self.cache.IsValid(self.csvPath))
+
+        self.cache.spectrogramConfig = dict(self.cache.spectrogramConfig, frame_step = "128")
+        self.assertFalse(self.cache.IsValid(self.csvPath))
+
+    def test_csv_files_with_the_same_name(self):
+        # A second csv file with the same name in another folder, holding only the first clip
+        otherPath = os.path.join(self.directory, "other", "test.csv")
+        os.makedirs(os.path.dirname(otherPath))
+
+        with open(self.csvPath, 'r', encoding = 'utf-8') as csvFile:
+            lines = csvFile.readlines()
+
+        with open(otherPath, 'w', encoding = 'utf-8') as csvFile:
+            csvFile.writelines(lines[:2])
+
+        self.assertNotEqual(self.cache.Directory(self.csvPath), self.cache.Directory(otherPath))
+
+        self.cache.Build(self.csvPath, self.ProcessData)
+        self.cache.Build(otherPath, self.ProcessData)
+
+        # Neither build replaced the cache of the other
+        self.assertTrue(self.cache.IsValid(self.csvPath))
+        self.assertTrue(self.cache.IsValid(otherPath))
+        self.assertEqual(len(list(self.cache.Load(self.csvPath, self.ProcessData))), 3)
+        self.assertEqual(len(list(self.cache.Load(otherPath, self.ProcessData))), 1)
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
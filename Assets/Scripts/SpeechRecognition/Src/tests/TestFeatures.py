@@ -0,0 +1,163 @@
+# Lucas Davis
+
+import os
+import sys
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from concurrent.futures import ThreadPoolExecutor
+
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "API"))
+
+from Data.Process import Process
+from Data.Features import Filterbank, SpectrogramExtractor, MelMatrix, DCTMatrix, FEATURE_TYPES
+from Recognition import SpeechRec
+
+# The largest absolute difference allowed between the two backends, for audio in [-1, 1]
+TOLERANCE = 1e-4
+
+class TestFeatures(unittest.TestCase):
+    def setUp(self):
+        self.process = Process()
+        self.extractor = SpectrogramExtractor(dict(self.process.spectrogramConfig, feature_type = "linear"))
+        self.rng = np.random.default_rng(42)
+
+    def Audio(self, _samples):
+        return self.rng.uniform(-1.0, 1.0, _samples).astype(np.float32)
+
+    def Configure(self, _featureType):
+        config = dict(self.process.spectrogramConfig, feature_type = _featureType)
+
+        self.process.spectrogramConfig = config
+        self.process.filterbank = Filterbank(config)
+        self.process.extractor = SpectrogramExtractor(config)
+
+    def Tensorflow(self, _audio):
+        return tf.signal.stft(tf.constant(_audio), frame_length = 256, frame_step = 160, fft_length = 384)
+
+    def test_matches_tf_stft(self):
+        for samples in [256, 257, 415, 416, 16000, 16000 * 12]:
+            audio = self.Audio(samples)
+            expected = np.sqrt(np.abs(self.Tensorflow(audio).numpy()))
+
+            spectrogram = self.extractor.Spectrogram(audio)
+
+            self.assertEqual(spectrogram.dtype, np.float32)
+            self.assertEqual(spectrogram.shape, expected.shape)
+            np.testing.assert_allclose(spectrogram, expected, rtol = 0, atol = TOLERANCE)
+
+    def test_normalize_matches_tensorflow(self):
+        spectrogram = self.extractor.Spectrogram(self.Audio(16000))
+        expected = self.process.NormalizeSpec(tf.constant(spectrogram)).numpy()
+
+        np.testing.assert_allclose(self.extractor.Normalize(spectrogram), expected, rtol = 0, atol = TOLERANCE)
+
+        # Silent frames have a std of 0, which the 1e-10 keeps from dividing by zero
+        silence = self.extractor.Features(np.zeros(1600, dtype = np.float32))
+        self.assertTrue(np.all(silence == 0))
+
+    def test_in_place_normalize(self):
+        spectrogram = self.extractor.Spectrogram(self.Audio(8000))
+        original = spectrogram.copy()
+
+        copied = self.extractor.Normalize(spectrogram)
+        np.testing.assert_array_equal(spectrogram, original)
+
+        inPlace = self.extractor.Normalize(spectrogram, _inPlace = True)
+        self.assertIs(inPlace, spectrogram)
+        np.testing.assert_array_equal(inPlace, copied)
+
+    def test_batch_and_short_clips(self):
+        batch = np.stack([self.Audio(4000) for _ in range(3)])
+        expected = np.sqrt(np.abs(self.Tensorflow(batch).numpy()))
+
+        np.testing.assert_allclose(self.extractor.Spectrogram(batch), expected, rtol = 0, atol = TOLERANCE)
+        self.assertEqual(self.extractor.Spectrogram(self.Audio(100)).shape, (0, 193))
+
+    def test_buffers_dont_leak_into_results(self):
+        first, second = self.Audio(16000), self.Audio(3200)
+
+        expected = self.extractor.Spectrogram(first).copy()
+
+        # The frame buffer is reused, earlier results have to stay untouched by later calls
+        result = self.extractor.Spectrogram(first)
+        self.extractor.Spectrogram(second)
+
+        np.testing.assert_array_equal(result, expected)
+
+        # Every thread has its own buffer
+        clips = [self.Audio(1600 * (i + 1)) for i in range(16)]
+
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(self.extractor.Features, clips * 4))
+
+        for clip, result in zip(clips * 4, results):
+            np.testing.assert_array_equal(result, self.extractor.Features(clip))
+
+    def test_process_backends(self):
+        audio = self.Audio(16000)
+
+        self.process.extractor = None
+        tensorflowSpec = self.process.Spectrogram(audio)
+
+        self.process.extractor = self.extractor
+        numpySpec = self.process.Spectrogram(audio)
+
+        self.assertIsInstance(numpySpec, np.ndarray)
+        np.testing.assert_allclose(numpySpec, tensorflowSpec.numpy(), rtol = 0, atol = TOLERANCE)
+
+        # Tensors, like those of the datasets, always stay in tensorflow
+        self.assertIsInstance(self.process.Spectrogram(tf.constant(audio)), tf.Tensor)
+        self.assertIsInstance(self.process.NormalizeSpec(tensorflowSpec), tf.Tensor)
+
+    def test_filterbank_matrices_match_tensorflow(self):
+        expected = tf.signal.linear_to_mel_weight_matrix(80, 193, 16000, 20.0, 7600.0).numpy()
+        np.testing.assert_allclose(MelMatrix(193, 16000, 80, 20.0, 7600.0), expected, rtol = 0, atol = 1e-5)
+
+        logMel = self.rng.standard_normal((5, 80)).astype(np.float32)
+        expected = tf.signal.mfccs_from_log_mel_spectrograms(logMel)[:, :40].numpy()
+        np.testing.assert_allclose(logMel @ DCTMatrix(80, 40), expected, rtol = 0, atol = 1e-4)
+
+        # Every config computes its matrices only once
+        config = dict(self.process.spectrogramConfig, feature_type = "mfcc")
+        self.assertIs(Filterbank(config).mel, Filterbank(dict(config)).mel)
+        self.assertIs(Filterbank(config).dct, Filterbank(dict(config)).dct)
+
+    def test_feature_types(self):
+        audio = self.Audio(16000)
+        bins = {"linear": 193, "mel": 80, "log-mel": 80, "mfcc": 40}
+
+        for featureType in FEATURE_TYPES:
+            self.Configure(featureType)
+
+            numpyFeatures = self.process.Spectrogram(audio)
+            tensorflowFeatures = self.process.Spectrogram(tf.constant(audio)).numpy()
+
+            self.assertEqual(self.process.Bins(), bins[featureType])
+            self.assertEqual(numpyFeatures.shape, (99, bins[featureType]))
+            self.assertEqual(tensorflowFeatures.shape, (99, bins[featureType]))
+
+            np.testing.assert_allclose(numpyFeatures, tensorflowFeatures, rtol = 1e-4, atol = TOLERANCE)
+
+            # The VAD's way around, through the linear spectrogram, ends at the same features
+            for linear in [self.process.Spectrogram(audio, _linear = True), self.process.Spectrogram(tf.constant(audio), _linear = True)]:
+                self.assertEqual(linear.shape[-1], 193)
+                np.testing.assert_allclose(np.asarray(self.process.Features(linear)), numpyFeatures, rtol = 1e-4, atol = TOLERANCE)
+
+    def test_unknown_feature_type(self):
+        with self.assertRaises(ValueError):
+            Filterbank(dict(self.process.spectrogramConfig, feature_type = "cepstrum"))
+
+    def test_speech_rec_checks_the_input_width(self):
+        model = keras.Sequential([keras.layers.Input((None, 80)), keras.layers.Dense(29)])
+
+        with self.assertRaises(ValueError):
+            SpeechRec(model, "greedy", _vad = False)
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+# Lucas Davis
+
+import os
+import struct
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+import unittest
+
+from Data.Process import Process
+from Scripts.IndexDataset import Index, IndexTranscript, Manifest, ReadWavHeader, soundfile
+
+def WriteWav(_path, _samples, _sampleRate = 16000, _extraChunk = False):
+    """
+    Writes a silent 16 bit mono wav file, optionally with a LIST chunk before the data like some
+    editors write
+    """
+    data = np.zeros(_samples, dtype = np.int16).tobytes()
+    fmt = struct.pack('<HHIIHH', 1, 1, _sampleRate, _sampleRate * 2, 2, 16)
+    extra = b'LIST' + struct.pack('<I', 5) + b'INFO\x00\x00' if _extraChunk else b''
+
+    body = b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt + extra + b'data' + struct.pack('<I', len(data)) + data
+
+    with open(_path, 'wb') as wavFile:
+        wavFile.write(b'RIFF' + struct.pack('<I', len(body)) + body)
+
+class TestIndexDataset(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.root = os.path.join(self.directory, "corpus")
+        self.expected = {}
+
+        # Two speakers with two chapters each, the same layout as LibriSpeech
+        for speaker in ["19", "26"]:
+            for chapter in ["198", "495"]:
+                chapterDir = os.path.join(self.root, speaker, chapter)
+                os.makedirs(chapterDir)
+
+                lines = []
+
+                for i in range(3):
+                    name = f"{speaker}-{chapter}-{i:04d}"
+                    samples = 1600 * (i + 1)
+
+                    WriteWav(os.path.join(chapterDir, name + ".wav"), samples, _extraChunk = i == 1)
+                    lines.append(f"{name} LIGHT THE FIRE {i}")
+
+                    self.expected[os.path.join(chapterDir, name + ".wav")] = samples
+
+                # Listed in the transcript, but the audio is missing
+                lines.append(f"{speaker}-{chapter}-0099 MISSING")
+
+                with open(os.path.join(chapterDir, f"{speaker}-{chapter}.trans.txt"), 'w') as transFile:
+                    transFile.write("\n".join(lines) + "\n")
+
+        self.csvPath = os.path.join(self.directory, "train.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_header_is_read(self):
+        path = os.path.join(self.directory, "extra.wav")
+        WriteWav(path, 4000, 8000, _extraChunk = True)
+
+        self.assertEqual(ReadWavHeader(path), (8000, 1, 4000))
+
+    def test_manifest_has_every_utterance(self):
+        count = Index(self.root, self.csvPath, _workers = 2, _verbose = False)
+
+        data = pd.read_csv(self.csvPath)
+
+        self.assertEqual(count, 12)
+        self.assertEqual(dict(zip(data['filename'], data['samples'])), self.expected)
+        self.assertTrue((data['sample_rate'] == 16000).all())
+        np.testing.assert_allclose(data['duration'], data['samples'] / 16000)
+        self.assertFalse(os.path.exists(self.csvPath + ".progress"))
+
+    def test_interrupted_run_resumes(self):
+        Index(self.root, os.path.join(self.directory, "complete.csv"), _workers = 1, _verbose = False)
+
+        # Index one transcript file, then leave half a row and half a progress line behind
+        transPath = sorted(os.path.join(dirPath, name) for dirPath, _, names in os.walk(self.root) for name in names if name.endswith(".trans.txt"))[0]
+
+        manifest = Manifest(self.csvPath, _resume = False)
+        manifest.Write(*IndexTranscript((transPath, ".wav", False)))
+        manifest.csvFile.write("/half/a/row.wav,12")
+        manifest.progressFile.write("/half/a/trans.txt\t9")
+        manifest.Close(_complete = False)
+
+        count = Index(self.root, self.csvPath, _workers = 1, _verbose = False)
+
+        resumed = pd.read_csv(self.csvPath).sort_values("filename").reset_index(drop = True)
+        complete = pd.read_csv(os.path.join(self.directory, "complete.csv")).sort_values("filename").reset_index(drop = True)
+
+        self.assertEqual(count, 9)
+        pd.testing.assert_frame_equal(resumed, complete)
+
+    def test_durations_filter_and_size_buckets(self):
+        Index(self.root, self.csvPath, _workers = 1, _verbose = False)
+
+        process = Process()
+        process.minDuration, process.maxDuration = 0.15, 0.25
+
+        audioPaths, _, _, samples = process.LoadCSV(self.csvPath, _withSizes = True, _withSamples = True)
+
+        self.assertEqual(len(audioPaths), 4)
+        self.assertEqual(set(samples), {3200})
+
+    @unittest.skipUnless(soundfile is not None or shutil.which("flac"), "Needs soundfile or the flac command line tool")
+    def test_flac_is_converted(self):
+        path = next(iter(self.expected))
+        audio = (np.sin(np.arange(1600) / 10) * 10000).astype(np.int16)
+
+        os.remove(path)
+
+        if soundfile is not None:
+            soundfile.write(path[:-4] + ".flac", audio, 16000)
+        else:
+            WriteWav(path, 1600)
+            os.system(f"flac --silent -o {path[:-4]}.flac {path} && rm {path}")
+
+        Index(self.root, self.csvPath, _workers = 1, _convert = True, _verbose = False)
+
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(path[:-4] + ".flac"))
+        self.assertEqual(ReadWavHeader(path), (16000, 1, 1600))
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# Lucas Davis
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+import unittest
+
+from Data.Manifest import Manifest, RewritePrefix
+from Data.Process import Process
+from Scripts.UpdateCSVPaths import UpdatePaths
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.csvPath = os.path.join(self.directory, "train.csv")
+        self.npzPath = os.path.join(self.directory, "train.npz")
+
+        pd.DataFrame({
+            'filename':    [f"/home/ldavis/LibriSpeech/{i}.wav" for i in range(6)],
+            'filesize':    [44 + 3200 * (i + 1) for i in range(6)],
+            'transcript':  ["open the door", "light the fire", "a much longer transcript than the others", "go", "north", "café"],
+            'duration':    [0.1 * (i + 1) for i in range(6)],
+            'sample_rate': [16000] * 6,
+            'samples':     [1600 * (i + 1) for i in range(6)]
+        }).to_csv(self.csvPath, index = False)
+
+        UpdatePaths(self.csvPath, self.npzPath)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_only_needed_columns_are_read(self):
+        manifest = Manifest(self.csvPath, ['filename', 'transcript'])
+
+        self.assertEqual(sorted(manifest.data), ['filename', 'transcript'])
+        self.assertIsNone(manifest.Column('samples'))
+        self.assertEqual(list(Manifest(self.npzPath, ['transcript']).Lengths('transcript')), [13, 14, 40, 2, 5, 4])
+
+    def test_npz_loads_like_csv(self):
+        process = Process()
+        process.minDuration, process.maxDuration, process.maxTranscriptLength = 0.15, 0.55, 20
+
+        csvPaths, csvTranscripts, csvSizes, csvSamples = process.LoadCSV(self.csvPath, _withSizes = True, _withSamples = True)
+        npzPaths, npzTranscripts, npzSizes, npzSamples = process.LoadCSV(self.npzPath, _withSizes = True, _withSamples = True)
+
+        self.assertEqual(list(csvTranscripts), ["light the fire", "go", "north"])
+        self.assertEqual([text.decode("utf-8") for text in npzTranscripts], list(csvTranscripts))
+        self.assertEqual([path.decode("utf-8") for path in npzPaths], list(csvPaths))
+        np.testing.assert_array_equal(npzSizes, csvSizes)
+        np.testing.assert_array_equal(npzSamples, csvSamples)
+
+        # Filtered while reading, across chunk boundaries
+        keep = np.array([True, False, True, True, False, True])
+        np.testing.assert_array_equal(Manifest(self.npzPath, ['samples']).Read('samples', keep, _chunk = 4), [1600, 4800, 6400, 9600])
+
+    def test_paths_are_rewritten(self):
+        for paths in [
+            np.array(["/home/ldavis/a.wav", "/data/b.wav"], dtype = object),
+            np.array([b"/home/ldavis/a.wav", b"/data/b.wav"]),
+            tf.constant(["/home/ldavis/a.wav", "/data/b.wav"])
+        ]:
+            rewritten = RewritePrefix(paths, "/home/ldavis/", "/mnt/datasets/speech/", _chunk = 1)
+            rewritten = rewritten.numpy() if isinstance(rewritten, tf.Tensor) else rewritten
+
+            self.assertEqual([path.decode("utf-8") if isinstance(path, bytes) else path for path in rewritten], ["/mnt/datasets/speech/a.wav", "/data/b.wav"])
+
+        process = Process()
+        process.pathPrefixFrom, process.pathPrefixTo = "/home/ldavis/", "/data/"
+
+        audioPaths, _ = process.LoadCSV(self.npzPath)
+
+        self.assertEqual(audioPaths[5], b"/data/LibriSpeech/5.wav")
+
+    def test_arrays_feed_tf_data(self):
+        audioPaths, transcripts = Process().LoadCSV(self.npzPath)
+
+        dataset = tf.data.Dataset.from_tensor_slices((audioPaths, transcripts))
+        path, transcript = next(iter(dataset.skip(5)))
+
+        self.assertEqual(path.numpy(), b"/home/ldavis/LibriSpeech/5.wav")
+        self.assertEqual(transcript.numpy().decode("utf-8"), "café")
+
+    def test_tensors_match_arrays(self):
+        manifest = Manifest(self.npzPath, ['transcript'])
+        keep = np.array([True, True, False, True, True, True])
+
+        # Chunks of 4 rows for the tensor and 2 rows for the array, so both cross a chunk boundary
+        tensor = manifest.Tensor('transcript', keep, _chunk = 4)
+        array = manifest.Strings('transcript', keep, _chunk = 2)
+
+        self.assertEqual(list(tensor.numpy()), list(array))
+        self.assertEqual([text.decode("utf-8") for text in array], ["open the door", "light the fire", "go", "north", "café"])
+
+        audioPaths, _ = Process().LoadCSV(self.csvPath, _asTensors = True)
+
+        self.assertEqual(audioPaths.dtype, tf.string)
+        self.assertEqual(audioPaths.shape[0], 6)
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+# Lucas Davis
+
+import numpy as np
+import tensorflow as tf
+
+import unittest
+
+from Model.ASRModel import ASRModel, CTCLoss
+from Model.Masking import FrameLengths, LengthMask
+
+class TestMasking(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(42)
+
+    def Padded(self, _spectrogram, _frames):
+        """
+        Zero pads a (frames, bins) spectrogram to _frames and adds the batch axis
+        """
+        padded = np.zeros((1, _frames, _spectrogram.shape[-1]), dtype = np.float32)
+        padded[0, :_spectrogram.shape[0]] = _spectrogram
+
+        return padded
+
+    def test_frame_lengths(self):
+        spectrograms = self.rng.standard_normal((4, 12, 5)).astype(np.float32)
+        spectrograms[0, 7:] = 0
+        spectrograms[1, :] = 0
+
+        # Silent frames inside a clip still count, only the zeros at the end are padding
+        spectrograms[2, 3:6] = 0
+
+        np.testing.assert_array_equal(np.asarray(FrameLengths(spectrograms)), [7, 0, 12, 12])
+        np.testing.assert_array_equal(np.asarray(LengthMask(4).Lengths(spectrograms)), [2, 0, 3, 3])
+
+    def test_padding_doesnt_change_the_logits(self):
+        # Both have more padding than the convolutions see past the end of the clip, and a multiple
+        # of 8 frames keeps their 'same' padding aligned, so only the recurrent layers could see a
+        # difference
+        spectrogram = self.rng.standard_normal((37, 193)).astype(np.float32)
+        short, long = self.Padded(spectrogram, 64), self.Padded(spectrogram, 96)
+
+        streaming = ASRModel.BuildStreamingModel(193, 28, _cell = "lstm", _layers = 2, _units = 32)
+        deepspeech2 = ASRModel.BuildModel(193, 28)
+
+        for model in [streaming, deepspeech2]:
+            before = model(short, training = False)
+            after = model(long, training = False)
+
+            np.testing.assert_array_equal(np.asarray(ASRModel.LogitLengths(after)), [10])
+            np.testing.assert_allclose(np.asarray(before)[:, :10], np.asarray(after)[:, :10], rtol = 1e-4, atol = 1e-4)
+
+            # Every decoder reads the padding as blanks, even without the lengths
+            self.assertTrue(np.all(np.asarray(after)[0, 10:].argmax(axis = -1) == 28))
+
+        # Without masking the backwards layers start in the padding
+        unmasked = ASRModel.BuildModel(193, 28, _masking = False)
+        unmasked.set_weights(deepspeech2.get_weights())
+
+        before = np.asarray(unmasked(short, training = False))
+        after = unmasked(long, training = False)
+
+        self.assertFalse(np.allclose(before[:, :10], np.asarray(after)[:, :10], rtol = 1e-4, atol = 1e-4))
+        np.testing.assert_array_equal(np.asarray(ASRModel.LogitLengths(after)), [24])
+
+    def test_loss_of_a_padded_batch(self):
+        model = ASRModel.BuildStreamingModel(193, 28, _layers = 1, _units = 32)
+        loss = CTCLoss()
+
+        clips = [self.rng.standard_normal((frames, 193)).astype(np.float32) for frames in [80, 24]]
+        labels = np.array([[3, 8, 5, 0], [1, 2, 0, 0]])
+
+        batch = np.concatenate([self.Padded(clip, 80) for clip in clips])
+        batchLoss = float(loss(labels, model(batch, training = False)))
+
+        # The short clip is only scored on its own 6 time steps, not on the padding after them. It
+        # keeps a little padding on its own, which is all its convolutions see of the batch
+        alone = [
+            float(loss(labels[:1], model(batch[:1], training = False))),
+            float(loss(labels[1:], model(self.Padded(clips[1], 48), training = False)))
+        ]
+
+        np.testing.assert_allclose(batchLoss, np.mean(alone), rtol = 1e-4)
+
+        unmasked = ASRModel.BuildStreamingModel(193, 28, _layers = 1, _units = 32, _masking = False)
+        unmasked.set_weights(model.get_weights())
+
+        self.assertFalse(np.isclose(float(loss(labels, unmasked(batch, training = False))), batchLoss, rtol = 1e-2))
+
+    def test_training(self):
+        model = ASRModel.Compile(ASRModel.BuildStreamingModel(193, 28, _layers = 1, _units = 32), 1e-3)
+
+        clips = [self.rng.standard_normal((frames, 193)).astype(np.float32) for frames in [64, 40, 20, 64]]
+        spectrograms = np.concatenate([self.Padded(clip, 64) for clip in clips])
+        labels = np.array([[3, 8, 5, 0], [1, 2, 0, 0], [4, 0, 0, 0], [7, 7, 1, 2]])
+
+        history = model.fit(tf.data.Dataset.from_tensor_slices((spectrograms, labels)).batch(4), epochs = 3, verbose = 0)
+
+        self.assertTrue(np.all(np.isfinite(history.history['loss'])))
+        self.assertLess(history.history['loss'][-1], history.history['loss'][0])
+
+    def test_masking_from_config(self):
+        masked = ASRModel.Build(193, 28, {"architecture": "streaming", "layers": "1", "units": "32"})
+        unmasked = ASRModel.Build(193, 28, {"architecture": "streaming", "layers": "1", "units": "32", "masking": "False"})
+
+        self.assertTrue(any(isinstance(layer, LengthMask) for layer in masked.layers))
+        self.assertFalse(any(isinstance(layer, LengthMask) for layer in unmasked.layers))
+        self.assertEqual(masked.count_params(), unmasked.count_params())
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+# Lucas Davis
+
+import os
+import sys
+import json
+import tempfile
+import threading
+import numpy as np
+
+import unittest
+from unittest.mock import Mock
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "API"))
+
+from Metrics import Metrics, Histogram, Merge, Render, metrics
+from Scheduler import BatchScheduler
+import ASR_API
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_buckets(self):
+        histogram = Histogram((0.1, 1.0))
+
+        for value in [0.05, 0.1, 0.5, 5.0]:
+            histogram.Observe(value)
+
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 5.65)
+
+    def test_request_counters(self):
+        instance = Metrics()
+
+        instance.Begin("/ASR")
+        instance.Audio(2.0)
+
+        with instance.Time("model"):
+            pass
+
+        instance.End(200)
+
+        instance.Begin("/ASR")
+        instance.End(500)
+
+        snapshot = instance.Snapshot()
+
+        self.assertEqual(snapshot["requests"], {"/ASR": 2})
+        self.assertEqual(snapshot["errors"], {"/ASR": 1})
+        self.assertEqual(snapshot["audioSeconds"], 2.0)
+        self.assertEqual(snapshot["stages"]["model"]["count"], 1)
+        self.assertEqual(snapshot["realTimeFactor"]["count"], 1)
+
+    def test_disabled_records_nothing(self):
+        instance = Metrics(_enabled = False)
+
+        self.assertIsNone(instance.Begin("/ASR"))
+
+        with instance.Time("model"):
+            pass
+
+        instance.End(200)
+
+        self.assertEqual(instance.Snapshot()["stages"], {})
+        self.assertEqual(instance.Snapshot()["requests"], {})
+
+    def test_suspended_stages_are_skipped(self):
+        instance = Metrics()
+
+        with instance.Suspend():
+            with instance.Time("model"):
+                pass
+
+        self.assertEqual(instance.Snapshot()["stages"], {})
+
+    def test_merge_and_render(self):
+        first, second = Metrics(), Metrics()
+
+        for instance in [first, second]:
+            instance.Begin("/ASR")
+            instance.Observe("model", 0.003)
+            instance.End(200)
+
+        text = Render(Merge([first.Snapshot(), second.Snapshot()]))
+
+        self.assertIn('asr_stage_seconds_bucket{stage="model",le="0.0025"} 0', text)
+        self.assertIn('asr_stage_seconds_bucket{stage="model",le="0.005"} 2', text)
+        self.assertIn('asr_stage_seconds_bucket{stage="model",le="+Inf"} 2', text)
+        self.assertIn('asr_requests_total{route="/ASR"} 2', text)
+
+    def test_trace_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.jsonl")
+            instance = Metrics(_tracePath = path, _traceBytes = 200, _traceBackups = 1)
+
+            for _ in range(5):
+                instance.Begin("/ASR")
+                instance.Audio(1.0)
+                instance.Observe("spectrogram", 0.001)
+                instance.End(200)
+
+            instance.Configure(_enabled = False)
+
+            with open(path) as trace:
+                line = json.loads(trace.readline())
+
+            self.assertEqual(line["route"], "/ASR")
+            self.assertEqual(line["stages"], {"spectrogram": 0.001})
+            self.assertTrue(os.path.exists(path + ".1"))
+            self.assertFalse(os.path.exists(path + ".2"))
+
+    def test_batched_stages_reach_the_callers_trace(self):
+        metrics.Configure()
+
+        def PredictBatch(_audios):
+            metrics.Observe("model", 0.01)
+            return list(_audios)
+
+        speechRec = Mock()
+        speechRec.PredictBatch.side_effect = PredictBatch
+
+        scheduler = BatchScheduler(speechRec, 4, 10)
+
+        trace = metrics.Begin("/ASR")
+        scheduler.Predict(1)
+        metrics.End(200)
+
+        scheduler.Close()
+
+        self.assertEqual(trace["stages"]["model"], 0.01)
+        self.assertIn("queue", trace["stages"])
+        self.assertEqual(metrics.Snapshot()["stages"]["model"]["count"], 1)
+
+    def test_metrics_endpoint(self):
+        metrics.Configure()
+
+        backend = Mock()
+        backend.Predict.side_effect = lambda audio: "hello"
+
+        ASR_API.backend = backend
+        ASR_API.admission = threading.BoundedSemaphore(4)
+        ASR_API.cache = None
+        ASR_API.ready.set()
+
+        client = ASR_API.app.test_client()
+
+        client.post('/ASR', data = np.zeros(8000, dtype = np.float32).tobytes())
+        client.post('/ASR', data = b"abc")
+
+        text = client.get('/metrics').get_data(as_text = True)
+
+        self.assertIn('asr_requests_total{route="/ASR"} 2', text)
+        self.assertIn('asr_errors_total{route="/ASR"} 1', text)
+        self.assertIn('asr_audio_seconds_total 0.5', text)
+        self.assertIn('asr_stage_seconds_count{stage="parse"} 2', text)
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
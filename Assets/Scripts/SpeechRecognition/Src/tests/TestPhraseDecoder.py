@@ -0,0 +1,79 @@
+# Lucas Davis
+
+import numpy as np
+import tensorflow as tf
+
+import unittest
+
+from Data.Process import Process
+from Model.PhraseDecoder import PhraseDecoder
+
+class TestPhraseDecoder(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.process = Process()
+        cls.phrases = ["open the door", "open", "close the door", "book", "ll", "light the torch"]
+
+    def Spell(self, _decoder, _phrase, _rng, _steps = 120):
+        """
+        Logits that clearly spell out a phrase: one block of frames per character, separated
+        by blanks, on top of some noise
+        """
+        label = _decoder.Encode(_phrase)
+        logits = _rng.normal(size = (_steps, 29))
+        width = _steps // (2 * len(label) + 1)
+
+        logits[:, -1] += 8.0
+
+        for i, char in enumerate(label):
+            logits[(2 * i + 1) * width:(2 * i + 2) * width, char] += 16.0
+
+        return logits.astype(np.float32)
+
+    def test_scores_match_ctc_loss(self):
+        decoder = PhraseDecoder(self.process, self.phrases, np.inf)
+        logits = np.random.default_rng(42).normal(size = (60, 29)).astype(np.float32)
+
+        scores = decoder.Score(logits)
+
+        for phrase, score in zip(self.phrases, scores):
+            label = list(decoder.Encode(phrase))
+
+            expected = -tf.nn.ctc_loss(
+                [label], logits[np.newaxis], [len(label)], [logits.shape[0]],
+                logits_time_major = False, blank_index = -1
+            ).numpy()[0]
+
+            self.assertAlmostEqual(score, expected, places = 3)
+
+    def test_decode_finds_phrase(self):
+        rng = np.random.default_rng(42)
+        decoder = PhraseDecoder(self.process, self.phrases, 20.0)
+
+        for phrase in self.phrases:
+            prediction, confidence = decoder.Decode(self.Spell(decoder, phrase, rng))
+
+            self.assertEqual(prediction, phrase)
+            self.assertGreater(confidence, 0.9)
+
+    def test_unknown_phrase_has_low_confidence(self):
+        rng = np.random.default_rng(42)
+        decoder = PhraseDecoder(self.process, self.phrases, 20.0)
+
+        _, confidence = decoder.Decode(self.Spell(decoder, "wolf", rng))
+
+        self.assertLess(confidence, 0.1)
+
+    def test_too_short_for_every_phrase(self):
+        rng = np.random.default_rng(42)
+        decoder = PhraseDecoder(self.process, ["open the door", "light the torch"], 20.0)
+
+        # Two time steps can't spell out any of the phrases, neither can an empty utterance
+        for steps in [2, 0]:
+            self.assertEqual(decoder.Decode(rng.normal(size = (steps, 29)).astype(np.float32)), (None, 0.0))
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
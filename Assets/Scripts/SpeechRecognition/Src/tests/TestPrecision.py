@@ -0,0 +1,54 @@
+# Lucas Davis
+
+import numpy as np
+from tensorflow import keras
+
+import unittest
+
+from Model.ASRModel import ASRModel
+
+class TestPrecision(unittest.TestCase):
+    def tearDown(self):
+        keras.mixed_precision.set_global_policy("float32")
+
+    def test_output_head_stays_float32(self):
+        ASRModel.SetPrecision("mixed_bfloat16")
+        model = ASRModel.BuildModel(193, 28)
+
+        self.assertEqual(model.layers[1].compute_dtype, "bfloat16")
+        self.assertEqual(model.layers[-1].compute_dtype, "float32")
+        self.assertEqual(model(np.zeros((1, 16, 193), dtype = np.float32)).dtype, "float32")
+
+    def test_loss_is_scaled_when_mixed(self):
+        ASRModel.SetPrecision("mixed_bfloat16")
+        mixed = ASRModel.Compile(ASRModel.BuildModel(193, 28), 1e-4)
+
+        ASRModel.SetPrecision("float32")
+        full = ASRModel.Compile(ASRModel.BuildModel(193, 28), 1e-4)
+
+        self.assertIsInstance(mixed.optimizer, keras.optimizers.LossScaleOptimizer)
+        self.assertNotIsInstance(full.optimizer, keras.optimizers.LossScaleOptimizer)
+
+    def test_auto_picks_a_policy(self):
+        self.assertIn(ASRModel.SetPrecision("auto"), ["float32", "mixed_bfloat16", "mixed_float16"])
+        self.assertEqual(keras.mixed_precision.global_policy().name, ASRModel.SetPrecision("auto"))
+
+    def test_xla_mixed_training_step(self):
+        ASRModel.SetPrecision("mixed_bfloat16")
+        model = ASRModel.Compile(ASRModel.BuildModel(193, 28), 1e-4, _jitCompile = True)
+
+        rng = np.random.default_rng(42)
+        spectrograms = rng.standard_normal((2, 32, 193)).astype(np.float32)
+        labels = rng.integers(1, 28, size = (2, 4))
+
+        first = model.train_on_batch(spectrograms, labels)
+        second = model.train_on_batch(spectrograms, labels)
+
+        self.assertTrue(np.isfinite(first) and np.isfinite(second))
+        self.assertLess(second, first)
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,7 @@ import pandas as pd
 import numpy as np
 
 import unittest
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 from Data.Process import Process
 
@@ -24,17 +24,21 @@ class TestProcess(unittest.TestCase):
             'transcript': ['Hello', 'World']
         }))
 
-        pd.read_csv = mock_read_csv
+        patcher = patch.object(pd, 'read_csv', mock_read_csv)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
         obj = Process()
         audioPath, transcripts = obj.LoadCSV('fake_path.csv')
-        self.assertEqual(audioPath, ['file1.wav', 'file2.wav'])
-        self.assertEqual(transcripts, ['Hello', 'World'])
+        self.assertEqual(list(audioPath), ['file1.wav', 'file2.wav'])
+        self.assertEqual(list(transcripts), ['Hello', 'World'])
 
     def test_empty_csv(self):
         mock_read_csv = Mock(side_effect=pd.errors.EmptyDataError)
 
-        pd.read_csv = mock_read_csv
+        patcher = patch.object(pd, 'read_csv', mock_read_csv)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
         obj = Process()
         with self.assertRaises(SystemExit):
@@ -43,7 +47,9 @@ class TestProcess(unittest.TestCase):
     def test_file_not_found(self):
         mock_read_csv = Mock(side_effect=FileNotFoundError)
 
-        pd.read_csv = mock_read_csv
+        patcher = patch.object(pd, 'read_csv', mock_read_csv)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
         obj = Process()
         with self.assertRaises(SystemExit):
@@ -53,8 +59,12 @@ class TestProcess(unittest.TestCase):
         mock_read_file = Mock(return_value=b'fake_audio_data')
         mock_decode_wav = Mock(return_value=(tf.constant([[0.1], [0.2], [0.3]]), tf.constant(16000)))
         
-        tf.io.read_file = mock_read_file
-        tf.audio.decode_wav = mock_decode_wav
+        patcher = patch.object(tf.io, 'read_file', mock_read_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(tf.audio, 'decode_wav', mock_decode_wav)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
         obj = Process()
         audio = obj.LoadAudioFile('fake_path.wav')
@@ -88,6 +98,14 @@ class TestProcess(unittest.TestCase):
 
         self.assertEqual(spectrogram.shape, tensor.shape)
 
+    def test_estimate_frames(self):
+        process = Process()
+
+        # 1024 16 bit samples plus the wav header, the same audio length as test_spectrogram
+        frames = process.EstimateFrames([44 + 2 * 1024, 44 + 2 * 100])
+
+        self.assertEqual(list(frames), [5, 0])
+
     def test_transcript(self):
         process = Process()
 
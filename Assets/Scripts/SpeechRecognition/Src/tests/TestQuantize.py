@@ -0,0 +1,78 @@
+# Lucas Davis
+
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "API"))
+
+from Data.Process import Process
+from Model.LiteModel import LiteModel
+from Model.Quantize import Quantize
+from Recognition import SpeechRec
+
+class TestQuantize(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        tf.random.set_seed(42)
+
+        # A small model with the same input, output and kind of layers as the real one
+        cls.model = keras.Sequential([
+            keras.layers.Input((None, 193)),
+            keras.layers.Bidirectional(keras.layers.GRU(16, return_sequences = True)),
+            keras.layers.Dense(29)
+        ])
+
+        cls.directory = tempfile.mkdtemp()
+        cls.results = Quantize(Process()).Export(cls.model, cls.directory)
+
+        rng = np.random.default_rng(42)
+        cls.spectrograms = rng.normal(size = (3, 50, 193)).astype(np.float32)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_exports_match_model(self):
+        expected = self.model(self.spectrograms).numpy()
+
+        for mode, tolerance in [("float16", 1e-2), ("int8", 5e-2)]:
+            path, size, _, _ = self.results[mode]
+            result = LiteModel(path).Invoke(self.spectrograms)
+
+            self.assertEqual(result.shape, expected.shape)
+            np.testing.assert_allclose(result, expected, atol = tolerance)
+
+    def test_int8_is_smaller(self):
+        self.assertLess(self.results["int8"][1], self.results["float16"][1])
+
+    def test_speech_rec_runs_export(self):
+        rng = np.random.default_rng(42)
+        audio = rng.normal(scale = 0.1, size = 16000).astype(np.float32)
+
+        original = SpeechRec(self.model, "greedy")
+        lite = SpeechRec(LiteModel(self.results["float16"][0]), "greedy")
+
+        np.testing.assert_allclose(lite.inferLogits(audio).numpy(), original.inferLogits(audio).numpy(), atol = 1e-2)
+
+        # Batches of different lengths go through the serving graph one clip after another
+        predictions = lite.PredictBatch([audio, audio[:8000]])
+
+        self.assertEqual(len(predictions), 2)
+        self.assertEqual(predictions[0], lite.Predict(audio))
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            Quantize(Process()).Convert(self.model, "int4")
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+# Lucas Davis
+
+import os
+import sys
+import threading
+import numpy as np
+from unittest.mock import Mock, patch
+
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "API"))
+
+import ASR_API
+from ResultCache import ResultCache
+
+def Utterance(_rng, _seconds = 2.0):
+    """
+    Parameters:
+        - _rng: A numpy Generator
+        - _seconds: The length of the clip
+
+    Returns:
+        A np.float32 clip of a few gliding tones, different for every call
+    """
+    t = np.arange(int(_seconds * 16000)) / 16000
+    audio = 0.01 * _rng.standard_normal(t.shape[0])
+
+    for start, end in _rng.uniform(200, 3000, size = (3, 2)):
+        audio += 0.1 * np.sin(2 * np.pi * (start + (end - start) * t / _seconds / 2) * t)
+
+    return audio.astype(np.float32)
+
+class TestResultCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.rng = np.random.default_rng(42)
+        cls.clips = [Utterance(cls.rng) for _ in range(4)]
+
+    def test_exact_hit_skips_compute(self):
+        cache = ResultCache(1e6)
+        compute = Mock(side_effect = lambda audio: "light the fire")
+
+        self.assertEqual(cache.Fetch(self.clips[0], compute), "light the fire")
+        self.assertEqual(cache.Fetch(self.clips[0].copy(), compute), "light the fire")
+        self.assertIsNone(cache.Get(self.clips[1]))
+
+        self.assertEqual(compute.call_count, 1)
+        self.assertEqual(cache.Stats()["hits"], 1)
+        self.assertEqual(cache.Stats()["misses"], 2)
+
+    def test_least_recently_used_is_evicted(self):
+        probe = ResultCache(1e6)
+        probe.Put(self.clips[0], "clip 0", 1.0)
+
+        # Room for three entries
+        limit = int(3.5 * probe.Stats()["bytes"])
+        cache = ResultCache(limit)
+
+        for i, clip in enumerate(self.clips[:3]):
+            cache.Put(clip, f"clip {i}", 1.0)
+
+        # Using the first clip makes the second the least recently used
+        cache.Get(self.clips[0])
+        cache.Put(self.clips[3], "clip 3", 1.0)
+
+        self.assertLessEqual(cache.Stats()["bytes"], limit)
+        self.assertEqual(cache.Stats()["evictions"], 1)
+        self.assertIsNone(cache.Get(self.clips[1]))
+        self.assertEqual(cache.Get(self.clips[0]), "clip 0")
+        self.assertEqual(cache.Get(self.clips[3]), "clip 3")
+
+    def test_near_duplicates_match(self):
+        cache = ResultCache(1e6, _nearDuplicates = True)
+        cache.Put(self.clips[0], "open the door", 1.0)
+
+        # The same recording, louder, with a little more noise and a few samples shorter
+        copy = (self.clips[0] * 1.5 + 0.003 * self.rng.standard_normal(self.clips[0].shape[0])).astype(np.float32)[:-500]
+
+        self.assertEqual(cache.Get(copy), "open the door")
+        self.assertIsNone(cache.Get(self.clips[1]))
+        self.assertIsNone(ResultCache(1e6).Get(copy))
+        self.assertEqual(cache.Stats()["near_hits"], 1)
+
+    def test_near_duplicate_lookups_are_bounded(self):
+        cache = ResultCache(1e7, _nearDuplicates = True)
+
+        for i in range(300):
+            cache.Put(Utterance(self.rng, 0.5 + i * 0.01), f"clip {i}", 1.0)
+
+        cache.Put(self.clips[0], "open the door", 1.0)
+
+        # The clip is the most recent one of its length, the 40 others within 10% of it aren't
+        # all compared
+        with patch.object(ResultCache, "MAX_CANDIDATES", 8), patch("numpy.unpackbits", wraps = np.unpackbits) as unpack:
+            self.assertEqual(cache.Get(self.clips[0][:-500] * 1.2), "open the door")
+
+        self.assertEqual(unpack.call_count, 8)
+
+        cache.Clear()
+
+        self.assertEqual((cache.index, cache.Stats()["bytes"]), ({}, 0))
+
+    def test_concurrent_puts_and_clears_keep_size(self):
+        cache = ResultCache(4e4, _nearDuplicates = True)
+        clips = [Utterance(self.rng, 0.5) for _ in range(16)]
+
+        def Work(_offset):
+            for i in range(200):
+                if i % 25 == 0:
+                    cache.Clear(f"list {_offset}")
+                else:
+                    cache.Put(clips[(i + _offset) % len(clips)], f"clip {i}", 1.0, f"list {(i + _offset) % 3}")
+
+        threads = [threading.Thread(target = Work, args = (offset,)) for offset in range(4)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        indexed = {key for bucket in cache.index.values() for key in bucket}
+
+        self.assertEqual(cache.size, sum(entry.size for entry in cache.entries.values()))
+        self.assertEqual(indexed, set(cache.entries))
+        self.assertLessEqual(cache.size, 4e4)
+
+    def test_namespaces_are_cleared_separately(self):
+        cache = ResultCache(1e6)
+
+        cache.Put(self.clips[0], "free", 1.0)
+        cache.Put(self.clips[0], ("light the fire", 0.9), 1.0, "phrases/campfire")
+
+        cache.Clear("phrases/campfire")
+
+        self.assertIsNone(cache.Get(self.clips[0], "phrases/campfire"))
+        self.assertEqual(cache.Get(self.clips[0]), "free")
+
+    def test_api_answers_repeats_from_cache(self):
+        backend = Mock()
+        backend.Predict.side_effect = lambda audio: "light the fire"
+
+        ASR_API.backend = backend
+        ASR_API.admission = threading.BoundedSemaphore(4)
+        ASR_API.cache = ResultCache(1e6)
+        ASR_API.ready.set()
+
+        client = ASR_API.app.test_client()
+
+        for _ in range(3):
+            response = client.post('/ASR', data = self.clips[0].tobytes(), content_type = 'application/octet-stream')
+            self.assertEqual(response.get_json()["prediction"], "light the fire")
+
+        stats = client.get('/cache').get_json()
+
+        self.assertEqual(backend.Predict.call_count, 1)
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+        ASR_API.cache = None
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
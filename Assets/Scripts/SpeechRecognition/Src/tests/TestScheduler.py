@@ -0,0 +1,67 @@
+# Lucas Davis
+
+import os
+import sys
+import threading
+
+import unittest
+from unittest.mock import Mock
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "API"))
+
+from Scheduler import BatchScheduler
+
+class TestScheduler(unittest.TestCase):
+    def test_predictions_return_to_caller(self):
+        speechRec = Mock()
+        speechRec.PredictBatch.side_effect = lambda audios: [f"clip {audio}" for audio in audios]
+
+        scheduler = BatchScheduler(speechRec, 4, 50)
+        futures = [scheduler.Submit(i) for i in range(6)]
+
+        results = [future.result(timeout = 5) for future in futures]
+        scheduler.Close()
+
+        self.assertEqual(results, [f"clip {i}" for i in range(6)])
+
+    def test_max_batch_size(self):
+        sizes = []
+        release = threading.Event()
+
+        def PredictBatch(_audios):
+            release.wait(5)
+            sizes.append(len(_audios))
+            return list(_audios)
+
+        speechRec = Mock()
+        speechRec.PredictBatch.side_effect = PredictBatch
+
+        scheduler = BatchScheduler(speechRec, 3, 1000)
+        futures = [scheduler.Submit(i) for i in range(7)]
+        release.set()
+
+        for future in futures:
+            future.result(timeout = 5)
+        scheduler.Close()
+
+        self.assertEqual(sum(sizes), 7)
+        self.assertTrue(all(size <= 3 for size in sizes))
+
+    def test_error_reaches_every_caller(self):
+        speechRec = Mock()
+        speechRec.PredictBatch.side_effect = RuntimeError("model failed")
+
+        scheduler = BatchScheduler(speechRec, 4, 50)
+        futures = [scheduler.Submit(i) for i in range(2)]
+
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout = 5)
+
+        scheduler.Close()
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
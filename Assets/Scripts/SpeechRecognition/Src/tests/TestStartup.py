@@ -0,0 +1,87 @@
+# Lucas Davis
+
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "API"))
+
+import ASR_API
+from Model.GraphModel import GraphModel
+from Recognition import SpeechRec
+
+API_CONFIG = {
+    'batching': 'False',
+    'stream_timeout_s': '30',
+    'stream_max_sessions': '4',
+    'queue_depth': '4'
+}
+
+class TestStartup(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        tf.random.set_seed(42)
+
+        # A small model with the same input, output and kind of layers as the real one
+        cls.model = keras.Sequential([
+            keras.layers.Input((None, 193)),
+            keras.layers.Bidirectional(keras.layers.GRU(16, return_sequences = True)),
+            keras.layers.Dense(29)
+        ])
+
+        cls.directory = tempfile.mkdtemp()
+        cls.exportPath = os.path.join(cls.directory, "ASR_savedmodel")
+
+        GraphModel.Export(cls.model, cls.exportPath)
+
+        rng = np.random.default_rng(42)
+        cls.audio = rng.normal(scale = 0.1, size = 16000).astype(np.float32)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_export_matches_model(self):
+        graphModel = SpeechRec.LoadModel(self.exportPath)
+
+        self.assertIsInstance(graphModel, GraphModel)
+        self.assertEqual(graphModel.input_shape, (None, None, 193))
+
+        spectrograms = np.random.default_rng(42).normal(size = (2, 30, 193)).astype(np.float32)
+
+        np.testing.assert_allclose(graphModel(spectrograms).numpy(), self.model(spectrograms).numpy(), atol = 1e-5)
+
+    def test_speech_rec_runs_export(self):
+        original = SpeechRec(self.model, "greedy")
+        export = SpeechRec(GraphModel(self.exportPath), "greedy")
+
+        self.assertEqual(export.Predict(self.audio), original.Predict(self.audio))
+        self.assertEqual(export.PredictBatch([self.audio, self.audio[:8000]]), original.PredictBatch([self.audio, self.audio[:8000]]))
+
+    def test_ready_after_load(self):
+        client = ASR_API.app.test_client()
+        audio = self.audio.tobytes()
+
+        ASR_API.ready.clear()
+
+        # Before the model is loaded / answers, but /ready and the model routes don't
+        self.assertEqual(client.get('/').status_code, 200)
+        self.assertEqual(client.get('/ready').status_code, 503)
+        self.assertEqual(client.post('/ASR', data = audio).status_code, 503)
+
+        ASR_API.Load(API_CONFIG, self.exportPath)
+
+        self.assertEqual(client.get('/ready').get_json(), {"ready": True, "stage": "ready"})
+        self.assertEqual(client.post('/ASR', data = audio).status_code, 200)
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
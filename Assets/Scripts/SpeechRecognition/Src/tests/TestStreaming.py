@@ -0,0 +1,120 @@
+# Lucas Davis
+
+import os
+import sys
+import numpy as np
+import tensorflow as tf
+from unittest.mock import patch
+
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "API"))
+
+from Data.Process import Process
+from Model.ASRModel import ASRModel
+from Recognition import SpeechRec
+from Streaming import StreamManager
+
+class TestStreaming(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        tf.random.set_seed(42)
+
+        process = Process()
+        model = ASRModel.BuildModel(193, process.charToNum.vocabulary_size())
+
+        cls.speechRec = SpeechRec(model, _vad = True)
+
+        rng = np.random.default_rng(42)
+        t = np.arange(3 * 16000) / 16000
+        cls.audio = (0.1 * np.sin(2 * np.pi * 440 * t) + 0.01 * rng.standard_normal(t.shape[0])).astype(np.float32)
+
+    def test_stream_spectrogram_matches_spectrogram(self):
+        process = self.speechRec.process
+
+        expected = np.asarray(process.Spectrogram(self.audio))
+
+        pending = np.zeros(0, dtype = np.float32)
+        frames = []
+
+        for start in range(0, len(self.audio), 1000):
+            spectrogram, pending = process.StreamSpectrogram(pending, self.audio[start:start + 1000])
+            frames.append(spectrogram)
+
+        result = np.concatenate(frames)
+
+        self.assertEqual(result.shape, expected.shape)
+        np.testing.assert_allclose(result, expected, rtol = 1e-5, atol = 1e-5)
+
+    def test_final_transcript_matches_predict(self):
+        streams = StreamManager(self.speechRec, 30, 4)
+
+        for start in range(0, len(self.audio) - 4000, 4000):
+            partial = streams.Push("player", self.audio[start:start + 4000])
+            self.assertIsInstance(partial, str)
+
+        final = streams.End("player", self.audio[start + 4000:])
+
+        self.assertEqual(final, self.speechRec.Predict(self.audio))
+        self.assertNotIn("player", streams.sessions)
+
+    def test_final_transcript_trims_silence(self):
+        streams = StreamManager(self.speechRec, 30, 4)
+
+        # A second of quiet noise on both sides of the tone
+        quiet = 1e-4 * np.random.default_rng(42).standard_normal(16000).astype(np.float32)
+        audio = np.concatenate([quiet, self.audio[:16000], quiet])
+
+        PredictSpectrograms = self.speechRec.PredictSpectrograms
+
+        with patch.object(self.speechRec, "PredictSpectrograms", side_effect = PredictSpectrograms) as predict:
+            for start in range(0, len(audio), 4000):
+                streams.Push("player", audio[start:start + 4000])
+
+            final = streams.End("player")
+
+            # Only the tone and the VAD's padding around it
+            self.assertLess(predict.call_args[0][0][0].shape[0], 150)
+
+            streams.Push("silent", quiet)
+            predict.reset_mock()
+
+            self.assertEqual(streams.End("silent"), "")
+            predict.assert_not_called()
+
+        self.assertEqual(final, self.speechRec.Predict(audio))
+
+    def test_long_streams_are_refused(self):
+        streams = StreamManager(self.speechRec, 30, 4, _maxSeconds = 2)
+
+        streams.Push("player", self.audio[:24000])
+
+        with self.assertRaises(ValueError):
+            streams.Push("player", self.audio[24000:])
+
+        # The audio received before the cap is still decoded
+        self.assertEqual(streams.End("player"), self.speechRec.Predict(self.audio[:24000]))
+
+    def test_abandoned_sessions_are_evicted(self):
+        streams = StreamManager(self.speechRec, 0, 4)
+
+        streams.Session("abandoned")
+        streams.Session("player")
+
+        self.assertEqual(list(streams.sessions), ["player"])
+
+    def test_least_recent_session_is_evicted(self):
+        streams = StreamManager(self.speechRec, 30, 2)
+
+        streams.Session("first")
+        streams.Session("second")
+        streams.Session("first")
+        streams.Session("third")
+
+        self.assertEqual(list(streams.sessions), ["first", "third"])
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
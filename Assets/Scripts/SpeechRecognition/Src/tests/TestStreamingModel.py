@@ -0,0 +1,84 @@
+# Lucas Davis
+
+import os
+import tempfile
+import numpy as np
+from tensorflow.keras.models import load_model
+
+import unittest
+
+from Model.ASRModel import ASRModel
+from Model.RowConv import RowConv
+
+class TestStreamingModel(unittest.TestCase):
+    def test_row_conv_looks_ahead(self):
+        layer = RowConv(2)
+        inputs = np.arange(10, dtype = np.float32).reshape((1, 5, 2))
+
+        outputs = np.asarray(layer(inputs))
+        kernel = np.asarray(layer.kernel)
+
+        padded = np.concatenate([inputs[0], np.zeros((2, 2), dtype = np.float32)])
+        expected = sum(padded[j:j + 5] * kernel[j] for j in range(3))
+
+        np.testing.assert_allclose(outputs[0], expected, rtol = 1e-5, atol = 1e-5)
+
+    def test_output_length_follows_stride(self):
+        for stride in [1, 2, 4, 8]:
+            model = ASRModel.BuildStreamingModel(193, 28, _layers = 1, _units = 32, _stride = stride)
+
+            self.assertEqual(ASRModel.TimeStride(model), stride)
+
+            for frames in [1, 13, 40]:
+                logits = model(np.zeros((1, frames, 193), dtype = np.float32))
+                self.assertEqual(logits.shape[1], ASRModel.OutputLength(frames, stride))
+
+    def test_deepspeech2_stride(self):
+        self.assertEqual(ASRModel.TimeStride(ASRModel.BuildModel(193, 28)), 4)
+
+    def test_future_frames_dont_change_past_outputs(self):
+        model = ASRModel.BuildStreamingModel(193, 28, _cell = "lstm", _layers = 2, _units = 32)
+
+        rng = np.random.default_rng(42)
+        spectrogram = rng.standard_normal((1, 80, 193)).astype(np.float32)
+
+        changed = spectrogram.copy()
+        changed[:, 48:] = rng.standard_normal((1, 32, 193))
+
+        before = np.asarray(model(spectrogram, training = False))
+        after = np.asarray(model(changed, training = False))
+
+        # The convolutions and the RowConv see at most 14 frames ahead, so the first 32 frames
+        # (8 time steps) don't depend on anything from frame 48 on
+        np.testing.assert_allclose(before[:, :8], after[:, :8], rtol = 1e-5, atol = 1e-5)
+        self.assertFalse(np.allclose(before[:, -4:], after[:, -4:]))
+
+    def test_build_from_config(self):
+        model = ASRModel.Build(193, 28, {"architecture": "streaming", "layers": "2", "units": "64", "stride": "2"})
+
+        self.assertEqual(ASRModel.TimeStride(model), 2)
+        self.assertEqual(model.output_shape[-1], 29)
+
+        with self.assertRaises(ValueError):
+            ASRModel.Build(193, 28, {"architecture": "transformer"})
+
+        with self.assertRaises(ValueError):
+            ASRModel.BuildStreamingModel(193, 28, _stride = 3)
+
+    def test_save_and_load(self):
+        model = ASRModel.Compile(ASRModel.BuildStreamingModel(193, 28, _layers = 1, _units = 32), 1e-4)
+        spectrogram = np.random.default_rng(42).standard_normal((1, 24, 193)).astype(np.float32)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "streaming.keras")
+            model.save(path)
+
+            loaded = load_model(path, custom_objects = {'ctcloss': ASRModel.ctcloss}, safe_mode = False)
+
+        np.testing.assert_allclose(model(spectrogram), loaded(spectrogram), rtol = 1e-5, atol = 1e-5)
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
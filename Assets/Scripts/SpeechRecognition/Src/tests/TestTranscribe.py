@@ -0,0 +1,93 @@
+# Lucas Davis
+
+import os
+import sys
+import csv
+import shutil
+import tempfile
+import numpy as np
+
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "API"))
+
+from Benchmarks.Common import SyntheticCSV
+from Model.ASRModel import ASRModel
+from Recognition import SpeechRec
+from Scripts.Transcribe import Transcribe, Transcriber, ErrorRate, ComputeFeatures
+
+class TestTranscribe(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.csvPath = SyntheticCSV(cls.directory, 11, np.random.default_rng(42), 0.5, 2.0)
+
+        model = ASRModel.BuildStreamingModel(193, 28, _layers = 1, _units = 32)
+        cls.speechRec = SpeechRec(model, "greedy", _vad = False)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def Read(self, _path):
+        with open(_path, newline = '', encoding = 'utf-8') as outputFile:
+            return list(csv.DictReader(outputFile))
+
+    def test_every_clip_is_written(self):
+        outputPath = os.path.join(self.directory, "predictions.csv")
+
+        clips, audioSeconds, seconds, errorRate = Transcribe(self.speechRec, self.csvPath, outputPath, 4, 2, 2, _verbose = False)
+        rows = self.Read(outputPath)
+        audioPaths, transcripts = self.speechRec.process.LoadCSV(self.csvPath)
+
+        self.assertEqual(clips, 11)
+        self.assertEqual(sorted(row["filename"] for row in rows), sorted(audioPaths))
+        self.assertGreater(audioSeconds, 5.5)
+        self.assertIsNotNone(errorRate)
+
+    def test_matches_batched_predictions(self):
+        outputPath = os.path.join(self.directory, "batched.csv")
+
+        Transcribe(self.speechRec, self.csvPath, outputPath, 3, 3, 2, _verbose = False)
+        rows = self.Read(outputPath)
+
+        # The rows are in the order the clips were batched in, so every three rows went through
+        # the model together
+        for i in range(0, len(rows), 3):
+            batch = rows[i:i + 3]
+            spectrograms = [ComputeFeatures(row["filename"])[0] for row in batch]
+
+            self.assertEqual([row["prediction"] for row in batch], self.speechRec.PredictSpectrograms(spectrograms))
+
+    def test_rows_are_sorted_by_length(self):
+        outputPath = os.path.join(self.directory, "sorted.csv")
+
+        Transcribe(self.speechRec, self.csvPath, outputPath, 4, 1, 1, _verbose = False)
+        sizes = [os.path.getsize(row["filename"]) for row in self.Read(outputPath)]
+
+        self.assertEqual(sizes, sorted(sizes))
+
+    def test_unreadable_clip_raises(self):
+        audioPaths, _ = self.speechRec.process.LoadCSV(self.csvPath)
+        audioPaths = list(audioPaths) + [os.path.join(self.directory, "missing.wav")]
+
+        transcriber = Transcriber(self.speechRec, 2, 2, 1, _prefetch = 1)
+
+        with self.assertRaises(Exception):
+            transcriber.Run(audioPaths, transcriber.Order(audioPaths, None), lambda *_: None)
+
+    def test_error_rate_skips_empty_references(self):
+        errorRate = ErrorRate()
+
+        self.assertIsNone(errorRate.Value())
+
+        errorRate.Add(["light the fire", ""], ["light a fire", "anything"])
+        errorRate.Add(["wolf"], ["wolf"])
+
+        self.assertAlmostEqual(errorRate.Value(), 0.25)
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
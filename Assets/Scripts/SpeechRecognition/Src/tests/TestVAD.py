@@ -0,0 +1,121 @@
+# Lucas Davis
+
+import os
+import sys
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from unittest.mock import Mock
+
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "API"))
+
+from Data.Process import Process
+from Data.VAD import VAD
+from Recognition import SpeechRec
+
+def Recording(_rng, _bursts, _seconds = 5.0):
+    """
+    A fixed length recording like the game sends: quiet microphone noise with a tone wherever
+    the player speaks
+
+    Parameters:
+        - _rng: A numpy Generator
+        - _bursts: A list of (start, end) times in seconds where the tone plays
+        - _seconds: The length of the recording
+
+    Returns:
+        A np.float32 audio clip
+    """
+    t = np.arange(int(_seconds * 16000)) / 16000
+    audio = 1e-4 * _rng.standard_normal(t.shape[0])
+
+    for start, end in _bursts:
+        inside = (t >= start) & (t < end)
+        audio[inside] += 0.3 * np.sin(2 * np.pi * 300 * t[inside])
+
+    return audio.astype(np.float32)
+
+class TestVAD(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        tf.random.set_seed(42)
+
+        cls.process = Process()
+        cls.rng = np.random.default_rng(42)
+
+        cls.model = keras.Sequential([
+            keras.layers.Input((None, 193)),
+            keras.layers.Dense(29)
+        ])
+
+    def Segments(self, _audio, _split = False):
+        return VAD(self.process, _split).Segments(np.asarray(self.process.Spectrogram(_audio)))
+
+    def test_silence_is_trimmed(self):
+        segments = self.Segments(Recording(self.rng, [(1.5, 3.0)]))
+
+        # 10 ms frames with 150 ms of padding on both sides
+        self.assertEqual(len(segments), 1)
+        self.assertAlmostEqual(segments[0][0], 135, delta = 3)
+        self.assertAlmostEqual(segments[0][1], 315, delta = 3)
+
+    def test_speech_from_start_to_end_is_kept(self):
+        audio = Recording(self.rng, [(0.0, 5.0)])
+        frames = self.process.Spectrogram(audio).shape[0]
+
+        self.assertEqual(self.Segments(audio), [(0, frames)])
+
+    def test_pauses_split_segments(self):
+        audio = Recording(self.rng, [(0.5, 1.5), (2.5, 3.5), (3.7, 4.0), (4.5, 4.52)])
+
+        # The 200 ms pause is too short to split at, and the 20 ms click is dropped
+        self.assertEqual(len(self.Segments(audio)), 1)
+        self.assertEqual(len(self.Segments(audio, True)), 2)
+
+    def test_silent_clip_skips_model(self):
+        speechRec = SpeechRec(self.model, "greedy", _vad = True)
+        speechRec.inferBatch = Mock()
+
+        predictions = speechRec.PredictBatch([np.zeros(16000, dtype = np.float32), Recording(self.rng, [])])
+
+        self.assertEqual(predictions, ["", ""])
+        self.assertEqual(speechRec.Predict(np.zeros(16000, dtype = np.float32)), "")
+        speechRec.inferBatch.assert_not_called()
+
+    def test_sub_frame_clip_skips_model(self):
+        # Empty and shorter than one 256 sample stft frame, both have no spectrogram frames
+        clips = [np.zeros(0, dtype = np.float32), self.rng.uniform(-0.5, 0.5, 100).astype(np.float32)]
+
+        for strategy in ["greedy", "beam"]:
+            for vad in [False, True]:
+                speechRec = SpeechRec(self.model, strategy, _vad = vad)
+
+                for clip in clips:
+                    self.assertEqual(speechRec.Predict(clip), "")
+
+                self.assertEqual(speechRec.PredictBatch(clips), ["", ""])
+
+                # The clips that are long enough still go through the model
+                self.assertIsInstance(speechRec.PredictBatch(clips + [Recording(self.rng, [(0.2, 0.8)], 1.0)])[2], str)
+
+    def test_segments_are_batched_together(self):
+        speechRec = SpeechRec(self.model, "greedy", _vad = True)
+        speechRec.vad = VAD(self.process, True)
+
+        inferBatch = speechRec.inferBatch
+        speechRec.inferBatch = Mock(side_effect = inferBatch)
+
+        audio = Recording(self.rng, [(0.5, 1.5), (2.5, 3.5)])
+        prediction = speechRec.Predict(audio)
+
+        self.assertIsInstance(prediction, str)
+        self.assertEqual(speechRec.inferBatch.call_count, 1)
+        self.assertEqual(speechRec.inferBatch.call_args[0][0].shape[0], 2)
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
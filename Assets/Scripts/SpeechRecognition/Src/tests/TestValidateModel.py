@@ -0,0 +1,131 @@
+# Lucas Davis
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from jiwer import wer
+
+import unittest
+from unittest.mock import Mock
+
+from Data.Process import Process
+from Model.ASRModel import ASRModel
+from Model.ValidateModel import ValidateModel
+
+class TestValidateModel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        tf.random.set_seed(42)
+
+        cls.process = Process()
+
+        rng = np.random.default_rng(42)
+        spectrograms = rng.normal(size = (12, 40, 193)).astype(np.float32)
+        labels = cls.process.charToNum(tf.strings.unicode_split(["the door opens"] * 12, 'UTF-8')).to_tensor().numpy()
+
+        cls.dataset = tf.data.Dataset.from_tensor_slices((spectrograms, labels)).batch(4)
+
+    def Model(self):
+        """
+        A tiny model with the same input and output as the real one, so training is quick
+        """
+        model = keras.Sequential([
+            keras.layers.Input((None, 193)),
+            keras.layers.Dense(29)
+        ])
+        model.compile(optimizer = keras.optimizers.Adam(1e-2), loss = ASRModel.ctcloss)
+
+        return model
+
+    def ErrorRate(self, _model, _dataset):
+        """
+        The error rate as the callback used to compute it, one item at a time
+        """
+        transcripts, predictions = [], []
+
+        for spectrogram, labels in _dataset:
+            for item in ASRModel.ctcDecoder(_model.predict(spectrogram, verbose = 0)):
+                predictions.append(self.process.ConvertLabel(item))
+
+            for item in labels:
+                transcripts.append(self.process.ConvertLabel(item))
+
+        return wer(transcripts, predictions)
+
+    def test_error_rate_reaches_logs(self):
+        model = self.Model()
+        validate = ValidateModel(self.dataset, _everyEpochs = 1, _subsample = 0, _asynchronous = True)
+
+        history = model.fit(self.dataset, validation_data = self.dataset, epochs = 2, callbacks = [validate], verbose = 0)
+
+        self.assertEqual(len(history.history['Error_Rate']), 2)
+        self.assertEqual([epoch for epoch, _ in validate.errorRate], [0, 1])
+
+        # The last error rate was computed on the weights training ended with
+        self.assertAlmostEqual(history.history['Error_Rate'][-1], self.ErrorRate(model, self.dataset))
+
+    def test_every_n_epochs(self):
+        model = self.Model()
+        validate = ValidateModel(self.dataset, _everyEpochs = 2, _subsample = 0, _asynchronous = True)
+
+        history = model.fit(self.dataset, validation_data = self.dataset, epochs = 4, callbacks = [validate], verbose = 0)
+
+        # The first epoch is always evaluated, so ModelCheckpoint has an error rate from the start
+        self.assertEqual([epoch for epoch, _ in validate.errorRate], [0, 1, 3])
+        self.assertEqual(len(history.history['Error_Rate']), 4)
+        self.assertEqual(history.history['Error_Rate'][0], validate.errorRate[0][1])
+        self.assertEqual(history.history['Error_Rate'][2], validate.errorRate[1][1])
+
+    def test_first_epoch_has_an_error_rate(self):
+        model = self.Model()
+        validate = ValidateModel(self.dataset, _everyEpochs = 2, _subsample = 0, _asynchronous = False)
+        validate.set_model(model)
+        validate.on_train_begin()
+
+        logs = {}
+        validate.on_epoch_begin(0)
+        validate.on_epoch_end(0, logs)
+
+        self.assertIn('Error_Rate', logs)
+        self.assertAlmostEqual(logs['Error_Rate'], self.ErrorRate(model, self.dataset))
+
+    def test_beam_search_skips_the_padding(self):
+        rng = np.random.default_rng(42)
+        spectrograms = rng.normal(size = (4, 40, 193)).astype(np.float32)
+        spectrograms[1, 25:] = 0
+        spectrograms[2, 7:] = 0
+
+        labels = self.process.charToNum(tf.strings.unicode_split(["the door"] * 4, 'UTF-8')).to_tensor().numpy()
+        dataset = tf.data.Dataset.from_tensor_slices((spectrograms, labels)).batch(4)
+
+        decoder = Mock()
+        decoder.DecodeBatch.side_effect = lambda _logits, _lengths: ["the door"] * len(_logits)
+
+        # A model built without masking, with the stride of the real one
+        model = ASRModel.BuildStreamingModel(193, 28, _layers = 1, _units = 16, _masking = False)
+
+        validate = ValidateModel(dataset, decoder, _everyEpochs = 1, _subsample = 0, _asynchronous = False)
+        validate.set_model(model)
+        validate.on_train_begin()
+
+        self.assertEqual(validate.ErrorRate(model.get_weights()), 0.0)
+
+        logits, lengths = decoder.DecodeBatch.call_args[0]
+
+        self.assertEqual(logits.shape[1], 10)
+        np.testing.assert_array_equal(lengths, ASRModel.OutputLength(np.array([40, 25, 7, 40]), 4))
+
+    def test_subsample(self):
+        model = self.Model()
+        validate = ValidateModel(self.dataset, _everyEpochs = 1, _subsample = 1, _asynchronous = False)
+
+        model.fit(self.dataset, epochs = 1, callbacks = [validate], verbose = 0)
+
+        self.assertEqual(len(validate.transcripts), 4)
+        self.assertAlmostEqual(validate.errorRate[0][1], self.ErrorRate(model, self.dataset.take(1)))
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()
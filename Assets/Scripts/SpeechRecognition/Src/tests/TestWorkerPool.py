@@ -0,0 +1,284 @@
+# Lucas Davis
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import unittest
+from unittest.mock import Mock, patch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "API"))
+
+import ASR_API
+from Recognition import SpeechRec
+from Backend import LocalBackend
+from WorkerPool import WorkerPool
+
+API_CONFIG = {
+    'batching': 'True',
+    'max_batch_size': '4',
+    'max_wait_ms': '10',
+    'stream_timeout_s': '30',
+    'stream_max_sessions': '4',
+    'intra_op_threads': '1',
+    'inter_op_threads': '1'
+}
+
+class TestWorkerPool(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        tf.random.set_seed(42)
+
+        # A tiny model with the same input and output as the real one, so the workers load quickly
+        model = keras.Sequential([
+            keras.layers.Input((None, 193)),
+            keras.layers.Dense(29)
+        ])
+
+        cls.directory = tempfile.mkdtemp()
+        cls.modelPath = os.path.join(cls.directory, "ASR.keras")
+        model.save(cls.modelPath)
+
+        cls.local = LocalBackend(SpeechRec(model), API_CONFIG)
+        cls.pool = WorkerPool(API_CONFIG, 2, cls.modelPath)
+
+        rng = np.random.default_rng(42)
+        cls.clips = [rng.normal(scale = 0.1, size = int(seconds * 16000)).astype(np.float32) for seconds in [0.5, 1.0, 1.5, 2.0]]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.Close()
+        cls.local.Close()
+        shutil.rmtree(cls.directory)
+
+    def test_predictions_match_in_process(self):
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(self.pool.Predict, self.clips))
+
+        self.assertEqual(results, [self.local.Predict(clip) for clip in self.clips])
+
+    def test_stream_stays_on_one_worker(self):
+        audio = self.clips[-1]
+
+        for start in range(0, len(audio) - 8000, 8000):
+            self.pool.StreamPush("player", audio[start:start + 8000])
+
+        final = self.pool.StreamEnd("player", audio[start + 8000:])
+
+        self.assertEqual(final, self.local.Predict(audio))
+
+    def test_phrases_reach_every_worker(self):
+        self.pool.RegisterPhrases("door", ["open the door", "light the fire"])
+        self.local.RegisterPhrases("door", ["open the door", "light the fire"])
+
+        expected = self.local.PredictPhrase(self.clips[0], "door")
+
+        for index in range(self.pool.count):
+            prediction, confidence = self.pool.Call(index, "PredictPhrase", self.clips[0], "door").result(timeout = 60)
+
+            self.assertEqual(prediction, expected[0])
+            self.assertAlmostEqual(confidence, expected[1], places = 5)
+
+        with self.assertRaises(KeyError):
+            self.pool.PredictPhrase(self.clips[0], "missing")
+
+    def test_dead_worker_is_replaced(self):
+        self.pool.RegisterPhrases("fire", ["light the fire"])
+
+        dead = self.pool.processes[0]
+        dead.kill()
+        dead.join()
+
+        deadline = time.monotonic() + 10
+
+        while self.pool.processes[0] is dead and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+        self.assertIsNot(self.pool.processes[0], dead)
+        self.assertTrue(self.pool.ready[0].wait(120))
+
+        # The replacement works and got the phrase lists registered before it started
+        prediction, _ = self.pool.Call(0, "PredictPhrase", self.clips[0], "fire").result(timeout = 60)
+
+        self.assertEqual(prediction, "light the fire")
+
+class TestRestarts(unittest.TestCase):
+    """
+    A pool whose workers are mocks instead of processes, and that only checks on them when the
+    test calls Monitor
+    """
+    def setUp(self):
+        self.loads = True
+        self.starts = []
+
+        for method, replacement in [("Start", self.Start), ("Reader", lambda pool: None)]:
+            patcher = patch.object(WorkerPool, method, autospec = True, side_effect = replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.pool = WorkerPool(dict(API_CONFIG, max_restarts = '2', restart_backoff_s = '0.2', metrics_timeout_s = '0.2'), 3)
+
+    def Start(self, _pool, _index):
+        _pool.processes[_index] = Mock(exitcode = 1)
+        _pool.processes[_index].is_alive.return_value = True
+        _pool.requests[_index] = Mock()
+
+        if self.loads:
+            _pool.ready[_index].set()
+
+        self.starts.append(_index)
+
+    def Crash(self, _index):
+        self.pool.processes[_index].is_alive.return_value = False
+
+    def test_only_ready_workers_get_requests(self):
+        self.pool.inFlight = [3, 0, 5]
+        self.assertEqual(self.pool.LeastBusy(), 1)
+
+        self.pool.ready[1].clear()
+        self.assertEqual(self.pool.LeastBusy(), 0)
+
+        # Without any ready worker the request waits on the least busy one
+        self.pool.ready[0].clear()
+        self.pool.ready[2].clear()
+        self.assertEqual(self.pool.LeastBusy(), 1)
+
+    def test_restarts_back_off(self):
+        # A worker that was ready is replaced right away, even by a replacement that never loads
+        self.loads = False
+        self.Crash(0)
+        self.pool.Monitor()
+
+        self.assertEqual(self.starts[3:], [0])
+        self.assertNotEqual(self.pool.LeastBusy(), 0)
+
+        # Every replacement that dies before it is ready waits twice as long as the one before
+        for restarts, delay in [(2, 0.2), (3, 0.4)]:
+            self.Crash(0)
+            self.pool.Monitor()
+
+            time.sleep(delay * 0.5)
+            self.pool.Monitor()
+            self.assertEqual(len(self.starts[3:]), restarts - 1)
+
+            time.sleep(delay * 0.6)
+            self.pool.Monitor()
+            self.assertEqual(len(self.starts[3:]), restarts)
+
+        # The third one in a row is one too many
+        self.Crash(0)
+        self.pool.Monitor()
+        time.sleep(1.0)
+        self.pool.Monitor()
+
+        self.assertEqual(self.starts[3:], [0, 0, 0])
+
+        # Its requests fail instead of waiting for it forever
+        future = self.pool.Call(0, "Predict", np.zeros(1600, dtype = np.float32))
+        self.pool.Monitor()
+
+        with self.assertRaises(RuntimeError):
+            future.result(timeout = 1)
+
+    def test_ready_once_phrases_are_registered(self):
+        self.pool.ready[0].clear()
+        process = self.pool.processes[0]
+        pending = [Future(), Future()]
+
+        restore = threading.Thread(target = self.pool.Restore, args = (0, process, pending))
+        restore.start()
+
+        pending[0].set_result(None)
+        self.assertFalse(self.pool.ready[0].wait(0.2))
+
+        pending[1].set_result(None)
+        restore.join(5)
+
+        self.assertTrue(self.pool.ready[0].is_set())
+
+    def test_failed_registration_restarts_worker(self):
+        self.pool.ready[1].clear()
+        process = self.pool.processes[1]
+        pending = [Future()]
+        pending[0].set_exception(KeyError("door"))
+
+        self.pool.Restore(1, process, pending)
+
+        self.assertFalse(self.pool.ready[1].is_set())
+        process.terminate.assert_called_once()
+
+        # A replacement that was started in the meantime is left alone
+        self.pool.Restore(1, process, pending)
+        self.pool.processes[1] = Mock()
+        self.pool.Restore(1, process, pending)
+
+        self.assertEqual(process.terminate.call_count, 2)
+
+    def test_metrics_skip_workers_that_dont_answer(self):
+        snapshot = ASR_API.metrics.Snapshot()
+        snapshot["rejected"] = 2
+
+        Call = self.pool.Call
+
+        def Answer(_index, _method, *_args):
+            future = Call(_index, _method, *_args)
+
+            if _index == 0:
+                future.set_result(snapshot)
+            elif _index == 1:
+                future.set_exception(RuntimeError("Worker 1 stopped with exit code 1"))
+
+            return future
+
+        self.pool.Call = Answer
+
+        start = time.monotonic()
+        merged = self.pool.Metrics()
+
+        self.assertEqual(merged["rejected"], 2)
+        self.assertLess(time.monotonic() - start, 1.0)
+
+class TestAdmission(unittest.TestCase):
+    def test_full_queue_is_rejected_but_index_answers(self):
+        release = threading.Event()
+
+        backend = Mock()
+        backend.Predict.side_effect = lambda audio: release.wait(5) and "light the fire"
+
+        ASR_API.backend = backend
+        ASR_API.admission = threading.BoundedSemaphore(1)
+        ASR_API.ready.set()
+
+        client = ASR_API.app.test_client()
+        audio = np.zeros(1600, dtype = np.float32).tobytes()
+
+        with ThreadPoolExecutor(1) as executor:
+            first = executor.submit(client.post, '/ASR', data = audio)
+
+            while backend.Predict.call_count == 0:
+                time.sleep(0.01)
+
+            rejected = client.post('/ASR', data = audio)
+            index = client.get('/')
+
+            release.set()
+
+            self.assertEqual(rejected.status_code, 503)
+            self.assertEqual(index.status_code, 200)
+            self.assertEqual(first.result().get_json()["prediction"], "light the fire")
+
+        # The slot is free again once the first request finished
+        self.assertEqual(client.post('/ASR', data = audio).status_code, 200)
+
+def main():
+    unittest.main(verbosity = 2)
+
+if __name__ == '__main__':
+    main()